@@ -421,6 +421,7 @@ class SupplierWebConfigForm(StyledModelForm):
             "request_timeout",
             "use_selenium",
             "selenium_wait_seconds",
+            "selenium_http_first",
             "price_multiplier",
             "is_active",
         ]
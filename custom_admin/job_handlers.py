@@ -0,0 +1,286 @@
+"""Catalog job handlers run by the job queue worker.
+
+Each handler receives the job's JSON ``params`` and a ``JobProgress`` (to
+pass to the scraper's ``set_progress_callback``) and returns the importer's
+result dict (``{"success": False, "error": ...}`` marks the job as failed).
+Params only carry ids and keys; everything else is loaded when the job runs.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Iterable
+
+from .progress import JobProgress
+from .services import job_handler
+
+EVRODIM_SUBCATEGORY = "stoly-evrodim"
+KRESLALUX_SUBCATEGORY = "ortopedichni-krisla"
+DIVANOFF_SUBCATEGORY = "divany-divanoff"
+
+
+def _updater(updater_cls: type, config: Any, progress: JobProgress) -> Any:
+    updater = updater_cls(config)
+    if hasattr(updater, "set_progress_callback"):
+        updater.set_progress_callback(progress)
+    return updater
+
+
+def _bulk_run(
+    configs: Iterable,
+    updater_cls: type,
+    method_name: str,
+    progress: JobProgress,
+    **kwargs: bool,
+) -> dict:
+    """Run updater_cls(config).<method_name>(**kwargs) for each config, aggregating results."""
+    configs = list(configs)
+    success_count = 0
+    errors: list[str] = []
+    for idx, config in enumerate(configs, 1):
+        progress.update(processed=idx - 1, total=len(configs), message=config.name)
+        try:
+            result = getattr(_updater(updater_cls, config, progress), method_name)(
+                **kwargs
+            )
+            if result.get("success"):
+                success_count += 1
+            else:
+                errors.append(
+                    f"{config.name}: {result.get('error', 'невідома помилка')}"
+                )
+                progress.update(error=errors[-1])
+        except Exception as exc:
+            errors.append(f"{config.name}: {exc}")
+            progress.update(error=errors[-1])
+    progress.update(processed=len(configs), total=len(configs))
+    return {
+        "success": True,
+        "updated_configs": success_count,
+        "total_configs": len(configs),
+        "errors": errors,
+    }
+
+
+def _run_config_updates(
+    model: Any, updater_cls: type, params: dict, progress: JobProgress
+) -> dict:
+    options = {key: True for key in ("force", "dry_run") if params.get(key)}
+    if "config_id" in params:
+        try:
+            config = model.objects.get(pk=params["config_id"])
+        except model.DoesNotExist:
+            return {
+                "success": False,
+                "error": f"Конфігурацію #{params['config_id']} не знайдено",
+            }
+        progress.update(message=config.name)
+        return _updater(updater_cls, config, progress).update_prices(**options)
+    configs = model.objects.filter(pk__in=params.get("config_ids", []))
+    return _bulk_run(configs, updater_cls, "update_prices", progress, **options)
+
+
+# ── Config-based updaters ─────────────────────────────────────────────────────
+
+
+@job_handler("google_sheet", "update_prices")
+def google_sheet_update_prices(params: dict, progress: JobProgress) -> dict:
+    from price_parser.models import GoogleSheetConfig
+    from price_parser.services import GoogleSheetsPriceUpdater
+
+    return _run_config_updates(
+        GoogleSheetConfig, GoogleSheetsPriceUpdater, params, progress
+    )
+
+
+@job_handler("supplier_feed", "update_prices")
+def supplier_feed_update_prices(params: dict, progress: JobProgress) -> dict:
+    from price_parser.models import SupplierFeedConfig
+    from price_parser.services import SupplierFeedPriceUpdater
+
+    return _run_config_updates(
+        SupplierFeedConfig, SupplierFeedPriceUpdater, params, progress
+    )
+
+
+@job_handler("supplier_web", "update_prices")
+def supplier_web_update_prices(params: dict, progress: JobProgress) -> dict:
+    from price_parser.models import SupplierWebConfig
+    from price_parser.services import SupplierWebPriceUpdater
+
+    return _run_config_updates(
+        SupplierWebConfig, SupplierWebPriceUpdater, params, progress
+    )
+
+
+# ── Supplier scrapers ─────────────────────────────────────────────────────────
+
+
+@job_handler("evrodim", "update_prices")
+def evrodim_update_prices(params: dict, progress: JobProgress) -> dict:
+    from price_parser.evrodim_scraper import EvrodimScraper
+
+    scraper = EvrodimScraper()
+    scraper.set_progress_callback(progress)
+    return scraper.update_prices(
+        subcategory_slug=EVRODIM_SUBCATEGORY, dry_run=bool(params.get("dry_run"))
+    )
+
+
+@job_handler("evrodim", "update_params")
+def evrodim_update_params(params: dict, progress: JobProgress) -> dict:
+    from price_parser.evrodim_scraper import EvrodimScraper
+
+    scraper = EvrodimScraper()
+    scraper.set_progress_callback(progress)
+    return scraper.update_params(subcategory_slug=EVRODIM_SUBCATEGORY)
+
+
+def _andersen_catalogs(params: dict) -> list:
+    from price_parser.andersen_scraper import CATALOG_CONFIGS
+
+    return params.get("catalogs") or list(CATALOG_CONFIGS.keys())
+
+
+@job_handler("andersen", "update_prices")
+def andersen_update_prices(params: dict, progress: JobProgress) -> dict:
+    from price_parser.andersen_scraper import AndersenScraper
+
+    scraper = AndersenScraper()
+    scraper.set_progress_callback(progress)
+    totals: dict[str, Any] = {"checked": 0, "updated": 0, "not_found": 0, "errors": []}
+    change_sets: list[str] = []
+    for catalog_key in _andersen_catalogs(params):
+        result = scraper.update_prices(catalog_key, dry_run=bool(params.get("dry_run")))
+        if not result.get("success", True):
+            totals["errors"].append(f"{catalog_key}: {result.get('error')}")
+            continue
+        for key in ("checked", "updated", "not_found"):
+            totals[key] += result.get(key, 0)
+        totals["errors"].extend(result.get("errors", []))
+        if result.get("change_set_id"):
+            change_sets.append(f"#{result['change_set_id']}")
+    if change_sets:
+        totals["change_sets"] = ", ".join(change_sets)
+    return totals
+
+
+@job_handler("andersen", "import")
+def andersen_run_import(params: dict, progress: JobProgress) -> dict:
+    from price_parser.andersen_scraper import AndersenScraper
+
+    scraper = AndersenScraper()
+    scraper.set_progress_callback(progress)
+    totals: dict[str, Any] = {"created": 0, "updated": 0, "skipped": 0, "errors": []}
+    for catalog_key in _andersen_catalogs(params):
+        result = scraper.run_import(catalog_key=catalog_key, dry_run=False)
+        if not result.get("success", True):
+            totals["errors"].append(f"{catalog_key}: {result.get('error')}")
+            continue
+        for key in ("created", "updated", "skipped"):
+            totals[key] += result.get(key, 0)
+        totals["errors"].extend(result.get("errors", []))
+    return totals
+
+
+@job_handler("kreslalux", "update_prices")
+def kreslalux_update_prices(params: dict, progress: JobProgress) -> dict:
+    from price_parser.kreslalux_scraper import KreslaluxScraper
+
+    scraper = KreslaluxScraper()
+    scraper.set_progress_callback(progress)
+    return scraper.update_prices(dry_run=bool(params.get("dry_run")))
+
+
+@job_handler("kreslalux", "import")
+def kreslalux_run_import(params: dict, progress: JobProgress) -> dict:
+    from price_parser.kreslalux_scraper import KreslaluxScraper
+
+    scraper = KreslaluxScraper()
+    scraper.set_progress_callback(progress)
+    return scraper.run_import(dry_run=False, subcategory_slug=KRESLALUX_SUBCATEGORY)
+
+
+def _preview_unsupported(supplier: str) -> dict:
+    """Divanoff and Eurosof write per-fabric-category prices straight to the
+    catalog; a change set cannot hold them, so a dry run is refused."""
+    return {
+        "success": False,
+        "error": f"Попередній перегляд цін {supplier} не підтримується.",
+    }
+
+
+def _eurosof_run(params: dict, progress: JobProgress, update_prices: bool) -> dict:
+    from price_parser.eurosof_scraper import EurosofImporter
+    from price_parser.management.commands.import_eurosof import (
+        CATALOG_CONFIGS,
+        DEFAULT_XLSX,
+    )
+
+    catalogs: list[dict[str, Any]] = [
+        CATALOG_CONFIGS[key] for key in params.get("catalogs") or CATALOG_CONFIGS
+    ]
+    importer = EurosofImporter(xlsx_path=DEFAULT_XLSX)
+    importer.set_progress_callback(progress)
+    totals: dict[str, Any] = {
+        "created": 0,
+        "updated": 0,
+        "skipped": 0,
+        "unmatched": 0,
+        "errors": [],
+    }
+    for cfg in catalogs:
+        result = importer.run(
+            catalog_urls=[cfg["url"]],
+            subcategory_name=cfg["subcategory_name"],
+            subcategory_slug=cfg["subcategory_slug"],
+            category_name=cfg["category_name"],
+            corner=cfg.get("corner", False),
+            bed=cfg.get("bed", False),
+            dry_run=False,
+            update_prices=update_prices,
+        )
+        for key in ("created", "updated", "skipped", "unmatched"):
+            totals[key] += result.get(key, 0)
+        totals["errors"].extend(result.get("errors", []))
+    return totals
+
+
+@job_handler("eurosof", "import")
+def eurosof_run_import(params: dict, progress: JobProgress) -> dict:
+    return _eurosof_run(params, progress, update_prices=False)
+
+
+@job_handler("eurosof", "update_prices")
+def eurosof_update_prices(params: dict, progress: JobProgress) -> dict:
+    if params.get("dry_run"):
+        return _preview_unsupported("Eurosof")
+    return _eurosof_run(params, progress, update_prices=True)
+
+
+@job_handler("divanoff", "update_prices")
+def divanoff_update_prices(params: dict, progress: JobProgress) -> dict:
+    if params.get("dry_run"):
+        return _preview_unsupported("Divanoff")
+
+    from price_parser.divanoff_scraper import DivanoffScraper
+    from price_parser.management.commands.import_divanoff import DEFAULT_XLSX
+
+    scraper = DivanoffScraper()
+    scraper.set_progress_callback(progress)
+    return scraper.update_prices(
+        subcategory_slug=DIVANOFF_SUBCATEGORY,
+        xlsx_path=DEFAULT_XLSX,
+    )
+
+
+@job_handler("divanoff", "import")
+def divanoff_run_import(params: dict, progress: JobProgress) -> dict:
+    from price_parser.divanoff_scraper import DivanoffScraper
+    from price_parser.management.commands.import_divanoff import DEFAULT_XLSX
+
+    scraper = DivanoffScraper()
+    scraper.set_progress_callback(progress)
+    return scraper.run_import(
+        subcategory_slug=DIVANOFF_SUBCATEGORY,
+        xlsx_path=DEFAULT_XLSX,
+    )
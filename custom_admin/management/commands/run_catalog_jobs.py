@@ -0,0 +1,60 @@
+import signal
+from types import FrameType
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from custom_admin.services import JobWorker
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued catalog import/update jobs (CatalogUpdateJob). Start one or "
+        "more of these next to the web server; interrupted jobs are resumed"
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=getattr(settings, "CATALOG_JOB_CONCURRENCY", 2),
+            help="Jobs run at the same time by this worker (default: settings.CATALOG_JOB_CONCURRENCY)",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Seconds between queue checks when idle",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty instead of waiting for new jobs",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency must be positive")
+
+        worker = JobWorker(
+            concurrency=options["concurrency"],
+            poll_interval=options["poll_interval"],
+        )
+
+        def _stop(signum: int, frame: Optional[FrameType]) -> None:
+            self.stdout.write("Stopping: waiting for running jobs to finish...")
+            worker.stop()
+
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+
+        self.stdout.write(
+            f"Worker {worker.name} started (concurrency {worker.concurrency})"
+        )
+        processed = worker.run(once=options["once"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Worker {worker.name} stopped, {processed} jobs processed"
+            )
+        )
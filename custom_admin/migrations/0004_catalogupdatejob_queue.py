@@ -0,0 +1,80 @@
+# Generated by Django 5.2 on 2026-10-19 06:02
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fail_orphaned_jobs(apps, schema_editor):
+    """Jobs "running" in web-process threads cannot be resumed by the queue."""
+    CatalogUpdateJob = apps.get_model("custom_admin", "CatalogUpdateJob")
+    CatalogUpdateJob.objects.filter(status="running").update(
+        status="error",
+        detail="Перервано: фонові завдання перенесено в чергу воркера.",
+        finished_at=timezone.now(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("custom_admin", "0003_alter_catalogupdatejob_supplier"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="catalogupdatejob",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="catalogupdatejob",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="catalogupdatejob",
+            name="params",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="catalogupdatejob",
+            name="started_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="catalogupdatejob",
+            name="worker",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name="catalogupdatejob",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("queued", "В черзі"),
+                    ("running", "Виконується"),
+                    ("success", "Успішно"),
+                    ("error", "Помилка"),
+                ],
+                default="queued",
+                max_length=10,
+            ),
+        ),
+        migrations.RunPython(fail_orphaned_jobs, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="catalogupdatejob",
+            index=models.Index(
+                fields=["status", "created_at"], name="catalog_job_status_created"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="catalogupdatejob",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status__in", ("queued", "running"))),
+                fields=("supplier", "action", "catalog_key"),
+                name="catalog_job_active_uniq",
+            ),
+        ),
+    ]
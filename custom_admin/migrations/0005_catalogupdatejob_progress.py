@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("custom_admin", "0004_catalogupdatejob_queue"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="catalogupdatejob",
+            name="progress",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -19,24 +19,45 @@ class CatalogUpdateJob(models.Model):
         ("update_params", "Оновлення характеристик"),
     ]
     STATUS_CHOICES = [
+        ("queued", "В черзі"),
         ("running", "Виконується"),
         ("success", "Успішно"),
         ("error", "Помилка"),
     ]
+    ACTIVE_STATUSES = ("queued", "running")
 
     supplier = models.CharField(max_length=20, choices=SUPPLIER_CHOICES)
     action = models.CharField(max_length=20, choices=ACTION_CHOICES)
     catalog_key = models.CharField(max_length=50, blank=True)
-    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="running")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="queued")
+    params = models.JSONField(default=dict, blank=True)
     detail = models.TextField(blank=True)
+    progress = models.JSONField(default=dict, blank=True)
     started_by = models.ForeignKey(
         settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL
     )
+    worker = models.CharField(max_length=100, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
     finished_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["status", "created_at"], name="catalog_job_status_created"
+            ),
+        ]
+        constraints = [
+            # One queued/running job per supplier/action/catalog at a time.
+            models.UniqueConstraint(
+                fields=["supplier", "action", "catalog_key"],
+                condition=models.Q(status__in=("queued", "running")),
+                name="catalog_job_active_uniq",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.get_supplier_display()} · {self.get_action_display()} · {self.status}"
@@ -0,0 +1,174 @@
+"""Structured live progress for running catalog jobs.
+
+Scrapers report progress as free-text lines through ``set_progress_callback``
+(``"[12/340] Назва товару"``, ``"ПОМИЛКА: ..."``). ``JobProgress`` is such a
+callback: it turns the lines into a compact snapshot — processed/total,
+rate, ETA, last message and last error — and publishes it
+
+* to the Django cache on every change (at most every
+  ``CATALOG_JOB_PROGRESS_CACHE_SECONDS``), which the admin page polls, and
+* to ``CatalogUpdateJob.progress`` every ``CATALOG_JOB_PROGRESS_DB_SECONDS``,
+  so the snapshot stays visible after the job ends.
+
+The cache only helps when the worker and the web process share it. With a
+per-process backend (locmem, the default without ``REDIS_URL``) the cache
+is skipped on both sides and the DB copy is written every
+``CATALOG_JOB_PROGRESS_UNSHARED_DB_SECONDS`` instead, so the admin page
+still sees progress within a few seconds.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import CatalogUpdateJob
+
+CACHE_KEY = "catalog_job_progress:{}"
+CACHE_TIMEOUT = 60 * 60 * 24
+
+_COUNTER_RE = re.compile(r"\[(\d+)\s*/\s*(\d+)\]")
+_ERROR_RE = re.compile(r"помилка|error|failed|не вдалося", re.IGNORECASE)
+_LOCAL_CACHE_BACKENDS = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def _setting(name: str, default: float) -> float:
+    return float(getattr(settings, name, default))
+
+
+def _cache_is_shared() -> bool:
+    """Whether the default cache is visible to other processes (worker ↔ web)."""
+    return settings.CACHES["default"]["BACKEND"] not in _LOCAL_CACHE_BACKENDS
+
+
+class JobProgress:
+    """Progress callback for one job, callable from any of the job's threads.
+
+    The publish bookkeeping (when the cache and DB were last written) is
+    guarded by a lock, so concurrent callers never publish the same interval
+    twice. The counters are plain attributes where the last writer wins,
+    which suits scraper lines that each carry their own ``[i/n]`` counter.
+    """
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self.processed = 0
+        self.total: Optional[int] = None
+        self.message = ""
+        self.last_error = ""
+        self.errors = 0
+        self._started = time.monotonic()
+        self._use_cache = _cache_is_shared()
+        self._cache_interval = _setting("CATALOG_JOB_PROGRESS_CACHE_SECONDS", 1)
+        self._db_interval = _setting("CATALOG_JOB_PROGRESS_DB_SECONDS", 15)
+        if not self._use_cache:
+            self._db_interval = min(
+                self._db_interval,
+                _setting("CATALOG_JOB_PROGRESS_UNSHARED_DB_SECONDS", 3),
+            )
+        self._cache_at = float("-inf")
+        self._db_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def __call__(self, message: str) -> None:
+        """Scraper progress callback: parse ``[i/n]`` counters and error lines."""
+        message = str(message).strip()
+        match = _COUNTER_RE.search(message)
+        if match:
+            self.processed, self.total = int(match.group(1)), int(match.group(2))
+        if _ERROR_RE.search(message):
+            self.errors += 1
+            self.last_error = message[:300]
+        self.message = message[:300]
+        self._publish()
+
+    def update(
+        self,
+        processed: Optional[int] = None,
+        total: Optional[int] = None,
+        message: Optional[str] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        if processed is not None:
+            self.processed = processed
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message[:300]
+        if error:
+            self.errors += 1
+            self.last_error = error[:300]
+        self._publish()
+
+    def snapshot(self) -> Dict:
+        elapsed = max(time.monotonic() - self._started, 0.001)
+        rate = self.processed / elapsed
+        eta = None
+        if self.total and rate > 0 and self.processed < self.total:
+            eta = int((self.total - self.processed) / rate)
+        return {
+            "processed": self.processed,
+            "total": self.total,
+            "percent": (
+                round(100 * self.processed / self.total, 1) if self.total else None
+            ),
+            "rate": round(rate * 60, 1),  # items per minute
+            "elapsed": int(elapsed),
+            "eta": eta,
+            "message": self.message,
+            "last_error": self.last_error,
+            "errors": self.errors,
+            "updated_at": timezone.now().isoformat(),
+        }
+
+    def _publish(self, force: bool = False) -> None:
+        now = time.monotonic()
+        with self._lock:
+            to_cache = self._use_cache and (
+                force or now - self._cache_at >= self._cache_interval
+            )
+            to_db = force or now - self._db_at >= self._db_interval
+            if not (to_cache or to_db):
+                return
+            data = self.snapshot()
+            if to_cache:
+                self._cache_at = now
+            if to_db:
+                self._db_at = now
+        if to_cache:
+            cache.set(CACHE_KEY.format(self.job_id), data, CACHE_TIMEOUT)
+        if to_db:
+            CatalogUpdateJob.objects.filter(pk=self.job_id).update(progress=data)
+
+    def flush(self) -> None:
+        self._publish(force=True)
+
+
+def read_progress(jobs: Iterable[CatalogUpdateJob]) -> Dict[int, Dict]:
+    """Latest snapshot per job: the shared cache when available, else the stored one."""
+    jobs = list(jobs)
+    cached = {}
+    if jobs and _cache_is_shared():
+        cached = cache.get_many([CACHE_KEY.format(job.pk) for job in jobs])
+    result = {}
+    for job in jobs:
+        data = cached.get(CACHE_KEY.format(job.pk)) or job.progress or {}
+        result[job.pk] = dict(data, status=job.status)
+    return result
+
+
+def active_jobs() -> List[CatalogUpdateJob]:
+    return list(
+        CatalogUpdateJob.objects.filter(
+            status__in=CatalogUpdateJob.ACTIVE_STATUSES
+        ).only("pk", "status", "progress")
+    )
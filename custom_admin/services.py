@@ -1,33 +1,68 @@
+"""Durable queue for catalog import/update jobs.
+
+Admin views only *enqueue* a ``CatalogUpdateJob`` (supplier, action and JSON
+``params``); the work runs in ``manage.py run_catalog_jobs`` worker processes,
+away from the web workers:
+
+* a worker claims the oldest queued job with a conditional ``UPDATE``
+  (``queued`` → ``running``), so two workers never run the same job, and
+  respects a per-supplier concurrency limit;
+* while a job runs, the worker refreshes ``heartbeat_at``; a job whose
+  heartbeat is older than the lease (worker killed, deploy restart) is put
+  back in the queue and resumed by the next worker, up to
+  ``CATALOG_JOB_MAX_ATTEMPTS`` attempts;
+* job code lives in ``job_handlers`` and is looked up by (supplier, action);
+  handlers report live progress through a ``progress.JobProgress``.
+
+With ``CATALOG_JOB_RUNNER = "thread"`` (development without a worker) a
+queued job is started right away in a thread of the current process; the
+thread waits while the supplier's limit is taken.
+"""
+
 from __future__ import annotations
 
+import logging
+import os
+import socket
 import threading
+import time
 import traceback
-from typing import Callable, Optional
+from datetime import timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
 
-from django.db import close_old_connections
+from django.conf import settings
+from django.contrib.auth.base_user import AbstractBaseUser
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, F, Q
 from django.utils import timezone
 
 from .models import CatalogUpdateJob
+from .progress import JobProgress
 
+logger = logging.getLogger(__name__)
 
-def _run_job(job_id: int, callable_fn: Callable[[], dict]) -> None:
-    close_old_connections()
-    job = CatalogUpdateJob.objects.get(pk=job_id)
-    try:
-        result = callable_fn()
-        if isinstance(result, dict) and not result.get("success", True):
-            job.status = "error"
-            job.detail = result.get("error", "Невідома помилка")
-        else:
-            job.status = "success"
-            job.detail = _format_result(result)
-    except Exception:
-        job.status = "error"
-        job.detail = traceback.format_exc(limit=3)
-    finally:
-        job.finished_at = timezone.now()
-        job.save(update_fields=["status", "detail", "finished_at"])
-        close_old_connections()
+JobHandler = Callable[[dict, JobProgress], dict]
+
+_handlers: Dict[Tuple[str, str], JobHandler] = {}
+
+# How often a "thread" runner job re-tries a claim refused by the supplier limit.
+THREAD_CLAIM_RETRY_SECONDS = 5
+
+
+def job_handler(supplier: str, action: str) -> Callable[[JobHandler], JobHandler]:
+    """Register ``fn(params, progress) -> result dict`` for a supplier/action pair."""
+
+    def register(fn: JobHandler) -> JobHandler:
+        _handlers[(supplier, action)] = fn
+        return fn
+
+    return register
+
+
+def get_handler(supplier: str, action: str) -> Optional[JobHandler]:
+    from . import job_handlers  # noqa: F401  (registers the handlers)
+
+    return _handlers.get((supplier, action))
 
 
 def _format_result(result: Optional[dict]) -> str:
@@ -47,31 +82,308 @@ def _format_result(result: Optional[dict]) -> str:
     return text
 
 
+def _setting(name: str, default: Any) -> Any:
+    return getattr(settings, name, default)
+
+
+def supplier_concurrency(supplier: str) -> int:
+    limits = _setting("CATALOG_JOB_SUPPLIER_CONCURRENCY", {}) or {}
+    return max(
+        1,
+        int(
+            limits.get(
+                supplier, _setting("CATALOG_JOB_DEFAULT_SUPPLIER_CONCURRENCY", 1)
+            )
+        ),
+    )
+
+
+def default_worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# --- Enqueueing -----------------------------------------------------------
+
+
 def start_job(
     request,
     supplier: str,
     action: str,
-    callable_fn: Callable[[], dict],
+    params: Optional[dict] = None,
     catalog_key: str = "",
 ) -> Optional[CatalogUpdateJob]:
-    """Start a background thread running callable_fn, tracked via CatalogUpdateJob.
+    """Queue a job for the worker, tracked via CatalogUpdateJob.
 
     Returns None (and does nothing) if a job with the same supplier/action/catalog_key
-    is already running, to avoid duplicate concurrent runs.
+    is already queued or running, to avoid duplicate concurrent runs.
     """
-    already_running = CatalogUpdateJob.objects.filter(
-        supplier=supplier, action=action, catalog_key=catalog_key, status="running"
-    ).exists()
-    if already_running:
+    user = getattr(request, "user", None) if request is not None else None
+    job = enqueue_job(
+        supplier,
+        action,
+        params=params,
+        catalog_key=catalog_key,
+        started_by=user if user is not None and user.is_authenticated else None,
+    )
+    if job is not None and _setting("CATALOG_JOB_RUNNER", "worker") == "thread":
+        thread = threading.Thread(
+            target=_run_in_thread,
+            args=(job.pk,),
+            daemon=True,
+            name=f"catalog-job-{job.pk}",
+        )
+        thread.start()
+    return job
+
+
+def enqueue_job(
+    supplier: str,
+    action: str,
+    params: Optional[dict] = None,
+    catalog_key: str = "",
+    started_by: Optional[AbstractBaseUser] = None,
+) -> Optional[CatalogUpdateJob]:
+    try:
+        with transaction.atomic():
+            return CatalogUpdateJob.objects.create(
+                supplier=supplier,
+                action=action,
+                catalog_key=catalog_key,
+                params=params or {},
+                status="queued",
+                started_by=started_by,
+            )
+    except IntegrityError:
+        # catalog_job_active_uniq: the same job is already queued or running.
         return None
 
-    job = CatalogUpdateJob.objects.create(
-        supplier=supplier,
-        action=action,
-        catalog_key=catalog_key,
-        status="running",
-        started_by=request.user if request.user.is_authenticated else None,
+
+def _run_in_thread(job_id: int) -> None:
+    close_old_connections()
+    try:
+        worker = default_worker_name() + ":thread"
+        while True:
+            job = claim_job(worker, job_id=job_id)
+            if job is not None:
+                run_job(job, worker)
+                return
+            # Refused by the supplier limit: there is no worker to pick the
+            # job up later, so wait for the running one to finish.
+            if not CatalogUpdateJob.objects.filter(pk=job_id, status="queued").exists():
+                return
+            time.sleep(THREAD_CLAIM_RETRY_SECONDS)
+    finally:
+        close_old_connections()
+
+
+# --- Claiming and running ---------------------------------------------------
+
+
+def claim_job(worker: str, job_id: Optional[int] = None) -> Optional[CatalogUpdateJob]:
+    """Atomically move the oldest eligible queued job to ``running`` for ``worker``."""
+    queued = CatalogUpdateJob.objects.filter(status="queued").order_by(
+        "created_at", "pk"
+    )
+    if job_id is not None:
+        queued = queued.filter(pk=job_id)
+    running_counts = dict(
+        CatalogUpdateJob.objects.filter(status="running")
+        .values_list("supplier")
+        .annotate(total=Count("pk"))
+    )
+
+    for candidate in queued[:50]:
+        limit = supplier_concurrency(candidate.supplier)
+        if running_counts.get(candidate.supplier, 0) >= limit:
+            continue
+        now = timezone.now()
+        claimed = CatalogUpdateJob.objects.filter(
+            pk=candidate.pk, status="queued"
+        ).update(
+            status="running",
+            worker=worker,
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if not claimed:
+            continue  # another worker was faster
+
+        # Two workers may pass the limit check at once; the later claims back off.
+        winners = list(
+            CatalogUpdateJob.objects.filter(
+                supplier=candidate.supplier, status="running"
+            )
+            .order_by("started_at", "pk")
+            .values_list("pk", flat=True)[:limit]
+        )
+        if candidate.pk not in winners:
+            CatalogUpdateJob.objects.filter(
+                pk=candidate.pk, status="running", worker=worker
+            ).update(
+                status="queued",
+                worker="",
+                started_at=None,
+                heartbeat_at=None,
+                attempts=F("attempts") - 1,
+            )
+            running_counts[candidate.supplier] = limit
+            continue
+
+        candidate.refresh_from_db()
+        return candidate
+    return None
+
+
+class _Heartbeat(threading.Thread):
+    def __init__(self, job_id: int, worker: str, interval: float):
+        super().__init__(daemon=True, name=f"catalog-job-heartbeat-{job_id}")
+        self.job_id = job_id
+        self.worker = worker
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    CatalogUpdateJob.objects.filter(
+                        pk=self.job_id, status="running", worker=self.worker
+                    ).update(heartbeat_at=timezone.now())
+                except Exception:
+                    logger.warning(
+                        "Heartbeat failed for job %s", self.job_id, exc_info=True
+                    )
+        finally:
+            close_old_connections()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join(timeout=self.interval)
+
+
+def run_job(job: CatalogUpdateJob, worker: str) -> CatalogUpdateJob:
+    """Run a claimed job and store its outcome (unless the lease was lost)."""
+    heartbeat = _Heartbeat(
+        job.pk, worker, float(_setting("CATALOG_JOB_HEARTBEAT_SECONDS", 15))
     )
-    thread = threading.Thread(target=_run_job, args=(job.id, callable_fn), daemon=True)
-    thread.start()
+    heartbeat.start()
+    progress = JobProgress(job.pk)
+    try:
+        handler = get_handler(job.supplier, job.action)
+        if handler is None:
+            status, detail = "error", f"Невідоме завдання: {job.supplier}/{job.action}"
+        else:
+            result = handler(dict(job.params or {}), progress)
+            if isinstance(result, dict) and not result.get("success", True):
+                status, detail = "error", result.get("error", "Невідома помилка")
+            else:
+                status, detail = "success", _format_result(result)
+    except Exception:
+        status, detail = "error", traceback.format_exc(limit=3)
+    finally:
+        heartbeat.stop()
+        progress.flush()
+
+    stored = CatalogUpdateJob.objects.filter(
+        pk=job.pk, status="running", worker=worker
+    ).update(status=status, detail=detail, finished_at=timezone.now())
+    if not stored:
+        logger.warning("Job %s lost its lease before finishing; result dropped", job.pk)
+    job.refresh_from_db()
     return job
+
+
+def requeue_stale_jobs() -> int:
+    """Re-queue running jobs whose worker stopped sending heartbeats."""
+    cutoff = timezone.now() - timedelta(
+        seconds=float(_setting("CATALOG_JOB_LEASE_SECONDS", 120))
+    )
+    max_attempts = int(_setting("CATALOG_JOB_MAX_ATTEMPTS", 3))
+    stale = CatalogUpdateJob.objects.filter(status="running").filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    )
+    requeued = 0
+    for job in stale:
+        lease = CatalogUpdateJob.objects.filter(
+            pk=job.pk,
+            status="running",
+            worker=job.worker,
+            heartbeat_at=job.heartbeat_at,
+        )
+        if job.attempts >= max_attempts:
+            lease.update(
+                status="error",
+                detail=f"Перервано: воркер {job.worker} не відповідає, спроби вичерпано ({job.attempts}).",
+                finished_at=timezone.now(),
+            )
+            continue
+        if lease.update(status="queued", worker="", started_at=None, heartbeat_at=None):
+            logger.warning(
+                "Re-queued interrupted job %s (worker %s)", job.pk, job.worker
+            )
+            requeued += 1
+    return requeued
+
+
+class JobWorker:
+    """Polls the queue and runs up to ``concurrency`` jobs in threads."""
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        poll_interval: float = 2.0,
+        name: Optional[str] = None,
+    ):
+        self.concurrency = max(
+            1, concurrency or int(_setting("CATALOG_JOB_CONCURRENCY", 2))
+        )
+        self.poll_interval = poll_interval
+        self.name = name or default_worker_name()
+        self._stop = threading.Event()
+        self._active: Dict[int, threading.Thread] = {}
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run(self, once: bool = False) -> int:
+        """Process jobs until stopped; with ``once``, until the queue is drained."""
+        processed = 0
+        while not self._stop.is_set():
+            self._reap()
+            requeue_stale_jobs()
+            claimed = False
+            while len(self._active) < self.concurrency and not self._stop.is_set():
+                job = claim_job(self.name)
+                if job is None:
+                    break
+                claimed = True
+                processed += 1
+                thread = threading.Thread(
+                    target=self._run,
+                    args=(job,),
+                    daemon=True,
+                    name=f"catalog-job-{job.pk}",
+                )
+                self._active[job.pk] = thread
+                thread.start()
+            if once and not claimed and not self._active:
+                break
+            self._stop.wait(self.poll_interval)
+        for thread in list(self._active.values()):
+            thread.join()
+        self._reap()
+        return processed
+
+    def _reap(self) -> None:
+        for job_id, thread in list(self._active.items()):
+            if not thread.is_alive():
+                del self._active[job_id]
+
+    def _run(self, job: CatalogUpdateJob) -> None:
+        close_old_connections()
+        try:
+            logger.info("Running job %s (%s/%s)", job.pk, job.supplier, job.action)
+            run_job(job, self.name)
+        finally:
+            close_old_connections()
@@ -0,0 +1,279 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from custom_admin.models import CatalogUpdateJob
+from custom_admin.progress import JobProgress, read_progress
+from custom_admin.services import (
+    JobWorker,
+    _run_in_thread,
+    claim_job,
+    enqueue_job,
+    requeue_stale_jobs,
+    run_job,
+)
+
+
+def _handler(result):
+    return lambda supplier, action: (lambda params, progress: result)
+
+
+class _InlineThread:
+    """Runs the worker's job threads synchronously (in-memory SQLite is per-thread)."""
+
+    def __init__(self, target, args=(), **kwargs):
+        self.target, self.args = target, args
+
+    def start(self):
+        self.target(*self.args)
+
+    def is_alive(self):
+        return False
+
+    def join(self, timeout=None):
+        pass
+
+
+@override_settings(CATALOG_JOB_RUNNER="worker", CATALOG_JOB_HEARTBEAT_SECONDS=60)
+class TestCatalogJobQueue(TestCase):
+    def test_enqueue_skips_duplicate_active_job(self):
+        first = enqueue_job("kreslalux", "import")
+        self.assertEqual(first.status, "queued")
+        self.assertIsNone(enqueue_job("kreslalux", "import"))
+        # A different catalog_key is a different job.
+        self.assertIsNotNone(enqueue_job("kreslalux", "import", catalog_key="other"))
+
+        first.status = "success"
+        first.save()
+        self.assertIsNotNone(enqueue_job("kreslalux", "import"))
+
+    def test_claim_is_exclusive_and_respects_supplier_limit(self):
+        first = enqueue_job("andersen", "import", params={"catalogs": ["a"]})
+        enqueue_job("andersen", "update_prices")
+        other = enqueue_job("evrodim", "update_prices")
+
+        job = claim_job("w1")
+        self.assertEqual(job.pk, first.pk)
+        self.assertEqual((job.status, job.worker, job.attempts), ("running", "w1", 1))
+        # The second Andersen job waits for the first; Evrodim can run.
+        self.assertEqual(claim_job("w2").pk, other.pk)
+        self.assertIsNone(claim_job("w2"))
+
+    @override_settings(CATALOG_JOB_SUPPLIER_CONCURRENCY={"andersen": 2})
+    def test_supplier_limit_from_settings(self):
+        enqueue_job("andersen", "import")
+        enqueue_job("andersen", "update_prices")
+        self.assertIsNotNone(claim_job("w1"))
+        self.assertIsNotNone(claim_job("w1"))
+
+    def test_run_job_stores_result(self):
+        enqueue_job("divanoff", "import", params={"x": 1})
+        job = claim_job("w1")
+        with patch(
+            "custom_admin.services.get_handler", _handler({"created": 3, "errors": []})
+        ):
+            job = run_job(job, "w1")
+        self.assertEqual(job.status, "success")
+        self.assertIn("created: 3", job.detail)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_run_job_marks_failures(self):
+        enqueue_job("divanoff", "import")
+        job = claim_job("w1")
+        with patch(
+            "custom_admin.services.get_handler",
+            _handler({"success": False, "error": "boom"}),
+        ):
+            job = run_job(job, "w1")
+        self.assertEqual((job.status, job.detail), ("error", "boom"))
+
+        enqueue_job("nobody", "nothing")
+        job = run_job(claim_job("w1"), "w1")
+        self.assertEqual(job.status, "error")
+
+    def test_result_dropped_after_lease_lost(self):
+        enqueue_job("divanoff", "import")
+        job = claim_job("w1")
+        CatalogUpdateJob.objects.filter(pk=job.pk).update(status="queued", worker="")
+        with patch("custom_admin.services.get_handler", _handler({"created": 1})):
+            job = run_job(job, "w1")
+        self.assertEqual(job.status, "queued")
+
+    @override_settings(CATALOG_JOB_LEASE_SECONDS=60, CATALOG_JOB_MAX_ATTEMPTS=2)
+    def test_stale_jobs_are_requeued_until_attempts_run_out(self):
+        job = enqueue_job("eurosof", "import")
+        stale = timezone.now() - timedelta(minutes=5)
+
+        claim_job("dead-worker")
+        CatalogUpdateJob.objects.filter(pk=job.pk).update(heartbeat_at=stale)
+        self.assertEqual(requeue_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.attempts), ("queued", "", 1))
+
+        claim_job("dead-worker")
+        CatalogUpdateJob.objects.filter(pk=job.pk).update(heartbeat_at=stale)
+        self.assertEqual(requeue_stale_jobs(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "error")
+
+    def test_fresh_heartbeat_is_not_requeued(self):
+        enqueue_job("eurosof", "import")
+        claim_job("w1")
+        self.assertEqual(requeue_stale_jobs(), 0)
+
+    def test_worker_drains_queue(self):
+        enqueue_job("kreslalux", "import")
+        enqueue_job("evrodim", "update_prices")
+        worker = JobWorker(concurrency=2, poll_interval=0.01, name="test")
+        with patch(
+            "custom_admin.services.get_handler", _handler({"updated": 1})
+        ), patch("custom_admin.services.threading.Thread", _InlineThread):
+            processed = worker.run(once=True)
+        self.assertEqual(processed, 2)
+        self.assertEqual(
+            set(CatalogUpdateJob.objects.values_list("status", flat=True)), {"success"}
+        )
+
+    def test_thread_runner_waits_for_the_supplier_limit(self):
+        blocking = enqueue_job("andersen", "import")
+        claim_job("w1")
+        job = enqueue_job("andersen", "update_prices")
+
+        def finish_blocking(seconds):
+            CatalogUpdateJob.objects.filter(pk=blocking.pk).update(status="success")
+
+        with patch("custom_admin.services.close_old_connections"), patch(
+            "custom_admin.services.time.sleep", side_effect=finish_blocking
+        ) as sleep, patch(
+            "custom_admin.services.get_handler", _handler({"updated": 1})
+        ):
+            _run_in_thread(job.pk)
+
+        sleep.assert_called_once()
+        job.refresh_from_db()
+        self.assertEqual(job.status, "success")
+
+    def test_scraper_price_preview_is_queued_as_dry_run(self):
+        from django.contrib.auth import get_user_model
+
+        user = get_user_model().objects.create_user(
+            "staff", password="x", is_staff=True
+        )
+        self.client.force_login(user)
+        self.client.post(
+            reverse("custom_admin:kreslalux_update_prices"), {"dry_run": "on"}
+        )
+        self.client.post(reverse("custom_admin:kreslalux_update_prices"))
+
+        jobs = CatalogUpdateJob.objects.order_by("pk")
+        self.assertEqual(
+            [(job.catalog_key, job.params) for job in jobs],
+            [("preview", {"dry_run": True}), ("", {})],
+        )
+
+    def test_preview_is_refused_for_suppliers_without_dry_run(self):
+        from django.contrib.auth import get_user_model
+        from django.contrib.messages import get_messages
+
+        from custom_admin.job_handlers import (
+            divanoff_update_prices,
+            eurosof_update_prices,
+        )
+
+        user = get_user_model().objects.create_user(
+            "staff", password="x", is_staff=True
+        )
+        self.client.force_login(user)
+        for name in ("divanoff_update_prices", "eurosof_run_import"):
+            response = self.client.post(
+                reverse(f"custom_admin:{name}"),
+                {"dry_run": "on", "update_prices_only": "on"},
+            )
+            notices = [str(m) for m in get_messages(response.wsgi_request)]
+            self.assertIn("не підтримується", notices[0])
+        self.assertFalse(CatalogUpdateJob.objects.exists())
+
+        for handler in (divanoff_update_prices, eurosof_update_prices):
+            result = handler({"dry_run": True}, None)
+            self.assertFalse(result["success"])
+
+
+@override_settings(
+    CATALOG_JOB_PROGRESS_CACHE_SECONDS=0, CATALOG_JOB_PROGRESS_DB_SECONDS=3600
+)
+class TestJobProgress(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.job = enqueue_job("andersen", "import")
+        shared = patch("custom_admin.progress._cache_is_shared", return_value=True)
+        shared.start()
+        self.addCleanup(shared.stop)
+
+    def test_parses_scraper_lines(self):
+        progress = JobProgress(self.job.pk)
+        progress("Обробляємо 40 товарів...")
+        progress("[10/40] Матрац Andersen")
+        progress("ПОМИЛКА: сторінка недоступна")
+        data = read_progress([self.job])[self.job.pk]
+        self.assertEqual(
+            (data["processed"], data["total"], data["percent"]), (10, 40, 25.0)
+        )
+        self.assertEqual(data["errors"], 1)
+        self.assertEqual(data["last_error"], "ПОМИЛКА: сторінка недоступна")
+        self.assertIsNotNone(data["eta"])
+        self.assertEqual(data["status"], "queued")
+
+    def test_db_snapshot_is_throttled_and_flushed(self):
+        progress = JobProgress(self.job.pk)
+        progress("[1/5] a")  # first call writes both
+        progress("[2/5] b")
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.progress["processed"], 1)
+        progress.flush()
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.progress["processed"], 2)
+        # Without the cache entry the stored snapshot is used.
+        cache.clear()
+        self.assertEqual(read_progress([self.job])[self.job.pk]["processed"], 2)
+
+    @override_settings(CATALOG_JOB_PROGRESS_UNSHARED_DB_SECONDS=0)
+    def test_unshared_cache_falls_back_to_db(self):
+        with patch("custom_admin.progress._cache_is_shared", return_value=False):
+            progress = JobProgress(self.job.pk)
+            progress("[1/5] a")
+            progress("[2/5] b")
+            self.assertIsNone(cache.get(f"catalog_job_progress:{self.job.pk}"))
+            self.job.refresh_from_db()
+            self.assertEqual(self.job.progress["processed"], 2)
+            self.assertEqual(read_progress([self.job])[self.job.pk]["processed"], 2)
+
+    def test_run_job_passes_progress_to_handler(self):
+        def handler(params, progress):
+            progress.update(processed=3, total=3, message="готово")
+            return {"updated": 3}
+
+        job = claim_job("w1")
+        with patch(
+            "custom_admin.services.get_handler", lambda supplier, action: handler
+        ):
+            job = run_job(job, "w1")
+        self.assertEqual(job.progress["processed"], 3)
+
+    def test_progress_endpoint(self):
+        from django.contrib.auth import get_user_model
+
+        user = get_user_model().objects.create_user(
+            "staff", password="x", is_staff=True
+        )
+        self.client.force_login(user)
+        JobProgress(self.job.pk)("[4/8] x")
+        response = self.client.get(reverse("custom_admin:catalog_job_progress"))
+        self.assertEqual(response.json()[str(self.job.pk)]["processed"], 4)
+
+        CatalogUpdateJob.objects.update(status="success")
+        response = self.client.get(reverse("custom_admin:catalog_job_progress"))
+        self.assertEqual(response.json(), {})
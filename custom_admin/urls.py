@@ -78,6 +78,11 @@ urlpatterns = [
         name="palette_colors_bulk_edit",
     ),
     path("catalog-updates/", views.catalog_updates_page, name="catalog_updates"),
+    path(
+        "catalog-updates/progress/",
+        views.catalog_job_progress,
+        name="catalog_job_progress",
+    ),
     path(
         "evrodim/update-prices/",
         views.evrodim_update_prices,
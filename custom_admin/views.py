@@ -3,6 +3,7 @@ from __future__ import annotations
 from functools import cached_property
 from typing import Any, Optional
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
@@ -10,7 +11,7 @@ from django.contrib.auth.views import LoginView, LogoutView
 from django.core.exceptions import FieldError, ValidationError
 from django.db import IntegrityError, close_old_connections, transaction
 from django.db.models import Q
-from django.http import Http404
+from django.http import Http404, HttpRequest, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
 from django.utils.html import escape
@@ -49,33 +50,11 @@ from .forms import (
     FurnitureVariantImageFormSet,
     OrderItemFormSet,
 )
+from .models import CatalogUpdateJob
 from .registry import AdminSection, registry
 from .services import start_job
 
 
-def _bulk_run(configs, updater_cls, method_name: str) -> dict:
-    """Run updater_cls(config).<method_name>() for each config, aggregating results."""
-    success_count = 0
-    errors: list[str] = []
-    for config in configs:
-        try:
-            result = getattr(updater_cls(config), method_name)()
-            if result.get("success"):
-                success_count += 1
-            else:
-                errors.append(
-                    f"{config.name}: {result.get('error', 'невідома помилка')}"
-                )
-        except Exception as exc:
-            errors.append(f"{config.name}: {exc}")
-    return {
-        "success": True,
-        "updated_configs": success_count,
-        "total_configs": configs.count(),
-        "errors": errors,
-    }
-
-
 class StaffRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
     """Ensure the user is authenticated and flagged as staff."""
 
@@ -594,10 +573,9 @@ def update_price_config_prices(request, pk: int):
         "custom_admin:list", kwargs={"section_slug": "price-configs"}
     )
 
-    def run():
-        return GoogleSheetsPriceUpdater(config).update_prices()
-
-    job = start_job(request, "google_sheet", "update_prices", run, catalog_key=str(pk))
+    job = start_job(
+        request, "google_sheet", "update_prices", {"config_id": pk}, catalog_key=str(pk)
+    )
     if job is None:
         messages.warning(request, f"Оновлення «{config.name}» вже виконується.")
     else:
@@ -665,11 +643,12 @@ def price_config_bulk_action(request):
         config_ids = sorted(configs.values_list("pk", flat=True))
         catalog_key = "bulk:" + ",".join(str(i) for i in config_ids)
 
-        def run():
-            return _bulk_run(configs, GoogleSheetsPriceUpdater, "update_prices")
-
         job = start_job(
-            request, "google_sheet", "update_prices", run, catalog_key=catalog_key
+            request,
+            "google_sheet",
+            "update_prices",
+            {"config_ids": config_ids},
+            catalog_key=catalog_key,
         )
         if job is None:
             messages.warning(request, "Масове оновлення вже виконується.")
@@ -719,10 +698,13 @@ def update_supplier_feed_prices(request, pk: int):
         "custom_admin:list", kwargs={"section_slug": "supplier-feeds"}
     )
 
-    def run():
-        return SupplierFeedPriceUpdater(config).update_prices()
-
-    job = start_job(request, "supplier_feed", "update_prices", run, catalog_key=str(pk))
+    job = start_job(
+        request,
+        "supplier_feed",
+        "update_prices",
+        {"config_id": pk},
+        catalog_key=str(pk),
+    )
     if job is None:
         messages.warning(request, f"Оновлення «{config.name}» вже виконується.")
     else:
@@ -790,11 +772,12 @@ def supplier_feed_bulk_action(request):
         config_ids = sorted(configs.values_list("pk", flat=True))
         catalog_key = "bulk:" + ",".join(str(i) for i in config_ids)
 
-        def run():
-            return _bulk_run(configs, SupplierFeedPriceUpdater, "update_prices")
-
         job = start_job(
-            request, "supplier_feed", "update_prices", run, catalog_key=catalog_key
+            request,
+            "supplier_feed",
+            "update_prices",
+            {"config_ids": config_ids},
+            catalog_key=catalog_key,
         )
         if job is None:
             messages.warning(request, "Масове оновлення вже виконується.")
@@ -841,10 +824,9 @@ def update_supplier_web_prices(request, pk: int):
     config = get_object_or_404(SupplierWebConfig, pk=pk)
     redirect_url = reverse("custom_admin:list", kwargs={"section_slug": "supplier-web"})
 
-    def run():
-        return SupplierWebPriceUpdater(config).update_prices()
-
-    job = start_job(request, "supplier_web", "update_prices", run, catalog_key=str(pk))
+    job = start_job(
+        request, "supplier_web", "update_prices", {"config_id": pk}, catalog_key=str(pk)
+    )
     if job is None:
         messages.warning(request, f"Оновлення «{config.name}» вже виконується.")
     else:
@@ -910,11 +892,12 @@ def supplier_web_bulk_action(request):
         config_ids = sorted(configs.values_list("pk", flat=True))
         catalog_key = "bulk:" + ",".join(str(i) for i in config_ids)
 
-        def run():
-            return _bulk_run(configs, SupplierWebPriceUpdater, "update_prices")
-
         job = start_job(
-            request, "supplier_web", "update_prices", run, catalog_key=catalog_key
+            request,
+            "supplier_web",
+            "update_prices",
+            {"config_ids": config_ids},
+            catalog_key=catalog_key,
         )
         if job is None:
             messages.warning(request, "Масове оновлення вже виконується.")
@@ -1276,7 +1259,10 @@ def catalog_updates_page(request):
 
     def _running(supplier: str, action: str, catalog_key: str = "") -> bool:
         return CatalogUpdateJob.objects.filter(
-            supplier=supplier, action=action, catalog_key=catalog_key, status="running"
+            supplier=supplier,
+            action=action,
+            catalog_key=catalog_key,
+            status__in=CatalogUpdateJob.ACTIVE_STATUSES,
         ).exists()
 
     context = {
@@ -1312,30 +1298,63 @@ def catalog_updates_page(request):
                 supplier__in=["google_sheet", "supplier_feed", "supplier_web"]
             )[:8]
         ),
-        "has_running_jobs": CatalogUpdateJob.objects.filter(status="running").exists(),
+        "has_running_jobs": CatalogUpdateJob.objects.filter(
+            status__in=CatalogUpdateJob.ACTIVE_STATUSES
+        ).exists(),
+        "progress_poll_ms": int(
+            float(getattr(settings, "CATALOG_JOB_PROGRESS_POLL_SECONDS", 3)) * 1000
+        ),
     }
     return render(request, "custom_admin/catalog_updates.html", context)
 
 
 @login_required
-@require_POST
-def evrodim_update_prices(request):
+def catalog_job_progress(request: HttpRequest) -> JsonResponse:
+    """Progress snapshot of queued/running jobs, polled by the catalog updates page.
+
+    A short JSON response rather than a stream or long-poll, so a sync web
+    worker is released at once: each poll costs one indexed query for the
+    active jobs plus, with a shared cache, one ``get_many`` for their snapshots.
+    """
     if not request.user.is_staff:
         raise Http404("Сторінку не знайдено")
 
-    from price_parser.evrodim_scraper import EvrodimScraper
+    from .progress import active_jobs, read_progress
 
-    def run():
-        return EvrodimScraper().update_prices(subcategory_slug="stoly-evrodim")
+    return JsonResponse(
+        {str(pk): data for pk, data in read_progress(active_jobs()).items()}
+    )
+
+
+def _price_job_started_message(supplier: str, job: CatalogUpdateJob) -> str:
+    if job.params.get("dry_run"):
+        return (
+            f"Запущено попередній перегляд цін {supplier} у фоні — номер набору змін "
+            f"з'явиться в статусі завдання нижче, каталог не змінюється."
+        )
+    return f"Запущено оновлення цін {supplier} у фоні — статус з'явиться нижче за кілька хвилин."
+
+
+@login_required
+@require_POST
+def evrodim_update_prices(request):
+    if not request.user.is_staff:
+        raise Http404("Сторінку не знайдено")
 
-    job = start_job(request, "evrodim", "update_prices", run)
+    if request.POST.get("dry_run") == "on":
+        job = start_job(
+            request,
+            "evrodim",
+            "update_prices",
+            {"dry_run": True},
+            catalog_key="preview",
+        )
+    else:
+        job = start_job(request, "evrodim", "update_prices")
     if job is None:
         messages.warning(request, "Оновлення цін Evrodim вже виконується.")
     else:
-        messages.info(
-            request,
-            "Запущено оновлення цін Evrodim у фоні — статус з'явиться нижче за кілька хвилин.",
-        )
+        messages.info(request, _price_job_started_message("Evrodim", job))
     return redirect("custom_admin:catalog_updates")
 
 
@@ -1345,12 +1364,7 @@ def evrodim_update_params(request):
     if not request.user.is_staff:
         raise Http404("Сторінку не знайдено")
 
-    from price_parser.evrodim_scraper import EvrodimScraper
-
-    def run():
-        return EvrodimScraper().update_params(subcategory_slug="stoly-evrodim")
-
-    job = start_job(request, "evrodim", "update_params", run)
+    job = start_job(request, "evrodim", "update_params")
     if job is None:
         messages.warning(request, "Оновлення характеристик Evrodim вже виконується.")
     else:
@@ -1370,34 +1384,24 @@ def andersen_update_prices(request):
     if not request.user.is_staff:
         raise Http404("Сторінку не знайдено")
 
-    from price_parser.andersen_scraper import AndersenScraper
-
     catalog_arg = request.POST.get("catalog", "all")
     catalogs = (
         list(ANDERSEN_CATALOG_CONFIGS.keys()) if catalog_arg == "all" else [catalog_arg]
     )
 
-    def run():
-        scraper = AndersenScraper()
-        totals = {"checked": 0, "updated": 0, "not_found": 0, "errors": []}
-        for catalog_key in catalogs:
-            result = scraper.update_prices(catalog_key)
-            if not result.get("success", True):
-                totals["errors"].append(f"{catalog_key}: {result.get('error')}")
-                continue
-            for key in ("checked", "updated", "not_found"):
-                totals[key] += result.get(key, 0)
-            totals["errors"].extend(result.get("errors", []))
-        return totals
-
-    job = start_job(request, "andersen", "update_prices", run, catalog_key=catalog_arg)
+    params: dict = {"catalogs": catalogs}
+    catalog_key = catalog_arg
+    if request.POST.get("dry_run") == "on":
+        params["dry_run"] = True
+        catalog_key = f"preview:{catalog_arg}"
+
+    job = start_job(
+        request, "andersen", "update_prices", params, catalog_key=catalog_key
+    )
     if job is None:
         messages.warning(request, "Оновлення цін Andersen вже виконується.")
     else:
-        messages.info(
-            request,
-            "Запущено оновлення цін Andersen у фоні — статус з'явиться нижче за кілька хвилин.",
-        )
+        messages.info(request, _price_job_started_message("Andersen", job))
     return redirect("custom_admin:catalog_updates")
 
 
@@ -1407,27 +1411,14 @@ def andersen_run_import(request):
     if not request.user.is_staff:
         raise Http404("Сторінку не знайдено")
 
-    from price_parser.andersen_scraper import AndersenScraper
-
     catalog_arg = request.POST.get("catalog", "all")
     catalogs = (
         list(ANDERSEN_CATALOG_CONFIGS.keys()) if catalog_arg == "all" else [catalog_arg]
     )
 
-    def run():
-        scraper = AndersenScraper()
-        totals = {"created": 0, "updated": 0, "skipped": 0, "errors": []}
-        for catalog_key in catalogs:
-            result = scraper.run_import(catalog_key=catalog_key, dry_run=False)
-            if not result.get("success", True):
-                totals["errors"].append(f"{catalog_key}: {result.get('error')}")
-                continue
-            for key in ("created", "updated", "skipped"):
-                totals[key] += result.get(key, 0)
-            totals["errors"].extend(result.get("errors", []))
-        return totals
-
-    job = start_job(request, "andersen", "import", run, catalog_key=catalog_arg)
+    job = start_job(
+        request, "andersen", "import", {"catalogs": catalogs}, catalog_key=catalog_arg
+    )
     if job is None:
         messages.warning(request, "Імпорт Andersen вже виконується.")
     else:
@@ -1447,19 +1438,20 @@ def kreslalux_update_prices(request):
     if not request.user.is_staff:
         raise Http404("Сторінку не знайдено")
 
-    from price_parser.kreslalux_scraper import KreslaluxScraper
-
-    def run():
-        return KreslaluxScraper().update_prices()
-
-    job = start_job(request, "kreslalux", "update_prices", run)
+    if request.POST.get("dry_run") == "on":
+        job = start_job(
+            request,
+            "kreslalux",
+            "update_prices",
+            {"dry_run": True},
+            catalog_key="preview",
+        )
+    else:
+        job = start_job(request, "kreslalux", "update_prices")
     if job is None:
         messages.warning(request, "Оновлення цін Kreslalux вже виконується.")
     else:
-        messages.info(
-            request,
-            "Запущено оновлення цін Kreslalux у фоні — статус з'явиться нижче за кілька хвилин.",
-        )
+        messages.info(request, _price_job_started_message("Kreslalux", job))
     return redirect("custom_admin:catalog_updates")
 
 
@@ -1469,14 +1461,7 @@ def kreslalux_run_import(request):
     if not request.user.is_staff:
         raise Http404("Сторінку не знайдено")
 
-    from price_parser.kreslalux_scraper import KreslaluxScraper
-
-    def run():
-        return KreslaluxScraper().run_import(
-            dry_run=False, subcategory_slug="ortopedichni-krisla"
-        )
-
-    job = start_job(request, "kreslalux", "import", run)
+    job = start_job(request, "kreslalux", "import")
     if job is None:
         messages.warning(request, "Імпорт Kreslalux вже виконується.")
     else:
@@ -1498,47 +1483,25 @@ def eurosof_run_import(request):
 
     import os
 
-    from price_parser.eurosof_scraper import EurosofImporter
-
     catalog_arg = request.POST.get("catalog", "all")
     update_prices_only = request.POST.get("update_prices_only") == "on"
+    if request.POST.get("dry_run") == "on":
+        messages.error(request, "Попередній перегляд цін Eurosof не підтримується.")
+        return redirect("custom_admin:catalog_updates")
     catalogs = (
-        list(EUROSOF_CATALOG_CONFIGS.values())
-        if catalog_arg == "all"
-        else [EUROSOF_CATALOG_CONFIGS[catalog_arg]]
+        list(EUROSOF_CATALOG_CONFIGS.keys()) if catalog_arg == "all" else [catalog_arg]
     )
+    if any(key not in EUROSOF_CATALOG_CONFIGS for key in catalogs):
+        raise Http404("Каталог не знайдено")
     action = "update_prices" if update_prices_only else "import"
 
     if not os.path.exists(EUROSOF_DEFAULT_XLSX):
         messages.error(request, f"Excel-файл не знайдено: {EUROSOF_DEFAULT_XLSX}")
         return redirect("custom_admin:catalog_updates")
 
-    def run():
-        importer = EurosofImporter(xlsx_path=EUROSOF_DEFAULT_XLSX)
-        totals = {
-            "created": 0,
-            "updated": 0,
-            "skipped": 0,
-            "unmatched": 0,
-            "errors": [],
-        }
-        for cfg in catalogs:
-            result = importer.run(
-                catalog_urls=[cfg["url"]],
-                subcategory_name=cfg["subcategory_name"],
-                subcategory_slug=cfg["subcategory_slug"],
-                category_name=cfg["category_name"],
-                corner=cfg.get("corner", False),
-                bed=cfg.get("bed", False),
-                dry_run=False,
-                update_prices=update_prices_only,
-            )
-            for key in ("created", "updated", "skipped", "unmatched"):
-                totals[key] += result.get(key, 0)
-            totals["errors"].extend(result.get("errors", []))
-        return totals
-
-    job = start_job(request, "eurosof", action, run, catalog_key=catalog_arg)
+    job = start_job(
+        request, "eurosof", action, {"catalogs": catalogs}, catalog_key=catalog_arg
+    )
     if job is None:
         messages.warning(request, "Ця операція Eurosof вже виконується.")
     else:
@@ -1859,19 +1822,14 @@ def divanoff_update_prices(request):
 
     import os
 
-    from price_parser.divanoff_scraper import DivanoffScraper
-
+    if request.POST.get("dry_run") == "on":
+        messages.error(request, "Попередній перегляд цін Divanoff не підтримується.")
+        return redirect("custom_admin:catalog_updates")
     if not os.path.exists(DIVANOFF_DEFAULT_XLSX):
         messages.error(request, f"Excel-файл не знайдено: {DIVANOFF_DEFAULT_XLSX}")
         return redirect("custom_admin:catalog_updates")
 
-    def run():
-        return DivanoffScraper().update_prices(
-            subcategory_slug="divany-divanoff",
-            xlsx_path=DIVANOFF_DEFAULT_XLSX,
-        )
-
-    job = start_job(request, "divanoff", "update_prices", run)
+    job = start_job(request, "divanoff", "update_prices")
     if job is None:
         messages.warning(request, "Оновлення цін Divanoff вже виконується.")
     else:
@@ -1890,19 +1848,11 @@ def divanoff_run_import(request):
 
     import os
 
-    from price_parser.divanoff_scraper import DivanoffScraper
-
     if not os.path.exists(DIVANOFF_DEFAULT_XLSX):
         messages.error(request, f"Excel-файл не знайдено: {DIVANOFF_DEFAULT_XLSX}")
         return redirect("custom_admin:catalog_updates")
 
-    def run():
-        return DivanoffScraper().run_import(
-            subcategory_slug="divany-divanoff",
-            xlsx_path=DIVANOFF_DEFAULT_XLSX,
-        )
-
-    job = start_job(request, "divanoff", "import", run)
+    job = start_job(request, "divanoff", "import")
     if job is None:
         messages.warning(request, "Імпорт Divanoff вже виконується.")
     else:
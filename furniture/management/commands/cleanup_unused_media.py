@@ -1,19 +1,21 @@
 from __future__ import annotations
 
-import os
+from datetime import timedelta
 from pathlib import Path
-from urllib.parse import urlparse
 
-from django.apps import apps
 from django.conf import settings
 from django.core.files.storage import default_storage
-from django.core.management.base import BaseCommand
-from django.db import models
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.models import MediaInventoryState, MediaObject, MediaReference
+from utils import media_index
 
 
 class Command(BaseCommand):
     help = (
-        "Сканує медіа-сховище та видаляє файли, які більше не згадуються в жодному FileField/ImageField."
+        "Видаляє з медіа-сховища файли, які більше не згадуються в жодному FileField/ImageField. "
+        "Використовує індекс посилань і збережений перелік сховища (див. utils.media_index), "
+        "тож кожен запуск перевіряє лише змінені з минулого разу ключі."
     )
 
     def add_arguments(self, parser):
@@ -39,30 +41,72 @@ class Command(BaseCommand):
             default=500,
             help="Скільки ключів видаляти за один запит у S3/R2.",
         )
+        parser.add_argument(
+            "--max-list",
+            type=int,
+            default=None,
+            help="Отримати зі сховища не більше N ключів за запуск; наступний продовжить з курсора.",
+        )
+        parser.add_argument(
+            "--rebuild-index",
+            action="store_true",
+            help="Перебудувати індекс посилань з усіх FileField (після масових update() чи SQL).",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Повна перевірка: новий прохід по сховищу з початку та перебудова індексу.",
+        )
+        parser.add_argument(
+            "--max-delete-ratio",
+            type=float,
+            default=0.5,
+            help=(
+                "Відмовитися видаляти, якщо без посилань більше цієї частки файлів у переліку "
+                "(ознака порожнього чи зламаного індексу; default: 0.5)."
+            ),
+        )
+        parser.add_argument(
+            "--grace-minutes",
+            type=int,
+            default=60,
+            help="Не чіпати файли, змінені пізніше ніж N хвилин тому (default: 60).",
+        )
 
     def handle(self, *args, **options):
         prefix = options["prefix"].lstrip("/")
         delete_files = options["delete"]
         limit = options["limit"]
         batch_size = options["batch_size"]
+        full = options["full"]
 
         storage_type = self._detect_storage_type()
         self.stdout.write(self.style.NOTICE(f"Використовується storage: {storage_type}"))
 
-        referenced = self._collect_referenced_paths()
-        referenced_bases = {self._canonical_key(path) for path in referenced}
-        self.stdout.write(f"Знайдено {len(referenced)} унікальних файлів у базі даних (без урахування розширення).")
-
-        storage_files = self._list_storage_files(prefix)
-        self.stdout.write(
-            f"Отримано {len(storage_files)} файлів зі сховища{f' (префікс {prefix})' if prefix else ''}."
-        )
+        if full or options["rebuild_index"] or not MediaReference.objects.exists():
+            created = media_index.rebuild_references()
+            self.stdout.write(f"Індекс посилань перебудовано: {created} файлів у базі даних.")
+        else:
+            self.stdout.write(f"Індекс посилань: {MediaReference.objects.count()} файлів у базі даних.")
+
+        state = MediaInventoryState.objects.filter(prefix=prefix).first()
+        if state is not None and state.cursor and not full:
+            self.stdout.write(f"Продовжуємо перелік сховища після '{state.cursor}'.")
+        inventory = media_index.refresh_inventory(prefix, max_keys=options["max_list"], restart=full)
+        where = f" (префікс {prefix})" if prefix else ""
+        if inventory.completed:
+            self.stdout.write(
+                f"Отримано {inventory.listed} файлів зі сховища{where}; прохід завершено, "
+                f"зниклих ключів: {inventory.removed}."
+            )
+        else:
+            self.stdout.write(
+                f"Отримано {inventory.listed} файлів зі сховища{where}; прохід буде продовжено наступним запуском."
+            )
 
-        unused = sorted(
-            key
-            for key in storage_files
-            if self._canonical_key(key) not in referenced_bases
-        )
+        dirty = MediaObject.objects.filter(dirty=True, key__startswith=prefix).count()
+        unused = media_index.find_unused(prefix, grace=timedelta(minutes=options["grace_minutes"]))
+        self.stdout.write(f"Перевірено змінених ключів: {dirty}.")
         if limit is not None:
             unused = unused[:limit]
 
@@ -86,9 +130,26 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING("Запустіть із --delete, щоб видалити перераховані файли."))
             return
 
+        self._check_index_sanity(prefix, len(unused), options["max_delete_ratio"])
+
         deleted = self._delete_files(unused, storage_type, batch_size)
+        media_index.forget_keys(unused)
         self.stdout.write(self.style.SUCCESS(f"Видалено {deleted} файлів."))
 
+    def _check_index_sanity(self, prefix: str, unused: int, max_ratio: float) -> None:
+        """Refuse to delete when the reference index looks empty or broken."""
+        if not MediaReference.objects.exists():
+            raise CommandError(
+                "Індекс посилань порожній: видалення скасовано. Перевірте базу даних і запустіть "
+                "команду з --rebuild-index."
+            )
+        listed = MediaObject.objects.filter(key__startswith=prefix).count()
+        if listed and unused > listed * max_ratio:
+            raise CommandError(
+                f"Без посилань {unused} з {listed} файлів (більше {max_ratio:.0%}): схоже, індекс "
+                "посилань неповний. Видалення скасовано; перевірте звіт або підвищте --max-delete-ratio."
+            )
+
     def _detect_storage_type(self) -> str:
         storage = default_storage
         if hasattr(storage, "bucket"):
@@ -97,91 +158,6 @@ class Command(BaseCommand):
             return "filesystem"
         return "unknown"
 
-    def _normalize_path(self, value: str | None) -> str | None:
-        if not value:
-            return None
-        value = value.strip()
-        if not value:
-            return None
-        parsed = urlparse(value)
-        if parsed.scheme and parsed.netloc:
-            value = parsed.path
-        value = value.lstrip("/")
-        return value or None
-
-    def _canonical_key(self, path: str | None) -> str:
-        """
-        Зрізає розширення та варіантні суфікси типу '_400w', '_800w', '_1200w'.
-        """
-        if not path:
-            return ""
-
-        clean = path.rstrip("/")
-        if not clean:
-            return ""
-
-        stem, _ = os.path.splitext(clean)
-        parts = stem.split("/")
-        filename = parts[-1]
-        prefix = "/".join(parts[:-1])
-
-        variant_suffixes = ("_400w", "_800w", "_1200w", "_default")
-        for suffix in variant_suffixes:
-            if filename.endswith(suffix):
-                filename = filename[: -len(suffix)]
-                break
-
-        canonical = "/".join(filter(None, [prefix, filename])) if filename else prefix
-        return canonical or stem
-
-    def _collect_referenced_paths(self) -> set[str]:
-        referenced: set[str] = set()
-        for model in apps.get_models():
-            file_fields = [
-                field for field in model._meta.get_fields() if isinstance(field, models.FileField)
-            ]
-            if not file_fields:
-                continue
-            qs = model.objects.all()
-            for field in file_fields:
-                values = (
-                    qs.exclude(**{f"{field.name}__isnull": True})
-                    .exclude(**{field.name: ""})
-                    .values_list(field.name, flat=True)
-                )
-                for path in values.iterator(chunk_size=1000):
-                    normalized = self._normalize_path(path)
-                    if normalized:
-                        referenced.add(normalized)
-        return referenced
-
-    def _list_storage_files(self, prefix: str) -> set[str]:
-        storage = default_storage
-        normalized_prefix = prefix.rstrip("/")
-
-        if hasattr(storage, "bucket"):
-            bucket = storage.bucket
-            objects = bucket.objects.filter(Prefix=normalized_prefix) if normalized_prefix else bucket.objects.all()
-            files = {obj.key.lstrip("/") for obj in objects}
-            return files
-
-        media_root = getattr(settings, "MEDIA_ROOT", None)
-        if not media_root:
-            raise RuntimeError("MEDIA_ROOT не заданий та storage не підтримує перелік файлів.")
-
-        media_root_path = Path(media_root)
-        files: set[str] = set()
-        target_root = media_root_path / normalized_prefix if normalized_prefix else media_root_path
-        if not target_root.exists():
-            return files
-
-        for root, _, filenames in os.walk(target_root):
-            for filename in filenames:
-                full = Path(root) / filename
-                rel = full.relative_to(media_root_path)
-                files.add(str(rel).replace("\\", "/"))
-        return files
-
     def _delete_files(self, keys: list[str], storage_type: str, batch_size: int) -> int:
         storage = default_storage
         if storage_type == "s3" and hasattr(storage, "bucket"):
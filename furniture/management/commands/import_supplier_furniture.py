@@ -1,5 +1,3 @@
-import hashlib
-import os
 import re
 import uuid
 import logging
@@ -11,15 +9,13 @@ from typing import Dict, Iterable, List, Optional, Tuple
 from urllib.parse import urlsplit
 
 import requests
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
 from django.core.management.base import BaseCommand, CommandError
 from django.utils.text import slugify
-from PIL import Image, UnidentifiedImageError
 
 from categories.models import Category
 from furniture.models import Furniture, FurnitureVariantImage, FurnitureSizeVariant, FurnitureImage
 from params.models import FurnitureParameter, Parameter
+from price_parser.supplier_images import SupplierImageStore
 from sub_categories.models import SubCategory
 
 logger = logging.getLogger(__name__)
@@ -227,8 +223,6 @@ USER_AGENT = (
     "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
 )
 
-IMAGE_CACHE_DIR = "supplier_cache"
-
 SKIP_PARAMETER_NAMES = {"торгова марка", "готові кольорові рішення"}
 
 NAME_REPLACEMENTS = [
@@ -470,6 +464,7 @@ class Command(BaseCommand):
             raise CommandError("Вкажіть --feed-url або --feed-file")
 
         self.http = self._build_http_session()
+        self.image_store = SupplierImageStore(self._get_image, timeout=60)
 
         xml_data = self._load_feed_data(feed_url, feed_file)
         root = ET.fromstring(xml_data)
@@ -1160,8 +1155,9 @@ class Command(BaseCommand):
             return
 
         start_position = furniture.images.count()
+        cached = self.image_store.fetch_many(offer.picture_urls[1:])
         for idx, url in enumerate(offer.picture_urls[1:], start=1):
-            cache_path = self._download_or_get_cached_image(url)
+            cache_path = cached.get(url)
             if not cache_path:
                 continue
             gallery_image = FurnitureImage(
@@ -1205,7 +1201,9 @@ class Command(BaseCommand):
 
             created += 1
             if offer.picture_urls:
-                cache_path = self._download_or_get_cached_image(offer.picture_urls[0])
+                # Colourways of one photo look alike to the perceptual hash:
+                # a colour variant only ever gets its own (byte-identical) photo.
+                cache_path = self._download_or_get_cached_image(offer.picture_urls[0], similar=False)
                 if cache_path:
                     variant.image.name = cache_path
                     variant.save(update_fields=["image"])
@@ -1644,9 +1642,7 @@ class Command(BaseCommand):
             return base[:100]
         return f"param_{abs(hash(label))}"
 
-    def _fetch_image(self, url: str) -> Optional[ContentFile]:
-        if not url:
-            return None
+    def _get_image(self, url: str, timeout: int = 60) -> requests.Response:
         headers = {
             "User-Agent": USER_AGENT,
             "Accept": "image/*,*/*;q=0.8",
@@ -1654,37 +1650,12 @@ class Command(BaseCommand):
         referer = self._build_safe_referer(url)
         if referer:
             headers["Referer"] = referer
-        try:
-            response = self.http.get(url, headers=headers, timeout=60)
-            response.raise_for_status()
-        except requests.RequestException as exc:
-            logger.warning("Не вдалося завантажити зображення %s: %s", url, exc)
-            return None
-        return ContentFile(response.content)
+        return self.http.get(url, headers=headers, timeout=timeout)
 
-    def _download_or_get_cached_image(self, url: str) -> Optional[str]:
+    def _download_or_get_cached_image(self, url: str, similar: bool = True) -> Optional[str]:
         if not url:
             return None
-        cache_path = self._build_cache_path(url)
-        if default_storage.exists(cache_path):
-            return cache_path
-        image_content = self._fetch_image(url)
-        if not image_content:
-            return None
-        if not self._is_valid_image_file(image_content):
-            logger.warning("Пропущено некоректне зображення %s", url)
-            return None
-        default_storage.save(cache_path, image_content)
-        return cache_path
-
-    def _build_cache_path(self, url: str) -> str:
-        parsed = urlsplit(url)
-        base = os.path.basename(parsed.path)
-        ext = os.path.splitext(base)[1].lower()
-        if ext not in {".jpg", ".jpeg", ".png", ".webp", ".gif"}:
-            ext = ".jpg"
-        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
-        return f"{IMAGE_CACHE_DIR}/{digest}{ext}"
+        return self.image_store.fetch(url, similar=similar)
 
     def _build_safe_referer(self, url: str) -> Optional[str]:
         try:
@@ -1695,19 +1666,6 @@ class Command(BaseCommand):
             return None
         return f"{parsed.scheme}://{parsed.netloc}"
 
-    def _is_valid_image_file(self, content: ContentFile) -> bool:
-        try:
-            content.seek(0)
-            with Image.open(content) as img:
-                img.verify()
-            content.seek(0)
-            return True
-        except (UnidentifiedImageError, OSError):
-            return False
-        except Exception:
-            content.seek(0)
-            return False
-
     def _attach_variant_image_to_gallery(
         self,
         furniture: Furniture,
@@ -1,20 +1,28 @@
+from typing import Optional
+
 from django.contrib import admin
-from django.http import HttpResponseRedirect
+from django.db.models import QuerySet
+from django.http import HttpRequest, HttpResponseRedirect
 from django.urls import path
 from django.contrib import messages
 from django.utils.html import format_html
 from django.utils import timezone
 
 from .models import (
+    CrawlPageState,
     GoogleSheetConfig,
     PriceUpdateLog,
     FurniturePriceCellMapping,
     FurnitureModelPriceMapping,
+    PriceChangeSet,
+    PriceHistory,
     SupplierFeedConfig,
     SupplierFeedUpdateLog,
+    SupplierImage,
     SupplierWebConfig,
     SupplierWebUpdateLog,
 )
+from .change_sets import apply_change_set, discard_change_set
 from .services import (
     GoogleSheetsPriceUpdater,
     SupplierFeedPriceUpdater,
@@ -27,7 +35,10 @@ class GoogleSheetConfigAdmin(admin.ModelAdmin):
     list_display = ['name', 'sheet_id', 'parsing_mode', 'is_active', 'created_at', 'updated_at']
     list_filter = ['is_active', 'created_at']
     search_fields = ['name', 'sheet_id']
-    readonly_fields = ['sheet_id', 'created_at', 'updated_at']
+    readonly_fields = [
+        'sheet_id', 'created_at', 'updated_at',
+        'fetch_strategy', 'fetch_latency_ms', 'sheet_etag', 'sheet_last_modified', 'sheet_content_hash',
+    ]
     
     fieldsets = (
         ('Основна інформація', {
@@ -46,7 +57,10 @@ class GoogleSheetConfigAdmin(admin.ModelAdmin):
             'description': 'Налаштування конвертації валют'
         }),
         ('Системна інформація', {
-            'fields': ('created_at', 'updated_at'),
+            'fields': (
+                'created_at', 'updated_at',
+                'fetch_strategy', 'fetch_latency_ms', 'sheet_etag', 'sheet_last_modified', 'sheet_content_hash',
+            ),
             'classes': ('collapse',)
         })
     )
@@ -121,6 +135,11 @@ class GoogleSheetConfigAdmin(admin.ModelAdmin):
         actions = super().get_actions(request)
         actions['update_prices'] = (update_prices_action, 'update_prices', "Оновити ціни для вибраних конфігурацій")
         actions['test_parse'] = (test_parse_action, 'test_parse', "Тестувати парсинг для вибраних конфігурацій")
+        actions['preview_price_changes'] = (
+            preview_price_changes_action,
+            'preview_price_changes',
+            "Попередній перегляд змін цін (без запису)",
+        )
         return actions
 
 
@@ -129,7 +148,7 @@ class SupplierFeedConfigAdmin(admin.ModelAdmin):
     list_display = ['name', 'supplier', 'category_hint', 'fetch_mode', 'is_active', 'updated_at']
     list_filter = ['is_active', 'supplier']
     search_fields = ['name', 'supplier', 'category_hint']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['created_at', 'updated_at', 'feed_etag', 'feed_last_modified', 'feed_content_hash']
 
     fieldsets = (
         ('Основна інформація', {
@@ -162,7 +181,7 @@ class SupplierFeedConfigAdmin(admin.ModelAdmin):
             'description': 'Множник для конвертації валют'
         }),
         ('Системна інформація', {
-            'fields': ('created_at', 'updated_at'),
+            'fields': ('created_at', 'updated_at', 'feed_etag', 'feed_last_modified', 'feed_content_hash'),
             'classes': ('collapse',)
         })
     )
@@ -235,11 +254,21 @@ class SupplierFeedConfigAdmin(admin.ModelAdmin):
             'update_supplier_feeds',
             "Оновити ціни для вибраних фідів",
         )
+        actions['force_update_supplier_feeds'] = (
+            force_update_supplier_feeds_action,
+            'force_update_supplier_feeds',
+            "Оновити ціни примусово (повністю перечитати фід)",
+        )
         actions['test_supplier_feeds'] = (
             test_supplier_feeds_action,
             'test_supplier_feeds',
             "Тестувати вибрані фіди",
         )
+        actions['preview_price_changes'] = (
+            preview_price_changes_action,
+            'preview_price_changes',
+            "Попередній перегляд змін цін (без запису)",
+        )
         return actions
 
 
@@ -290,7 +319,7 @@ class SupplierWebConfigAdmin(admin.ModelAdmin):
         (
             "Selenium (опційно)",
             {
-                "fields": ("use_selenium", "selenium_wait_seconds"),
+                "fields": ("use_selenium", "selenium_wait_seconds", "selenium_http_first"),
             },
         ),
         (
@@ -378,6 +407,11 @@ class SupplierWebConfigAdmin(admin.ModelAdmin):
             "test_supplier_web",
             "Тестувати вибрані веб-конфігурації",
         )
+        actions["preview_price_changes"] = (
+            preview_price_changes_action,
+            "preview_price_changes",
+            "Попередній перегляд змін цін (без запису)",
+        )
         return actions
 
 
@@ -425,6 +459,51 @@ def test_parse_action(modeladmin, request, queryset):
     )
 
 
+PREVIEW_JOB_SUPPLIERS = {
+    GoogleSheetConfig: 'google_sheet',
+    SupplierFeedConfig: 'supplier_feed',
+    SupplierWebConfig: 'supplier_web',
+}
+
+
+def preview_price_changes_action(modeladmin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet) -> None:
+    """Queue dry-run updates; each job stores its changes as a PriceChangeSet.
+
+    Only the updaters in ``PREVIEW_JOB_SUPPLIERS`` can run dry; Divanoff and
+    Eurosof write per-fabric-category prices directly and are refused.
+    """
+    from custom_admin.services import start_job
+
+    supplier = PREVIEW_JOB_SUPPLIERS.get(queryset.model)
+    if supplier is None:
+        modeladmin.message_user(
+            request,
+            "Попередній перегляд цін для цього постачальника не підтримується.",
+            messages.ERROR,
+        )
+        return
+    for config in queryset:
+        job = start_job(
+            request,
+            supplier,
+            'update_prices',
+            {'config_id': config.pk, 'dry_run': True},
+            catalog_key=f'preview:{config.pk}',
+        )
+        if job is None:
+            modeladmin.message_user(
+                request,
+                f"{config.name}: попередній перегляд вже виконується.",
+                messages.WARNING,
+            )
+        else:
+            modeladmin.message_user(
+                request,
+                f"{config.name}: попередній перегляд запущено у фоні — "
+                f"набір змін з'явиться у «Наборах змін цін» після завершення.",
+            )
+
+
 def update_supplier_feeds_action(modeladmin, request, queryset):
     updated_count = 0
     for config in queryset:
@@ -446,6 +525,29 @@ def update_supplier_feeds_action(modeladmin, request, queryset):
     )
 
 
+def force_update_supplier_feeds_action(
+    modeladmin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet
+) -> None:
+    """Queue a full run: no 304 / content-hash short-circuit, every offer reapplied."""
+    from custom_admin.services import start_job
+
+    config_ids = sorted(queryset.values_list('pk', flat=True))
+    job = start_job(
+        request,
+        'supplier_feed',
+        'update_prices',
+        {'config_ids': config_ids, 'force': True},
+        catalog_key='force:' + ','.join(str(pk) for pk in config_ids),
+    )
+    if job is None:
+        modeladmin.message_user(request, "Примусове оновлення вже виконується.", messages.WARNING)
+    else:
+        modeladmin.message_user(
+            request,
+            f"Запущено примусове оновлення для {len(config_ids)} фідів у фоні.",
+        )
+
+
 def test_supplier_feeds_action(modeladmin, request, queryset):
     tested_count = 0
     for config in queryset:
@@ -609,6 +711,111 @@ class SupplierWebUpdateLogAdmin(admin.ModelAdmin):
 
 
 
+@admin.register(PriceHistory)
+class PriceHistoryAdmin(admin.ModelAdmin):
+    list_display = [
+        'recorded_at', 'furniture', 'size_variant', 'old_price', 'new_price',
+        'old_promotional_price', 'new_promotional_price', 'source', 'run_id', 'is_rollup',
+    ]
+    list_filter = ['source', 'is_rollup', 'recorded_at']
+    search_fields = ['run_id', 'furniture__name', 'furniture__article_code']
+    list_select_related = ['furniture', 'size_variant']
+    date_hierarchy = 'recorded_at'
+
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
+
+    def has_change_permission(self, request: HttpRequest, obj: Optional[PriceHistory] = None) -> bool:
+        return False
+
+
+@admin.register(PriceChangeSet)
+class PriceChangeSetAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'source', 'label', 'status', 'items_count', 'conflicts_count', 'applied_at']
+    list_filter = ['status', 'source', 'created_at']
+    search_fields = ['run_id', 'label']
+    readonly_fields = [
+        'source', 'run_id', 'label', 'status', 'items_count', 'created_at', 'applied_at',
+        'entries_preview', 'conflicts',
+    ]
+    exclude = ['entries']
+    actions = ['apply_selected', 'discard_selected']
+
+    @admin.display(description="Конфліктів")
+    def conflicts_count(self, obj: PriceChangeSet) -> int:
+        return len(obj.conflicts or [])
+
+    @admin.display(description="Зміни")
+    def entries_preview(self, obj: PriceChangeSet) -> str:
+        rows = []
+        for entry in (obj.entries or [])[:200]:
+            rows.append(format_html(
+                "<tr><td>{}</td><td>{}</td><td>{} → {}</td><td>{} → {}</td></tr>",
+                entry.get('kind'),
+                entry.get('id'),
+                entry.get('old_price'),
+                entry.get('new_price'),
+                entry.get('old_promotional_price') or '—',
+                entry.get('new_promotional_price') or '—',
+            ))
+        if not rows:
+            return "—"
+        return format_html(
+            "<table><tr><th>Тип</th><th>ID</th><th>Ціна</th><th>Акційна ціна</th></tr>{}</table>",
+            format_html("".join(str(row) for row in rows)),
+        )
+
+    @admin.action(description="Застосувати вибрані набори змін")
+    def apply_selected(self, request: HttpRequest, queryset: QuerySet) -> None:
+        for change_set in queryset.filter(status=PriceChangeSet.STATUS_PENDING):
+            result = apply_change_set(change_set)
+            level = messages.WARNING if result['conflicts'] else messages.SUCCESS
+            self.message_user(
+                request,
+                f"Набір #{change_set.pk}: оновлено {result['items_updated']}, "
+                f"конфліктів {result['conflicts']}",
+                level,
+            )
+
+    @admin.action(description="Відхилити вибрані набори змін")
+    def discard_selected(self, request: HttpRequest, queryset: QuerySet) -> None:
+        discarded = sum(1 for change_set in queryset if discard_change_set(change_set))
+        self.message_user(request, f"Відхилено {discarded} наборів змін")
+
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
+
+    def has_change_permission(self, request: HttpRequest, obj: Optional[PriceChangeSet] = None) -> bool:
+        return False
+
+
+@admin.register(CrawlPageState)
+class CrawlPageStateAdmin(admin.ModelAdmin):
+    list_display = ['source', 'url', 'lastmod', 'last_scraped_at']
+    list_filter = ['source']
+    search_fields = ['url']
+    date_hierarchy = 'last_scraped_at'
+
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
+
+    def has_change_permission(self, request: HttpRequest, obj: Optional[CrawlPageState] = None) -> bool:
+        return False
+
+
+@admin.register(SupplierImage)
+class SupplierImageAdmin(admin.ModelAdmin):
+    list_display = ['key', 'width', 'height', 'size_bytes', 'created_at']
+    search_fields = ['key', 'sha256', 'urls__url']
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
+
+    def has_change_permission(self, request: HttpRequest, obj: Optional[SupplierImage] = None) -> bool:
+        return False
+
+
 @admin.register(FurniturePriceCellMapping)
 class FurniturePriceCellMappingAdmin(admin.ModelAdmin):
     list_display = ['furniture', 'config', 'cell_reference', 'price_type', 'is_active']
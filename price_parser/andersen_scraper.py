@@ -1,23 +1,26 @@
 import hashlib
 import logging
 import re
-import time
 from dataclasses import dataclass, field
 from decimal import Decimal, InvalidOperation
-from typing import Dict, List, Optional, Tuple
-from urllib.parse import urlsplit, urljoin
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
 
 from curl_cffi import requests as cffi_requests
 from bs4 import BeautifulSoup
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
 from django.utils.text import slugify
 
+from .crawl_engine import CrawlEngine
+from .http_cache import HttpCache
+from .supplier_images import SupplierImageStore
+
+if TYPE_CHECKING:
+    from .price_history import PriceHistoryRecorder
+
 logger = logging.getLogger(__name__)
 
 BASE_URL = "https://andersen.ua"
 REQUEST_DELAY = 0.8
-IMAGE_CACHE_DIR = "supplier_cache/andersen"
 
 CATALOG_CONFIGS: Dict[str, Dict] = {
     "matratsy": {
@@ -119,8 +122,11 @@ def _generate_slug(name: str) -> str:
 
 class AndersenScraper:
     def __init__(self):
-        self.session = self._build_session()
+        self._crawler = CrawlEngine(REQUEST_DELAY, cache=HttpCache.from_settings())
+        self.session = self._crawler.session(self._build_session)
+        self.images = SupplierImageStore(self.session.get)
         self._progress_callback = None
+        self._history = self._new_history()
 
     def set_progress_callback(self, callback):
         self._progress_callback = callback
@@ -130,6 +136,12 @@ class AndersenScraper:
         if self._progress_callback:
             self._progress_callback(msg)
 
+    def _new_history(self, dry_run: bool = False, label: str = "") -> "PriceHistoryRecorder":
+        from .models import PriceHistory
+        from .price_history import PriceHistoryRecorder
+
+        return PriceHistoryRecorder(PriceHistory.SOURCE_ANDERSEN, dry_run=dry_run, label=label)
+
     def _build_session(self):
         session = cffi_requests.Session(impersonate="chrome124")
         session.headers.update({
@@ -338,44 +350,6 @@ class AndersenScraper:
 
         return image_urls
 
-    # ── Image download ────────────────────────────────────────────────────────
-
-    def _image_cache_path(self, url: str) -> str:
-        parsed = urlsplit(url)
-        ext = re.search(r"\.(jpg|jpeg|png|webp|gif)(\?|$)", parsed.path, re.I)
-        ext_str = f".{ext.group(1).lower()}" if ext else ".jpg"
-        digest = hashlib.sha1(url.encode()).hexdigest()
-        return f"{IMAGE_CACHE_DIR}/{digest}{ext_str}"
-
-    def _download_image(self, url: str) -> Optional[str]:
-        cache_path = self._image_cache_path(url)
-        if default_storage.exists(cache_path):
-            return cache_path
-        try:
-            resp = self.session.get(url, timeout=30)
-            resp.raise_for_status()
-        except Exception as exc:
-            logger.warning("Image download failed %s: %s", url, exc)
-            return None
-
-        content = ContentFile(resp.content)
-        if not self._is_valid_image(content):
-            return None
-        default_storage.save(cache_path, content)
-        return cache_path
-
-    def _is_valid_image(self, content: ContentFile) -> bool:
-        try:
-            from PIL import Image
-            content.seek(0)
-            with Image.open(content) as img:
-                img.verify()
-            content.seek(0)
-            return True
-        except Exception:
-            content.seek(0)
-            return False
-
     # ── Subcategory auto-create ───────────────────────────────────────────────
 
     def _ensure_subcategory(self, catalog_key: str):
@@ -420,12 +394,12 @@ class AndersenScraper:
             "created": 0, "updated": 0, "skipped": 0,
             "candidates": len(candidates), "errors": [],
         }
+        self._history = self._new_history()
 
-        for idx, candidate in enumerate(candidates, 1):
+        products = self._crawler.map(lambda candidate: self.scrape_product(candidate["url"]), candidates)
+        for idx, (candidate, product) in enumerate(products, 1):
             self._log(f"[{idx}/{len(candidates)}] {candidate['name']}")
-            time.sleep(REQUEST_DELAY)
 
-            product = self.scrape_product(candidate["url"])
             if not product:
                 stats["errors"].append(f"Не вдалося завантажити: {candidate['url']}")
                 stats["skipped"] += 1
@@ -481,6 +455,7 @@ class AndersenScraper:
             )
             stats["created"] += 1
 
+        self._history.flush()
         stats["success"] = True
         return stats
 
@@ -503,6 +478,7 @@ class AndersenScraper:
             promo_price = product.sale_price if is_promo else None
 
         fields = []
+        before = (furniture.price, furniture.promotional_price)
         if furniture.is_promotional != is_promo:
             furniture.is_promotional = is_promo
             fields.append("is_promotional")
@@ -510,7 +486,7 @@ class AndersenScraper:
             furniture.promotional_price = promo_price
             fields.append("promotional_price")
         if fields:
-            furniture.save(update_fields=fields)
+            self._history.save(furniture, before, fields)
 
     def _base_price(self, product: AndersenProduct) -> Decimal:
         if product.sizes:
@@ -554,6 +530,7 @@ class AndersenScraper:
 
                 if variant:
                     fields = []
+                    before = (variant.price, variant.promotional_price)
                     if variant.price != size.regular_price:
                         if not dry_run:
                             variant.price = size.regular_price
@@ -567,6 +544,7 @@ class AndersenScraper:
                     if fields:
                         if not dry_run:
                             variant.save(update_fields=fields)
+                            self._history.record(variant, before)
                         self._log(
                             f"  Оновлено {size.label}: {size.regular_price}"
                             + (f" (акція: {size.sale_price})" if size.sale_price else "")
@@ -594,8 +572,10 @@ class AndersenScraper:
             new_price = product.price or Decimal("0")
             if new_price and furniture.price != new_price:
                 if not dry_run:
+                    before = (furniture.price, furniture.promotional_price)
                     furniture.price = new_price
                     furniture.save(update_fields=["price"])
+                    self._history.record(furniture, before)
                 self._log(f"  Оновлено ціну: {new_price}")
                 changed = True
 
@@ -614,8 +594,9 @@ class AndersenScraper:
     def _save_images(self, furniture, image_urls: List[str]) -> None:
         from furniture.models import FurnitureImage
 
+        cached = self.images.fetch_many(image_urls[:5])
         for img_idx, img_url in enumerate(image_urls[:5]):
-            cache_path = self._download_image(img_url)
+            cache_path = cached.get(img_url)
             if not cache_path:
                 continue
             if img_idx == 0 and not furniture.image:
@@ -632,7 +613,8 @@ class AndersenScraper:
 
     # ── Price update (fast path) ──────────────────────────────────────────────
 
-    def update_prices(self, catalog_key: str) -> Dict:
+    def update_prices(self, catalog_key: str, dry_run: bool = False) -> Dict:
+        """Оновлює ціни. З dry_run зміни лише збираються в PriceChangeSet."""
         from furniture.models import Furniture, FurnitureSizeVariant
 
         config = CATALOG_CONFIGS[catalog_key]
@@ -650,7 +632,7 @@ class AndersenScraper:
             f.article_code: f
             for f in Furniture.objects.filter(
                 sub_category__slug=config["subcategory_slug"]
-            ).only("id", "article_code", "price")
+            ).only("id", "article_code", "price", "promotional_price")
             if f.article_code
         }
 
@@ -659,12 +641,12 @@ class AndersenScraper:
 
         candidates = self.collect_product_urls(catalog_key)
         stats = {"checked": 0, "updated": 0, "not_found": 0, "errors": []}
+        self._history = self._new_history(dry_run=dry_run, label=config["subcategory_name"])
 
-        for idx, candidate in enumerate(candidates, 1):
+        products = self._crawler.map(lambda candidate: self.scrape_product(candidate["url"]), candidates)
+        for idx, (candidate, product) in enumerate(products, 1):
             self._log(f"[{idx}/{len(candidates)}] {candidate['name']}")
-            time.sleep(REQUEST_DELAY)
 
-            product = self.scrape_product(candidate["url"])
             if not product:
                 stats["errors"].append(f"Не вдалося: {candidate['url']}")
                 continue
@@ -678,6 +660,7 @@ class AndersenScraper:
                         continue
                     stats["checked"] += 1
                     fields = []
+                    before = (variant.price, variant.promotional_price)
                     if variant.price != size.regular_price:
                         variant.price = size.regular_price
                         fields.append("price")
@@ -687,7 +670,7 @@ class AndersenScraper:
                         variant.is_promotional = is_promo
                         fields.extend(["promotional_price", "is_promotional"])
                     if fields:
-                        variant.save(update_fields=fields)
+                        self._history.save(variant, before, fields)
                         self._log(
                             f"  {size.label}: {size.regular_price}"
                             + (f" → акція {size.sale_price}" if size.sale_price else "")
@@ -707,8 +690,9 @@ class AndersenScraper:
                 new_price = product.price or Decimal("0")
                 updated = False
                 if new_price and furniture.price != new_price:
+                    before = (furniture.price, furniture.promotional_price)
                     furniture.price = new_price
-                    furniture.save(update_fields=["price"])
+                    self._history.save(furniture, before, ["price"])
                     self._log(f"  {furniture.article_code}: {new_price}")
                     stats["updated"] += 1
                     updated = True
@@ -716,5 +700,8 @@ class AndersenScraper:
                     self._sync_promo_to_furniture(furniture, product)
                 stats["checked"] += 1
 
+        self._history.flush()
+        if dry_run:
+            stats["change_set_id"] = self._history.store_change_set().pk
         stats["success"] = True
         return stats
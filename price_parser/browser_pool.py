@@ -0,0 +1,125 @@
+"""Pool of long-lived headless browsers for JS-rendered supplier pages.
+
+Starting Chrome costs seconds, so ``BrowserPool`` keeps up to ``size``
+drivers alive and hands them out per page. A driver is health-checked
+before reuse and replaced after ``max_pages`` pages (Chrome memory grows
+with every navigation) or after any error. ``close()`` quits everything;
+callers own the pool for the duration of one run.
+"""
+
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledDriver:
+    def __init__(self, driver: Any) -> None:
+        self.driver = driver
+        self.pages = 0
+
+
+class BrowserPool:
+    # How long a borrower blocks on the idle queue before re-checking free slots.
+    wait_interval = 0.5
+
+    def __init__(self, factory: Callable[[], Any], size: int = 2, max_pages: int = 50):
+        self._factory = factory
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self._idle: "queue.LifoQueue[_PooledDriver]" = queue.LifoQueue()
+        self._all: List[_PooledDriver] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @contextmanager
+    def driver(self) -> Iterator[Any]:
+        """Borrow a healthy driver; it goes back to the pool unless it failed."""
+        pooled = self._acquire()
+        try:
+            yield pooled.driver
+        except Exception:
+            self._discard(pooled)
+            raise
+        pooled.pages += 1
+        if pooled.pages >= self.max_pages or self._closed:
+            self._discard(pooled)
+        else:
+            self._idle.put(pooled)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            drivers, self._all = self._all, []
+        for pooled in drivers:
+            self._quit(pooled)
+        while not self._idle.empty():
+            self._idle.get_nowait()
+
+    def __enter__(self) -> "BrowserPool":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    # --- Internals --------------------------------------------------------
+
+    def _acquire(self) -> _PooledDriver:
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                pooled = self._create_or_wait()
+            if self._is_healthy(pooled):
+                return pooled
+            self._discard(pooled)
+
+    def _create_or_wait(self) -> _PooledDriver:
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("Browser pool is closed")
+                can_create = len(self._all) < self.size
+                if can_create:
+                    # Reserve the slot before the slow browser start.
+                    placeholder = _PooledDriver(None)
+                    self._all.append(placeholder)
+            if can_create:
+                break
+            try:
+                return self._idle.get(timeout=self.wait_interval)
+            except queue.Empty:
+                # A discarded driver or a failed start frees a slot without
+                # putting anything in the queue; look again.
+                continue
+        try:
+            placeholder.driver = self._factory()
+        except Exception:
+            with self._lock:
+                if placeholder in self._all:
+                    self._all.remove(placeholder)
+            raise
+        return placeholder
+
+    @staticmethod
+    def _is_healthy(pooled: _PooledDriver) -> bool:
+        try:
+            return pooled.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def _discard(self, pooled: _PooledDriver) -> None:
+        with self._lock:
+            if pooled in self._all:
+                self._all.remove(pooled)
+        self._quit(pooled)
+
+    @staticmethod
+    def _quit(pooled: _PooledDriver) -> None:
+        try:
+            pooled.driver.quit()
+        except Exception:
+            logger.debug("Browser quit failed", exc_info=True)
@@ -0,0 +1,129 @@
+"""Applying price change sets collected by dry runs.
+
+A dry run (``update_prices(dry_run=True)``) has already done all fetching and
+matching; applying its ``PriceChangeSet`` is a single transaction of bulk
+updates. An entry is skipped as a conflict when the catalog price no longer
+equals the ``old`` price seen by the dry run, so a stale preview never
+overwrites a newer manual or automatic edit.
+"""
+
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from furniture.models import Furniture, FurnitureSizeVariant
+
+from .models import PriceChangeSet
+from .price_history import PriceHistoryRecorder
+
+PRICE_FIELDS = ["price", "promotional_price", "is_promotional"]
+
+
+def _to_decimal(value: Optional[str]) -> Optional[Decimal]:
+    return None if value is None else Decimal(value)
+
+
+def _invalidate_furniture_cache() -> None:
+    # Same keys as the Furniture post_save handler, which bulk_update skips.
+    from shop.signals import invalidate_furniture_cache
+
+    invalidate_furniture_cache(sender=Furniture)
+
+
+def apply_change_set(change_set: PriceChangeSet) -> Dict:
+    """Write a pending change set to the catalog in one transaction."""
+    with transaction.atomic():
+        change_set = PriceChangeSet.objects.select_for_update().get(pk=change_set.pk)
+        if change_set.status != PriceChangeSet.STATUS_PENDING:
+            return {
+                "success": False,
+                "error": f'Набір змін уже має статус "{change_set.get_status_display()}"',
+            }
+
+        entries = change_set.entries or []
+        furniture_ids = [e["id"] for e in entries if e["kind"] == "furniture"]
+        variant_ids = [e["id"] for e in entries if e["kind"] == "variant"]
+        furniture_map = Furniture.objects.select_for_update().in_bulk(furniture_ids)
+        variant_map = FurnitureSizeVariant.objects.select_for_update().in_bulk(
+            variant_ids
+        )
+
+        history = PriceHistoryRecorder(change_set.source, run_id=change_set.run_id)
+        now = timezone.now()
+        furniture_updates: List[Furniture] = []
+        variant_updates: List[FurnitureSizeVariant] = []
+        promo_disabled_ids: List[int] = []
+        conflicts: List[Dict] = []
+
+        for entry in entries:
+            objects = furniture_map if entry["kind"] == "furniture" else variant_map
+            obj = objects.get(entry["id"])
+            if obj is None:
+                conflicts.append({**entry, "reason": "Запис видалено з каталогу"})
+                continue
+            before = history.snapshot(obj)
+            if before != (
+                _to_decimal(entry["old_price"]),
+                _to_decimal(entry["old_promotional_price"]),
+            ):
+                conflicts.append(
+                    {
+                        **entry,
+                        "reason": "Ціна в каталозі змінилась після попереднього перегляду",
+                        "current_price": (
+                            str(before[0]) if before[0] is not None else None
+                        ),
+                    }
+                )
+                continue
+
+            was_promotional = obj.is_promotional
+            obj.price = _to_decimal(entry["new_price"])
+            obj.promotional_price = _to_decimal(entry["new_promotional_price"])
+            obj.is_promotional = entry["is_promotional"]
+            history.record(obj, before)
+            if entry["kind"] == "furniture":
+                obj.updated_at = now
+                furniture_updates.append(obj)
+                if was_promotional and not obj.is_promotional:
+                    promo_disabled_ids.append(obj.pk)
+            else:
+                variant_updates.append(obj)
+
+        Furniture.objects.bulk_update(
+            furniture_updates, PRICE_FIELDS + ["updated_at"], batch_size=500
+        )
+        if promo_disabled_ids:
+            # Furniture.save() clears variant promo prices when promo is switched off.
+            FurnitureSizeVariant.objects.filter(
+                furniture_id__in=promo_disabled_ids,
+                promotional_price__isnull=False,
+            ).update(promotional_price=None)
+        FurnitureSizeVariant.objects.bulk_update(
+            variant_updates, PRICE_FIELDS, batch_size=500
+        )
+        history.flush()
+
+        change_set.status = PriceChangeSet.STATUS_APPLIED
+        change_set.applied_at = now
+        change_set.conflicts = conflicts
+        change_set.save(update_fields=["status", "applied_at", "conflicts"])
+
+        if furniture_updates:
+            transaction.on_commit(_invalidate_furniture_cache)
+
+    return {
+        "success": True,
+        "items_updated": len(furniture_updates) + len(variant_updates),
+        "conflicts": len(conflicts),
+    }
+
+
+def discard_change_set(change_set: PriceChangeSet) -> bool:
+    updated = PriceChangeSet.objects.filter(
+        pk=change_set.pk,
+        status=PriceChangeSet.STATUS_PENDING,
+    ).update(status=PriceChangeSet.STATUS_DISCARDED)
+    return bool(updated)
@@ -0,0 +1,249 @@
+"""Shared crawl engine for supplier scrapers.
+
+Supplier scrapers used to fetch product pages one by one with a fixed
+``time.sleep(REQUEST_DELAY)`` between requests, so a refresh took roughly
+``pages × (latency + delay)``. ``CrawlEngine`` keeps the same politeness
+budget (``1 / REQUEST_DELAY`` requests per second per host) but spends it
+with a small worker pool:
+
+* ``engine.session(factory)`` returns a ``CrawlSession`` — a drop-in for the
+  scraper's HTTP session. Each worker thread gets its own underlying session
+  (curl_cffi sessions are not thread-safe) and every ``get`` goes through the
+  per-host token bucket and the retry policy.
+* with a ``cache`` (``HttpCache``) fresh pages are served from disk without
+  touching the limiter and stale ones are revalidated conditionally.
+* ``engine.map(scrape, items)`` runs a ``scrape_product``-style callback over
+  items on the pool and yields ``(item, result)`` pairs in input order, so
+  the caller keeps doing all DB work in its own thread.
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+from .http_cache import HttpCache
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, up to ``capacity``."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = 1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(1.0, float(capacity))
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until it is available. Returns the wait."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # Reserve the token under the lock; concurrent callers queue up
+            # behind it by driving the balance negative.
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+class HostRateLimiter:
+    """One ``TokenBucket`` per host name."""
+
+    def __init__(self, rate: float, burst: float = 1, **bucket_kwargs: Any):
+        self.rate = rate
+        self.burst = burst
+        self._bucket_kwargs = bucket_kwargs
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url: str) -> float:
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(
+                    self.rate, self.burst, **self._bucket_kwargs
+                )
+        return bucket.acquire()
+
+
+class CrawlSession:
+    """Session facade: per-thread sessions behind a rate-limited ``get``."""
+
+    def __init__(self, engine: "CrawlEngine", factory: Callable[[], object]):
+        self._engine = engine
+        self._factory = factory
+        self._local = threading.local()
+
+    @property
+    def raw(self) -> Any:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self._factory()
+        return session
+
+    @property
+    def headers(self) -> Any:
+        return self.raw.headers
+
+    def get(self, url: str, **kwargs: Any) -> Any:
+        return self._engine.get(self.raw, url, **kwargs)
+
+
+class CrawlEngine:
+    """Bounded worker pool with per-host rate limiting and jittered retries."""
+
+    def __init__(
+        self,
+        request_delay: float,
+        workers: Optional[int] = None,
+        burst: float = 1,
+        retries: int = 2,
+        backoff: float = 1.0,
+        sleep: Callable[[float], None] = time.sleep,
+        cache: Optional[HttpCache] = None,
+    ):
+        self.workers = max(
+            1,
+            (
+                workers
+                if workers is not None
+                else getattr(settings, "SUPPLIER_CRAWL_WORKERS", 4)
+            ),
+        )
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self._sleep = sleep
+        self.cache = cache
+        rate = 1.0 / request_delay if request_delay > 0 else 1000.0
+        self.limiter = HostRateLimiter(rate, burst, sleep=sleep)
+
+    def session(self, factory: Callable[[], object]) -> CrawlSession:
+        return CrawlSession(self, factory)
+
+    def _retry_delay(self, attempt: int) -> float:
+        base = self.backoff * (2**attempt)
+        return base * random.uniform(0.5, 1.5)
+
+    def get(self, session: Any, url: str, **kwargs: Any) -> Any:
+        """``session.get`` through the cache (if any), rate limiter and retries."""
+        if self.cache is None:
+            return self._fetch(session, url, **kwargs)
+        return self.cache.get(
+            lambda target, **kw: self._fetch(session, target, **kw), url, **kwargs
+        )
+
+    def _fetch(self, session: Any, url: str, **kwargs: Any) -> Any:
+        """Rate-limited ``session.get``; retries errors and 429/5xx."""
+        attempt = 0
+        while True:
+            self.limiter.acquire(url)
+            try:
+                response = session.get(url, **kwargs)
+            except Exception as exc:
+                if attempt >= self.retries:
+                    raise
+                logger.info(
+                    "GET %s failed (%s), retry %s/%s",
+                    url,
+                    exc,
+                    attempt + 1,
+                    self.retries,
+                )
+            else:
+                if (
+                    response.status_code not in RETRY_STATUSES
+                    or attempt >= self.retries
+                ):
+                    return response
+                logger.info(
+                    "GET %s returned %s, retry %s/%s",
+                    url,
+                    response.status_code,
+                    attempt + 1,
+                    self.retries,
+                )
+            self._sleep(self._retry_delay(attempt))
+            attempt += 1
+
+    def map(
+        self, func: Callable[[T], R], items: Iterable[T]
+    ) -> Iterator[Tuple[T, Optional[R]]]:
+        """Apply ``func`` to items concurrently; yield ``(item, result)`` in order.
+
+        At most ``workers * 2`` items are in flight. A callback that raises
+        yields ``None`` for its item, mirroring how scrapers report a page
+        that could not be parsed.
+        """
+        if self.workers == 1:
+            for item in items:
+                yield item, self._call(func, item)
+            return
+
+        iterator = iter(items)
+        window = self.workers * 2
+        executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="crawl"
+        )
+        try:
+            pending: List[Tuple[T, "Future[Optional[R]]"]] = [
+                (item, executor.submit(self._call, func, item))
+                for item in islice(iterator, window)
+            ]
+            while pending:
+                item, future = pending.pop(0)
+                result = future.result()
+                for next_item in islice(iterator, 1):
+                    pending.append(
+                        (next_item, executor.submit(self._call, func, next_item))
+                    )
+                yield item, result
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def _call(func: Callable[[T], R], item: T) -> Optional[R]:
+        try:
+            return func(item)
+        except Exception:
+            logger.warning("Crawl callback failed for %r", item, exc_info=True)
+            return None
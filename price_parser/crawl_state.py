@@ -0,0 +1,130 @@
+"""Per-URL crawl state for incremental supplier crawls.
+
+A crawl records, for every page it processed successfully, the sitemap
+``lastmod`` and/or a fingerprint of what it saw (e.g. the listing card with
+the price). The next run asks ``is_unchanged`` before scraping a page and
+skips it when nothing moved. Each page is still re-scraped at least every
+``full_sweep_days`` (spread per URL so the sweep does not land on one day),
+and ``force=True`` turns every check off.
+"""
+
+import hashlib
+import logging
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import CrawlPageState
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(*parts: object) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(str(part if part is not None else "").encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+class CrawlStateStore:
+    """Loads a source's page states once and upserts changes in bulk."""
+
+    def __init__(
+        self, source: str, full_sweep_days: Optional[float] = None, force: bool = False
+    ):
+        self.source = source
+        if full_sweep_days is None:
+            full_sweep_days = getattr(settings, "SUPPLIER_CRAWL_FULL_SWEEP_DAYS", 7)
+        self.full_sweep_days = full_sweep_days
+        self.force = force
+        self.now = timezone.now()
+        self._states: Optional[Dict[str, CrawlPageState]] = None
+        self._dirty: Dict[str, CrawlPageState] = {}
+        self.skipped = 0
+
+    @property
+    def states(self) -> Dict[str, CrawlPageState]:
+        if self._states is None:
+            self._states = {
+                state.url: state
+                for state in CrawlPageState.objects.filter(source=self.source)
+            }
+        return self._states
+
+    def _is_due(self, state: CrawlPageState) -> bool:
+        if not self.full_sweep_days:
+            return True
+        # Spread re-scrapes over the second half of the sweep window.
+        spread = int(fingerprint(state.url)[:4], 16) / 0xFFFF
+        max_age = timedelta(days=self.full_sweep_days * (0.5 + spread / 2))
+        return self.now - state.last_scraped_at >= max_age
+
+    def is_unchanged(self, url: str, lastmod: str = "", content_hash: str = "") -> bool:
+        """True when the page can be skipped: same lastmod/fingerprint and not due."""
+        if self.force or not (lastmod or content_hash):
+            return False
+        state = self.states.get(url)
+        if state is None or self._is_due(state):
+            return False
+        if lastmod and state.lastmod != lastmod:
+            return False
+        if content_hash and state.content_hash != content_hash:
+            return False
+        self.skipped += 1
+        return True
+
+    def payload(self, url: str) -> Dict:
+        state = self.states.get(url)
+        return dict(state.payload or {}) if state else {}
+
+    def mark(
+        self,
+        url: str,
+        lastmod: str = "",
+        content_hash: str = "",
+        payload: Optional[Dict] = None,
+    ) -> None:
+        """Remember a successfully processed page; written on ``flush``."""
+        state = self.states.get(url)
+        if state is None:
+            state = CrawlPageState(source=self.source, url=url, payload={})
+            self.states[url] = state
+        state.lastmod = lastmod or ""
+        state.content_hash = content_hash or ""
+        if payload is not None:
+            state.payload = payload
+        state.last_scraped_at = self.now
+        self._dirty[url] = state
+
+    def flush(self) -> None:
+        if not self._dirty:
+            return
+        rows = [
+            CrawlPageState(
+                source=self.source,
+                url=state.url,
+                lastmod=state.lastmod,
+                content_hash=state.content_hash,
+                payload=state.payload,
+                last_scraped_at=state.last_scraped_at,
+            )
+            for state in self._dirty.values()
+        ]
+        try:
+            CrawlPageState.objects.bulk_create(
+                rows,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=["source", "url"],
+                update_fields=["lastmod", "content_hash", "payload", "last_scraped_at"],
+            )
+        except Exception:
+            # Losing crawl state only costs a fuller crawl next time.
+            logger.warning(
+                "Failed to store crawl state for %s", self.source, exc_info=True
+            )
+            return
+        self._dirty.clear()
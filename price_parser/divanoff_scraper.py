@@ -2,26 +2,30 @@ import hashlib
 import json
 import logging
 import re
-import time
 from dataclasses import dataclass, field
 from decimal import Decimal, InvalidOperation
-from difflib import SequenceMatcher
-from typing import Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
-import openpyxl
 from bs4 import BeautifulSoup
 from curl_cffi import requests as cffi_requests
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
 from django.utils.text import slugify
 
+from .crawl_engine import CrawlEngine
+from .fuzzy_match import BlockedMatcher
+from .http_cache import HttpCache
+from .supplier_images import SupplierImageStore
+from .xlsx_reader import read_xlsx_rows
+
+if TYPE_CHECKING:
+    from .price_history import PriceHistoryRecorder
+
 logger = logging.getLogger(__name__)
 
 BASE_URL = "https://divanoff.ua"
 CATALOG_URL = f"{BASE_URL}/divany"
 MAX_PAGES = 20  # safety cap — цикл зупиняється раніше на першій порожній сторінці
 REQUEST_DELAY = 0.8
-IMAGE_CACHE_DIR = "supplier_cache/divanoff"
 # 0-indexed columns C–J = Category 0 (cheapest) through Category VII
 FABRIC_COLS = list(range(2, 10))
 PRICE_COL = FABRIC_COLS[0]  # default: Category 0
@@ -154,6 +158,7 @@ def _extract_size_and_base(name: str) -> Tuple[str, str]:
     return name.strip(), ""
 
 
+@lru_cache(maxsize=4096)
 def _normalise_for_match(text: str) -> str:
     """Sorted bag-of-words normalisation for fuzzy name comparison.
 
@@ -201,10 +206,6 @@ def _normalise_for_match(text: str) -> str:
     return "".join(transliterated)
 
 
-def _fuzzy(a: str, b: str) -> float:
-    return SequenceMatcher(None, a, b).ratio()
-
-
 def _parse_price(value) -> Optional[Decimal]:
     if value is None:
         return None
@@ -234,11 +235,9 @@ def load_price_rows(xlsx_path: str, price_col: int = PRICE_COL) -> List[PriceRow
     Loads all 8 fabric-category prices (cols C–J) per row regardless of price_col.
     `price` is set to the column requested by price_col (for backward compat).
     """
-    wb = openpyxl.load_workbook(xlsx_path, data_only=True, read_only=True)
-    ws = wb.active
     rows: List[PriceRow] = []
     col_offset = FABRIC_COLS[0]  # 2
-    for row in ws.iter_rows(min_row=8, values_only=True):
+    for row in read_xlsx_rows(xlsx_path, min_row=8, max_col=FABRIC_COLS[-1] + 1):
         raw_name = row[1]
         if not raw_name or not isinstance(raw_name, str) or not raw_name.strip():
             continue
@@ -259,7 +258,6 @@ def load_price_rows(xlsx_path: str, price_col: int = PRICE_COL) -> List[PriceRow
             price=price,
             all_prices=all_prices,
         ))
-    wb.close()
     return rows
 
 
@@ -313,17 +311,22 @@ def _ensure_divanoff_brand():
     return brand
 
 
-def _best_match_key(site_norm: str, price_rows: List[PriceRow]) -> Tuple[str, float]:
-    """Return (best_norm_key, best_score) from price_rows for a given site_norm."""
-    key_scores: Dict[str, float] = {}
-    for pr in price_rows:
-        if pr.norm_key in key_scores:
-            continue
-        key_scores[pr.norm_key] = _fuzzy(site_norm, pr.norm_key)
-    return max(key_scores.items(), key=lambda kv: kv[1], default=("", 0.0))
+def price_row_matcher(price_rows: List[PriceRow]) -> BlockedMatcher:
+    """Blocked matcher over the distinct norm_keys, in price-sheet order."""
+    return BlockedMatcher(dict.fromkeys(pr.norm_key for pr in price_rows))
+
+
+def _best_match_key(site_norm: str, matcher: BlockedMatcher) -> Tuple[str, float]:
+    """Return (best_norm_key, best_score) for keys scoring at least MATCH_THRESHOLD."""
+    best_key, best_score = matcher.best_key(site_norm, cutoff=MATCH_THRESHOLD)
+    return best_key or "", best_score
 
 
-def match_price_rows(product_name: str, price_rows: List[PriceRow]) -> List[PriceRow]:
+def match_price_rows(
+    product_name: str,
+    price_rows: List[PriceRow],
+    matcher: Optional[BlockedMatcher] = None,
+) -> List[PriceRow]:
     """Find all price rows whose base_name best matches the product name.
 
     Returns a list because one site product can map to multiple sizes (e.g.
@@ -333,6 +336,9 @@ def match_price_rows(product_name: str, price_rows: List[PriceRow]) -> List[Pric
     Pass 1 — full normalised name including shape words (кут, міні, тахта).
     Pass 2 — if no match, retry without 'кут' (handles cases like 'Норд Мини
     угловой' vs price-sheet 'Норд mini' that omits the 'кут' word).
+
+    Pass ``matcher`` (``price_row_matcher(price_rows)``) when matching many
+    products against the same sheet.
     """
     site_norm = _normalise_for_match(
         re.sub(r"^(?:диван|модульна[а-я]*)\s+", "", product_name, flags=re.I)
@@ -340,13 +346,15 @@ def match_price_rows(product_name: str, price_rows: List[PriceRow]) -> List[Pric
     if not site_norm:
         return []
 
-    best_key, best_score = _best_match_key(site_norm, price_rows)
+    if matcher is None:
+        matcher = price_row_matcher(price_rows)
+    best_key, best_score = _best_match_key(site_norm, matcher)
 
     # Pass 2: if угловой/кутовий is in site name but price omits 'кут'
     if best_score < MATCH_THRESHOLD and re.search(r"угл|кут", product_name, re.I):
         norm_no_kut = re.sub(r"kut", "", site_norm)
         if norm_no_kut and norm_no_kut != site_norm:
-            bk2, bs2 = _best_match_key(norm_no_kut, price_rows)
+            bk2, bs2 = _best_match_key(norm_no_kut, matcher)
             if bs2 > best_score:
                 best_key, best_score = bk2, bs2
 
@@ -360,8 +368,13 @@ def match_price_rows(product_name: str, price_rows: List[PriceRow]) -> List[Pric
 
 class DivanoffScraper:
     def __init__(self):
-        self.session = self._build_session()
+        self._crawler = CrawlEngine(REQUEST_DELAY, cache=HttpCache.from_settings())
+        self.session = self._crawler.session(self._build_session)
+        self.images = SupplierImageStore(self.session.get)
         self._progress_callback = None
+        self._history = self._new_history()
+        # Product URL → fingerprint of its catalog card.
+        self._listing_fingerprints: Dict[str, str] = {}
 
     def set_progress_callback(self, callback):
         self._progress_callback = callback
@@ -371,6 +384,12 @@ class DivanoffScraper:
         if self._progress_callback:
             self._progress_callback(msg)
 
+    def _new_history(self) -> "PriceHistoryRecorder":
+        from .models import PriceHistory
+        from .price_history import PriceHistoryRecorder
+
+        return PriceHistoryRecorder(PriceHistory.SOURCE_DIVANOFF)
+
     def _build_session(self):
         session = cffi_requests.Session(impersonate="chrome124")
         session.headers.update({
@@ -391,13 +410,14 @@ class DivanoffScraper:
     # ── Catalog ───────────────────────────────────────────────────────────────
 
     def collect_product_urls(self, limit: Optional[int] = None) -> List[str]:
+        from .crawl_state import fingerprint
+
         all_urls: List[str] = []
         seen: set = set()
 
         for page in range(1, MAX_PAGES + 1):
             url = CATALOG_URL if page == 1 else f"{CATALOG_URL}?page={page}"
             self._log(f"Каталог сторінка {page}/{MAX_PAGES}: {url}")
-            time.sleep(REQUEST_DELAY if page > 1 else 0)
 
             soup = self._get(url)
             if not soup:
@@ -415,6 +435,7 @@ class DivanoffScraper:
                 if href not in seen:
                     seen.add(href)
                     page_urls.append(href)
+                    self._listing_fingerprints[href] = fingerprint(card.get_text(" ", strip=True))
                     if limit and len(all_urls) + len(page_urls) >= limit:
                         break
 
@@ -540,45 +561,12 @@ class DivanoffScraper:
 
     # ── Image download ────────────────────────────────────────────────────────
 
-    def _image_cache_path(self, url: str) -> str:
-        ext = re.search(r"\.(jpg|jpeg|png|webp)(\?|$)", url, re.I)
-        ext_str = f".{ext.group(1).lower()}" if ext else ".jpg"
-        digest = hashlib.sha1(url.encode()).hexdigest()
-        return f"{IMAGE_CACHE_DIR}/{digest}{ext_str}"
-
-    def _download_image(self, url: str) -> Optional[str]:
-        cache_path = self._image_cache_path(url)
-        if default_storage.exists(cache_path):
-            return cache_path
-        try:
-            resp = self.session.get(url, timeout=30)
-            resp.raise_for_status()
-        except Exception as exc:
-            logger.warning("Image download failed %s: %s", url, exc)
-            return None
-        content = ContentFile(resp.content)
-        if not self._is_valid_image(content):
-            return None
-        default_storage.save(cache_path, content)
-        return cache_path
-
-    def _is_valid_image(self, content: ContentFile) -> bool:
-        try:
-            from PIL import Image
-            content.seek(0)
-            with Image.open(content) as img:
-                img.verify()
-            content.seek(0)
-            return True
-        except Exception:
-            content.seek(0)
-            return False
-
     def _save_images(self, furniture, image_urls: List[str]) -> None:
         from furniture.models import FurnitureImage
 
+        cached = self.images.fetch_many(image_urls[:5])
         for idx, img_url in enumerate(image_urls[:5]):
-            cache_path = self._download_image(img_url)
+            cache_path = cached.get(img_url)
             if not cache_path:
                 continue
             if idx == 0 and not furniture.image:
@@ -616,6 +604,7 @@ class DivanoffScraper:
             fabric_brand = _ensure_divanoff_brand()
 
         price_rows = load_price_rows(xlsx_path, price_col)
+        matcher = price_row_matcher(price_rows)
         self._log(f"Завантажено {len(price_rows)} рядків з прайсу")
 
         all_urls = self.collect_product_urls(limit=limit)
@@ -634,18 +623,17 @@ class DivanoffScraper:
             "created": 0, "updated": 0, "skipped": 0,
             "unmatched": 0, "errors": [],
         }
+        self._history = self._new_history()
 
-        for idx, url in enumerate(all_urls, 1):
+        for idx, (url, product) in enumerate(self._crawler.map(self.scrape_product, all_urls), 1):
             self._log(f"[{idx}/{len(all_urls)}] {url}")
-            time.sleep(REQUEST_DELAY)
 
-            product = self.scrape_product(url)
             if not product:
                 stats["errors"].append(f"Не вдалося завантажити: {url}")
                 stats["skipped"] += 1
                 continue
 
-            matched = match_price_rows(product.name, price_rows)
+            matched = match_price_rows(product.name, price_rows, matcher)
             if not matched:
                 self._log(f"  ⚠ Не знайдено в прайсі: {product.name}")
                 stats["unmatched"] += 1
@@ -733,6 +721,7 @@ class DivanoffScraper:
                     self._log(f"  Створено: {furniture.name} ({article_code}) — {furniture.price} грн")
                     stats["created"] += 1
 
+        self._history.flush()
         stats["success"] = True
         return stats
 
@@ -755,9 +744,11 @@ class DivanoffScraper:
             return False
         self._log(f"  Оновлено {furniture.article_code}: {furniture.price} → {new_price}")
         if not dry_run:
+            before = (furniture.price, furniture.promotional_price)
             furniture.price = new_price
             furniture.fabric_value = new_step
             furniture.save(update_fields=["price", "fabric_value"])
+            self._history.record(furniture, before)
         return True
 
     # ── Price update ──────────────────────────────────────────────────────────
@@ -767,37 +758,62 @@ class DivanoffScraper:
         subcategory_slug: str,
         xlsx_path: str,
         price_col: int = PRICE_COL,
+        force: bool = False,
     ) -> Dict:
+        """Оновлює ціни з прайсу, зіставляючи його з товарами на сайті.
+
+        Назву й артикул товару, картка якого в каталозі не змінилась, беремо
+        зі збереженого стану, не завантажуючи сторінку (крім force та
+        періодичного повного проходу).
+        """
         from furniture.models import Furniture
 
+        from .crawl_state import CrawlStateStore
+
         self._log("Оновлення цін Divanoff...")
 
         fabric_brand = _ensure_divanoff_brand()
         price_rows = load_price_rows(xlsx_path, price_col)
+        matcher = price_row_matcher(price_rows)
         self._log(f"Завантажено {len(price_rows)} рядків з прайсу")
 
         # article_code → Furniture
         furniture_map: Dict[str, "Furniture"] = {
             f.article_code: f
             for f in Furniture.objects.filter(sub_category__slug=subcategory_slug)
-            .only("id", "article_code", "price")
+            .only("id", "article_code", "price", "promotional_price")
             if f.article_code
         }
         if not furniture_map:
             return {"success": False, "error": "Немає товарів — спочатку запустіть import"}
 
         all_urls = self.collect_product_urls()
-        stats = {"checked": 0, "updated": 0, "not_found": 0, "unmatched": 0}
-
-        for idx, url in enumerate(all_urls, 1):
+        crawl_state = CrawlStateStore("divanoff", force=force)
+        known: Dict[str, DivanoffProduct] = {}
+        for url in all_urls:
+            payload = crawl_state.payload(url)
+            if payload.get("name") and crawl_state.is_unchanged(
+                url, content_hash=self._listing_fingerprints.get(url, "")
+            ):
+                known[url] = DivanoffProduct(url=url, name=payload["name"], site_article=payload.get("site_article", ""))
+        stats = {"checked": 0, "updated": 0, "not_found": 0, "unmatched": 0, "unchanged": len(known)}
+        self._log(f"Сторінок без змін (з кешу стану): {len(known)}")
+        self._history = self._new_history()
+
+        products = self._crawler.map(lambda url: known.get(url) or self.scrape_product(url), all_urls)
+        for idx, (url, product) in enumerate(products, 1):
             self._log(f"[{idx}/{len(all_urls)}] {url}")
-            time.sleep(REQUEST_DELAY)
 
-            product = self.scrape_product(url)
             if not product:
                 continue
+            if url not in known:
+                crawl_state.mark(
+                    url,
+                    content_hash=self._listing_fingerprints.get(url, ""),
+                    payload={"name": product.name, "site_article": product.site_article},
+                )
 
-            matched = match_price_rows(product.name, price_rows)
+            matched = match_price_rows(product.name, price_rows, matcher)
             if not matched:
                 self._log(f"  ⚠ Не знайдено в прайсі: {product.name}")
                 stats["unmatched"] += 1
@@ -819,6 +835,7 @@ class DivanoffScraper:
                 new_price = _apply_price_formula(pr.all_prices[0] or pr.price)
                 new_step = _per_sofa_step(pr.all_prices)
                 update_fields = []
+                before = (furniture.price, furniture.promotional_price)
                 if furniture.price != new_price or furniture.fabric_value != new_step:
                     furniture.price = new_price
                     furniture.fabric_value = new_step
@@ -828,8 +845,11 @@ class DivanoffScraper:
                     update_fields.append("selected_fabric_brand")
                 if update_fields:
                     furniture.save(update_fields=update_fields)
+                    self._history.record(furniture, before)
                     self._log(f"  {article_code}: {new_price} грн")
                     stats["updated"] += 1
 
+        self._history.flush()
+        crawl_state.flush()
         stats["success"] = True
         return stats
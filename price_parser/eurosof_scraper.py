@@ -1,24 +1,28 @@
-import hashlib
 import logging
 import re
-import time
 from dataclasses import dataclass, field
 from decimal import Decimal
-from difflib import SequenceMatcher
-from typing import Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 from urllib.parse import urljoin
 
 from bs4 import BeautifulSoup
 from curl_cffi import requests as cffi_requests
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
 from django.utils.text import slugify
 
+from .crawl_engine import CrawlEngine
+from .fuzzy_match import BlockedMatcher
+from .http_cache import HttpCache
+from .supplier_images import SupplierImageStore
+from .xlsx_reader import read_xlsx_rows
+
+if TYPE_CHECKING:
+    from .price_history import PriceHistoryRecorder
+
 logger = logging.getLogger(__name__)
 
 BASE_URL = "https://eurosof.com.ua"
 REQUEST_DELAY = 1.0
-IMAGE_CACHE_DIR = "supplier_cache/eurosof"
 PRICE_MULTIPLIER = Decimal("1.4")
 PRICE_ADDON = Decimal("2000")
 XLSX_PATH = "Прайс Eurosof Б.Церква 05.05.26р.xlsx"
@@ -68,15 +72,12 @@ def _translit(text: str) -> str:
     return "".join(result)
 
 
+@lru_cache(maxsize=4096)
 def _normalize_name(text: str) -> str:
     """Transliterate, lowercase, remove non-alpha."""
     return re.sub(r"[^a-z0-9]", "", _translit(text))
 
 
-def _fuzzy_score(a: str, b: str) -> float:
-    return SequenceMatcher(None, a, b).ratio()
-
-
 def _extract_name_from_quotes(raw: str) -> Optional[str]:
     """Extract name inside curly/angle quotes from a catalog row name."""
     m = re.search(r'[""„««]([^""»»]+)[""»»]', raw)
@@ -205,10 +206,7 @@ class EurosofCatalogParser:
         self.xlsx_path = xlsx_path
 
     def _load_rows(self) -> list:
-        import openpyxl
-        wb = openpyxl.load_workbook(self.xlsx_path, data_only=True)
-        ws = wb[MAIN_SHEET]
-        return list(ws.iter_rows(values_only=True))
+        return read_xlsx_rows(self.xlsx_path, MAIN_SHEET, max_col=COL_SIZE + 1)
 
     def parse(self) -> List[CatalogProduct]:
         """Straight sofas + mini + kanape (everything except corner)."""
@@ -325,10 +323,7 @@ class EurosofBedCatalogParser(EurosofCatalogParser):
     """Parses the beds sheet; forces product_type=BED and skips add-on rows."""
 
     def _load_rows(self) -> list:
-        import openpyxl
-        wb = openpyxl.load_workbook(self.xlsx_path, data_only=True)
-        ws = wb[BED_SHEET]
-        return list(ws.iter_rows(values_only=True))
+        return read_xlsx_rows(self.xlsx_path, BED_SHEET, max_col=COL_SIZE + 1)
 
     def _is_product_row(self, row) -> bool:
         name = row[COL_NAME]
@@ -350,12 +345,17 @@ class EurosofBedCatalogParser(EurosofCatalogParser):
 
 class EurosofWebScraper:
     def __init__(self):
-        self.session = cffi_requests.Session(impersonate="chrome124")
-        self.session.headers.update({
+        self._crawler = CrawlEngine(REQUEST_DELAY, cache=HttpCache.from_settings())
+        self.session = self._crawler.session(self._build_session)
+        self._progress_callback = None
+
+    def _build_session(self) -> cffi_requests.Session[cffi_requests.Response]:
+        session: cffi_requests.Session[cffi_requests.Response] = cffi_requests.Session(impersonate="chrome124")
+        session.headers.update({
             "Accept-Language": "uk-UA,uk;q=0.9,en-US;q=0.8",
             "Accept": "text/html,application/xhtml+xml,*/*;q=0.8",
         })
-        self._progress_callback = None
+        return session
 
     def set_progress_callback(self, cb):
         self._progress_callback = cb
@@ -444,12 +444,14 @@ class EurosofWebScraper:
         seen_slugs: set = set()
         for cat_url in catalog_urls:
             self._log(f"Збираємо посилання з {cat_url}")
+            entries = []
             for entry in self.collect_product_urls(cat_url):
                 if entry["slug"] in seen_slugs:
                     continue
                 seen_slugs.add(entry["slug"])
-                time.sleep(REQUEST_DELAY)
-                product = self.scrape_product(entry["url"], entry["slug"])
+                entries.append(entry)
+            scraped = self._crawler.map(lambda entry: self.scrape_product(entry["url"], entry["slug"]), entries)
+            for entry, product in scraped:
                 if product:
                     all_products.append(product)
                     self._log(f"  ✓ {product.h1_name} ({entry['slug']})")
@@ -467,6 +469,7 @@ def match_catalog_to_scraped(
 ) -> List[Tuple[CatalogProduct, Optional[ScrapedProduct]]]:
     """Match each catalog product to the best-scoring scraped product."""
     slug_index: Dict[str, ScrapedProduct] = {sp.slug: sp for sp in scraped}
+    matcher = BlockedMatcher(sp.normalized_name for sp in scraped)
     results = []
     for cp in catalog:
         # 1. Check manual override first
@@ -478,56 +481,23 @@ def match_catalog_to_scraped(
                 logger.debug("MANUAL MATCH: %s → %s", cp.catalog_name, match.h1_name)
                 continue
 
-        # 2. Fuzzy match against all scraped products
-        best: Optional[ScrapedProduct] = None
-        best_score = 0.0
-        for sp in scraped:
-            score = _fuzzy_score(cp.normalized_name, sp.normalized_name)
-            if score > best_score:
-                best_score = score
-                best = sp
-        if best_score >= threshold:
+        # 2. Fuzzy match against the shortlisted scraped products
+        best_idx, best_score = matcher.best(cp.normalized_name, cutoff=threshold)
+        if best_idx is not None:
+            best = scraped[best_idx]
             results.append((cp, best))
             logger.debug("MATCH %.2f: %s → %s", best_score, cp.catalog_name, best.h1_name)
         else:
             results.append((cp, None))
-            logger.warning("UNMATCHED (%.2f): %s", best_score, cp.catalog_name)
+            # Below the cutoff ``best`` only knows a lower bound; rescore
+            # without one to log how close the nearest product really was.
+            _, closest_score = matcher.best(cp.normalized_name)
+            logger.warning("UNMATCHED (%.2f): %s", closest_score, cp.catalog_name)
     return results
 
 
 # ── Importer ──────────────────────────────────────────────────────────────────
 
-def _image_cache_path(url: str) -> str:
-    parsed_path = url.split("eurosof.com.ua")[-1]
-    digest = hashlib.sha1(url.encode()).hexdigest()
-    ext_m = re.search(r"\.(jpg|jpeg|png|webp)(\?|$)", url, re.I)
-    ext = f".{ext_m.group(1).lower()}" if ext_m else ".jpg"
-    return f"{IMAGE_CACHE_DIR}/{digest}{ext}"
-
-
-def _download_image(session, url: str) -> Optional[str]:
-    cache_path = _image_cache_path(url)
-    if default_storage.exists(cache_path):
-        return cache_path
-    try:
-        resp = session.get(url, timeout=30)
-        resp.raise_for_status()
-    except Exception as exc:
-        logger.warning("Image download failed %s: %s", url, exc)
-        return None
-    content = ContentFile(resp.content)
-    try:
-        from PIL import Image as PilImage
-        content.seek(0)
-        with PilImage.open(content) as img:
-            img.verify()
-        content.seek(0)
-    except Exception:
-        return None
-    default_storage.save(cache_path, content)
-    return cache_path
-
-
 def _ensure_subcategory(subcategory_name: str, subcategory_slug: str, category_name: str):
     from categories.models import Category
     from sub_categories.models import SubCategory
@@ -592,12 +562,21 @@ def _reference_step(catalog_product: CatalogProduct, multiplier=None) -> Decimal
 class EurosofImporter:
     def __init__(self, xlsx_path: str):
         self.xlsx_path = xlsx_path
-        self.session = cffi_requests.Session(impersonate="chrome124")
-        self.session.headers.update({
+        # Product photos are downloaded on the crawl engine's pool, which
+        # gives every worker its own curl_cffi session.
+        self._crawler = CrawlEngine(REQUEST_DELAY)
+        self.session = self._crawler.session(self._build_session)
+        self.images = SupplierImageStore(self.session.get)
+        self._progress_callback = None
+        self._history = self._new_history()
+
+    def _build_session(self) -> cffi_requests.Session[cffi_requests.Response]:
+        session: cffi_requests.Session[cffi_requests.Response] = cffi_requests.Session(impersonate="chrome124")
+        session.headers.update({
             "Accept-Language": "uk-UA,uk;q=0.9",
             "Accept": "text/html,*/*;q=0.8",
         })
-        self._progress_callback = None
+        return session
 
     def set_progress_callback(self, cb):
         self._progress_callback = cb
@@ -607,6 +586,12 @@ class EurosofImporter:
         if self._progress_callback:
             self._progress_callback(msg)
 
+    def _new_history(self) -> "PriceHistoryRecorder":
+        from .models import PriceHistory
+        from .price_history import PriceHistoryRecorder
+
+        return PriceHistoryRecorder(PriceHistory.SOURCE_EUROSOF)
+
     def run(
         self,
         catalog_urls: List[str],
@@ -660,6 +645,7 @@ class EurosofImporter:
             fabric_brand, fabric_cats = _ensure_fabric_brand()
 
         stats = {"created": 0, "updated": 0, "skipped": 0, "unmatched": 0, "errors": []}
+        self._history = self._new_history()
 
         for cp, sp in matches:
             if sp is None:
@@ -714,6 +700,7 @@ class EurosofImporter:
                 stats["errors"].append(str(exc))
                 stats["skipped"] += 1
 
+        self._history.flush()
         return stats
 
     def _create_size_variants(self, furniture, cp: CatalogProduct) -> None:
@@ -736,19 +723,31 @@ class EurosofImporter:
         from furniture.models import FurnitureSizeVariant
 
         fabric_value = _reference_step(cp)
+        before = (furniture.price, furniture.promotional_price)
         furniture.fabric_value = fabric_value
         first_minus1 = next((r.prices[0] for r in cp.sizes if r.prices[0]), None)
         if first_minus1:
             furniture.price = _calc_price(first_minus1)
         furniture.save(update_fields=["price", "fabric_value"])
+        self._history.record(furniture, before)
 
+        # Loaded up front only to know the previous prices for the history.
+        variants = list(FurnitureSizeVariant.objects.filter(furniture=furniture).only(
+            "id", "furniture_id", "width", "length", "price", "promotional_price",
+        ))
         for sr in cp.sizes:
             minus1 = sr.prices[0]
             if not minus1:
                 continue
+            new_price = _calc_price(minus1)
             FurnitureSizeVariant.objects.filter(
                 furniture=furniture, width=sr.width, length=sr.length
-            ).update(price=_calc_price(minus1))
+            ).update(price=new_price)
+            for variant in variants:
+                if variant.width == sr.width and variant.length == sr.length:
+                    variant_before = (variant.price, variant.promotional_price)
+                    variant.price = new_price
+                    self._history.record(variant, variant_before)
 
         self._log(f"  ↻ Оновлено ціни: {furniture.name}")
 
@@ -756,8 +755,9 @@ class EurosofImporter:
         from furniture.models import FurnitureImage
 
         first_path = None
+        cached = self.images.fetch_many(image_urls)
         for position, url in enumerate(image_urls):
-            path = _download_image(self.session, url)
+            path = cached.get(url)
             if path:
                 FurnitureImage.objects.get_or_create(
                     furniture=furniture,
@@ -1,24 +1,26 @@
 import hashlib
 import logging
 import re
-import time
 from dataclasses import dataclass, field
 from decimal import Decimal, InvalidOperation
-from typing import Dict, List, Optional, Tuple
-from urllib.parse import urlsplit
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
 from curl_cffi import requests as cffi_requests
 from bs4 import BeautifulSoup
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
 from django.utils.text import slugify
 
+from .crawl_engine import CrawlEngine
+from .http_cache import HttpCache
+from .supplier_images import SupplierImageStore
+
+if TYPE_CHECKING:
+    from .price_history import PriceHistoryRecorder
+
 logger = logging.getLogger(__name__)
 
 BASE_URL = "https://evrodim-company.com.ua"
 CATALOG_URL = f"{BASE_URL}/yevrodim"
 REQUEST_DELAY = 0.8
-IMAGE_CACHE_DIR = "supplier_cache/evrodim"
 
 CYRILLIC_MAP = {
     "а": "a", "б": "b", "в": "v", "г": "h", "ґ": "g", "д": "d", "е": "e",
@@ -144,8 +146,13 @@ def _generate_slug(name: str) -> str:
 
 class EvrodimScraper:
     def __init__(self):
-        self.session = self._build_session()
+        self._crawler = CrawlEngine(REQUEST_DELAY, cache=HttpCache.from_settings())
+        self.session = self._crawler.session(self._build_session)
+        self.images = SupplierImageStore(self.session.get)
         self._progress_callback = None
+        self._history = self._new_history()
+        # Product URL → fingerprint of its catalog card (name, price, badges).
+        self._listing_fingerprints: Dict[str, str] = {}
 
     def set_progress_callback(self, callback):
         self._progress_callback = callback
@@ -184,6 +191,8 @@ class EvrodimScraper:
         return max_page
 
     def _collect_urls_from_page(self, soup: BeautifulSoup) -> List[str]:
+        from .crawl_state import fingerprint
+
         seen: set = set()
         urls: List[str] = []
         for card in soup.select(".product-layout"):
@@ -192,6 +201,7 @@ class EvrodimScraper:
                 if href and href not in seen:
                     seen.add(href)
                     urls.append(href)
+                    self._listing_fingerprints[href] = fingerprint(card.get_text(" ", strip=True))
                     break
         return urls
 
@@ -222,9 +232,10 @@ class EvrodimScraper:
         if _add_urls(page1_urls):
             return all_urls
 
-        for page in range(2, total_pages + 1):
-            time.sleep(REQUEST_DELAY)
-            soup = self._get(f"{CATALOG_URL}/?page={page}")
+        pages = self._crawler.map(
+            lambda page: self._get(f"{CATALOG_URL}/?page={page}"), range(2, total_pages + 1)
+        )
+        for page, soup in pages:
             if not soup:
                 break
             urls = self._collect_urls_from_page(soup)
@@ -381,40 +392,11 @@ class EvrodimScraper:
 
     # ── Image download ────────────────────────────────────────────────────────
 
-    def _image_cache_path(self, url: str) -> str:
-        parsed = urlsplit(url)
-        ext = re.search(r"\.(jpg|jpeg|png|webp|gif)(\?|$)", parsed.path, re.I)
-        ext_str = f".{ext.group(1).lower()}" if ext else ".jpg"
-        digest = hashlib.sha1(url.encode()).hexdigest()
-        return f"{IMAGE_CACHE_DIR}/{digest}{ext_str}"
-
-    def _download_image(self, url: str) -> Optional[str]:
-        cache_path = self._image_cache_path(url)
-        if default_storage.exists(cache_path):
-            return cache_path
-        try:
-            resp = self.session.get(url, timeout=30)
-            resp.raise_for_status()
-        except Exception as exc:
-            logger.warning("Image download failed %s: %s", url, exc)
-            return None
-        content = ContentFile(resp.content)
-        if not self._is_valid_image(content):
-            return None
-        default_storage.save(cache_path, content)
-        return cache_path
+    def _new_history(self, dry_run: bool = False, label: str = "") -> "PriceHistoryRecorder":
+        from .models import PriceHistory
+        from .price_history import PriceHistoryRecorder
 
-    def _is_valid_image(self, content: ContentFile) -> bool:
-        try:
-            from PIL import Image
-            content.seek(0)
-            with Image.open(content) as img:
-                img.verify()
-            content.seek(0)
-            return True
-        except Exception:
-            content.seek(0)
-            return False
+        return PriceHistoryRecorder(PriceHistory.SOURCE_EVRODIM, dry_run=dry_run, label=label)
 
     # ── Promo sync ────────────────────────────────────────────────────────────
 
@@ -463,12 +445,11 @@ class EvrodimScraper:
         self._log(f"Обробляємо {len(all_urls)} сторінок товарів...")
 
         stats = {"created": 0, "variants": 0, "updated": 0, "skipped": 0, "not_table": 0, "errors": []}
+        self._history = self._new_history()
 
-        for idx, url in enumerate(all_urls, 1):
+        for idx, (url, product) in enumerate(self._crawler.map(self.scrape_product, all_urls), 1):
             self._log(f"[{idx}/{len(all_urls)}] {url}")
-            time.sleep(REQUEST_DELAY)
 
-            product = self.scrape_product(url)
             if not product:
                 stats["not_table"] += 1
                 continue
@@ -547,12 +528,14 @@ class EvrodimScraper:
                     leaders[product.base_model_name] = furniture
                 stats["created"] += 1
 
+        self._history.flush()
         stats["success"] = True
         return stats
 
     def _update_existing(self, furniture, product: EvrodimProduct, dry_run: bool) -> bool:
         changed = False
         update_fields = []
+        before = (furniture.price, furniture.promotional_price)
 
         if product.price and furniture.price != product.price:
             if not dry_run:
@@ -569,6 +552,7 @@ class EvrodimScraper:
 
         if update_fields and not dry_run:
             furniture.save(update_fields=update_fields)
+            self._history.record(furniture, before)
 
         if not furniture.image and product.image_urls:
             if not dry_run:
@@ -581,8 +565,9 @@ class EvrodimScraper:
     def _save_images(self, furniture, image_urls: List[str]) -> None:
         from furniture.models import FurnitureImage
 
+        cached = self.images.fetch_many(image_urls[:5])
         for img_idx, img_url in enumerate(image_urls[:5]):
-            cache_path = self._download_image(img_url)
+            cache_path = cached.get(img_url)
             if not cache_path:
                 continue
             if img_idx == 0 and not furniture.image:
@@ -599,9 +584,16 @@ class EvrodimScraper:
 
     # ── Price update ──────────────────────────────────────────────────────────
 
-    def update_prices(self, subcategory_slug: str) -> Dict:
+    def update_prices(self, subcategory_slug: str, dry_run: bool = False, force: bool = False) -> Dict:
+        """Оновлює ціни. З dry_run зміни лише збираються в PriceChangeSet.
+
+        Товари, картка яких у каталозі не змінилась з минулого запуску,
+        пропускаються (крім force та періодичного повного проходу).
+        """
         from furniture.models import Furniture
 
+        from .crawl_state import CrawlStateStore
+
         self._log("Оновлення цін Evrodim...")
 
         try:
@@ -619,14 +611,22 @@ class EvrodimScraper:
         if not furniture_map:
             return {"success": False, "error": "Немає товарів — спочатку запустіть import"}
 
-        all_urls = self.collect_product_urls()
-        stats = {"checked": 0, "updated": 0, "not_found": 0, "errors": []}
+        crawl_state = CrawlStateStore("evrodim", force=force)
+        listed_urls = self.collect_product_urls()
+        all_urls = [
+            url for url in listed_urls
+            if not crawl_state.is_unchanged(url, content_hash=self._listing_fingerprints.get(url, ""))
+        ]
+        stats = {
+            "checked": 0, "updated": 0, "not_found": 0,
+            "unchanged": len(listed_urls) - len(all_urls), "errors": [],
+        }
+        self._log(f"Без змін у каталозі: {stats['unchanged']}, перевіряємо: {len(all_urls)}")
+        self._history = self._new_history(dry_run=dry_run, label=subcategory_slug)
 
-        for idx, url in enumerate(all_urls, 1):
+        for idx, (url, product) in enumerate(self._crawler.map(self.scrape_product, all_urls), 1):
             self._log(f"[{idx}/{len(all_urls)}] {url}")
-            time.sleep(REQUEST_DELAY)
 
-            product = self.scrape_product(url)
             if not product:
                 continue
 
@@ -637,6 +637,7 @@ class EvrodimScraper:
 
             stats["checked"] += 1
             update_fields = []
+            before = (furniture.price, furniture.promotional_price)
 
             if product.price and furniture.price != product.price:
                 furniture.price = product.price
@@ -646,11 +647,19 @@ class EvrodimScraper:
             update_fields.extend(promo_fields)
 
             if update_fields:
-                furniture.save(update_fields=update_fields)
+                self._history.save(furniture, before, update_fields)
                 sale_info = f" → акція {product.sale_price} грн" if product.sale_price else ""
                 self._log(f"  {furniture.article_code}: {product.price} грн{sale_info}")
                 stats["updated"] += 1
-
+            # Only matched pages are skipped next time: an unmatched one may
+            # match a product imported later.
+            crawl_state.mark(url, content_hash=self._listing_fingerprints.get(url, ""))
+
+        self._history.flush()
+        if dry_run:
+            stats["change_set_id"] = self._history.store_change_set().pk
+        else:
+            crawl_state.flush()
         stats["success"] = True
         return stats
 
@@ -676,11 +685,9 @@ class EvrodimScraper:
         all_urls = self.collect_product_urls()
         stats = {"checked": 0, "updated": 0, "not_found": 0}
 
-        for idx, url in enumerate(all_urls, 1):
+        for idx, (url, product) in enumerate(self._crawler.map(self.scrape_product, all_urls), 1):
             self._log(f"[{idx}/{len(all_urls)}] {url}")
-            time.sleep(REQUEST_DELAY)
 
-            product = self.scrape_product(url)
             if not product:
                 continue
 
@@ -0,0 +1,120 @@
+"""Blocked ``SequenceMatcher`` best-match search.
+
+Divanoff and Eurosof match every scraped product against every price-row or
+catalog key with ``SequenceMatcher(None, query, key).ratio()`` and keep the
+best one. ``BlockedMatcher`` returns exactly the same winner without scoring
+all pairs:
+
+* keys are indexed by character bigrams (with counts) and bucketed by
+  length;
+* for a query, the shared-bigram count ``s`` of every key comes from the
+  posting lists. SequenceMatcher's matching blocks are disjoint common
+  substrings separated by at least one unmatched character, which bounds
+  the matched length by ``M <= (s + len(query) + len(key) + 1) / 3`` (and by
+  the shorter length). Keys whose bound cannot reach the cutoff, or the best
+  score found so far, are never scored;
+* candidates are scored in descending bound order, so a good match found
+  early prunes the rest.
+
+Ties resolve to the key added first, like a linear scan with ``>``.
+"""
+
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def _bigrams(value: str) -> Counter:
+    return Counter(value[i : i + 2] for i in range(len(value) - 1))
+
+
+def _matched_bound(query_len: int, key_len: int, shared: int) -> int:
+    """Upper bound on the characters SequenceMatcher can match."""
+    return min(query_len, key_len, (shared + query_len + key_len + 1) // 3)
+
+
+def ratio_bound(query_len: int, key_len: int, shared: int) -> float:
+    total = query_len + key_len
+    if not total:
+        return 1.0  # SequenceMatcher treats two empty strings as identical
+    return 2.0 * _matched_bound(query_len, key_len, shared) / total
+
+
+class BlockedMatcher:
+    """Finds the key with the highest ``SequenceMatcher`` ratio to a query."""
+
+    def __init__(self, keys: Iterable[str]):
+        self.keys: List[str] = list(keys)
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._by_length: Dict[int, List[int]] = {}
+        # One SequenceMatcher per key with the key as ``b``: its b2j table is
+        # built once and reused for every query.
+        self._matchers: List[Optional[SequenceMatcher]] = [None] * len(self.keys)
+        for idx, key in enumerate(self.keys):
+            self._by_length.setdefault(len(key), []).append(idx)
+            for gram, count in _bigrams(key).items():
+                self._postings.setdefault(gram, []).append((idx, count))
+        self.scored = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _score(self, idx: int, query: str, needed: float) -> float:
+        matcher = self._matchers[idx]
+        if matcher is None:
+            matcher = self._matchers[idx] = SequenceMatcher(None, "", self.keys[idx])
+        matcher.set_seq1(query)
+        if matcher.quick_ratio() < needed:
+            return -1.0
+        self.scored += 1
+        return matcher.ratio()
+
+    def _candidates(self, query: str, cutoff: float) -> List[Tuple[float, int]]:
+        query_len = len(query)
+        shared: Dict[int, int] = {}
+        for gram, query_count in _bigrams(query).items():
+            for idx, key_count in self._postings.get(gram, ()):
+                shared[idx] = shared.get(idx, 0) + min(query_count, key_count)
+
+        candidates = []
+        for idx, count in shared.items():
+            bound = ratio_bound(query_len, len(self.keys[idx]), count)
+            if bound >= cutoff:
+                candidates.append((bound, idx))
+        # Keys sharing no bigram: the bound only depends on the length.
+        for key_len, indices in self._by_length.items():
+            bound = ratio_bound(query_len, key_len, 0)
+            if bound < cutoff:
+                continue
+            candidates.extend((bound, idx) for idx in indices if idx not in shared)
+        candidates.sort(key=lambda pair: (-pair[0], pair[1]))
+        return candidates
+
+    def best(self, query: str, cutoff: float = 0.0) -> Tuple[Optional[int], float]:
+        """Return ``(index, score)`` of the best key scoring at least ``cutoff``.
+
+        ``index`` is ``None`` when no key reaches ``cutoff``; the score is then
+        the best one actually computed (a lower bound of the true maximum).
+        """
+        best_idx: Optional[int] = None
+        best_score = 0.0
+        for bound, idx in self._candidates(query, cutoff):
+            if best_idx is not None and (
+                bound < best_score or (bound == best_score and idx > best_idx)
+            ):
+                break
+            score = self._score(idx, query, max(cutoff, best_score))
+            if score < cutoff:
+                best_score = max(best_score, score)
+                continue
+            if (
+                best_idx is None
+                or score > best_score
+                or (score == best_score and idx < best_idx)
+            ):
+                best_idx, best_score = idx, score
+        return best_idx, best_score
+
+    def best_key(self, query: str, cutoff: float = 0.0) -> Tuple[Optional[str], float]:
+        idx, score = self.best(query, cutoff)
+        return (self.keys[idx] if idx is not None else None), score
@@ -0,0 +1,299 @@
+"""Disk-backed HTTP response cache for supplier crawls.
+
+Supplier pages are re-downloaded by every import, price update and params
+update. ``HttpCache`` keeps the last 200 response per URL on disk with its
+``ETag``/``Last-Modified`` validators and a zlib-compressed body:
+
+* within ``ttl`` seconds the cached body is returned without any request;
+* after that the request is sent with ``If-None-Match``/``If-Modified-Since``
+  and a ``304`` reuses the stored body;
+* the directory is kept under ``max_bytes`` by evicting least recently used
+  entries.
+
+Only textual responses (HTML, XML, JSON) are cached — images have their own
+storage cache in each scraper. The cache is best-effort: any disk error is
+logged and the request simply goes to the network.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CACHEABLE_CONTENT_TYPES = (
+    "text/",
+    "application/xml",
+    "application/xhtml",
+    "application/json",
+    "application/rss",
+)
+
+
+class HTTPStatusError(Exception):
+    def __init__(self, response: "CachedResponse"):
+        super().__init__(f"HTTP {response.status_code} for {response.url}")
+        self.response = response
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    status_code: int
+    headers: Dict[str, str]
+    encoding: str
+    etag: str
+    last_modified: str
+    stored_at: float
+    path: str
+
+
+class CachedResponse:
+    """Minimal response object served from the cache."""
+
+    from_cache = True
+
+    def __init__(self, entry: CacheEntry, content: bytes):
+        self.url = entry.url
+        self.status_code = entry.status_code
+        self.headers = entry.headers
+        self.encoding = entry.encoding
+        self.content = content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise HTTPStatusError(self)
+
+
+class HttpCache:
+    def __init__(
+        self, directory: str, max_bytes: int = 256 * 1024 * 1024, ttl: float = 600
+    ):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+
+    @classmethod
+    def from_settings(cls) -> Optional["HttpCache"]:
+        """Shared cache configured by ``SUPPLIER_HTTP_CACHE_*`` settings, or ``None``."""
+        directory = getattr(settings, "SUPPLIER_HTTP_CACHE_DIR", "")
+        if not directory:
+            return None
+        return cls(
+            directory,
+            max_bytes=int(getattr(settings, "SUPPLIER_HTTP_CACHE_MAX_MB", 256))
+            * 1024
+            * 1024,
+            ttl=float(getattr(settings, "SUPPLIER_HTTP_CACHE_TTL", 600)),
+        )
+
+    # --- Public API -------------------------------------------------------
+
+    def get(
+        self,
+        send: Callable[..., Any],
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """Fetch ``url`` through the cache. ``send`` has the ``session.get`` signature."""
+        entry = self.lookup(url)
+        if entry is not None and time.time() - entry.stored_at < self.ttl:
+            cached = self._load(entry)
+            if cached is not None:
+                return cached
+
+        request_headers = dict(headers or {})
+        if entry is not None:
+            if entry.etag:
+                request_headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                request_headers["If-Modified-Since"] = entry.last_modified
+
+        response = send(url, headers=request_headers, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            cached = self._load(entry)
+            if cached is not None:
+                self._touch(entry)
+                return cached
+            # Body vanished between lookup and load: fetch unconditionally.
+            response = send(url, headers=dict(headers or {}), **kwargs)
+
+        if response.status_code == 200:
+            self.store(url, response)
+        return response
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as fh:
+                meta = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != url or not os.path.exists(body_path):
+            return None
+        return CacheEntry(
+            url=url,
+            status_code=meta.get("status_code", 200),
+            headers=meta.get("headers") or {},
+            encoding=meta.get("encoding") or "utf-8",
+            etag=meta.get("etag") or "",
+            last_modified=meta.get("last_modified") or "",
+            stored_at=float(meta.get("stored_at") or 0),
+            path=body_path,
+        )
+
+    def store(self, url: str, response: Any) -> None:
+        headers = {
+            key.lower(): value for key, value in dict(response.headers or {}).items()
+        }
+        content_type = headers.get("content-type", "").lower()
+        if content_type and not content_type.startswith(CACHEABLE_CONTENT_TYPES):
+            return
+        if "no-store" in headers.get("cache-control", "").lower():
+            return
+
+        meta = {
+            "url": url,
+            "status_code": response.status_code,
+            "headers": {"content-type": content_type} if content_type else {},
+            "encoding": getattr(response, "encoding", None) or "utf-8",
+            "etag": headers.get("etag", ""),
+            "last_modified": headers.get("last-modified", ""),
+            "stored_at": time.time(),
+        }
+        body = zlib.compress(response.content, 6)
+        meta_path, body_path = self._paths(url)
+        try:
+            os.makedirs(os.path.dirname(body_path), exist_ok=True)
+            previous = self._entry_size(meta_path, body_path)
+            self._atomic_write(body_path, body)
+            self._atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+            added = self._entry_size(meta_path, body_path) - previous
+        except OSError as exc:
+            logger.warning("HTTP cache write failed for %s: %s", url, exc)
+            return
+        self._account(added)
+
+    def clear(self) -> None:
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                try:
+                    os.remove(os.path.join(root, name))
+                except OSError:
+                    pass
+        with self._lock:
+            self._total_bytes = 0
+
+    # --- Internals --------------------------------------------------------
+
+    def _paths(self, url: str) -> Tuple[str, str]:
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, digest[:2], digest)
+        return base + ".json", base + ".zz"
+
+    def _load(self, entry: CacheEntry) -> Optional[CachedResponse]:
+        try:
+            with open(entry.path, "rb") as fh:
+                content = zlib.decompress(fh.read())
+        except (OSError, zlib.error):
+            return None
+        try:
+            os.utime(entry.path)  # LRU bookkeeping
+        except OSError:
+            pass
+        return CachedResponse(entry, content)
+
+    def _touch(self, entry: CacheEntry) -> None:
+        meta_path, _ = self._paths(entry.url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as fh:
+                meta = json.load(fh)
+            meta["stored_at"] = time.time()
+            self._atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+        except (OSError, ValueError):
+            pass
+
+    def _atomic_write(self, path: str, data: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @staticmethod
+    def _entry_size(meta_path: str, body_path: str) -> int:
+        size = 0
+        for path in (meta_path, body_path):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return size
+
+    def _account(self, added: int) -> None:
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += added
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _scan_size(self) -> int:
+        total = 0
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def _evict(self) -> None:
+        """Drop least recently used entries down to 80% of ``max_bytes``."""
+        bodies = []
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".zz"):
+                    path = os.path.join(root, name)
+                    try:
+                        bodies.append((os.path.getmtime(path), path))
+                    except OSError:
+                        pass
+        bodies.sort()
+        target = self.max_bytes * 0.8
+        total = self._total_bytes or 0
+        for _mtime, body_path in bodies:
+            if total <= target:
+                break
+            meta_path = body_path[:-3] + ".json"
+            freed = self._entry_size(meta_path, body_path)
+            for path in (meta_path, body_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= freed
+        self._total_bytes = total
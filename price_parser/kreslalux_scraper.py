@@ -1,25 +1,26 @@
-import hashlib
 import logging
 import re
-import time
 from dataclasses import dataclass, field
 from decimal import Decimal, InvalidOperation
-from typing import Dict, List, Optional
-from urllib.parse import urlsplit
+from typing import TYPE_CHECKING, Dict, List, Optional
 
 from curl_cffi import requests as cffi_requests
 from bs4 import BeautifulSoup
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
 from django.utils.text import slugify
 
+from .crawl_engine import CrawlEngine
+from .http_cache import HttpCache
+from .supplier_images import SupplierImageStore
+
+if TYPE_CHECKING:
+    from .price_history import PriceHistoryRecorder
+
 logger = logging.getLogger(__name__)
 
 CATALOG_URL = "https://kreslalux.ua/uk/18-kresla-dlya-doma"
 BASE_URL = "https://kreslalux.ua"
 MAX_PRICE_DEFAULT = Decimal("40000")
 REQUEST_DELAY = 0.6  # seconds between requests
-IMAGE_CACHE_DIR = "supplier_cache/kreslalux"
 
 CYRILLIC_MAP = {
     "а": "a", "б": "b", "в": "v", "г": "h", "ґ": "g", "д": "d", "е": "e",
@@ -115,8 +116,11 @@ def _generate_slug(name: str) -> str:
 class KreslaluxScraper:
     def __init__(self, max_price: Decimal = MAX_PRICE_DEFAULT):
         self.max_price = max_price
-        self.session = self._build_session()
+        self._crawler = CrawlEngine(REQUEST_DELAY, cache=HttpCache.from_settings())
+        self.session = self._crawler.session(self._build_session)
+        self.images = SupplierImageStore(self.session.get)
         self._progress_callback = None
+        self._history = self._new_history()
 
     def set_progress_callback(self, callback):
         self._progress_callback = callback
@@ -126,6 +130,12 @@ class KreslaluxScraper:
         if self._progress_callback:
             self._progress_callback(msg)
 
+    def _new_history(self, dry_run: bool = False, label: str = "") -> "PriceHistoryRecorder":
+        from .models import PriceHistory
+        from .price_history import PriceHistoryRecorder
+
+        return PriceHistoryRecorder(PriceHistory.SOURCE_KRESLALUX, dry_run=dry_run, label=label)
+
     # ── HTTP helpers ──────────────────────────────────────────────────────────
 
     def _build_session(self):
@@ -263,11 +273,11 @@ class KreslaluxScraper:
             self._log(f"Ліміт {limit} досягнуто на 1-й сторінці")
             return candidates
 
-        for page in range(2, total_pages + 1):
-            time.sleep(REQUEST_DELAY)
-            page_url = f"{CATALOG_URL}?page={page}"
-            products = self._scrape_catalog_page(page_url)
-            self._log(f"Сторінка {page}/{total_pages}: {len(products)} товарів (без розпродано)")
+        pages = self._crawler.map(
+            lambda page: self._scrape_catalog_page(f"{CATALOG_URL}?page={page}"), range(2, total_pages + 1)
+        )
+        for page, products in pages:
+            self._log(f"Сторінка {page}/{total_pages}: {len(products or [])} товарів (без розпродано)")
             if not products:
                 break
             if _add_from_page(products):
@@ -397,44 +407,6 @@ class KreslaluxScraper:
             image_urls=image_urls,
         )
 
-    # ── Image download ────────────────────────────────────────────────────────
-
-    def _download_image(self, url: str) -> Optional[str]:
-        cache_path = self._image_cache_path(url)
-        if default_storage.exists(cache_path):
-            return cache_path
-        try:
-            resp = self.session.get(url, timeout=30)
-            resp.raise_for_status()
-        except Exception as exc:
-            logger.warning("Image download failed %s: %s", url, exc)
-            return None
-
-        content = ContentFile(resp.content)
-        if not self._is_valid_image(content):
-            return None
-        default_storage.save(cache_path, content)
-        return cache_path
-
-    def _image_cache_path(self, url: str) -> str:
-        parsed = urlsplit(url)
-        ext = re.search(r"\.(jpg|jpeg|png|webp|gif)(\?|$)", parsed.path, re.I)
-        ext_str = f".{ext.group(1).lower()}" if ext else ".jpg"
-        digest = hashlib.sha1(url.encode()).hexdigest()
-        return f"{IMAGE_CACHE_DIR}/{digest}{ext_str}"
-
-    def _is_valid_image(self, content: ContentFile) -> bool:
-        try:
-            from PIL import Image, UnidentifiedImageError
-            content.seek(0)
-            with Image.open(content) as img:
-                img.verify()
-            content.seek(0)
-            return True
-        except Exception:
-            content.seek(0)
-            return False
-
     # ── Import ────────────────────────────────────────────────────────────────
 
     def run_import(
@@ -455,12 +427,12 @@ class KreslaluxScraper:
         self._log(f"Знайдено кандидатів: {len(candidates)}. Починаємо обробку детальних сторінок...")
 
         stats = {"created": 0, "updated": 0, "skipped": 0, "candidates": len(candidates), "errors": []}
+        self._history = self._new_history()
 
-        for idx, candidate in enumerate(candidates, 1):
+        products = self._crawler.map(lambda candidate: self.scrape_product(candidate["url"]), candidates)
+        for idx, (candidate, product) in enumerate(products, 1):
             self._log(f"[{idx}/{len(candidates)}] {candidate['name']}")
-            time.sleep(REQUEST_DELAY)
 
-            product = self.scrape_product(candidate["url"])
             if not product:
                 stats["errors"].append(f"Не вдалося завантажити: {candidate['url']}")
                 stats["skipped"] += 1
@@ -488,8 +460,10 @@ class KreslaluxScraper:
                 # Update price if changed
                 if existing.price != product.price and product.price > 0:
                     if not dry_run:
+                        before = (existing.price, existing.promotional_price)
                         existing.price = product.price
                         existing.save(update_fields=["price"])
+                        self._history.record(existing, before)
                     self._log(f"  Оновлено ціну: {product.price}")
                     changed = True
 
@@ -500,8 +474,9 @@ class KreslaluxScraper:
                         self._log(f"  [DRY-RUN] Додав би картинки: {min(len(product.image_urls), 5)} шт.")
                     else:
                         added = 0
+                        cached = self.images.fetch_many(product.image_urls[:5])
                         for img_idx, img_url in enumerate(product.image_urls[:5]):
-                            cache_path = self._download_image(img_url)
+                            cache_path = cached.get(img_url)
                             if not cache_path:
                                 continue
                             if img_idx == 0:
@@ -565,8 +540,9 @@ class KreslaluxScraper:
                 )
 
             # Images — limit to first 5
+            cached = self.images.fetch_many(product.image_urls[:5])
             for img_idx, img_url in enumerate(product.image_urls[:5]):
-                cache_path = self._download_image(img_url)
+                cache_path = cached.get(img_url)
                 if not cache_path:
                     continue
                 if img_idx == 0 and not furniture.image:
@@ -584,6 +560,7 @@ class KreslaluxScraper:
             self._log(f"  Додано: {furniture.name} ({furniture.article_code})")
             stats["created"] += 1
 
+        self._history.flush()
         stats["success"] = True
         return stats
 
@@ -591,8 +568,11 @@ class KreslaluxScraper:
 
     # ── Price update ──────────────────────────────────────────────────────────
 
-    def update_prices(self) -> Dict:
-        """Scrape catalog pages and update prices for existing Furniture by article_code."""
+    def update_prices(self, dry_run: bool = False) -> Dict:
+        """Scrape catalog pages and update prices for existing Furniture by article_code.
+
+        With dry_run the changes are only collected into a PriceChangeSet.
+        """
         from furniture.models import Furniture
 
         self._log("Збираємо актуальні ціни з kreslalux.ua...")
@@ -601,7 +581,7 @@ class KreslaluxScraper:
         furniture_map: Dict[str, Furniture] = {}
         for f in Furniture.objects.filter(
             sub_category__slug="ortopedichni-krisla"
-        ).only("id", "name", "article_code", "price"):
+        ).only("id", "name", "article_code", "price", "promotional_price"):
             if f.article_code:
                 furniture_map[f.article_code.strip()] = f
 
@@ -617,6 +597,7 @@ class KreslaluxScraper:
         total_pages = self._detect_total_pages(first_soup)
 
         stats = {"checked": 0, "updated": 0, "not_found": 0, "errors": []}
+        self._history = self._new_history(dry_run=dry_run, label="ortopedichni-krisla")
 
         def _process_page_products(products: List[Dict]) -> None:
             for p in products:
@@ -629,17 +610,18 @@ class KreslaluxScraper:
                     continue
                 stats["checked"] += 1
                 if furniture.price != p["price"] and p["price"] > 0:
+                    before = (furniture.price, furniture.promotional_price)
                     furniture.price = p["price"]
-                    furniture.save(update_fields=["price"])
+                    self._history.save(furniture, before, ["price"])
                     self._log(f"  {furniture.name}: {p['price']} грн")
                     stats["updated"] += 1
 
         _process_page_products(self._scrape_catalog_page(CATALOG_URL))
 
-        for page in range(2, total_pages + 1):
-            time.sleep(REQUEST_DELAY)
-            page_url = f"{CATALOG_URL}?page={page}"
-            products = self._scrape_catalog_page(page_url)
+        pages = self._crawler.map(
+            lambda page: self._scrape_catalog_page(f"{CATALOG_URL}?page={page}"), range(2, total_pages + 1)
+        )
+        for page, products in pages:
             if not products:
                 break
             _process_page_products(products)
@@ -649,10 +631,12 @@ class KreslaluxScraper:
         missing = {sku: f for sku, f in furniture_map.items() if sku not in found_skus}
 
         for sku, furniture in missing.items():
-            time.sleep(REQUEST_DELAY)
             # Search by name on detail pages — try to find by scraping
             # For now, log as not found
             stats["not_found"] += 1
 
+        self._history.flush()
+        if dry_run:
+            stats["change_set_id"] = self._history.store_change_set().pk
         stats["success"] = True
         return stats
@@ -0,0 +1,43 @@
+from datetime import timedelta
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.utils import timezone
+
+from price_parser.price_history import rollup_price_history
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll up price history older than the retention window to one row "
+        "per product/size variant per month"
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=getattr(settings, "PRICE_HISTORY_RETENTION_DAYS", 180),
+            help="Keep every change for this many days (default: settings.PRICE_HISTORY_RETENTION_DAYS)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show how many rows would be removed without changing anything",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        days = options["days"]
+        if days < 1:
+            raise CommandError("--days must be positive")
+
+        cutoff = timezone.now() - timedelta(days=days)
+        kept, deleted = rollup_price_history(cutoff, dry_run=options["dry_run"])
+
+        prefix = "[DRY-RUN] " if options["dry_run"] else ""
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix}History before {cutoff:%Y-%m-%d}: kept {kept} monthly rows, removed {deleted}"
+            )
+        )
@@ -28,6 +28,11 @@ class Command(BaseCommand):
             action='store_true',
             help='Test parsing without updating prices'
         )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Process sheets even if they did not change since the last run'
+        )
 
     def handle(self, *args, **options):
         configs = []
@@ -77,8 +82,10 @@ class Command(BaseCommand):
                             self.style.ERROR(f'Test failed: {result["error"]}')
                         )
                 else:
-                    result = updater.update_prices()
-                    if result['success']:
+                    result = updater.update_prices(force=options['force'])
+                    if result.get('unchanged'):
+                        self.stdout.write(result['message'])
+                    elif result['success']:
                         total_processed += result['processed_count']
                         total_updated += result['updated_count']
                         self.stdout.write(
@@ -0,0 +1,103 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from price_parser.models import SupplierFeedConfig
+from price_parser.services import SupplierFeedPriceUpdater
+
+
+class Command(BaseCommand):
+    help = "Update furniture prices from supplier XML/YML feeds"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--config-id",
+            type=int,
+            help="ID of a specific SupplierFeedConfig to run",
+        )
+        parser.add_argument(
+            "--config-name",
+            type=str,
+            help="Name of a specific SupplierFeedConfig to run",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Run all active supplier feed configurations",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Re-read the whole feed, ignoring ETag, content hash and offer digests from previous runs",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        configs = []
+
+        if options["config_id"]:
+            try:
+                configs.append(SupplierFeedConfig.objects.get(id=options["config_id"]))
+            except SupplierFeedConfig.DoesNotExist as exc:
+                raise CommandError(
+                    f'Configuration with ID {options["config_id"]} not found'
+                ) from exc
+        elif options["config_name"]:
+            try:
+                configs.append(
+                    SupplierFeedConfig.objects.get(name=options["config_name"])
+                )
+            except SupplierFeedConfig.DoesNotExist as exc:
+                raise CommandError(
+                    f'Configuration with name "{options["config_name"]}" not found'
+                ) from exc
+        elif options["all"]:
+            configs = list(SupplierFeedConfig.objects.filter(is_active=True))
+            if not configs:
+                self.stdout.write(
+                    self.style.WARNING("No active feed configurations found")
+                )
+                return
+        else:
+            raise CommandError("Please specify --config-id, --config-name, or --all")
+
+        total_processed = 0
+        total_matched = 0
+        total_updated = 0
+
+        for config in configs:
+            self.stdout.write(f"Processing feed configuration: {config.name}")
+            try:
+                result = SupplierFeedPriceUpdater(config).update_prices(
+                    force=options["force"]
+                )
+                if not result.get("success"):
+                    self.stdout.write(
+                        self.style.ERROR(f"Update failed: {result.get('error')}")
+                    )
+                    continue
+                if result.get("unchanged"):
+                    self.stdout.write(
+                        "Feed unchanged since the last run (use --force to re-read it)"
+                    )
+                    continue
+                processed = int(result.get("offers_processed", 0))
+                matched = int(result.get("items_matched", 0))
+                updated = int(result.get("items_updated", 0))
+                total_processed += processed
+                total_matched += matched
+                total_updated += updated
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Updated {updated} items (matched {matched}, processed {processed} offers)"
+                    )
+                )
+            except Exception as exc:
+                self.stdout.write(
+                    self.style.ERROR(f"Error processing {config.name}: {exc}")
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\nTotal: updated {total_updated}, matched {total_matched}, processed {total_processed}"
+            )
+        )
@@ -28,6 +28,11 @@ class Command(BaseCommand):
             action="store_true",
             help="Run in test mode without DB updates",
         )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Re-scrape every page, ignoring sitemap lastmod from previous runs",
+        )
 
     def handle(self, *args, **options):
         configs = []
@@ -70,7 +75,7 @@ class Command(BaseCommand):
                         self.stdout.write(self.style.ERROR(f"Test failed: {result.get('error')}"))
                     continue
 
-                result = updater.update_prices()
+                result = updater.update_prices(force=options["force"])
                 if result.get("success"):
                     processed = int(result.get("items_processed", 0))
                     matched = int(result.get("items_matched", 0))
@@ -0,0 +1,65 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("price_parser", "0024_divanoffpriceconfig"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="supplierfeedconfig",
+            name="feed_etag",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Заповнюється автоматично після успішного оновлення",
+                max_length=255,
+                verbose_name="ETag фіда",
+            ),
+        ),
+        migrations.AddField(
+            model_name="supplierfeedconfig",
+            name="feed_last_modified",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Заповнюється автоматично після успішного оновлення",
+                max_length=100,
+                verbose_name="Last-Modified фіда",
+            ),
+        ),
+        migrations.AddField(
+            model_name="supplierfeedconfig",
+            name="feed_content_hash",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Якщо фід не змінився з останнього оновлення, обробка пропускається",
+                max_length=64,
+                verbose_name="Хеш вмісту фіда",
+            ),
+        ),
+        migrations.AddField(
+            model_name="supplierfeedconfig",
+            name="feed_state_fingerprint",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Зміна налаштувань або каталогу скасовує пропуск незмінного фіда",
+                max_length=64,
+                verbose_name="Відбиток налаштувань і каталогу",
+            ),
+        ),
+        migrations.AddField(
+            model_name="supplierfeedconfig",
+            name="offer_digests",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                help_text="Офери з незмінним хешем не обробляються повторно",
+                verbose_name="Хеші оброблених оферів",
+            ),
+        ),
+    ]
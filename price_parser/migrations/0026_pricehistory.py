@@ -0,0 +1,150 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("furniture", "0033_alter_furniture_fabric_value"),
+        ("price_parser", "0025_supplierfeedconfig_feed_validators"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PriceHistory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "old_price",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        max_digits=10,
+                        null=True,
+                        verbose_name="Стара ціна",
+                    ),
+                ),
+                (
+                    "new_price",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        max_digits=10,
+                        null=True,
+                        verbose_name="Нова ціна",
+                    ),
+                ),
+                (
+                    "old_promotional_price",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        max_digits=10,
+                        null=True,
+                        verbose_name="Стара акційна ціна",
+                    ),
+                ),
+                (
+                    "new_promotional_price",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        max_digits=10,
+                        null=True,
+                        verbose_name="Нова акційна ціна",
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[
+                            ("google_sheets", "Google таблиця"),
+                            ("supplier_feed", "XML фід постачальника"),
+                            ("supplier_web", "Сайт постачальника"),
+                            ("evrodim", "Evrodim"),
+                            ("andersen", "Andersen"),
+                            ("divanoff", "Divanoff"),
+                            ("kreslalux", "Kreslalux"),
+                            ("eurosof", "Eurosof"),
+                        ],
+                        max_length=30,
+                        verbose_name="Джерело",
+                    ),
+                ),
+                (
+                    "run_id",
+                    models.CharField(
+                        blank=True,
+                        help_text="Ідентифікатор запуску оновлення, що змінив ціну",
+                        max_length=64,
+                        verbose_name="Запуск",
+                    ),
+                ),
+                (
+                    "is_rollup",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Останній запис місяця, залишений після очищення старої історії",
+                        verbose_name="Згорнутий запис",
+                    ),
+                ),
+                (
+                    "recorded_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Час зміни"
+                    ),
+                ),
+                (
+                    "furniture",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="price_history",
+                        to="furniture.furniture",
+                        verbose_name="Меблі",
+                    ),
+                ),
+                (
+                    "size_variant",
+                    models.ForeignKey(
+                        blank=True,
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="price_history",
+                        to="furniture.furnituresizevariant",
+                        verbose_name="Розмірний варіант",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Історія ціни",
+                "verbose_name_plural": "Історія цін",
+                "db_table": "price_parser_price_history",
+                "ordering": ["-recorded_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["furniture", "recorded_at"],
+                        name="price_hist_furniture_idx",
+                    ),
+                    models.Index(
+                        fields=["size_variant", "recorded_at"],
+                        name="price_hist_variant_idx",
+                    ),
+                    models.Index(fields=["run_id"], name="price_hist_run_idx"),
+                    models.Index(
+                        fields=["recorded_at"], name="price_hist_recorded_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,109 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("price_parser", "0026_pricehistory"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PriceChangeSet",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[
+                            ("google_sheets", "Google таблиця"),
+                            ("supplier_feed", "XML фід постачальника"),
+                            ("supplier_web", "Сайт постачальника"),
+                            ("evrodim", "Evrodim"),
+                            ("andersen", "Andersen"),
+                            ("divanoff", "Divanoff"),
+                            ("kreslalux", "Kreslalux"),
+                            ("eurosof", "Eurosof"),
+                        ],
+                        max_length=30,
+                        verbose_name="Джерело",
+                    ),
+                ),
+                (
+                    "run_id",
+                    models.CharField(max_length=64, unique=True, verbose_name="Запуск"),
+                ),
+                (
+                    "label",
+                    models.CharField(
+                        blank=True,
+                        help_text="Назва конфігурації або каталогу, для якого зібрано зміни",
+                        max_length=200,
+                        verbose_name="Опис",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Очікує застосування"),
+                            ("applied", "Застосовано"),
+                            ("discarded", "Відхилено"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "entries",
+                    models.JSONField(
+                        default=list,
+                        help_text="Список змін: товар/варіант, стара та нова ціна",
+                        verbose_name="Зміни",
+                    ),
+                ),
+                (
+                    "items_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Кількість змін"
+                    ),
+                ),
+                (
+                    "conflicts",
+                    models.JSONField(
+                        blank=True,
+                        default=list,
+                        help_text="Зміни, пропущені під час застосування, бо ціна в каталозі вже інша",
+                        verbose_name="Конфлікти",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата створення"
+                    ),
+                ),
+                (
+                    "applied_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Дата застосування"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Набір змін цін",
+                "verbose_name_plural": "Набори змін цін",
+                "db_table": "price_parser_price_change_set",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
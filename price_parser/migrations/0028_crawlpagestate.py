@@ -0,0 +1,70 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("price_parser", "0027_pricechangeset"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CrawlPageState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        help_text="Скрапер або конфігурація, напр. 'evrodim' чи 'supplier_web:3'",
+                        max_length=60,
+                        verbose_name="Джерело",
+                    ),
+                ),
+                ("url", models.CharField(max_length=1000, verbose_name="URL")),
+                (
+                    "lastmod",
+                    models.CharField(
+                        blank=True, max_length=40, verbose_name="lastmod із sitemap"
+                    ),
+                ),
+                (
+                    "content_hash",
+                    models.CharField(
+                        blank=True, max_length=64, verbose_name="Відбиток вмісту"
+                    ),
+                ),
+                (
+                    "payload",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        help_text="Напр. ID товарів, зіставлених із цією сторінкою",
+                        verbose_name="Додаткові дані",
+                    ),
+                ),
+                (
+                    "last_scraped_at",
+                    models.DateTimeField(verbose_name="Остання обробка"),
+                ),
+            ],
+            options={
+                "verbose_name": "Стан сторінки постачальника",
+                "verbose_name_plural": "Стани сторінок постачальників",
+                "db_table": "price_parser_crawl_page_state",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("source", "url"),
+                        name="crawl_page_state_source_url_uniq",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("price_parser", "0028_crawlpagestate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="supplierwebconfig",
+            name="selenium_http_first",
+            field=models.BooleanField(
+                default=False,
+                help_text="Для Selenium-конфігурацій: якщо блок ціни вже є у звичайній HTML-відповіді, браузер не запускається.",
+                verbose_name="Спершу пробувати звичайний HTTP",
+            ),
+        ),
+    ]
@@ -0,0 +1,81 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("price_parser", "0029_supplierwebconfig_selenium_http_first"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="googlesheetconfig",
+            name="fetch_latency_ms",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Заповнюється автоматично після успішного завантаження",
+                null=True,
+                verbose_name="Час завантаження, мс",
+            ),
+        ),
+        migrations.AddField(
+            model_name="googlesheetconfig",
+            name="fetch_strategy",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("csv", "Експорт CSV"),
+                    ("xlsx", "Експорт XLSX"),
+                    ("gviz", "GViz CSV"),
+                ],
+                default="",
+                help_text="Останній спосіб, яким таблицю вдалося завантажити; наступного разу пробується першим",
+                max_length=10,
+                verbose_name="Спосіб завантаження",
+            ),
+        ),
+        migrations.AddField(
+            model_name="googlesheetconfig",
+            name="sheet_content_hash",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Якщо таблиця не змінилась з останнього оновлення, обробка пропускається",
+                max_length=64,
+                verbose_name="Хеш вмісту таблиці",
+            ),
+        ),
+        migrations.AddField(
+            model_name="googlesheetconfig",
+            name="sheet_etag",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Заповнюється автоматично після успішного оновлення",
+                max_length=255,
+                verbose_name="ETag таблиці",
+            ),
+        ),
+        migrations.AddField(
+            model_name="googlesheetconfig",
+            name="sheet_last_modified",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Заповнюється автоматично після успішного оновлення",
+                max_length=100,
+                verbose_name="Last-Modified таблиці",
+            ),
+        ),
+        migrations.AddField(
+            model_name="googlesheetconfig",
+            name="sheet_state_fingerprint",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Зміна налаштувань, мапінгів або каталогу скасовує пропуск незмінної таблиці",
+                max_length=64,
+                verbose_name="Відбиток налаштувань і каталогу",
+            ),
+        ),
+    ]
@@ -0,0 +1,116 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("price_parser", "0030_googlesheetconfig_fetch_state"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SupplierImage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "sha256",
+                    models.CharField(
+                        max_length=64, unique=True, verbose_name="SHA-256 вмісту"
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(max_length=255, verbose_name="Ключ у сховищі"),
+                ),
+                (
+                    "phash",
+                    models.CharField(max_length=16, verbose_name="Перцептивний хеш"),
+                ),
+                ("phash_band0", models.PositiveIntegerField(db_index=True)),
+                ("phash_band1", models.PositiveIntegerField(db_index=True)),
+                ("phash_band2", models.PositiveIntegerField(db_index=True)),
+                ("phash_band3", models.PositiveIntegerField(db_index=True)),
+                (
+                    "mean_color",
+                    models.CharField(
+                        blank=True, max_length=7, verbose_name="Середній колір"
+                    ),
+                ),
+                (
+                    "width",
+                    models.PositiveIntegerField(default=0, verbose_name="Ширина, px"),
+                ),
+                (
+                    "height",
+                    models.PositiveIntegerField(default=0, verbose_name="Висота, px"),
+                ),
+                (
+                    "size_bytes",
+                    models.PositiveIntegerField(default=0, verbose_name="Розмір, байт"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Завантажено"),
+                ),
+            ],
+            options={
+                "verbose_name": "Зображення постачальника",
+                "verbose_name_plural": "Зображення постачальників",
+                "db_table": "price_parser_supplier_image",
+            },
+        ),
+        migrations.CreateModel(
+            name="SupplierImageUrl",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "url_hash",
+                    models.CharField(
+                        max_length=40, unique=True, verbose_name="SHA-1 URL"
+                    ),
+                ),
+                ("url", models.CharField(max_length=1000, verbose_name="URL")),
+                (
+                    "image",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="urls",
+                        to="price_parser.supplierimage",
+                        verbose_name="Зображення",
+                    ),
+                ),
+                (
+                    "similar",
+                    models.BooleanField(
+                        default=False, verbose_name="Схоже, а не ідентичне зображення"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Додано"),
+                ),
+            ],
+            options={
+                "verbose_name": "URL зображення постачальника",
+                "verbose_name_plural": "URL зображень постачальників",
+                "db_table": "price_parser_supplier_image_url",
+            },
+        ),
+    ]
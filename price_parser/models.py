@@ -82,6 +82,57 @@ class GoogleSheetConfig(models.Model):
         verbose_name="Активна",
         help_text="Чи використовувати цю конфігурацію"
     )
+
+    FETCH_STRATEGY_CSV = 'csv'
+    FETCH_STRATEGY_XLSX = 'xlsx'
+    FETCH_STRATEGY_GVIZ = 'gviz'
+    FETCH_STRATEGY_CHOICES = [
+        (FETCH_STRATEGY_CSV, 'Експорт CSV'),
+        (FETCH_STRATEGY_XLSX, 'Експорт XLSX'),
+        (FETCH_STRATEGY_GVIZ, 'GViz CSV'),
+    ]
+    fetch_strategy = models.CharField(
+        max_length=10,
+        choices=FETCH_STRATEGY_CHOICES,
+        blank=True,
+        default='',
+        verbose_name="Спосіб завантаження",
+        help_text="Останній спосіб, яким таблицю вдалося завантажити; наступного разу пробується першим"
+    )
+    fetch_latency_ms = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Час завантаження, мс",
+        help_text="Заповнюється автоматично після успішного завантаження"
+    )
+    sheet_etag = models.CharField(
+        max_length=255,
+        blank=True,
+        default='',
+        verbose_name="ETag таблиці",
+        help_text="Заповнюється автоматично після успішного оновлення"
+    )
+    sheet_last_modified = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        verbose_name="Last-Modified таблиці",
+        help_text="Заповнюється автоматично після успішного оновлення"
+    )
+    sheet_content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        verbose_name="Хеш вмісту таблиці",
+        help_text="Якщо таблиця не змінилась з останнього оновлення, обробка пропускається"
+    )
+    sheet_state_fingerprint = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        verbose_name="Відбиток налаштувань і каталогу",
+        help_text="Зміна налаштувань, мапінгів або каталогу скасовує пропуск незмінної таблиці"
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name="Дата створення"
@@ -294,6 +345,40 @@ class SupplierFeedConfig(models.Model):
         default=True,
         verbose_name="Активний"
     )
+    feed_etag = models.CharField(
+        max_length=255,
+        blank=True,
+        default='',
+        verbose_name="ETag фіда",
+        help_text="Заповнюється автоматично після успішного оновлення"
+    )
+    feed_last_modified = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        verbose_name="Last-Modified фіда",
+        help_text="Заповнюється автоматично після успішного оновлення"
+    )
+    feed_content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        verbose_name="Хеш вмісту фіда",
+        help_text="Якщо фід не змінився з останнього оновлення, обробка пропускається"
+    )
+    feed_state_fingerprint = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        verbose_name="Відбиток налаштувань і каталогу",
+        help_text="Зміна налаштувань або каталогу скасовує пропуск незмінного фіда"
+    )
+    offer_digests = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name="Хеші оброблених оферів",
+        help_text="Офери з незмінним хешем не обробляються повторно"
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name="Дата створення"
@@ -463,6 +548,11 @@ class SupplierWebConfig(models.Model):
         default=4,
         verbose_name="Очікування Selenium (сек)",
     )
+    selenium_http_first = models.BooleanField(
+        default=False,
+        verbose_name="Спершу пробувати звичайний HTTP",
+        help_text="Для Selenium-конфігурацій: якщо блок ціни вже є у звичайній HTML-відповіді, браузер не запускається.",
+    )
     price_multiplier = models.DecimalField(
         max_digits=10,
         decimal_places=4,
@@ -748,3 +838,288 @@ class DivanoffPriceConfig(models.Model):
     def get(cls):
         obj, _ = cls.objects.get_or_create(pk=1)
         return obj
+
+
+class PriceHistory(models.Model):
+    """Append-only record of a price change written by one of the updaters.
+
+    Rows are buffered and bulk-inserted per run (see ``price_history.PriceHistoryRecorder``)
+    and never edited afterwards; ``prune_price_history`` rolls old rows up
+    to one row per item per month.
+    """
+
+    SOURCE_GOOGLE_SHEETS = 'google_sheets'
+    SOURCE_SUPPLIER_FEED = 'supplier_feed'
+    SOURCE_SUPPLIER_WEB = 'supplier_web'
+    SOURCE_EVRODIM = 'evrodim'
+    SOURCE_ANDERSEN = 'andersen'
+    SOURCE_DIVANOFF = 'divanoff'
+    SOURCE_KRESLALUX = 'kreslalux'
+    SOURCE_EUROSOF = 'eurosof'
+    SOURCE_CHOICES = [
+        (SOURCE_GOOGLE_SHEETS, 'Google таблиця'),
+        (SOURCE_SUPPLIER_FEED, 'XML фід постачальника'),
+        (SOURCE_SUPPLIER_WEB, 'Сайт постачальника'),
+        (SOURCE_EVRODIM, 'Evrodim'),
+        (SOURCE_ANDERSEN, 'Andersen'),
+        (SOURCE_DIVANOFF, 'Divanoff'),
+        (SOURCE_KRESLALUX, 'Kreslalux'),
+        (SOURCE_EUROSOF, 'Eurosof'),
+    ]
+
+    furniture = models.ForeignKey(
+        Furniture,
+        on_delete=models.CASCADE,
+        related_name='price_history',
+        db_index=False,
+        verbose_name="Меблі"
+    )
+    size_variant = models.ForeignKey(
+        FurnitureSizeVariant,
+        on_delete=models.CASCADE,
+        related_name='price_history',
+        null=True,
+        blank=True,
+        db_index=False,
+        verbose_name="Розмірний варіант"
+    )
+    old_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="Стара ціна"
+    )
+    new_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="Нова ціна"
+    )
+    old_promotional_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="Стара акційна ціна"
+    )
+    new_promotional_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="Нова акційна ціна"
+    )
+    source = models.CharField(
+        max_length=30,
+        choices=SOURCE_CHOICES,
+        verbose_name="Джерело"
+    )
+    run_id = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name="Запуск",
+        help_text="Ідентифікатор запуску оновлення, що змінив ціну"
+    )
+    is_rollup = models.BooleanField(
+        default=False,
+        verbose_name="Згорнутий запис",
+        help_text="Останній запис місяця, залишений після очищення старої історії"
+    )
+    recorded_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Час зміни"
+    )
+
+    class Meta:
+        db_table = "price_parser_price_history"
+        verbose_name = "Історія ціни"
+        verbose_name_plural = "Історія цін"
+        ordering = ['-recorded_at']
+        indexes = [
+            models.Index(fields=['furniture', 'recorded_at'], name='price_hist_furniture_idx'),
+            models.Index(fields=['size_variant', 'recorded_at'], name='price_hist_variant_idx'),
+            models.Index(fields=['run_id'], name='price_hist_run_idx'),
+            models.Index(fields=['recorded_at'], name='price_hist_recorded_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.furniture_id}: {self.old_price} → {self.new_price}"
+
+
+class PriceChangeSet(models.Model):
+    """Price changes computed by a dry run, waiting for review.
+
+    ``entries`` holds one dict per product/size variant with the old and new
+    prices; ``change_sets.apply_change_set`` writes them in one transaction.
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_APPLIED = 'applied'
+    STATUS_DISCARDED = 'discarded'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Очікує застосування'),
+        (STATUS_APPLIED, 'Застосовано'),
+        (STATUS_DISCARDED, 'Відхилено'),
+    ]
+
+    source = models.CharField(
+        max_length=30,
+        choices=PriceHistory.SOURCE_CHOICES,
+        verbose_name="Джерело"
+    )
+    run_id = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name="Запуск"
+    )
+    label = models.CharField(
+        max_length=200,
+        blank=True,
+        verbose_name="Опис",
+        help_text="Назва конфігурації або каталогу, для якого зібрано зміни"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name="Статус"
+    )
+    entries = models.JSONField(
+        default=list,
+        verbose_name="Зміни",
+        help_text="Список змін: товар/варіант, стара та нова ціна"
+    )
+    items_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Кількість змін"
+    )
+    conflicts = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name="Конфлікти",
+        help_text="Зміни, пропущені під час застосування, бо ціна в каталозі вже інша"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата створення"
+    )
+    applied_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Дата застосування"
+    )
+
+    class Meta:
+        db_table = "price_parser_price_change_set"
+        verbose_name = "Набір змін цін"
+        verbose_name_plural = "Набори змін цін"
+        ordering = ['-created_at']
+
+    def __str__(self) -> str:
+        return f"{self.label or self.get_source_display()} — {self.items_count} змін"
+
+
+class CrawlPageState(models.Model):
+    """What a supplier crawl saw on a page last time.
+
+    Used by ``crawl_state.CrawlStateStore`` to skip pages whose sitemap
+    ``lastmod`` or listing fingerprint has not changed since the last
+    successful scrape.
+    """
+
+    source = models.CharField(
+        max_length=60,
+        verbose_name="Джерело",
+        help_text="Скрапер або конфігурація, напр. 'evrodim' чи 'supplier_web:3'"
+    )
+    url = models.CharField(
+        max_length=1000,
+        verbose_name="URL"
+    )
+    lastmod = models.CharField(
+        max_length=40,
+        blank=True,
+        verbose_name="lastmod із sitemap"
+    )
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name="Відбиток вмісту"
+    )
+    payload = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Додаткові дані",
+        help_text="Напр. ID товарів, зіставлених із цією сторінкою"
+    )
+    last_scraped_at = models.DateTimeField(
+        verbose_name="Остання обробка"
+    )
+
+    class Meta:
+        db_table = "price_parser_crawl_page_state"
+        verbose_name = "Стан сторінки постачальника"
+        verbose_name_plural = "Стани сторінок постачальників"
+        constraints = [
+            models.UniqueConstraint(fields=["source", "url"], name="crawl_page_state_source_url_uniq"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.source}: {self.url}"
+
+
+class SupplierImage(models.Model):
+    """A distinct supplier photo, stored once under the SHA-256 of its bytes.
+
+    ``phash`` is a 64-bit difference hash; its four 16-bit bands are indexed
+    so ``supplier_images`` can find near-duplicates (the same photo resized
+    or re-encoded by another CDN) without scanning the table. The hash is
+    grayscale, so ``mean_color`` must match as well: colourways of one
+    product photo hash alike.
+    """
+
+    sha256 = models.CharField(max_length=64, unique=True, verbose_name="SHA-256 вмісту")
+    key = models.CharField(max_length=255, verbose_name="Ключ у сховищі")
+    phash = models.CharField(max_length=16, verbose_name="Перцептивний хеш")
+    phash_band0 = models.PositiveIntegerField(db_index=True)
+    phash_band1 = models.PositiveIntegerField(db_index=True)
+    phash_band2 = models.PositiveIntegerField(db_index=True)
+    phash_band3 = models.PositiveIntegerField(db_index=True)
+    mean_color = models.CharField(max_length=7, blank=True, verbose_name="Середній колір")
+    width = models.PositiveIntegerField(default=0, verbose_name="Ширина, px")
+    height = models.PositiveIntegerField(default=0, verbose_name="Висота, px")
+    size_bytes = models.PositiveIntegerField(default=0, verbose_name="Розмір, байт")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Завантажено")
+
+    class Meta:
+        db_table = "price_parser_supplier_image"
+        verbose_name = "Зображення постачальника"
+        verbose_name_plural = "Зображення постачальників"
+
+    def __str__(self) -> str:
+        return self.key
+
+
+class SupplierImageUrl(models.Model):
+    """Supplier URL already resolved to a stored image (never downloaded again)."""
+
+    url_hash = models.CharField(max_length=40, unique=True, verbose_name="SHA-1 URL")
+    url = models.CharField(max_length=1000, verbose_name="URL")
+    image = models.ForeignKey(
+        SupplierImage,
+        on_delete=models.CASCADE,
+        related_name="urls",
+        verbose_name="Зображення",
+    )
+    similar = models.BooleanField(default=False, verbose_name="Схоже, а не ідентичне зображення")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Додано")
+
+    class Meta:
+        db_table = "price_parser_supplier_image_url"
+        verbose_name = "URL зображення постачальника"
+        verbose_name_plural = "URL зображень постачальників"
+
+    def __str__(self) -> str:
+        return self.url
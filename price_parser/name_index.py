@@ -0,0 +1,164 @@
+"""Inverted character n-gram index for fuzzy name matching.
+
+Supplier importers match offers to catalog items by normalized names. A plain
+``dict`` answers exact lookups, but the "partial contains" fallback
+(``fragment in name`` / ``name in fragment``) used to scan every stored name
+for every offer. ``NameIndex`` answers both directions from an n-gram
+posting list, so a run builds the index once and each lookup only touches
+names that share the rarest n-gram of the query.
+
+Keys are expected to be normalized by the caller (each importer has its own
+normalization rules); the index itself never rewrites them.
+"""
+
+from typing import (
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+T = TypeVar("T")
+
+DEFAULT_NGRAM = 3
+
+
+def _ngrams(value: str, n: int) -> Set[str]:
+    if len(value) < n:
+        return set()
+    return {value[i : i + n] for i in range(len(value) - n + 1)}
+
+
+class NameIndex(Generic[T]):
+    """Maps normalized names to items and finds names by substring or similarity."""
+
+    def __init__(self, ngram: int = DEFAULT_NGRAM):
+        if ngram < 1:
+            raise ValueError("ngram must be positive")
+        self.ngram = ngram
+        self._items: Dict[str, List[T]] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._grams: Dict[str, Set[str]] = {}
+        self._key_lengths: Set[int] = set()
+
+    @classmethod
+    def from_mapping(
+        cls, mapping: Dict[str, List[T]], ngram: int = DEFAULT_NGRAM
+    ) -> "NameIndex[T]":
+        index: NameIndex[T] = cls(ngram=ngram)
+        for key, items in mapping.items():
+            for item in items:
+                index.add(key, item)
+        return index
+
+    # --- Building ---------------------------------------------------------
+
+    def add(self, key: str, item: T) -> None:
+        if not key:
+            return
+        bucket = self._items.get(key)
+        if bucket is None:
+            bucket = self._items[key] = []
+            grams = _ngrams(key, self.ngram)
+            self._grams[key] = grams
+            self._key_lengths.add(len(key))
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(key)
+        bucket.append(item)
+
+    # --- Lookups ----------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._items
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._items)
+
+    def get(self, key: str, default: Optional[List[T]] = None) -> List[T]:
+        items = self._items.get(key)
+        if items is None:
+            return [] if default is None else default
+        return items
+
+    def items(self) -> Iterable[Tuple[str, List[T]]]:
+        return self._items.items()
+
+    def keys_containing(self, fragment: str) -> Set[str]:
+        """Return stored keys ``k`` for which ``fragment in k``."""
+        if not fragment:
+            return set()
+        grams = _ngrams(fragment, self.ngram)
+        if not grams:
+            # Fragment shorter than the n-gram size: nothing to intersect on.
+            return {key for key in self._items if fragment in key}
+
+        postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+        if not postings[0]:
+            return set()
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                return set()
+        return {key for key in candidates if fragment in key}
+
+    def keys_contained_in(self, text: str) -> Set[str]:
+        """Return stored keys ``k`` for which ``k in text``.
+
+        Enumerates only substrings of ``text`` whose length matches some
+        stored key, so the cost depends on the query, not the catalog size.
+        """
+        if not text:
+            return set()
+        found: Set[str] = set()
+        text_len = len(text)
+        for length in self._key_lengths:
+            if length > text_len:
+                continue
+            for start in range(text_len - length + 1):
+                piece = text[start : start + length]
+                if piece in self._items:
+                    found.add(piece)
+        return found
+
+    def partial_matches(self, fragment: str) -> List[T]:
+        """Items whose key contains ``fragment`` or is contained in it."""
+        keys = self.keys_containing(fragment) | self.keys_contained_in(fragment)
+        result: List[T] = []
+        for key in keys:
+            result.extend(self._items[key])
+        return result
+
+    def search(
+        self, query: str, limit: int = 5, min_score: float = 0.3
+    ) -> List[Tuple[str, float]]:
+        """Rank stored keys by n-gram Dice similarity to ``query``.
+
+        Returns ``(key, score)`` pairs sorted by descending score. Only keys
+        sharing at least one n-gram with the query are scored.
+        """
+        query_grams = _ngrams(query, self.ngram)
+        if not query_grams:
+            return [(query, 1.0)] if query in self._items else []
+
+        overlaps: Dict[str, int] = {}
+        for gram in query_grams:
+            for key in self._postings.get(gram, ()):
+                overlaps[key] = overlaps.get(key, 0) + 1
+
+        scored: List[Tuple[str, float]] = []
+        total = len(query_grams)
+        for key, shared in overlaps.items():
+            score = 2.0 * shared / (total + len(self._grams[key]))
+            if score >= min_score:
+                scored.append((key, round(score, 4)))
+        scored.sort(key=lambda pair: (-pair[1], pair[0]))
+        return scored[:limit]
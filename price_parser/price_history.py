@@ -0,0 +1,250 @@
+"""Buffered writer for the append-only ``PriceHistory`` table.
+
+Every updater owns one ``PriceHistoryRecorder`` per run. Call sites take a
+``snapshot`` of the object before touching its prices and hand it to ``save``
+(or to ``record`` after saving themselves); only real changes are buffered,
+and the buffer is written with ``bulk_create`` when it fills up or when the
+run calls ``flush``.
+
+In ``dry_run`` mode ``save`` writes nothing to the catalog. Changes are
+collected and ``store_change_set`` persists them as a ``PriceChangeSet``,
+which can be reviewed and applied later with ``change_sets.apply_change_set``.
+"""
+
+import logging
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple, Union
+
+from django.db import transaction
+from django.utils import timezone
+
+from furniture.models import Furniture, FurnitureSizeVariant
+
+from .models import PriceChangeSet, PriceHistory
+
+logger = logging.getLogger(__name__)
+
+PriceSnapshot = Tuple[Optional[Decimal], Optional[Decimal]]
+PricedItem = Union[Furniture, FurnitureSizeVariant]
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def new_run_id(source: str) -> str:
+    return f"{source}-{uuid.uuid4().hex[:12]}"
+
+
+class PriceHistoryRecorder:
+    """Collects price changes of a single run and writes them in bulk."""
+
+    def __init__(
+        self,
+        source: str,
+        run_id: Optional[str] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        dry_run: bool = False,
+        label: str = "",
+    ):
+        self.source = source
+        self.run_id = run_id or new_run_id(source)
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.label = label
+        self._pending: List[PriceHistory] = []
+        self._changes: Dict[Tuple[str, int], Dict] = {}
+        self.recorded = 0
+        self.change_set: Optional[PriceChangeSet] = None
+
+    @staticmethod
+    def snapshot(obj: PricedItem) -> PriceSnapshot:
+        """Prices of a ``Furniture`` or ``FurnitureSizeVariant`` before an update."""
+        return obj.price, obj.promotional_price
+
+    def save(
+        self,
+        obj: PricedItem,
+        before: PriceSnapshot,
+        update_fields: Optional[List[str]] = None,
+    ) -> None:
+        """Save ``obj`` and record its change; in dry-run mode only collect it."""
+        if self.dry_run:
+            self._collect(obj, before)
+            return
+        obj.save(update_fields=update_fields)
+        self.record(obj, before)
+
+    @property
+    def changes_count(self) -> int:
+        return len(self._changes)
+
+    def _collect(self, obj: PricedItem, before: PriceSnapshot) -> None:
+        if isinstance(obj, FurnitureSizeVariant):
+            kind, furniture_id = "variant", obj.furniture_id
+        else:
+            kind, furniture_id = "furniture", obj.pk
+        entry = self._changes.get((kind, obj.pk))
+        if entry is None:
+            # The first snapshot wins: later saves of the same object in this
+            # run only move the "new" side.
+            entry = self._changes[(kind, obj.pk)] = {
+                "kind": kind,
+                "id": obj.pk,
+                "furniture_id": furniture_id,
+                "old_price": _decimal_str(before[0]),
+                "old_promotional_price": _decimal_str(before[1]),
+            }
+        entry.update(
+            new_price=_decimal_str(obj.price),
+            new_promotional_price=_decimal_str(obj.promotional_price),
+            is_promotional=bool(obj.is_promotional),
+        )
+
+    def record(self, obj: PricedItem, before: PriceSnapshot) -> bool:
+        """Buffer a history row if ``obj`` prices differ from ``before``."""
+        old_price, old_promo = before
+        new_price, new_promo = obj.price, obj.promotional_price
+        if old_price == new_price and old_promo == new_promo:
+            return False
+
+        if isinstance(obj, FurnitureSizeVariant):
+            furniture_id, variant_id = obj.furniture_id, obj.pk
+        else:
+            furniture_id, variant_id = obj.pk, None
+
+        self._pending.append(
+            PriceHistory(
+                furniture_id=furniture_id,
+                size_variant_id=variant_id,
+                old_price=old_price,
+                new_price=new_price,
+                old_promotional_price=old_promo,
+                new_promotional_price=new_promo,
+                source=self.source,
+                run_id=self.run_id,
+                recorded_at=timezone.now(),
+            )
+        )
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self) -> int:
+        """Write buffered rows. History is best-effort and never fails a run."""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, []
+        try:
+            # Savepoint: a failed insert must not poison a caller's transaction.
+            with transaction.atomic():
+                PriceHistory.objects.bulk_create(pending, batch_size=self.batch_size)
+        except Exception as exc:
+            logger.warning(
+                "Failed to write %d price history rows for %s: %s",
+                len(pending),
+                self.run_id,
+                exc,
+            )
+            return 0
+        self.recorded += len(pending)
+        return len(pending)
+
+    def store_change_set(self) -> PriceChangeSet:
+        """Persist changes collected in dry-run mode; call once the run succeeded."""
+        entries = list(self._changes.values())
+        change_set, _ = PriceChangeSet.objects.update_or_create(
+            run_id=self.run_id,
+            defaults={
+                "source": self.source,
+                "label": self.label[:200],
+                "entries": entries,
+                "items_count": len(entries),
+            },
+        )
+        self.change_set = change_set
+        return change_set
+
+
+def _decimal_str(value: Optional[Decimal]) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def rollup_price_history(
+    older_than: datetime, dry_run: bool = False, chunk_size: int = 2000
+) -> Tuple[int, int]:
+    """Collapse rows recorded before ``older_than`` to one row per item per month.
+
+    The kept row is the month's last change; its ``old_*`` prices are rewritten
+    to the month's first values so the row still describes the net change.
+    Returns ``(kept, deleted)``.
+    """
+    rows = (
+        PriceHistory.objects.filter(recorded_at__lt=older_than)
+        .order_by("furniture_id", "size_variant_id", "recorded_at", "id")
+        .values_list(
+            "id",
+            "furniture_id",
+            "size_variant_id",
+            "recorded_at",
+            "old_price",
+            "old_promotional_price",
+            "is_rollup",
+        )
+    )
+
+    kept: List[PriceHistory] = []
+    delete_ids: List[int] = []
+    group_key = None
+    first_old: PriceSnapshot = (None, None)
+    last_id = None
+    last_is_rollup = False
+    group_size = 0
+
+    def close_group() -> None:
+        if last_id is None:
+            return
+        if group_size > 1 or not last_is_rollup:
+            kept.append(
+                PriceHistory(
+                    id=last_id,
+                    old_price=first_old[0],
+                    old_promotional_price=first_old[1],
+                    is_rollup=True,
+                )
+            )
+
+    for (
+        row_id,
+        furniture_id,
+        variant_id,
+        recorded_at,
+        old_price,
+        old_promo,
+        is_rollup,
+    ) in rows.iterator(chunk_size=chunk_size):
+        key = (furniture_id, variant_id, recorded_at.year, recorded_at.month)
+        if key != group_key:
+            close_group()
+            group_key = key
+            first_old = (old_price, old_promo)
+            group_size = 0
+        elif last_id is not None:
+            delete_ids.append(last_id)
+        last_id, last_is_rollup = row_id, is_rollup
+        group_size += 1
+    close_group()
+
+    if not dry_run:
+        # Deleted only after the scan so the cursor never sees its own writes.
+        for start in range(0, len(delete_ids), chunk_size):
+            PriceHistory.objects.filter(
+                id__in=delete_ids[start : start + chunk_size]
+            ).delete()
+        if kept:
+            PriceHistory.objects.bulk_update(
+                kept,
+                ["old_price", "old_promotional_price", "is_rollup"],
+                batch_size=chunk_size,
+            )
+    return len(kept), len(delete_ids)
@@ -1,17 +1,23 @@
 import re
 import json
+import hashlib
 import logging
+import threading
+import time
 import xml.etree.ElementTree as ET
+from contextlib import contextmanager
 from dataclasses import dataclass
 from decimal import Decimal, InvalidOperation
-from io import BytesIO, StringIO
-from typing import Dict, List, Optional, Tuple
+from io import StringIO
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
 from urllib.parse import urljoin, urlparse
 
 import csv
 import requests
 from bs4 import BeautifulSoup
+from django.conf import settings
 from django.db import close_old_connections
+from django.db.models import Count, Max
 from django.db.utils import InterfaceError, OperationalError
 from django.utils import timezone
 
@@ -20,11 +26,19 @@ from .models import (
     PriceUpdateLog,
     FurniturePriceCellMapping,
     FurnitureModelPriceMapping,
+    PriceHistory,
     SupplierFeedConfig,
     SupplierFeedUpdateLog,
     SupplierWebConfig,
     SupplierWebUpdateLog,
 )
+from .browser_pool import BrowserPool
+from .crawl_state import CrawlStateStore, fingerprint
+from .http_cache import HttpCache
+from .name_index import NameIndex
+from .price_history import PriceHistoryRecorder
+from .sitemap_reader import SitemapReader
+from .xlsx_reader import read_xlsx_rows
 from furniture.models import Furniture, FurnitureSizeVariant
 
 logger = logging.getLogger(__name__)
@@ -38,12 +52,54 @@ DEFAULT_FEED_HEADERS = {
 }
 
 
+_sheets_session: Optional[requests.Session] = None
+_sheets_session_lock = threading.Lock()
+
+
+def _get_sheets_session() -> requests.Session:
+    """Process-wide keep-alive session for docs.google.com requests."""
+    global _sheets_session
+    with _sheets_session_lock:
+        if _sheets_session is None:
+            _sheets_session = requests.Session()
+        return _sheets_session
+
+
+def _variant_prices_digest() -> str:
+    """Digest of every size variant's price columns, for the run fingerprints.
+
+    Size variants have no ``updated_at``, so their count and max id alone
+    would miss a price edited in the admin; hashing the price columns does not.
+    """
+    digest = hashlib.sha256()
+    rows = FurnitureSizeVariant.objects.order_by('id').values_list(
+        'id', 'price', 'promotional_price', 'is_promotional'
+    )
+    for row in rows.iterator(chunk_size=2000):
+        digest.update('|'.join(str(value) for value in row).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class SheetNotModified(Exception):
+    """The sheet answered 304 to a conditional request."""
+
+
 class GoogleSheetsPriceUpdater:
     """Service for updating furniture prices from Google Sheets."""
-    
+
+    FETCH_STRATEGIES = (
+        (GoogleSheetConfig.FETCH_STRATEGY_CSV, '_fetch_google_sheets_via_export'),
+        (GoogleSheetConfig.FETCH_STRATEGY_XLSX, '_fetch_google_sheets_via_xlsx_export'),
+        (GoogleSheetConfig.FETCH_STRATEGY_GVIZ, '_fetch_google_sheets_via_gviz'),
+    )
+
     def __init__(self, config: GoogleSheetConfig):
         self.config = config
         self.log = None
+        self.history = PriceHistoryRecorder(PriceHistory.SOURCE_GOOGLE_SHEETS)
+        self._response_validators: Dict[str, str] = {}
+        self._content_hash = ''
     
     def test_parse(self) -> Dict:
         """Test fetching sheet data without updating prices."""
@@ -76,20 +132,51 @@ class GoogleSheetsPriceUpdater:
             logger.error(f"Error testing sheet access for config {self.config.name}: {str(e)}")
             return {'success': False, 'error': str(e)}
 
-    def update_prices(self) -> Dict:
-        """Update furniture prices from Google Sheets using the config's parsing mode."""
+    def update_prices(self, dry_run: bool = False, force: bool = False) -> Dict:
+        """Update furniture prices from Google Sheets using the config's parsing mode.
+
+        Unless ``force`` is set, the sheet is requested conditionally and the
+        run stops early when Google answers 304 or the downloaded sheet is
+        byte-identical to the last completed run (and neither the settings,
+        the mappings nor the catalog changed since).
+
+        With ``dry_run`` nothing is written to the catalog; the changes are
+        stored as a ``PriceChangeSet`` for review instead.
+        """
         start_time = timezone.now()
 
         # Create log entry
-        self.log = PriceUpdateLog.objects.create(
+        self.log = log = PriceUpdateLog.objects.create(
             config=self.config,
             status='success',
             started_at=start_time
         )
+        self.history = PriceHistoryRecorder(
+            PriceHistory.SOURCE_GOOGLE_SHEETS,
+            run_id=f"{PriceHistory.SOURCE_GOOGLE_SHEETS}-{log.pk}",
+            dry_run=dry_run,
+            label=self.config.name,
+        )
 
         try:
+            state_fingerprint = self._state_fingerprint()
+            state_unchanged = (
+                not force
+                and bool(self.config.sheet_state_fingerprint)
+                and state_fingerprint == self.config.sheet_state_fingerprint
+            )
+
             # Fetch data from Google Sheets
-            data = self._fetch_sheet_data()
+            try:
+                data = self._fetch_sheet_data(conditional=state_unchanged)
+            except SheetNotModified:
+                return self._finish_unchanged('Таблиця не змінилась (304 Not Modified)')
+            if (
+                state_unchanged
+                and self._content_hash
+                and self._content_hash == self.config.sheet_content_hash
+            ):
+                return self._finish_unchanged('Таблиця не змінилась (хеш вмісту збігається)')
             if not data:
                 self._update_log_error("Не вдалося отримати дані з таблиці")
                 return {'success': False, 'error': 'Не вдалося отримати дані з таблиці'}
@@ -100,93 +187,128 @@ class GoogleSheetsPriceUpdater:
                 updated_count, processed_count = self._update_prices_from_cell_mappings(data)
 
             # Update log
-            self.log.items_processed = processed_count
-            self.log.items_updated = updated_count
-            self.log.completed_at = timezone.now()
-            self.log.log_details = f"Оновлено {updated_count} товарів з {processed_count} комірок"
-            self.log.save()
-
-            return {
+            log.items_processed = processed_count
+            log.items_updated = updated_count
+            log.completed_at = timezone.now()
+            log.log_details = f"Оновлено {updated_count} товарів з {processed_count} комірок"
+            if dry_run:
+                log.log_details = f"Попередній перегляд (без запису): {log.log_details}"
+            log.save()
+
+            result = {
                 'success': True,
                 'updated_count': updated_count,
                 'processed_count': processed_count,
             }
+            if dry_run:
+                result['change_set_id'] = self.history.store_change_set().pk
+            else:
+                self._store_sheet_state()
+            return result
 
         except Exception as e:
             error_msg = f"Помилка оновлення цін: {str(e)}"
             logger.error(error_msg)
             self._update_log_error(error_msg)
             return {'success': False, 'error': str(e)}
+        finally:
+            self.history.flush()
     
-    def _fetch_sheet_data(self) -> Optional[List[List]]:
-        """Fetch data from Google Sheets or XLSX file."""
+    def _fetch_sheet_data(self, conditional: bool = False) -> Optional[List[List]]:
+        """Fetch data from Google Sheets or XLSX file.
+
+        Raises ``SheetNotModified`` when a ``conditional`` request got a 304.
+        """
+        self._response_validators = {}
+        self._content_hash = ''
         try:
             if self.config.xlsx_file:
                 # Handle XLSX file
                 return self._fetch_xlsx_data()
             else:
                 # Handle Google Sheets
-                return self._fetch_google_sheets_data()
+                return self._fetch_google_sheets_data(conditional=conditional)
+        except SheetNotModified:
+            raise
         except Exception as e:
             logger.error(f"Error fetching data: {str(e)}")
             return None
     
-    def _fetch_google_sheets_data(self) -> Optional[List[List]]:
-        """Fetch data from Google Sheets using CSV export with GViz fallback."""
-        last_error: Optional[Exception] = None
+    def _fetch_google_sheets_data(self, conditional: bool = False) -> Optional[List[List]]:
+        """Fetch sheet data, trying the strategy that worked last time first.
 
-        try:
-            return self._fetch_google_sheets_via_export()
-        except Exception as exc:
-            last_error = exc
-            logger.warning(
-                "Standard sheet export failed for config %s: %s",
-                self.config.name,
-                exc,
-            )
-
-        try:
-            return self._fetch_google_sheets_via_xlsx_export()
-        except Exception as exc:
-            last_error = exc
-            logger.warning(
-                "XLSX export fallback failed for config %s: %s",
-                self.config.name,
-                exc,
-            )
+        The default order is CSV export, XLSX export, then GViz (works when
+        export is blocked). Only the remembered strategy is requested
+        conditionally: the stored validators belong to its URL.
+        """
+        remembered = self.config.fetch_strategy
+        strategies = sorted(self.FETCH_STRATEGIES, key=lambda item: item[0] != remembered)
+        last_error: Optional[Exception] = None
 
-        try:
-            data = self._fetch_google_sheets_via_gviz()
-            if data:
-                logger.info(
-                    "GViz fallback succeeded for config %s",
+        for strategy, method_name in strategies:
+            started = time.monotonic()
+            try:
+                data = getattr(self, method_name)(conditional=conditional and strategy == remembered)
+            except SheetNotModified:
+                self._remember_fetch_strategy(strategy, started)
+                raise
+            except Exception as exc:
+                last_error = exc
+                logger.warning(
+                    "Sheet fetch via %s failed for config %s: %s",
+                    strategy,
                     self.config.name,
+                    exc,
                 )
+                continue
+            if strategy != remembered:
+                logger.info("Sheet fetch via %s succeeded for config %s", strategy, self.config.name)
+            self._remember_fetch_strategy(strategy, started)
             return data
-        except Exception as exc:
-            last_error = exc
-            logger.error(
-                "GViz fallback failed for config %s: %s",
-                self.config.name,
-                exc,
-            )
 
         if last_error:
             raise last_error
         return None
 
-    def _fetch_google_sheets_via_export(self) -> List[List]:
+    def _remember_fetch_strategy(self, strategy: str, started: float) -> None:
+        self.config.fetch_strategy = strategy
+        self.config.fetch_latency_ms = int((time.monotonic() - started) * 1000)
+        if self.config.pk:
+            self.config.save(update_fields=['fetch_strategy', 'fetch_latency_ms'])
+
+    def _sheet_get(
+        self, url: str, timeout: int, conditional: bool = False, params: Optional[Dict[str, str]] = None
+    ) -> requests.Response:
+        """GET over the shared session; remembers validators and the body hash."""
+        headers: Dict[str, str] = {}
+        if conditional:
+            if self.config.sheet_etag:
+                headers["If-None-Match"] = self.config.sheet_etag
+            if self.config.sheet_last_modified:
+                headers["If-Modified-Since"] = self.config.sheet_last_modified
+        response = _get_sheets_session().get(url, params=params, headers=headers, timeout=timeout)
+        if conditional and headers and response.status_code == 304:
+            raise SheetNotModified()
+        response.raise_for_status()
+        self._response_validators = {}
+        for header, key in (('ETag', 'etag'), ('Last-Modified', 'last_modified')):
+            value = response.headers.get(header)
+            if isinstance(value, str):
+                self._response_validators[key] = value
+        self._content_hash = hashlib.sha256(response.content).hexdigest()
+        return response
+
+    def _fetch_google_sheets_via_export(self, conditional: bool = False) -> List[List]:
         """Fetch sheet data via the export CSV endpoint."""
         csv_url = (
             f"https://docs.google.com/spreadsheets/d/{self.config.sheet_id}/export"
             f"?format=csv&gid={self._get_sheet_gid()}"
         )
-        response = requests.get(csv_url, timeout=30)
-        response.raise_for_status()
+        response = self._sheet_get(csv_url, timeout=30, conditional=conditional)
         csv_data = StringIO(response.text)
         return list(csv.reader(csv_data))
 
-    def _fetch_google_sheets_via_gviz(self) -> List[List]:
+    def _fetch_google_sheets_via_gviz(self, conditional: bool = False) -> List[List]:
         """Fetch sheet data via the GViz endpoint (works when export is blocked)."""
         base_url = f"https://docs.google.com/spreadsheets/d/{self.config.sheet_id}/gviz/tq"
         params: Dict[str, str] = {"tqx": "out:csv"}
@@ -198,47 +320,41 @@ class GoogleSheetsPriceUpdater:
         else:
             params["gid"] = self._get_sheet_gid()
 
-        response = requests.get(base_url, params=params, timeout=30)
-        response.raise_for_status()
+        response = self._sheet_get(base_url, timeout=30, conditional=conditional, params=params)
         csv_data = StringIO(response.text)
         return list(csv.reader(csv_data))
 
-    def _fetch_google_sheets_via_xlsx_export(self) -> List[List]:
+    def _fetch_google_sheets_via_xlsx_export(self, conditional: bool = False) -> List[List]:
         """Download the Google Sheet as XLSX and return matrix data."""
-        from openpyxl import load_workbook  # Imported lazily
-
         url = f"https://docs.google.com/spreadsheets/d/{self.config.sheet_id}/export?format=xlsx&id={self.config.sheet_id}"
         params: Dict[str, str] = {}
         if self.config.sheet_gid:
             params["gid"] = self.config.sheet_gid
 
-        response = requests.get(url, params=params or None, timeout=60)
-        response.raise_for_status()
-
-        workbook = load_workbook(BytesIO(response.content), data_only=True)
-
-        if self.config.sheet_name and self.config.sheet_name in workbook.sheetnames:
-            worksheet = workbook[self.config.sheet_name]
-        else:
-            worksheet = workbook.active
+        response = self._sheet_get(url, timeout=60, conditional=conditional, params=params or None)
 
-        return self._worksheet_to_data(worksheet)
+        return read_xlsx_rows(
+            response.content,
+            self.config.sheet_name or None,
+            as_text=True,
+            default_to_active=True,
+        )
 
     def _fetch_xlsx_data(self) -> Optional[List[List]]:
         """Fetch data from XLSX file."""
         try:
-            from openpyxl import load_workbook
+            import openpyxl  # noqa: F401
         except ImportError:
             logger.error("openpyxl is not installed. Please install it with: pip install openpyxl")
             return None
 
         try:
-            workbook = load_workbook(self.config.xlsx_file.path, data_only=True)
-            if self.config.sheet_name and self.config.sheet_name in workbook.sheetnames:
-                worksheet = workbook[self.config.sheet_name]
-            else:
-                worksheet = workbook.active
-            return self._worksheet_to_data(worksheet)
+            return read_xlsx_rows(
+                self.config.xlsx_file.path,
+                self.config.sheet_name or None,
+                as_text=True,
+                default_to_active=True,
+            )
         except Exception as e:
             logger.error(f"Error fetching XLSX data: {str(e)}")
             return None
@@ -281,19 +397,6 @@ class GoogleSheetsPriceUpdater:
             logger.error(f"Error getting sheet GID: {str(e)}")
             return '0'  # Default to first sheet
 
-    def _worksheet_to_data(self, worksheet) -> List[List[str]]:
-        """Convert an openpyxl worksheet to a list of lists."""
-        data: List[List[str]] = []
-        for row in worksheet.iter_rows(values_only=True):
-            row_data: List[str] = []
-            for cell_value in row:
-                if cell_value is None:
-                    row_data.append("")
-                else:
-                    row_data.append(str(cell_value))
-            data.append(row_data)
-        return data
-
     def _parse_price(self, price_str: str) -> Optional[Decimal]:
         """Parse price string into Decimal and apply multiplier."""
         try:
@@ -356,14 +459,16 @@ class GoogleSheetsPriceUpdater:
                             # Update the price
                             if mapping.size_variant:
                                 # Update size variant price
+                                before = self.history.snapshot(mapping.size_variant)
                                 mapping.size_variant.price = price
-                                mapping.size_variant.save()
+                                self.history.save(mapping.size_variant, before)
                                 updated_count += 1
                                 logger.info(f"Updated size variant price for {mapping.furniture.name}: {price}")
                             else:
                                 # Update main furniture price
+                                before = self.history.snapshot(mapping.furniture)
                                 mapping.furniture.price = price
-                                mapping.furniture.save()
+                                self.history.save(mapping.furniture, before)
                                 updated_count += 1
                                 logger.info(f"Updated furniture price for {mapping.furniture.name}: {price}")
                         else:
@@ -554,8 +659,9 @@ class GoogleSheetsPriceUpdater:
                                 'error': f'Не вдалося розібрати ціну: {price_str}',
                             })
                             continue
+                        before = self.history.snapshot(mapping.furniture)
                         mapping.furniture.price = price
-                        mapping.furniture.save()
+                        self.history.save(mapping.furniture, before)
                         updated_count += 1
                         continue
 
@@ -580,12 +686,68 @@ class GoogleSheetsPriceUpdater:
                             'error': f'Не вдалося розібрати ціну: {price_str}',
                         })
                         continue
+                    before = self.history.snapshot(variant)
                     variant.price = price
-                    variant.save()
+                    self.history.save(variant, before)
                     updated_count += 1
 
         return updated_count, processed_count
 
+    def _state_fingerprint(self) -> str:
+        """Fingerprint of everything besides the sheet body that affects a run."""
+        mapping_stats = [
+            model.objects.filter(config=self.config).aggregate(total=Count('id'), last=Max('updated_at'))
+            for model in (FurniturePriceCellMapping, FurnitureModelPriceMapping)
+        ]
+        furniture_stats = Furniture.objects.aggregate(total=Count('id'), last=Max('updated_at'))
+        parts = [
+            self.config.sheet_id or '',
+            self.config.sheet_name or '',
+            self.config.sheet_gid or '',
+            self.config.xlsx_file.name if self.config.xlsx_file else '',
+            self.config.parsing_mode,
+            # A freshly created config may still hold the float default.
+            str(Decimal(str(self.config.price_multiplier or 1)).normalize()),
+            _variant_prices_digest(),
+        ]
+        for stats in mapping_stats + [furniture_stats]:
+            last = stats['last']
+            parts.append(str(stats['total']))
+            parts.append(last.isoformat() if last else '')
+        return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def _store_sheet_state(self) -> None:
+        """Remember what this completed run saw so the next run can skip it.
+
+        The catalog fingerprint is taken after the run: prices written just now
+        bump ``Furniture.updated_at`` and must not invalidate the state.
+        """
+        if not self.config.pk:
+            return
+        self.config.sheet_etag = self._response_validators.get('etag', '')
+        self.config.sheet_last_modified = self._response_validators.get('last_modified', '')
+        self.config.sheet_content_hash = self._content_hash
+        self.config.sheet_state_fingerprint = self._state_fingerprint()
+        self.config.save(update_fields=[
+            'sheet_etag',
+            'sheet_last_modified',
+            'sheet_content_hash',
+            'sheet_state_fingerprint',
+        ])
+
+    def _finish_unchanged(self, reason: str) -> Dict:
+        if self.log:
+            self.log.completed_at = timezone.now()
+            self.log.log_details = reason
+            self.log.save()
+        return {
+            'success': True,
+            'unchanged': True,
+            'updated_count': 0,
+            'processed_count': 0,
+            'message': reason,
+        }
+
     def _update_log_error(self, error_msg: str):
         """Update log with error information."""
         if self.log:
@@ -617,7 +779,12 @@ class SupplierFeedPriceUpdater:
         self.config = config
         self.log: Optional[SupplierFeedUpdateLog] = None
         self._furniture_index: Optional[Dict[str, Dict]] = None
+        self._name_ngram_index: Optional[NameIndex[Furniture]] = None
+        self.history = PriceHistoryRecorder(PriceHistory.SOURCE_SUPPLIER_FEED)
         self._variant_vendor_index: Optional[Dict[str, FurnitureSizeVariant]] = None
+        # Validators of the feed response fetched in this run; persisted only
+        # after the run completes so a failed run never suppresses the next one.
+        self._response_validators: Dict[str, str] = {}
 
     def test_parse(self) -> Dict:
         """Preview first offers without applying changes."""
@@ -643,31 +810,68 @@ class SupplierFeedPriceUpdater:
             'preview': preview,
         }
 
-    def update_prices(self) -> Dict:
+    def update_prices(self, force: bool = False, dry_run: bool = False) -> Dict:
+        """Apply feed prices to the catalog.
+
+        Unless ``force`` is set, the feed is requested conditionally and the
+        run stops early when the supplier answers 304 or the body hash matches
+        the last completed run. Offers whose digest was already applied
+        successfully are skipped as well.
+
+        With ``dry_run`` nothing is written to the catalog and the feed state
+        is left untouched; the changes are stored as a ``PriceChangeSet``.
+        """
         if not self.config.is_active:
             return {'success': False, 'error': 'Конфігурація неактивна'}
 
-        self.log = SupplierFeedUpdateLog.objects.create(
+        self.log = log = SupplierFeedUpdateLog.objects.create(
             config=self.config,
             status='success',
             started_at=timezone.now(),
         )
+        self.history = PriceHistoryRecorder(
+            PriceHistory.SOURCE_SUPPLIER_FEED,
+            run_id=f"{PriceHistory.SOURCE_SUPPLIER_FEED}-{log.pk}",
+            dry_run=dry_run,
+            label=self.config.name,
+        )
 
         try:
-            offers = self._fetch_offers()
+            state_fingerprint = self._state_fingerprint()
+            state_unchanged = not force and state_fingerprint == self.config.feed_state_fingerprint
+
+            content = self._get_feed_content(conditional=state_unchanged)
+            if content is None:
+                return self._finish_unchanged('Фід не змінився (304 Not Modified)')
+            content_hash = hashlib.sha256(content).hexdigest()
+            if state_unchanged and content_hash == self.config.feed_content_hash:
+                return self._finish_unchanged('Фід не змінився (хеш вмісту збігається)')
+
+            offers = self._parse_offers_from_content(content)
             if not offers:
                 self._finalize_log(errors=[{'error': 'Фід не містить пропозицій'}])
                 return {'success': False, 'error': 'Фід не містить пропозицій'}
 
             offers_processed = len(offers)
+            offers_unchanged = 0
             items_matched = 0
             items_updated = 0
-            errors: List[Dict[str, str]] = []
+            errors: List[Dict] = []
             # De-duplicate by (furniture.pk, size_variant.pk or None) so that
             # color-variant duplicates are skipped but different sizes are each processed.
             seen_pairs: set = set()
+            # Digests only describe offers applied against the same catalog state.
+            previous_digests = set(self.config.offer_digests or []) if state_unchanged else set()
+            applied_digests: List[str] = []
 
             for offer in offers:
+                digest = self._offer_digest(offer)
+                if digest in previous_digests:
+                    offers_unchanged += 1
+                    applied_digests.append(digest)
+                    continue
+                errors_before = len(errors)
+
                 size_str = (
                     f"{offer.size_width}×{offer.size_length}"
                     if offer.size_width is not None else None
@@ -688,6 +892,7 @@ class SupplierFeedPriceUpdater:
                     items_matched += 1
                     pair = (furniture.pk, size_variant.pk)
                     if pair in seen_pairs:
+                        applied_digests.append(digest)
                         continue
                     try:
                         changed = self._apply_offer_prices(furniture, offer, size_variant=size_variant)
@@ -704,6 +909,7 @@ class SupplierFeedPriceUpdater:
                         })
                         continue
                     seen_pairs.add(pair)
+                    applied_digests.append(digest)
                     if changed:
                         items_updated += 1
                     continue
@@ -736,6 +942,7 @@ class SupplierFeedPriceUpdater:
                         'розмір': size_str,
                         'article_info': article_hint,
                         'name_variants': name_variants,
+                        'схожі_назви': self._suggest_similar_names(offer.name),
                         'error': (
                             'Товар не знайдено в БД. '
                             f'{article_hint}. '
@@ -787,6 +994,8 @@ class SupplierFeedPriceUpdater:
 
                 pair = (furniture.pk, size_variant.pk if size_variant else None)
                 if pair in seen_pairs:
+                    if len(errors) == errors_before:
+                        applied_digests.append(digest)
                     continue
 
                 try:
@@ -804,6 +1013,8 @@ class SupplierFeedPriceUpdater:
                     continue
 
                 seen_pairs.add(pair)
+                if len(errors) == errors_before:
+                    applied_digests.append(digest)
                 if changed:
                     items_updated += 1
 
@@ -812,21 +1023,32 @@ class SupplierFeedPriceUpdater:
                 items_matched=items_matched,
                 items_updated=items_updated,
                 errors=errors,
+                offers_unchanged=offers_unchanged,
             )
 
             success = not errors or items_updated > 0
-            return {
+            result = {
                 'success': success,
                 'offers_processed': offers_processed,
+                'offers_unchanged': offers_unchanged,
                 'items_matched': items_matched,
                 'items_updated': items_updated,
                 'errors': errors,
             }
+            if dry_run:
+                log.log_details = f"Попередній перегляд (без запису)\n{log.log_details}"
+                log.save(update_fields=['log_details'])
+                result['change_set_id'] = self.history.store_change_set().pk
+            else:
+                self._store_feed_state(content_hash, applied_digests)
+            return result
 
         except Exception as exc:
             logger.exception("Supplier feed update failed for %s", self.config.name)
             self._finalize_log(errors=[{'error': str(exc)}], force_status='error')
             return {'success': False, 'error': str(exc)}
+        finally:
+            self.history.flush()
 
     # --- Internal helpers -------------------------------------------------
 
@@ -856,7 +1078,13 @@ class SupplierFeedPriceUpdater:
         content = self._get_feed_content()
         return self._parse_offers_from_content(content)
 
-    def _get_feed_content(self) -> bytes:
+    def _get_feed_content(self, conditional: bool = False) -> Optional[bytes]:
+        """Return the raw feed body, or ``None`` when the supplier answers 304.
+
+        With ``conditional`` the stored ETag/Last-Modified are sent so an
+        unchanged feed costs a single empty response.
+        """
+        self._response_validators = {}
         if self.config.fetch_mode == SupplierFeedConfig.FETCH_MODE_MANUAL:
             raw = (self.config.manual_feed_content or '').strip()
             if not raw:
@@ -867,7 +1095,11 @@ class SupplierFeedPriceUpdater:
                 )
             return raw.encode('utf-8')
 
-        session = self._build_warmed_session()
+        conditional = conditional and bool(self.config.feed_etag or self.config.feed_last_modified)
+        # A revalidation carries the cookies' worth of proof already (the
+        # validators came from an accepted request); warm up only when the
+        # supplier refuses it.
+        session = requests.Session() if conditional else self._build_warmed_session()
         parsed = urlparse(self.config.feed_url)
         homepage_url = f"{parsed.scheme}://{parsed.netloc}/"
         feed_headers = {
@@ -876,7 +1108,19 @@ class SupplierFeedPriceUpdater:
             "Accept-Language": "uk-UA,uk;q=0.9,en;q=0.8",
             "Accept-Encoding": "gzip, deflate, br",
         }
+        if conditional:
+            if self.config.feed_etag:
+                feed_headers["If-None-Match"] = self.config.feed_etag
+            if self.config.feed_last_modified:
+                feed_headers["If-Modified-Since"] = self.config.feed_last_modified
         response = session.get(self.config.feed_url, headers=feed_headers, timeout=60)
+        if conditional and response.status_code == 304:
+            return None
+        if conditional and response.status_code == 403:
+            session = self._build_warmed_session()
+            response = session.get(self.config.feed_url, headers=feed_headers, timeout=60)
+            if response.status_code == 304:
+                return None
         try:
             response.raise_for_status()
         except requests.HTTPError as exc:
@@ -895,8 +1139,90 @@ class SupplierFeedPriceUpdater:
                     f"Body (перші 500 симв.): {snippet}"
                 ) from exc
             raise
+        for header, key in (('ETag', 'etag'), ('Last-Modified', 'last_modified')):
+            value = response.headers.get(header)
+            if isinstance(value, str):
+                self._response_validators[key] = value
         return response.content
 
+    def _state_fingerprint(self) -> str:
+        """Fingerprint of everything besides the feed body that affects a run.
+
+        Parsing/matching settings and the catalog itself (new products, edited
+        article codes) change what an identical feed would produce, so any
+        change here disables the 304 / same-hash short-circuit.
+        """
+        furniture_stats = Furniture.objects.aggregate(total=Count('id'), last=Max('updated_at'))
+        parts = [
+            self.config.feed_url,
+            self.config.fetch_mode,
+            self._offer_settings_key(),
+            str(furniture_stats['total']),
+            furniture_stats['last'].isoformat() if furniture_stats['last'] else '',
+            _variant_prices_digest(),
+        ]
+        return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def _offer_settings_key(self) -> str:
+        return '|'.join(str(value) for value in (
+            self.config.article_tag_name,
+            self.config.article_prefix_parts,
+            self.config.update_size_variants,
+            self.config.size_param_name,
+            self.config.match_by_article,
+            self.config.match_by_name,
+            # A freshly created config may still hold the float default.
+            Decimal(str(self.config.price_multiplier or 1)).normalize(),
+        ))
+
+    def _offer_digest(self, offer: SupplierOffer) -> str:
+        """Stable digest of an offer together with the settings applied to it."""
+        payload = '|'.join(str(value) for value in (
+            self._offer_settings_key(),
+            offer.offer_id,
+            offer.name,
+            offer.model,
+            offer.price,
+            offer.old_price,
+            offer.size_width,
+            offer.size_length,
+        ))
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=12).hexdigest()
+
+    def _store_feed_state(self, content_hash: str, applied_digests: List[str]) -> None:
+        """Remember what this completed run saw so the next run can skip it.
+
+        The catalog fingerprint is taken after the run: prices written just now
+        bump ``Furniture.updated_at`` and must not invalidate the state.
+        """
+        self.config.feed_etag = self._response_validators.get('etag', '')
+        self.config.feed_last_modified = self._response_validators.get('last_modified', '')
+        self.config.feed_content_hash = content_hash
+        self.config.feed_state_fingerprint = self._state_fingerprint()
+        self.config.offer_digests = sorted(set(applied_digests))
+        self.config.save(update_fields=[
+            'feed_etag',
+            'feed_last_modified',
+            'feed_content_hash',
+            'feed_state_fingerprint',
+            'offer_digests',
+        ])
+
+    def _finish_unchanged(self, reason: str) -> Dict:
+        self._finalize_log()
+        if self.log:
+            self.log.log_details = reason
+            self.log.save(update_fields=['log_details'])
+        return {
+            'success': True,
+            'unchanged': True,
+            'offers_processed': 0,
+            'items_matched': 0,
+            'items_updated': 0,
+            'errors': [],
+            'message': reason,
+        }
+
     def _sanitize_xml_content(self, content: bytes) -> bytes:
         """Escape stray '&' not part of a valid XML entity/char-ref.
 
@@ -1013,20 +1339,26 @@ class SupplierFeedPriceUpdater:
         if len(candidates) == 1:
             return candidates[0]
 
-        # Fallback: partial contains search across index
+        # Fallback: partial contains search ("variant in name" or "name in variant")
+        # answered by the n-gram index instead of scanning every stored name.
         partial_candidates: List[Furniture] = []
-        name_index = index['names']
+        ngram_index = self._get_name_ngram_index()
         for variant in offer_variants:
             if not variant:
                 continue
-            for stored_name, furnitures in name_index.items():
-                if variant in stored_name or stored_name in variant:
-                    partial_candidates.extend(furnitures)
+            partial_candidates.extend(ngram_index.partial_matches(variant))
         unique_partial = self._deduplicate(partial_candidates)
         if len(unique_partial) == 1:
             return unique_partial[0]
         return None
 
+    def _suggest_similar_names(self, offer_name: str, limit: int = 3) -> List[str]:
+        """Closest catalog names for an unmatched offer (diagnostics only)."""
+        if not offer_name:
+            return []
+        query = self._normalize_name(offer_name)
+        return [key for key, _ in self._get_name_ngram_index().search(query, limit=limit)]
+
     def _collect_name_matches(self, offer_variants: List[str]) -> List[Furniture]:
         index = self._get_furniture_index()['names']
         matches: List[Furniture] = []
@@ -1097,6 +1429,12 @@ class SupplierFeedPriceUpdater:
         self._furniture_index = {'article': article_index, 'names': name_index}
         return self._furniture_index
 
+    def _get_name_ngram_index(self) -> NameIndex[Furniture]:
+        """N-gram index over the ``names`` keys, built once per run."""
+        if self._name_ngram_index is None:
+            self._name_ngram_index = NameIndex.from_mapping(self._get_furniture_index()['names'])
+        return self._name_ngram_index
+
     def _get_variant_vendor_index(self) -> Dict[str, FurnitureSizeVariant]:
         """Lazy-built index: vendor_code → FurnitureSizeVariant."""
         if self._variant_vendor_index is not None:
@@ -1125,6 +1463,7 @@ class SupplierFeedPriceUpdater:
 
         updated_fields: List[str] = []
         changed = False
+        before = self.history.snapshot(furniture)
 
         if furniture.price != base_price:
             furniture.price = base_price
@@ -1145,7 +1484,7 @@ class SupplierFeedPriceUpdater:
                 changed = True
 
         if changed:
-            furniture.save(update_fields=list(dict.fromkeys(updated_fields)))
+            self.history.save(furniture, before, list(dict.fromkeys(updated_fields)))
 
         return changed
 
@@ -1157,6 +1496,7 @@ class SupplierFeedPriceUpdater:
     ) -> bool:
         updated_fields: List[str] = []
         changed = False
+        before = self.history.snapshot(variant)
 
         if variant.price != base_price:
             variant.price = base_price
@@ -1177,7 +1517,7 @@ class SupplierFeedPriceUpdater:
                 changed = True
 
         if changed:
-            variant.save(update_fields=list(dict.fromkeys(updated_fields)))
+            self.history.save(variant, before, list(dict.fromkeys(updated_fields)))
 
         return changed
 
@@ -1207,6 +1547,7 @@ class SupplierFeedPriceUpdater:
         items_updated: int = 0,
         errors: Optional[List[Dict]] = None,
         force_status: Optional[str] = None,
+        offers_unchanged: int = 0,
     ) -> None:
         if not self.log:
             return
@@ -1242,6 +1583,7 @@ class SupplierFeedPriceUpdater:
 
         self.log.log_details = (
             f"Оброблено оферів: {offers_processed}\n"
+            f"Без змін з минулого запуску: {offers_unchanged}\n"
             f"Збігів знайдено: {items_matched}\n"
             f"Цін оновлено: {items_updated}\n"
             f"Помилок: {len(errors)}"
@@ -1256,6 +1598,7 @@ class SupplierWebPriceUpdater:
     def __init__(self, config: SupplierWebConfig):
         self.config = config
         self.log: Optional[SupplierWebUpdateLog] = None
+        self.history = PriceHistoryRecorder(PriceHistory.SOURCE_SUPPLIER_WEB)
         self._session = requests.Session()
         self._session.headers.update(
             {
@@ -1264,8 +1607,21 @@ class SupplierWebPriceUpdater:
             }
         )
         self._sitemap_urls_cache: Optional[List[str]] = None
+        self._sitemap_lastmods: Dict[str, str] = {}
+        self._http_cache = HttpCache.from_settings()
+        self._browser_pool: Optional[BrowserPool] = None
         self._page_cache: Dict[str, str] = {}
+        # Normalized page text and verification verdicts, shared by every
+        # furniture item that lands on the same candidate page.
+        self._page_text_cache: Dict[str, str] = {}
+        self._page_related_cache: Dict[Tuple[str, str, str], bool] = {}
+        self._url_index: Optional[NameIndex[Tuple[int, str]]] = None
+        self._url_index_source: Optional[List[str]] = None
         self._domain = urlparse(self.config.base_url).netloc.lower()
+        self._progress_callback: Optional[Callable[[str], None]] = None
+
+    def set_progress_callback(self, callback: Callable[[str], None]) -> None:
+        self._progress_callback = callback
 
     def _progress(self, message: str) -> None:
         """Emit progress to both logger and stdout for long-running manual runs."""
@@ -1273,6 +1629,14 @@ class SupplierWebPriceUpdater:
         text = f"{prefix} {message}"
         logger.info(text)
         print(text, flush=True)
+        if self._progress_callback:
+            self._progress_callback(message)
+
+    def _http_get(self, url: str, timeout: int) -> Any:
+        """GET through the shared disk cache, revalidating stale entries."""
+        if self._http_cache is None:
+            return self._session.get(url, timeout=timeout)
+        return self._http_cache.get(self._session.get, url, timeout=timeout)
 
     def _run_db_with_retry(self, func, label: str = "db operation"):
         """Run DB operation with one reconnect+retry on dropped connection."""
@@ -1293,20 +1657,23 @@ class SupplierWebPriceUpdater:
             return {"success": False, "error": str(exc)}
 
         preview: List[Dict[str, str]] = []
-        for url in urls[:5]:
-            try:
-                html = self._fetch_page_content(url)
-                base_price, promo_price = self._extract_prices(html)
-            except Exception:
-                base_price = None
-                promo_price = None
-            preview.append(
-                {
-                    "url": url,
-                    "base_price": str(base_price) if base_price is not None else "",
-                    "promo_price": str(promo_price) if promo_price is not None else "",
-                }
-            )
+        try:
+            for url in urls[:5]:
+                try:
+                    html = self._fetch_page_content(url)
+                    base_price, promo_price = self._extract_prices(html)
+                except Exception:
+                    base_price = None
+                    promo_price = None
+                preview.append(
+                    {
+                        "url": url,
+                        "base_price": str(base_price) if base_price is not None else "",
+                        "promo_price": str(promo_price) if promo_price is not None else "",
+                    }
+                )
+        finally:
+            self._close_browser_pool()
 
         return {
             "success": True,
@@ -1314,12 +1681,19 @@ class SupplierWebPriceUpdater:
             "preview": preview,
         }
 
-    def update_prices(self) -> Dict:
+    def update_prices(self, dry_run: bool = False, force: bool = False) -> Dict:
+        """Scrape supplier pages and apply prices.
+
+        With ``dry_run`` nothing is written to the catalog; the changes are
+        stored as a ``PriceChangeSet`` for review instead. Products whose
+        page kept the same sitemap ``lastmod`` since the last run are skipped
+        unless ``force`` is set or the page is due for its periodic re-scrape.
+        """
         if not self.config.is_active:
             return {"success": False, "error": "Конфігурація неактивна"}
 
         self._progress("Start update_prices")
-        self.log = self._run_db_with_retry(
+        self.log = log = self._run_db_with_retry(
             lambda: SupplierWebUpdateLog.objects.create(
                 config=self.config,
                 status="success",
@@ -1327,10 +1701,26 @@ class SupplierWebPriceUpdater:
             ),
             label="create web update log",
         )
+        self.history = PriceHistoryRecorder(
+            PriceHistory.SOURCE_SUPPLIER_WEB,
+            run_id=f"{PriceHistory.SOURCE_SUPPLIER_WEB}-{log.pk}",
+            dry_run=dry_run,
+            label=self.config.name,
+        )
 
         try:
             candidates = self._collect_candidate_urls()
             self._progress(f"Collected candidate URLs: {len(candidates)}")
+            candidate_set = set(candidates)
+            crawl_state = CrawlStateStore(f"supplier_web:{self.config.pk}", force=force)
+            previous_urls: Dict[int, str] = self._run_db_with_retry(
+                lambda: {
+                    furniture_id: url
+                    for url, state in crawl_state.states.items()
+                    for furniture_id in (state.payload or {}).get("furniture_ids", [])
+                },
+                label="load crawl state",
+            )
             furnitures_qs = Furniture.objects.all()
             close_old_connections()
             selected_categories = self.config.target_categories.all()
@@ -1357,11 +1747,19 @@ class SupplierWebPriceUpdater:
             items_processed = len(furnitures)
             items_matched = 0
             items_updated = 0
+            items_unchanged = 0
             errors: List[Dict[str, str]] = []
 
             for index, furniture in enumerate(furnitures, start=1):
                 close_old_connections()
                 self._progress(f"[{index}/{items_processed}] Processing: {furniture.name} ({furniture.article_code})")
+                previous_url = previous_urls.get(furniture.id)
+                if previous_url in candidate_set and crawl_state.is_unchanged(
+                    previous_url, lastmod=self._sitemap_lastmods.get(previous_url, "")
+                ):
+                    items_unchanged += 1
+                    self._progress(f"[{index}/{items_processed}] Page unchanged since last run, skipped")
+                    continue
                 try:
                     matched_url = self._find_best_url_for_furniture(furniture, candidates)
                 except Exception as exc:
@@ -1400,6 +1798,7 @@ class SupplierWebPriceUpdater:
                         f"[{index}/{items_processed}] Parsed prices -> base: {base_price}, promo: {promo_price}"
                     )
                     changed = self._apply_prices(furniture, base_price, promo_price)
+                    self._remember_page(crawl_state, furniture, matched_url, previous_url, base_price, promo_price)
                     if changed:
                         items_updated += 1
                         self._progress(f"[{index}/{items_processed}] DB updated")
@@ -1416,30 +1815,77 @@ class SupplierWebPriceUpdater:
                         }
                     )
 
+            if not dry_run:
+                self._run_db_with_retry(crawl_state.flush, label="store crawl state")
             self._finalize_web_log(
                 items_processed=items_processed,
                 items_matched=items_matched,
                 items_updated=items_updated,
+                items_unchanged=items_unchanged,
                 errors=errors,
             )
             self._progress(
                 f"Finished update_prices: processed={items_processed}, matched={items_matched}, "
-                f"updated={items_updated}, errors={len(errors)}"
+                f"updated={items_updated}, unchanged={items_unchanged}, errors={len(errors)}"
             )
 
             success = not errors or items_updated > 0
-            return {
+            result = {
                 "success": success,
                 "items_processed": items_processed,
                 "items_matched": items_matched,
                 "items_updated": items_updated,
+                "items_unchanged": items_unchanged,
                 "errors": errors,
             }
+            if dry_run:
+                log.log_details = f"Попередній перегляд (без запису)\n{log.log_details}"
+                self._run_db_with_retry(
+                    lambda: log.save(update_fields=["log_details"]),
+                    label="mark web log as preview",
+                )
+                result["change_set_id"] = self._run_db_with_retry(
+                    self.history.store_change_set,
+                    label="store change set",
+                ).pk
+            return result
         except Exception as exc:
             logger.exception("Supplier web update failed for %s", self.config.name)
             self._progress(f"Fatal error: {exc}")
             self._finalize_web_log(errors=[{"error": str(exc)}], force_status="error")
             return {"success": False, "error": str(exc)}
+        finally:
+            self.history.flush()
+            self._close_browser_pool()
+
+    def _remember_page(
+        self,
+        crawl_state: CrawlStateStore,
+        furniture: Furniture,
+        url: str,
+        previous_url: Optional[str],
+        base_price: Decimal,
+        promo_price: Optional[Decimal],
+    ) -> None:
+        """Record the furniture ↔ page match with the page's current lastmod."""
+        if previous_url and previous_url != url:
+            stale = crawl_state.payload(previous_url)
+            stale_ids = [fid for fid in stale.get("furniture_ids", []) if fid != furniture.id]
+            crawl_state.mark(
+                previous_url,
+                lastmod=crawl_state.states[previous_url].lastmod,
+                content_hash=crawl_state.states[previous_url].content_hash,
+                payload={**stale, "furniture_ids": stale_ids},
+            )
+        payload = crawl_state.payload(url)
+        furniture_ids = set(payload.get("furniture_ids", []))
+        furniture_ids.add(furniture.id)
+        crawl_state.mark(
+            url,
+            lastmod=self._sitemap_lastmods.get(url, ""),
+            content_hash=fingerprint(base_price, promo_price),
+            payload={**payload, "furniture_ids": sorted(furniture_ids)},
+        )
 
     def _collect_candidate_urls(self) -> List[str]:
         if self._sitemap_urls_cache is not None:
@@ -1483,23 +1929,24 @@ class SupplierWebPriceUpdater:
         else:
             self._progress(f"Sitemaps discovered: {len(sitemaps)}")
 
+        reader = SitemapReader(
+            self._open_sitemap_stream,
+            max_urls=self.config.max_urls_to_scan,
+            workers=getattr(settings, "SUPPLIER_CRAWL_WORKERS", 4),
+        )
         urls: List[str] = []
-        for sitemap_url in sitemaps:
-            try:
-                self._progress(f"Parse sitemap: {sitemap_url}")
-                urls.extend(self._parse_sitemap_recursive(sitemap_url))
-            except Exception:
-                logger.warning("Failed to parse sitemap %s", sitemap_url, exc_info=True)
-            if len(urls) >= self.config.max_urls_to_scan:
-                break
-        self._progress(f"URLs collected from sitemaps: {len(urls[: self.config.max_urls_to_scan])}")
-        return urls[: self.config.max_urls_to_scan]
+        for loc, lastmod in reader.read(sitemaps):
+            urls.append(loc)
+            if lastmod:
+                self._sitemap_lastmods[loc.split("#")[0]] = lastmod
+        self._progress(f"URLs collected from sitemaps: {len(urls)}")
+        return urls
 
     def _extract_sitemaps_from_robots(self, robots_url: str) -> List[str]:
         timeout = max(5, int(self.config.request_timeout))
         sitemaps: List[str] = []
         try:
-            response = self._session.get(robots_url, timeout=timeout)
+            response = self._http_get(robots_url, timeout=timeout)
             if response.status_code >= 400:
                 return []
             for line in response.text.splitlines():
@@ -1511,45 +1958,60 @@ class SupplierWebPriceUpdater:
             return []
         return sitemaps
 
-    def _parse_sitemap_recursive(self, sitemap_url: str) -> List[str]:
+    @contextmanager
+    def _open_sitemap_stream(self, sitemap_url: str) -> Iterator[BinaryIO]:
+        """Stream a sitemap body; the reader decompresses .xml.gz on the fly."""
         timeout = max(5, int(self.config.request_timeout))
-        response = self._session.get(sitemap_url, timeout=timeout)
-        response.raise_for_status()
-        root = ET.fromstring(response.content)
-        ns = {"sm": "http://www.sitemaps.org/schemas/sitemap/0.9"}
-
-        if root.tag.endswith("sitemapindex"):
-            urls: List[str] = []
-            for sitemap_el in root.findall("sm:sitemap", ns):
-                loc = sitemap_el.findtext("sm:loc", default="", namespaces=ns).strip()
-                if not loc:
-                    continue
-                urls.extend(self._parse_sitemap_recursive(loc))
-                if len(urls) >= self.config.max_urls_to_scan:
-                    break
-            return urls
-
-        urls = []
-        for url_el in root.findall("sm:url", ns):
-            loc = url_el.findtext("sm:loc", default="", namespaces=ns).strip()
-            if loc:
-                urls.append(loc)
-            if len(urls) >= self.config.max_urls_to_scan:
-                break
-        return urls
+        response = self._session.get(sitemap_url, timeout=timeout, stream=True)
+        try:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            yield response.raw
+        finally:
+            response.close()
+
+    def _get_url_index(self, urls: List[str]) -> NameIndex[Tuple[int, str]]:
+        """Normalize candidate URLs once and index them by n-grams.
+
+        Items keep the candidate position so lookups can return URLs in the
+        original sitemap order.
+        """
+        if self._url_index is None or self._url_index_source is not urls:
+            index: NameIndex[Tuple[int, str]] = NameIndex()
+            for position, url in enumerate(urls):
+                index.add(self._normalize_text(url), (position, url))
+            self._url_index = index
+            self._url_index_source = urls
+        return self._url_index
+
+    def _urls_matching_name(self, index: NameIndex[Tuple[int, str]], name_norm: str) -> List[Tuple[int, str]]:
+        """Index-backed equivalent of ``_name_matches_in_url`` over all candidates."""
+        if not name_norm:
+            return []
+        keys = set(index.keys_containing(name_norm))
+        name_parts = [part for part in name_norm.split(" ") if len(part) >= 4]
+        if name_parts:
+            required = min(2, len(name_parts))
+            hits: Dict[str, int] = {}
+            for part in name_parts:
+                for key in index.keys_containing(part):
+                    hits[key] = hits.get(key, 0) + 1
+            keys.update(key for key, count in hits.items() if count >= required)
+        return [item for key in keys for item in index.get(key)]
 
     def _find_best_url_for_furniture(self, furniture: Furniture, urls: List[str]) -> Optional[str]:
         article = self._normalize_text(furniture.article_code)
         name = self._normalize_text(furniture.name)
+        index = self._get_url_index(urls)
 
         article_matches: List[str] = []
         name_matches: List[str] = []
-        for url in urls:
-            norm_url = self._normalize_text(url)
-            if self.config.match_by_article and article and article in norm_url:
-                article_matches.append(url)
-            if self.config.match_by_name and name and self._name_matches_in_url(name, norm_url):
-                name_matches.append(url)
+        if self.config.match_by_article and article:
+            article_matches = [
+                url for _, url in sorted(item for key in index.keys_containing(article) for item in index.get(key))
+            ]
+        if self.config.match_by_name and name:
+            name_matches = [url for _, url in sorted(self._urls_matching_name(index, name))]
 
         for candidate in article_matches[:10]:
             if self._page_seems_related(candidate, furniture):
@@ -1619,19 +2081,27 @@ class SupplierWebPriceUpdater:
         return None
 
     def _page_seems_related(self, url: str, furniture: Furniture) -> bool:
-        try:
-            html = self._fetch_page_content(url)
-        except Exception:
-            return False
+        article_norm = self._normalize_text(furniture.article_code) if self.config.match_by_article else ""
+        name_norm = self._normalize_text(furniture.name) if self.config.match_by_name else ""
+        cache_key = (url, article_norm, name_norm)
+        if cache_key in self._page_related_cache:
+            return self._page_related_cache[cache_key]
+
+        text_norm = self._page_text_cache.get(url)
+        if text_norm is None:
+            try:
+                html = self._fetch_page_content(url)
+            except Exception:
+                return False
+            text_norm = self._normalize_text(html)
+            self._page_text_cache[url] = text_norm
 
-        text_norm = self._normalize_text(html)
-        if self.config.match_by_article and furniture.article_code:
-            if self._normalize_text(furniture.article_code) in text_norm:
-                return True
-        if self.config.match_by_name and furniture.name:
-            if self._name_matches_in_url(self._normalize_text(furniture.name), text_norm):
-                return True
-        return False
+        related = bool(
+            (article_norm and article_norm in text_norm)
+            or (name_norm and self._name_matches_in_url(name_norm, text_norm))
+        )
+        self._page_related_cache[cache_key] = related
+        return related
 
     def _fetch_page_content(self, url: str) -> str:
         if url in self._page_cache:
@@ -1639,6 +2109,11 @@ class SupplierWebPriceUpdater:
 
         timeout = max(5, int(self.config.request_timeout))
         if self.config.use_selenium:
+            if self.config.selenium_http_first:
+                html = self._fetch_if_server_rendered(url, timeout)
+                if html is not None:
+                    self._page_cache[url] = html
+                    return html
             try:
                 html = self._fetch_with_selenium(url)
                 self._page_cache[url] = html
@@ -1646,12 +2121,46 @@ class SupplierWebPriceUpdater:
             except Exception:
                 logger.warning("Selenium fetch failed for %s, fallback to requests", url, exc_info=True)
 
-        response = self._session.get(url, timeout=timeout)
+        response = self._http_get(url, timeout=timeout)
         response.raise_for_status()
         self._page_cache[url] = response.text
         return response.text
 
+    def _fetch_if_server_rendered(self, url: str, timeout: int) -> Optional[str]:
+        """Plain HTTP fetch, kept only if the price block is already in the HTML."""
+        try:
+            response = self._http_get(url, timeout=timeout)
+            if response.status_code >= 400:
+                return None
+            html = response.text
+        except Exception:
+            return None
+        selector = (self.config.price_block_selector or "").strip() or "div.price.hp_price"
+        soup = BeautifulSoup(html, "html.parser")
+        if soup.select_one(selector) or soup.select_one(".autocalc-product-price"):
+            return html
+        return None
+
     def _fetch_with_selenium(self, url: str) -> str:
+        with self._get_browser_pool().driver() as driver:
+            driver.get(url)
+            return driver.page_source
+
+    def _get_browser_pool(self) -> BrowserPool:
+        if self._browser_pool is None:
+            self._browser_pool = BrowserPool(
+                self._build_chrome_driver,
+                size=getattr(settings, "SUPPLIER_BROWSER_POOL_SIZE", 2),
+                max_pages=getattr(settings, "SUPPLIER_BROWSER_MAX_PAGES", 50),
+            )
+        return self._browser_pool
+
+    def _close_browser_pool(self) -> None:
+        if self._browser_pool is not None:
+            self._browser_pool.close()
+            self._browser_pool = None
+
+    def _build_chrome_driver(self) -> Any:
         try:
             from selenium import webdriver
             from selenium.webdriver.chrome.options import Options
@@ -1667,13 +2176,9 @@ class SupplierWebPriceUpdater:
         options.add_argument("--window-size=1400,1200")
 
         driver = webdriver.Chrome(options=options)
-        try:
-            driver.get(url)
-            wait_seconds = max(1, int(self.config.selenium_wait_seconds))
-            driver.implicitly_wait(wait_seconds)
-            return driver.page_source
-        finally:
-            driver.quit()
+        driver.implicitly_wait(max(1, int(self.config.selenium_wait_seconds)))
+        driver.set_page_load_timeout(max(5, int(self.config.request_timeout)) + int(self.config.selenium_wait_seconds))
+        return driver
 
     def _extract_prices(self, html: str) -> Tuple[Optional[Decimal], Optional[Decimal]]:
         soup = BeautifulSoup(html, "html.parser")
@@ -1732,6 +2237,7 @@ class SupplierWebPriceUpdater:
     def _apply_prices(self, furniture: Furniture, base_price: Decimal, promo_price: Optional[Decimal]) -> bool:
         changed = False
         updated_fields: List[str] = []
+        before = self.history.snapshot(furniture)
 
         if furniture.price != base_price:
             furniture.price = base_price
@@ -1759,7 +2265,7 @@ class SupplierWebPriceUpdater:
 
         if changed:
             self._run_db_with_retry(
-                lambda: furniture.save(update_fields=list(dict.fromkeys(updated_fields))),
+                lambda: self.history.save(furniture, before, list(dict.fromkeys(updated_fields))),
                 label=f"save furniture {furniture.id}",
             )
         return changed
@@ -1805,6 +2311,7 @@ class SupplierWebPriceUpdater:
         items_processed: int = 0,
         items_matched: int = 0,
         items_updated: int = 0,
+        items_unchanged: int = 0,
         errors: Optional[List[Dict]] = None,
         force_status: Optional[str] = None,
     ) -> None:
@@ -1821,7 +2328,7 @@ class SupplierWebPriceUpdater:
         self.log.completed_at = timezone.now()
         self.log.log_details = (
             f"Перевірено: {items_processed}, знайдено: {items_matched}, "
-            f"оновлено: {items_updated}, помилок: {len(errors)}"
+            f"оновлено: {items_updated}, без змін на сайті: {items_unchanged}, помилок: {len(errors)}"
         )
         try:
             self._run_db_with_retry(self.log.save, label="finalize web update log")
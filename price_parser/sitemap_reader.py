@@ -0,0 +1,133 @@
+"""Streaming sitemap reader.
+
+Supplier sitemaps can be tens of megabytes (often ``.xml.gz``) and nested
+under several sitemap indexes. ``SitemapReader`` never holds a document in
+memory: each response is decompressed on the fly, ``<url>``/``<sitemap>``
+entries are picked up with ``iterparse`` and discarded right away, child
+sitemaps of an index are fetched concurrently, and everything stops as soon
+as ``max_urls`` page URLs have been collected.
+"""
+
+import gzip
+import io
+import logging
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    BinaryIO,
+    Callable,
+    ContextManager,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
+
+logger = logging.getLogger(__name__)
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+SitemapEntry = Tuple[str, str]  # (loc, lastmod)
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def open_decompressed(stream: BinaryIO) -> Union[BinaryIO, gzip.GzipFile]:
+    """Wrap ``stream`` in a gzip decoder when it starts with the gzip magic."""
+    buffered = (
+        stream
+        if hasattr(stream, "peek")
+        else io.BufferedReader(cast(io.RawIOBase, stream))
+    )
+    if buffered.peek(2)[:2] == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=buffered)
+    return buffered
+
+
+def iter_sitemap_entries(stream: BinaryIO) -> Iterator[Tuple[str, str, str]]:
+    """Yield ``(kind, loc, lastmod)``; ``kind`` is ``"url"`` or ``"sitemap"``."""
+    root: Optional[ET.Element] = None
+    for event, elem in ET.iterparse(open_decompressed(stream), events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            continue
+        kind = _local_name(elem.tag)
+        if kind not in ("url", "sitemap"):
+            continue
+        loc = lastmod = ""
+        for child in elem:
+            name = _local_name(child.tag)
+            if name == "loc":
+                loc = (child.text or "").strip()
+            elif name == "lastmod":
+                lastmod = (child.text or "").strip()
+        # Drop parsed entries so memory stays flat on huge documents.
+        if root is not None:
+            root.clear()
+        if loc:
+            yield kind, loc, lastmod
+
+
+class SitemapReader:
+    """Collects page URLs from sitemaps and sitemap indexes, breadth first."""
+
+    def __init__(
+        self,
+        open_stream: Callable[[str], ContextManager[BinaryIO]],
+        max_urls: int,
+        workers: int = 4,
+    ):
+        self._open_stream = open_stream
+        self.max_urls = max_urls
+        self.workers = max(1, workers)
+        self._stop = threading.Event()
+
+    def read(self, sitemap_urls: List[str]) -> List[SitemapEntry]:
+        entries: List[SitemapEntry] = []
+        seen = set(sitemap_urls)
+        pending = list(sitemap_urls)
+        self._stop.clear()
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="sitemap"
+        ) as executor:
+            while pending and len(entries) < self.max_urls:
+                batch, pending = pending, []
+                for page_entries, children in executor.map(self._read_one, batch):
+                    for entry in page_entries:
+                        if len(entries) >= self.max_urls:
+                            break
+                        entries.append(entry)
+                    if len(entries) >= self.max_urls:
+                        # Let documents still streaming in other workers bail out.
+                        self._stop.set()
+                        break
+                    for child in children:
+                        if child not in seen:
+                            seen.add(child)
+                            pending.append(child)
+        return entries
+
+    def _read_one(self, url: str) -> Tuple[List[SitemapEntry], List[str]]:
+        entries: List[SitemapEntry] = []
+        children: List[str] = []
+        if self._stop.is_set():
+            return entries, children
+        try:
+            with self._open_stream(url) as stream:
+                for kind, loc, lastmod in iter_sitemap_entries(stream):
+                    if kind == "sitemap":
+                        children.append(loc)
+                        continue
+                    entries.append((loc, lastmod))
+                    if len(entries) >= self.max_urls or self._stop.is_set():
+                        break
+        except Exception:
+            # Keep whatever was parsed before a broken/truncated document.
+            logger.warning("Failed to read sitemap %s", url, exc_info=True)
+        return entries, children
@@ -0,0 +1,356 @@
+"""Content-addressed, de-duplicated store for supplier product photos.
+
+Importers used to cache each photo under the SHA-1 of its *URL*, one
+download at a time. The same photo reached through another URL (a CDN size,
+a query string, another catalog page) was downloaded, stored and turned into
+responsive variants again. ``SupplierImageStore`` instead:
+
+* resolves URLs seen before from ``SupplierImageUrl`` without any request;
+* downloads the rest on a bounded thread pool (``SUPPLIER_IMAGE_WORKERS``;
+  scraper sessions are ``CrawlSession``s, so the per-host rate limit holds);
+* stores each distinct photo once under ``<prefix>/<sha256[:2]>/<sha256>.<ext>``
+  (``SupplierImage``);
+* optionally (``SUPPLIER_IMAGE_PHASH_DISTANCE`` > 0, off by default) treats
+  photos whose 64-bit difference hash differs in at most that many bits and
+  whose mean colours match as the same photo and reuses the stored one,
+  unless the new copy is larger. The hash is grayscale, so the colour check
+  keeps colourways of one product apart; callers that need the exact photo
+  (colour variants) pass ``similar=False``.
+
+Each downloaded file is handled in memory from start to finish: the worker
+that uploads a new photo also validates it, reads its size and placeholder
+and encodes its responsive variants from the same bytes
+(``SUPPLIER_IMAGE_VARIANTS``). Stored keys never change content, so the
+variant job scheduled when a product is saved with one finds them in the
+manifest (``IMAGE_VARIANT_IMMUTABLE_PREFIXES``) and never reads the original
+back from storage.
+
+Database work stays in the calling thread; workers only download, hash,
+encode and upload.
+"""
+
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from io import BytesIO
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage, default_storage
+from django.db.models import Q
+from PIL import Image
+
+from utils.image_variants import (
+    GeneratedVariant,
+    Placeholder,
+    generate_variants_from_bytes,
+    record_generated,
+)
+
+if TYPE_CHECKING:
+    from .models import SupplierImage
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "GIF": ".gif"}
+BANDS = 4
+# Largest per-channel difference of mean colours of two copies of one photo.
+COLOR_TOLERANCE = 12
+
+
+@dataclass
+class ImageInfo:
+    sha256: str
+    data: bytes
+    ext: str
+    width: int
+    height: int
+    phash: int
+    mean_color: str = ""
+    key: str = ""
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+
+def dhash(img: Image.Image, size: int = 8) -> int:
+    """64-bit difference hash: brighter-than-right-neighbour bits of a 9x8 thumbnail."""
+    # RGB, not L: mean_color() reads the same reduced decode afterwards.
+    img.draft("RGB", (size * 4, size * 4))
+    gray = img.convert("L").resize((size + 1, size), Image.Resampling.BOX)
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def phash_bands(value: int) -> List[int]:
+    return [(value >> (16 * (BANDS - 1 - index))) & 0xFFFF for index in range(BANDS)]
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def mean_color(img: Image.Image) -> str:
+    pixel = img.convert("RGB").resize((1, 1), Image.Resampling.BOX).getpixel((0, 0))
+    red, green, blue = cast(Tuple[int, int, int], pixel)
+    return f"#{red:02x}{green:02x}{blue:02x}"
+
+
+def colors_match(a: str, b: str) -> bool:
+    if not a or not b:
+        return False
+    return all(
+        abs(int(a[i : i + 2], 16) - int(b[i : i + 2], 16)) <= COLOR_TOLERANCE
+        for i in (1, 3, 5)
+    )
+
+
+def inspect_image(data: bytes) -> Optional[ImageInfo]:
+    """Validate downloaded bytes and hash them; None when they are not a usable image."""
+    try:
+        with Image.open(BytesIO(data)) as img:
+            img.verify()
+        with Image.open(BytesIO(data)) as img:
+            ext = EXTENSIONS.get(img.format or "")
+            if ext is None:
+                return None
+            width, height = img.size
+            value = dhash(img)
+            color = mean_color(img)
+    except Exception:
+        return None
+    return ImageInfo(
+        sha256=hashlib.sha256(data).hexdigest(),
+        data=data,
+        ext=ext,
+        width=width,
+        height=height,
+        phash=value,
+        mean_color=color,
+    )
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def content_key(info: ImageInfo) -> str:
+    prefix = getattr(settings, "SUPPLIER_IMAGE_PREFIX", "supplier_cache/content").strip(
+        "/"
+    )
+    return f"{prefix}/{info.sha256[:2]}/{info.sha256}{info.ext}"
+
+
+class SupplierImageStore:
+    def __init__(
+        self,
+        get: Callable,
+        workers: Optional[int] = None,
+        storage: Optional[Storage] = None,
+        timeout: int = 30,
+        variants: Optional[bool] = None,
+    ):
+        """``get(url, timeout=...)`` returns a response; it is called from worker threads."""
+        self._get = get
+        self.workers = max(
+            1, workers or int(getattr(settings, "SUPPLIER_IMAGE_WORKERS", 4))
+        )
+        self.storage = storage or default_storage
+        self.timeout = timeout
+        self.max_distance = int(getattr(settings, "SUPPLIER_IMAGE_PHASH_DISTANCE", 0))
+        self.variants = (
+            bool(getattr(settings, "SUPPLIER_IMAGE_VARIANTS", True))
+            if variants is None
+            else variants
+        )
+
+    # ── Worker side ──────────────────────────────────────────────────────────
+
+    def _download(self, url: str) -> Optional[ImageInfo]:
+        try:
+            resp = self._get(url, timeout=self.timeout)
+            resp.raise_for_status()
+        except Exception as exc:
+            logger.warning("Image download failed %s: %s", url, exc)
+            return None
+        info = inspect_image(resp.content)
+        if info is None:
+            logger.warning("Пропущено некоректне зображення %s", url)
+        return info
+
+    def _upload(
+        self, info: ImageInfo
+    ) -> Optional[Tuple[List[GeneratedVariant], Optional[Placeholder]]]:
+        """Upload a new photo and, unless it was already stored, its variants."""
+        if self.storage.exists(info.key):
+            return None
+        self.storage.save(info.key, ContentFile(info.data))
+        if not self.variants:
+            return None
+        try:
+            return generate_variants_from_bytes(
+                info.key, info.data, storage=self.storage
+            )
+        except Exception:
+            # The variant job scheduled on save will retry from storage.
+            logger.exception("Failed to generate variants of %s", info.key)
+            return None
+
+    # ── Lookup ───────────────────────────────────────────────────────────────
+
+    def _near_duplicate(
+        self, info: ImageInfo, batch: List[ImageInfo]
+    ) -> Union["SupplierImage", ImageInfo, None]:
+        """Closest stored (or just downloaded) photo of the same colour within ``max_distance`` bits."""
+        from .models import SupplierImage
+
+        best: Union[SupplierImage, ImageInfo, None] = None
+        best_distance = self.max_distance + 1
+        bands = phash_bands(info.phash)
+        # With at most BANDS - 1 differing bits, one 16-bit band matches exactly.
+        condition = Q()
+        for index, band in enumerate(bands):
+            condition |= Q(**{f"phash_band{index}": band})
+        rows = SupplierImage.objects.filter(condition).only(
+            "key", "phash", "mean_color", "width", "height"
+        )
+        for row in rows:
+            if not colors_match(info.mean_color, row.mean_color):
+                continue
+            distance = hamming(info.phash, int(row.phash, 16))
+            if distance < best_distance:
+                best, best_distance = row, distance
+        for other in batch:
+            if not colors_match(info.mean_color, other.mean_color):
+                continue
+            distance = hamming(info.phash, other.phash)
+            if distance < best_distance:
+                best, best_distance = other, distance
+        return best
+
+    def fetch(self, url: str, similar: bool = True) -> Optional[str]:
+        return self.fetch_many([url], similar=similar).get(url)
+
+    def fetch_many(
+        self, urls: Iterable[str], similar: bool = True
+    ) -> Dict[str, Optional[str]]:
+        """
+        Storage key for every URL (None when it could not be downloaded).
+
+        With ``similar=False`` only byte-identical photos are shared, never a
+        near-duplicate; use it where the exact photo matters (colour variants).
+        """
+        from .models import SupplierImage, SupplierImageUrl
+
+        urls = list(dict.fromkeys(url for url in urls if url))
+        result: Dict[str, Optional[str]] = {url: None for url in urls}
+        hashes = {url_hash(url): url for url in urls}
+        known = SupplierImageUrl.objects.filter(url_hash__in=list(hashes))
+        if not similar:
+            known = known.filter(similar=False)
+        for hashed, key in known.values_list("url_hash", "image__key"):
+            result[hashes[hashed]] = key
+        missing = [url for url in urls if result[url] is None]
+        if not missing:
+            return result
+
+        new: Dict[str, ImageInfo] = {}  # sha256 -> photo to upload
+        links: Dict[str, Union[SupplierImage, ImageInfo]] = {}
+        near_urls = set()
+        with ThreadPoolExecutor(
+            max_workers=min(self.workers, len(missing)),
+            thread_name_prefix="supplier-img",
+        ) as pool:
+            downloads = {pool.submit(self._download, url): url for url in missing}
+            for future in as_completed(downloads):
+                url = downloads[future]
+                info = future.result()
+                if info is None:
+                    continue
+                target = (
+                    new.get(info.sha256)
+                    or SupplierImage.objects.filter(sha256=info.sha256).first()
+                )
+                if target is None and similar and self.max_distance > 0:
+                    near = self._near_duplicate(info, list(new.values()))
+                    if near is not None and near.width * near.height >= info.pixels:
+                        target = near
+                        near_urls.add(url)
+                if target is None:
+                    info.key = content_key(info)
+                    new[info.sha256] = target = info
+                links[url] = target
+
+            uploads = {pool.submit(self._upload, info): info for info in new.values()}
+            failed = set()
+            rendered = {}
+            for upload in as_completed(uploads):
+                info = uploads[upload]
+                try:
+                    rendered[info.key] = upload.result()
+                except Exception as exc:
+                    logger.warning("Image upload failed %s: %s", info.key, exc)
+                    failed.add(info.sha256)
+
+        for key, variants in rendered.items():
+            if variants is not None:
+                record_generated(key, *variants)
+
+        rows: Dict[str, SupplierImage] = {}
+        for info in new.values():
+            if info.sha256 in failed:
+                continue
+            bands = phash_bands(info.phash)
+            rows[info.sha256], _ = SupplierImage.objects.get_or_create(
+                sha256=info.sha256,
+                defaults={
+                    "key": info.key,
+                    "phash": f"{info.phash:016x}",
+                    **{f"phash_band{index}": band for index, band in enumerate(bands)},
+                    "mean_color": info.mean_color,
+                    "width": info.width,
+                    "height": info.height,
+                    "size_bytes": len(info.data),
+                },
+            )
+
+        url_rows = []
+        for url, target in links.items():
+            image = rows.get(target.sha256) if isinstance(target, ImageInfo) else target
+            if image is None:
+                continue
+            result[url] = image.key
+            url_rows.append(
+                SupplierImageUrl(
+                    url_hash=url_hash(url),
+                    url=url[:1000],
+                    image=image,
+                    similar=url in near_urls,
+                )
+            )
+        SupplierImageUrl.objects.bulk_create(
+            url_rows,
+            update_conflicts=True,
+            unique_fields=["url_hash"],
+            update_fields=["image", "similar"],
+        )
+        return result
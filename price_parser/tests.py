@@ -1,26 +1,62 @@
 """Tests for price_parser — SupplierFeedPriceUpdater (sofa/yml7 feed)."""
 import csv
+import gzip
 import io
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
 from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import MagicMock, patch
 
 import requests
-from django.test import TestCase
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase, override_settings
+from django.utils import timezone
 
 from categories.models import Category
 from furniture.models import Furniture, FurnitureSizeVariant
 from price_parser.models import (
     FurnitureModelPriceMapping,
+    CrawlPageState,
     GoogleSheetConfig,
+    PriceChangeSet,
+    PriceHistory,
     SupplierFeedConfig,
+    SupplierFeedUpdateLog,
+    SupplierImage,
+    SupplierImageUrl,
+    SupplierWebConfig,
 )
+from price_parser.browser_pool import BrowserPool
+from price_parser.change_sets import apply_change_set
+from price_parser.crawl_engine import CrawlEngine, TokenBucket
+from price_parser.crawl_state import CrawlStateStore
+from price_parser.divanoff_scraper import (
+    PriceRow,
+    _normalise_for_match,
+    match_price_rows,
+    price_row_matcher,
+)
+from price_parser.fuzzy_match import BlockedMatcher
+from price_parser.http_cache import HttpCache
+from price_parser.name_index import NameIndex
+from price_parser.price_history import PriceHistoryRecorder, rollup_price_history
 from price_parser.services import (
     GoogleSheetsPriceUpdater,
     SupplierFeedAccessError,
     SupplierFeedPriceUpdater,
     SupplierOffer,
+    SupplierWebPriceUpdater,
 )
+from price_parser.sitemap_reader import SitemapReader, iter_sitemap_entries
+from price_parser.supplier_images import SupplierImageStore
+from shop.models import ImageMetadata, ImageVariant
+from price_parser.xlsx_reader import clear_xlsx_cache, read_xlsx_rows
 from sub_categories.models import SubCategory
+from utils.image_variants import build_variant_name, generate_variants_for_storage_key
 
 
 # ---------------------------------------------------------------------------
@@ -251,6 +287,170 @@ class TestSupplierFeedManualMode(TestCase):
             updater._fetch_offers()
 
 
+class TestSupplierFeedIncrementalUpdate(TestCase):
+    """Conditional fetch, content-hash short-circuit and per-offer digests."""
+
+    def _make_config(self, **kwargs):
+        defaults = {
+            "name": "Matroluxe — дивани",
+            "feed_url": "https://matroluxe.ua/index.php?route=extension/feed/yandex_yml7",
+            "article_tag_name": "vendorCode",
+            "fetch_mode": SupplierFeedConfig.FETCH_MODE_MANUAL,
+            "manual_feed_content": SOFA_YML_FIXTURE,
+        }
+        defaults.update(kwargs)
+        return SupplierFeedConfig.objects.create(**defaults)
+
+    def _feed_response(self, status_code=200, etag='"v1"'):
+        response = MagicMock()
+        response.status_code = status_code
+        response.content = SOFA_YML_FIXTURE.encode("utf-8")
+        response.headers = {"ETag": etag}
+        response.raise_for_status = MagicMock()
+        return response
+
+    def test_identical_feed_is_skipped(self):
+        config = self._make_config()
+        first = SupplierFeedPriceUpdater(config).update_prices()
+        self.assertNotIn("unchanged", first)
+        self.assertEqual(first["offers_processed"], 4)
+
+        config.refresh_from_db()
+        second = SupplierFeedPriceUpdater(config).update_prices()
+        self.assertTrue(second["unchanged"])
+        self.assertEqual(second["offers_processed"], 0)
+
+    def test_force_reprocesses_identical_feed(self):
+        config = self._make_config()
+        SupplierFeedPriceUpdater(config).update_prices()
+        config.refresh_from_db()
+
+        result = SupplierFeedPriceUpdater(config).update_prices(force=True)
+        self.assertNotIn("unchanged", result)
+        self.assertEqual(result["offers_processed"], 4)
+
+    def test_force_reaches_the_updater_from_a_job(self):
+        from custom_admin.progress import JobProgress
+        from custom_admin.services import get_handler
+
+        config = self._make_config()
+        SupplierFeedPriceUpdater(config).update_prices()
+        handler = get_handler("supplier_feed", "update_prices")
+
+        result = handler({"config_ids": [config.pk], "force": True}, MagicMock(spec=JobProgress))
+        self.assertEqual(result["total_configs"], 1)
+        log = SupplierFeedUpdateLog.objects.filter(config=config).latest("pk")
+        self.assertEqual(log.offers_processed, 4)
+
+    def test_settings_change_disables_short_circuit(self):
+        config = self._make_config()
+        SupplierFeedPriceUpdater(config).update_prices()
+        config.refresh_from_db()
+        config.price_multiplier = Decimal("1.2")
+        config.save()
+
+        result = SupplierFeedPriceUpdater(config).update_prices()
+        self.assertNotIn("unchanged", result)
+
+    def test_variant_price_edit_disables_short_circuit(self):
+        category = Category.objects.create(name="Дивани", slug="dyvany")
+        sub_category = SubCategory.objects.create(name="Прямі", slug="priami", category=category)
+        furniture = Furniture.objects.create(
+            name="Диван", article_code="TEST-SOFA", sub_category=sub_category, price=Decimal("0")
+        )
+        variant = FurnitureSizeVariant.objects.create(
+            furniture=furniture, width=200, length=90, height=80, price=Decimal("100")
+        )
+        config = self._make_config()
+        SupplierFeedPriceUpdater(config).update_prices()
+        config.refresh_from_db()
+        self.assertTrue(SupplierFeedPriceUpdater(config).update_prices()["unchanged"])
+
+        # Same variant count and ids, only the promo price edited in the admin.
+        FurnitureSizeVariant.objects.filter(pk=variant.pk).update(promotional_price=Decimal("90"))
+        config.refresh_from_db()
+        result = SupplierFeedPriceUpdater(config).update_prices()
+        self.assertNotIn("unchanged", result)
+
+    @patch("price_parser.services.requests.Session.get")
+    def test_not_modified_response_skips_parsing(self, mock_get):
+        config = self._make_config(fetch_mode=SupplierFeedConfig.FETCH_MODE_URL)
+        mock_get.side_effect = [MagicMock(), self._feed_response()]
+        SupplierFeedPriceUpdater(config).update_prices()
+        config.refresh_from_db()
+        self.assertEqual(config.feed_etag, '"v1"')
+
+        mock_get.reset_mock()
+        mock_get.side_effect = [self._feed_response(status_code=304)]
+        with patch.object(SupplierFeedPriceUpdater, "_parse_offers_from_content") as mock_parse:
+            result = SupplierFeedPriceUpdater(config).update_prices()
+
+        self.assertTrue(result["unchanged"])
+        mock_parse.assert_not_called()
+        # No homepage warm-up for a revalidation.
+        self.assertEqual(mock_get.call_count, 1)
+        feed_headers = mock_get.call_args.kwargs["headers"]
+        self.assertEqual(feed_headers["If-None-Match"], '"v1"')
+
+    @patch("price_parser.services.requests.Session.get")
+    def test_refused_revalidation_retries_with_warm_up(self, mock_get):
+        config = self._make_config(fetch_mode=SupplierFeedConfig.FETCH_MODE_URL)
+        mock_get.side_effect = [MagicMock(), self._feed_response()]
+        SupplierFeedPriceUpdater(config).update_prices()
+        config.refresh_from_db()
+
+        mock_get.reset_mock()
+        mock_get.side_effect = [
+            self._feed_response(status_code=403), MagicMock(), self._feed_response(status_code=304),
+        ]
+        result = SupplierFeedPriceUpdater(config).update_prices()
+
+        self.assertTrue(result["unchanged"])
+        self.assertEqual(mock_get.call_count, 3)
+
+    def test_only_changed_offers_are_reprocessed(self):
+        config = self._make_config()
+        furniture = MagicMock(pk=1)
+        furniture.name = "Диван"
+        with patch.object(SupplierFeedPriceUpdater, "_match_offer_to_furniture", return_value=furniture), \
+                patch.object(SupplierFeedPriceUpdater, "_apply_offer_prices", return_value=True) as mock_apply:
+            SupplierFeedPriceUpdater(config).update_prices()
+            self.assertEqual(mock_apply.call_count, 1)  # all offers collapse onto one pair
+
+            config.refresh_from_db()
+            self.assertEqual(len(config.offer_digests), 4)
+            config.manual_feed_content = SOFA_YML_FIXTURE.replace(
+                "<price>15470</price>", "<price>14990</price>"
+            )
+            config.save()
+            mock_apply.reset_mock()
+
+            result = SupplierFeedPriceUpdater(config).update_prices()
+
+        self.assertEqual(result["offers_unchanged"], 3)
+        self.assertEqual(mock_apply.call_count, 1)
+        self.assertEqual(mock_apply.call_args.args[1].offer_id, "1052")
+
+    def test_catalog_change_reprocesses_every_offer(self):
+        config = self._make_config()
+        furniture = MagicMock(pk=1)
+        furniture.name = "Диван"
+        with patch.object(SupplierFeedPriceUpdater, "_match_offer_to_furniture", return_value=furniture), \
+                patch.object(SupplierFeedPriceUpdater, "_apply_offer_prices", return_value=True) as mock_apply:
+            SupplierFeedPriceUpdater(config).update_prices()
+            config.refresh_from_db()
+            # A product added or edited since the last run: offers that did not
+            # match before may match now.
+            config.feed_state_fingerprint = "stale"
+            config.save()
+            mock_apply.reset_mock()
+
+            result = SupplierFeedPriceUpdater(config).update_prices()
+
+        self.assertEqual(result["offers_unchanged"], 0)
+        self.assertEqual(mock_apply.call_count, 1)
+
+
 class TestSupplierFeedResolvePrices(TestCase):
     """Unit tests for _resolve_prices logic (old_price → base, price → promo)."""
 
@@ -370,6 +570,36 @@ class TestSupplierFeedMatchOffer(TestCase):
         result = updater._match_offer_to_furniture(offer)
         self.assertIsNone(result)
 
+    def test_matches_by_partial_name_fallback(self):
+        sofa = self._make_furniture(5, "Диван Magnolia Lux", None)
+        other = self._make_furniture(6, "Ліжко Beverly", None)
+        updater = self._updater_with_index([sofa, other])
+
+        offer = SupplierOffer(
+            offer_id="709",
+            name="Magnolia",
+            model=None,
+            price=Decimal("17547"),
+            old_price=None,
+        )
+        result = updater._match_offer_to_furniture(offer)
+        self.assertIsNotNone(result)
+        self.assertEqual(result.pk, 5)
+
+    def test_partial_name_fallback_ambiguous_returns_none(self):
+        first = self._make_furniture(7, "Диван Magnolia Lux", None)
+        second = self._make_furniture(8, "Диван Magnolia Mini", None)
+        updater = self._updater_with_index([first, second])
+
+        offer = SupplierOffer(
+            offer_id="710",
+            name="Magnolia",
+            model=None,
+            price=Decimal("17547"),
+            old_price=None,
+        )
+        self.assertIsNone(updater._match_offer_to_furniture(offer))
+
     def test_article_code_with_dashes_matches(self):
         sofa = self._make_furniture(4, "Диван Chelsi", "6508-21")
         updater = self._updater_with_index([sofa])
@@ -386,6 +616,57 @@ class TestSupplierFeedMatchOffer(TestCase):
         self.assertEqual(result.pk, 4)
 
 
+class TestNameIndex(TestCase):
+    """NameIndex must return exactly what a brute-force substring scan returns."""
+
+    NAMES = [
+        "диван magnolia",
+        "magnolia",
+        "диван кутовий baltika",
+        "baltika",
+        "ліжко beverly",
+        "beverly",
+        "стіл t 904",
+        "t",
+        "904",
+        "ab",
+    ]
+
+    def _index(self):
+        index = NameIndex()
+        for pk, name in enumerate(self.NAMES):
+            index.add(name, pk)
+        return index
+
+    def _brute_force(self, fragment):
+        return {
+            name for name in self.NAMES
+            if fragment in name or name in fragment
+        }
+
+    def test_partial_matches_equal_brute_force(self):
+        index = self._index()
+        queries = ["magnolia", "agno", "диван", "диван кутовий baltika xl", "t", "ab", "ba", "zzz", "904 extra"]
+        for query in queries:
+            expected = self._brute_force(query)
+            found = index.keys_containing(query) | index.keys_contained_in(query)
+            self.assertEqual(found, expected, query)
+
+    def test_partial_matches_returns_items(self):
+        index = self._index()
+        self.assertEqual(sorted(index.partial_matches("beverly")), [4, 5])
+
+    def test_search_ranks_closest_name_first(self):
+        index = self._index()
+        results = index.search("диван magnolla")
+        self.assertEqual(results[0][0], "диван magnolia")
+
+    def test_exact_get(self):
+        index = self._index()
+        self.assertEqual(index.get("baltika"), [3])
+        self.assertEqual(index.get("missing"), [])
+
+
 class TestSupplierFeedApplyPrices(TestCase):
     """Tests for _apply_offer_prices — verifies DB save calls and field changes."""
 
@@ -785,3 +1066,992 @@ class TestUpdatePricesFromModelBlocks(TestCase):
         self.assertEqual(processed_count, 0)
         self.assertEqual(updater.log.errors, [])
         variant.save.assert_called_once()
+
+
+class TestPriceHistory(TestCase):
+    """PriceHistoryRecorder buffering and rollup_price_history retention."""
+
+    def setUp(self):
+        category = Category.objects.create(name="Дивани", slug="dyvany")
+        sub_category = SubCategory.objects.create(
+            name="Прямі дивани", slug="pryami-dyvany", category=category
+        )
+        self.furniture = Furniture.objects.create(
+            name="Baltika",
+            article_code="43271",
+            sub_category=sub_category,
+            price=Decimal("20000"),
+        )
+
+    def _apply(self, updater, price, old_price=None):
+        offer = SupplierOffer(
+            offer_id="631", name="Baltika", model="43271",
+            price=Decimal(price), old_price=Decimal(old_price) if old_price else None,
+        )
+        return updater._apply_offer_prices(self.furniture, offer)
+
+    def test_records_only_real_changes_in_bulk(self):
+        updater = SupplierFeedPriceUpdater(_make_config())
+        self.assertTrue(self._apply(updater, "25770", old_price="27832"))
+        self.assertFalse(self._apply(updater, "25770", old_price="27832"))
+        self.assertEqual(PriceHistory.objects.count(), 0)  # buffered until flush
+
+        updater.history.flush()
+        entry = PriceHistory.objects.get()
+        self.assertEqual(entry.furniture_id, self.furniture.pk)
+        self.assertIsNone(entry.size_variant_id)
+        self.assertEqual(entry.old_price, Decimal("20000"))
+        self.assertEqual(entry.new_price, Decimal("27832"))
+        self.assertIsNone(entry.old_promotional_price)
+        self.assertEqual(entry.new_promotional_price, Decimal("25770"))
+        self.assertEqual(entry.source, PriceHistory.SOURCE_SUPPLIER_FEED)
+        self.assertEqual(entry.run_id, updater.history.run_id)
+
+    def test_rollup_keeps_last_row_per_month_with_net_change(self):
+        recorder = PriceHistoryRecorder(PriceHistory.SOURCE_SUPPLIER_FEED)
+        for price in ("21000", "22000", "23000"):
+            before = recorder.snapshot(self.furniture)
+            self.furniture.price = Decimal(price)
+            recorder.record(self.furniture, before)
+        recorder.flush()
+
+        old = timezone.now() - timedelta(days=400)
+        rows = list(PriceHistory.objects.order_by("id"))
+        for offset, row in enumerate(rows):
+            row.recorded_at = old.replace(day=1) + timedelta(hours=offset)
+        PriceHistory.objects.bulk_update(rows, ["recorded_at"])
+
+        kept, deleted = rollup_price_history(timezone.now() - timedelta(days=180))
+
+        self.assertEqual((kept, deleted), (1, 2))
+        entry = PriceHistory.objects.get()
+        self.assertTrue(entry.is_rollup)
+        self.assertEqual(entry.old_price, Decimal("20000"))
+        self.assertEqual(entry.new_price, Decimal("23000"))
+
+        # A second pass over already rolled-up data is a no-op.
+        self.assertEqual(rollup_price_history(timezone.now() - timedelta(days=180)), (0, 0))
+
+
+class TestPriceChangeSet(TestCase):
+    """Dry-run collection into PriceChangeSet and transactional apply."""
+
+    def setUp(self):
+        category = Category.objects.create(name="Дивани", slug="dyvany")
+        sub_category = SubCategory.objects.create(
+            name="Прямі дивани", slug="pryami-dyvany", category=category
+        )
+        self.furniture = Furniture.objects.create(
+            name="Baltika",
+            article_code="43271",
+            sub_category=sub_category,
+            price=Decimal("20000"),
+        )
+
+    def _preview(self):
+        updater = SupplierFeedPriceUpdater(_make_config())
+        updater.history = PriceHistoryRecorder(
+            PriceHistory.SOURCE_SUPPLIER_FEED, dry_run=True, label="Matroluxe"
+        )
+        offer = SupplierOffer(
+            offer_id="631", name="Baltika", model="43271",
+            price=Decimal("25770"), old_price=Decimal("27832"),
+        )
+        self.assertTrue(updater._apply_offer_prices(self.furniture, offer))
+        return updater.history.store_change_set()
+
+    def test_dry_run_collects_changes_without_writing(self):
+        change_set = self._preview()
+
+        self.furniture.refresh_from_db()
+        self.assertEqual(self.furniture.price, Decimal("20000"))
+        self.assertFalse(self.furniture.is_promotional)
+        self.assertEqual(PriceHistory.objects.count(), 0)
+        self.assertEqual(change_set.status, PriceChangeSet.STATUS_PENDING)
+        self.assertEqual(change_set.items_count, 1)
+        entry = change_set.entries[0]
+        self.assertEqual(entry["kind"], "furniture")
+        self.assertEqual(Decimal(entry["old_price"]), Decimal("20000"))
+        self.assertEqual(Decimal(entry["new_price"]), Decimal("27832"))
+        self.assertEqual(Decimal(entry["new_promotional_price"]), Decimal("25770"))
+
+    def test_apply_writes_prices_and_history(self):
+        change_set = self._preview()
+
+        result = apply_change_set(change_set)
+
+        self.assertTrue(result["success"])
+        self.assertEqual(result["items_updated"], 1)
+        self.furniture.refresh_from_db()
+        self.assertEqual(self.furniture.price, Decimal("27832"))
+        self.assertEqual(self.furniture.promotional_price, Decimal("25770"))
+        self.assertTrue(self.furniture.is_promotional)
+        change_set.refresh_from_db()
+        self.assertEqual(change_set.status, PriceChangeSet.STATUS_APPLIED)
+        history = PriceHistory.objects.get()
+        self.assertEqual(history.run_id, change_set.run_id)
+        self.assertEqual(history.old_price, Decimal("20000"))
+
+        # Applying twice is refused.
+        self.assertFalse(apply_change_set(change_set)["success"])
+
+    def test_apply_skips_entries_changed_since_preview(self):
+        change_set = self._preview()
+        Furniture.objects.filter(pk=self.furniture.pk).update(price=Decimal("21000"))
+
+        result = apply_change_set(change_set)
+
+        self.assertEqual(result["items_updated"], 0)
+        self.assertEqual(result["conflicts"], 1)
+        self.furniture.refresh_from_db()
+        self.assertEqual(self.furniture.price, Decimal("21000"))
+        self.assertEqual(PriceHistory.objects.count(), 0)
+
+    @override_settings(CATALOG_JOB_RUNNER="worker")
+    def test_admin_preview_runs_as_a_dry_run_job(self):
+        from custom_admin.models import CatalogUpdateJob
+        from custom_admin.services import claim_job, run_job
+        from price_parser.admin import preview_price_changes_action
+
+        config = SupplierFeedConfig.objects.create(
+            name="Matroluxe", feed_url="https://matroluxe.ua/index.php?route=extension/feed/yandex_yml7"
+        )
+        preview_price_changes_action(MagicMock(), None, SupplierFeedConfig.objects.filter(pk=config.pk))
+
+        job = CatalogUpdateJob.objects.get()
+        self.assertEqual((job.supplier, job.action), ("supplier_feed", "update_prices"))
+        self.assertEqual(job.params, {"config_id": config.pk, "dry_run": True})
+        with patch.object(
+            SupplierFeedPriceUpdater, "update_prices", return_value={"success": True, "change_set_id": 7}
+        ) as mock_update:
+            job = run_job(claim_job("w1"), "w1")
+        mock_update.assert_called_once_with(dry_run=True)
+        self.assertIn("change_set_id: 7", job.detail)
+
+
+def _make_web_config(match_by_article=True, match_by_name=True):
+    """Return a mock SupplierWebConfig."""
+    cfg = MagicMock()
+    cfg.name = "Sofino"
+    cfg.base_url = "https://sofino.ua/"
+    cfg.match_by_article = match_by_article
+    cfg.match_by_name = match_by_name
+    cfg.search_path_template = ""
+    cfg.use_selenium = False
+    cfg.request_timeout = 10
+    return cfg
+
+
+class TestSupplierWebUrlIndex(TestCase):
+    """Pre-normalized candidate URL index and shared page verification."""
+
+    URLS = [
+        "https://sofino.ua/product/dyvan-baltika-43271/",
+        "https://sofino.ua/product/krislo-oskar/",
+        "https://sofino.ua/product/dyvan-bali-lux/",
+        "https://sofino.ua/product/baltika-mini-43271-m/",
+        "https://sofino.ua/catalog/dyvany/",
+    ]
+
+    def _furniture(self, name, article_code):
+        furniture = MagicMock()
+        furniture.name = name
+        furniture.article_code = article_code
+        return furniture
+
+    def test_index_matches_linear_scan(self):
+        updater = SupplierWebPriceUpdater(_make_web_config())
+        index = updater._get_url_index(self.URLS)
+
+        for name in ("Диван Baltika", "Baltika Mini", "Krislo Oskar", "Bali"):
+            name_norm = updater._normalize_text(name)
+            expected = [
+                url for url in self.URLS
+                if updater._name_matches_in_url(name_norm, updater._normalize_text(url))
+            ]
+            found = [url for _, url in sorted(updater._urls_matching_name(index, name_norm))]
+            self.assertEqual(found, expected, name)
+
+        self.assertIs(updater._get_url_index(self.URLS), index)
+
+    def test_article_match_is_verified_in_sitemap_order(self):
+        updater = SupplierWebPriceUpdater(_make_web_config(match_by_name=False))
+        pages = {
+            self.URLS[0]: "<h1>Диван Baltika</h1><span>Артикул 43271</span>",
+            self.URLS[3]: "<h1>Baltika mini</h1><span>Артикул 43271-M</span>",
+        }
+        with patch.object(updater, "_fetch_page_content", side_effect=pages.__getitem__) as mock_fetch:
+            url = updater._find_best_url_for_furniture(self._furniture("Baltika", "43271"), self.URLS)
+
+        self.assertEqual(url, self.URLS[0])
+        mock_fetch.assert_called_once_with(self.URLS[0])
+
+    def test_page_verification_is_shared_between_products(self):
+        updater = SupplierWebPriceUpdater(_make_web_config())
+        html = "<h1>Диван Baltika</h1><span>Артикул 43271</span>"
+        with patch.object(updater, "_fetch_page_content", return_value=html) as mock_fetch:
+            first = self._furniture("Baltika", "43271")
+            second = self._furniture("Baltika", "43271")
+            other = self._furniture("Oskar", "99999")
+            self.assertTrue(updater._page_seems_related(self.URLS[0], first))
+            self.assertTrue(updater._page_seems_related(self.URLS[0], second))
+            self.assertFalse(updater._page_seems_related(self.URLS[0], other))
+
+        mock_fetch.assert_called_once_with(self.URLS[0])
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    """Serves /page/<n>; /flaky answers 503 once, then 200."""
+
+    flaky_hits = 0
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        if self.path == "/flaky":
+            cls.flaky_hits += 1
+            status = 503 if cls.flaky_hits == 1 else 200
+        else:
+            with cls.lock:
+                cls.in_flight += 1
+                cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            time.sleep(0.05)
+            with cls.lock:
+                cls.in_flight -= 1
+            status = 200
+        body = f"<h1>{self.path}</h1>".encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestCrawlEngine(TestCase):
+    """Shared crawl engine against a local HTTP fixture server."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _FixtureHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def test_map_fetches_concurrently_and_keeps_order(self):
+        engine = CrawlEngine(request_delay=0.001, workers=4, burst=8)
+        session = engine.session(requests.Session)
+        urls = [f"{self.base_url}/page/{n}" for n in range(8)]
+        _FixtureHandler.max_in_flight = 0
+
+        results = list(engine.map(lambda url: session.get(url, timeout=5).text, urls))
+
+        self.assertEqual([url for url, _ in results], urls)
+        self.assertEqual(results[3][1], "<h1>/page/3</h1>")
+        self.assertGreater(_FixtureHandler.max_in_flight, 1)
+        self.assertLessEqual(_FixtureHandler.max_in_flight, 4)
+
+    def test_retries_transient_status(self):
+        _FixtureHandler.flaky_hits = 0
+        engine = CrawlEngine(request_delay=0.001, workers=1, backoff=0.001)
+        response = engine.session(requests.Session).get(f"{self.base_url}/flaky", timeout=5)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_FixtureHandler.flaky_hits, 2)
+
+    def test_failed_callback_yields_none(self):
+        engine = CrawlEngine(request_delay=0.001, workers=2)
+
+        def scrape(n):
+            if n == 1:
+                raise ValueError("broken page")
+            return n * 10
+
+        self.assertEqual(list(engine.map(scrape, range(3))), [(0, 0), (1, None), (2, 20)])
+
+    def test_token_bucket_spaces_requests(self):
+        now = [0.0]
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            now[0] += seconds
+
+        bucket = TokenBucket(rate=2, capacity=1, clock=lambda: now[0], sleep=sleep)
+        for _ in range(3):
+            bucket.acquire()
+
+        self.assertEqual(waits, [0.5, 0.5])
+
+
+class TestHttpCache(TestCase):
+    """Disk cache: TTL hits, conditional revalidation and LRU eviction."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = HttpCache(tmp.name, ttl=600)
+
+    def _response(self, status_code=200, body=b"<h1>Baltika</h1>", etag='"v1"'):
+        response = MagicMock()
+        response.status_code = status_code
+        response.content = body
+        response.encoding = "utf-8"
+        response.headers = {"Content-Type": "text/html; charset=utf-8", "ETag": etag}
+        return response
+
+    def test_fresh_entry_is_served_without_request(self):
+        send = MagicMock(return_value=self._response())
+        self.cache.get(send, "https://evrodim.ua/stil-1", timeout=5)
+        cached = self.cache.get(send, "https://evrodim.ua/stil-1", timeout=5)
+
+        send.assert_called_once()
+        self.assertTrue(cached.from_cache)
+        self.assertEqual(cached.text, "<h1>Baltika</h1>")
+
+    def test_stale_entry_is_revalidated(self):
+        url = "https://evrodim.ua/stil-1"
+        self.cache.get(MagicMock(return_value=self._response()), url)
+        self.cache.ttl = 0
+
+        send = MagicMock(return_value=self._response(status_code=304, body=b""))
+        cached = self.cache.get(send, url, timeout=5)
+
+        self.assertEqual(send.call_args.kwargs["headers"]["If-None-Match"], '"v1"')
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(cached.content, b"<h1>Baltika</h1>")
+
+    def test_images_are_not_cached(self):
+        response = self._response(body=b"\x89PNG")
+        response.headers = {"Content-Type": "image/png"}
+        self.cache.get(MagicMock(return_value=response), "https://evrodim.ua/a.png")
+
+        self.assertIsNone(self.cache.lookup("https://evrodim.ua/a.png"))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.cache.max_bytes = 3000
+        body = os.urandom(1024)  # incompressible
+        for n in range(4):
+            self.cache.get(MagicMock(return_value=self._response(body=body)), f"https://evrodim.ua/{n}")
+            time.sleep(0.01)
+
+        self.assertIsNone(self.cache.lookup("https://evrodim.ua/0"))
+        self.assertIsNotNone(self.cache.lookup("https://evrodim.ua/3"))
+
+
+class TestEvrodimIncrementalPrices(TestCase):
+    """Pages whose product is not in the catalog yet must be fetched again."""
+
+    def test_unmatched_pages_are_not_marked(self):
+        from price_parser.evrodim_scraper import EvrodimProduct, EvrodimScraper
+
+        category = Category.objects.create(name="Столи", slug="stoly")
+        sub_category = SubCategory.objects.create(name="Столи Evrodim", slug="stoly-evrodim", category=category)
+        Furniture.objects.create(
+            name="Стіл T-904", article_code="EVR-1", sub_category=sub_category, price=Decimal("100")
+        )
+        urls = ["https://evrodim.ua/t-904", "https://evrodim.ua/t-905"]
+        products = {
+            url: EvrodimProduct(
+                url=url, name="Стіл", article_code=f"EVR-{n}", base_model_name="T", variant_label="",
+                price=Decimal("120"),
+            )
+            for n, url in enumerate(urls, 1)
+        }
+        scraper = EvrodimScraper()
+        scraper._listing_fingerprints = {url: "card" for url in urls}
+        with patch.object(scraper, "_ensure_subcategory"), \
+                patch.object(scraper, "collect_product_urls", return_value=urls), \
+                patch.object(scraper, "scrape_product", side_effect=products.get):
+            result = scraper.update_prices(subcategory_slug="stoly-evrodim")
+
+        self.assertEqual((result["updated"], result["not_found"]), (1, 1))
+        self.assertEqual(list(CrawlPageState.objects.values_list("url", flat=True)), [urls[0]])
+
+
+class TestCrawlStateStore(TestCase):
+    """Incremental crawl decisions from stored lastmod and fingerprints."""
+
+    URL = "https://sofino.ua/product/dyvan-baltika-43271/"
+
+    def _seed(self, **kwargs):
+        store = CrawlStateStore("supplier_web:1", full_sweep_days=7)
+        store.mark(self.URL, **kwargs)
+        store.flush()
+        return CrawlStateStore("supplier_web:1", full_sweep_days=7)
+
+    def test_same_lastmod_is_skipped_until_sweep(self):
+        store = self._seed(lastmod="2026-10-01", payload={"furniture_ids": [5]})
+
+        self.assertTrue(store.is_unchanged(self.URL, lastmod="2026-10-01"))
+        self.assertFalse(store.is_unchanged(self.URL, lastmod="2026-10-18"))
+        self.assertEqual(store.payload(self.URL), {"furniture_ids": [5]})
+
+        CrawlPageState.objects.update(last_scraped_at=timezone.now() - timedelta(days=8))
+        store = CrawlStateStore("supplier_web:1", full_sweep_days=7)
+        self.assertFalse(store.is_unchanged(self.URL, lastmod="2026-10-01"))
+
+    def test_fingerprint_and_force(self):
+        store = self._seed(content_hash="abc")
+
+        self.assertTrue(store.is_unchanged(self.URL, content_hash="abc"))
+        self.assertFalse(store.is_unchanged(self.URL, content_hash="abd"))
+        self.assertFalse(store.is_unchanged("https://sofino.ua/new/", content_hash="abc"))
+        self.assertFalse(store.is_unchanged(self.URL))  # nothing to compare
+        forced = CrawlStateStore("supplier_web:1", full_sweep_days=7, force=True)
+        self.assertFalse(forced.is_unchanged(self.URL, content_hash="abc"))
+
+    def test_flush_upserts(self):
+        store = self._seed(lastmod="2026-10-01")
+        store.mark(self.URL, lastmod="2026-10-18")
+        store.flush()
+
+        state = CrawlPageState.objects.get()
+        self.assertEqual(state.lastmod, "2026-10-18")
+
+
+class TestSupplierWebIncrementalUpdate(TestCase):
+    """Products whose matched page kept its sitemap lastmod are not re-fetched."""
+
+    def setUp(self):
+        category = Category.objects.create(name="Дивани", slug="dyvany")
+        sub_category = SubCategory.objects.create(
+            name="Прямі дивани", slug="pryami-dyvany", category=category
+        )
+        self.furniture = Furniture.objects.create(
+            name="Baltika", article_code="43271", sub_category=sub_category, price=Decimal("20000"),
+        )
+        self.config = SupplierWebConfig.objects.create(name="Sofino", base_url="https://sofino.ua/")
+        self.url = "https://sofino.ua/product/dyvan-baltika-43271/"
+
+    def _run(self, lastmod, **kwargs):
+        updater = SupplierWebPriceUpdater(self.config)
+        updater._sitemap_urls_cache = [self.url]
+        updater._sitemap_lastmods = {self.url: lastmod}
+        html = '<h1>Baltika 43271</h1><div class="price hp_price"><ins>21 000</ins></div>'
+        with patch.object(updater, "_fetch_page_content", return_value=html) as mock_fetch, \
+                patch.object(updater, "_progress"):
+            result = updater.update_prices(**kwargs)
+        return result, mock_fetch
+
+    def test_unchanged_lastmod_skips_page(self):
+        first, _ = self._run("2026-10-01")
+        self.assertEqual(first["items_updated"], 1)
+
+        second, mock_fetch = self._run("2026-10-01")
+        self.assertEqual(second["items_unchanged"], 1)
+        mock_fetch.assert_not_called()
+
+        third, mock_fetch = self._run("2026-10-02")
+        self.assertEqual(third["items_unchanged"], 0)
+        self.assertTrue(mock_fetch.called)
+
+        forced, _ = self._run("2026-10-02", force=True)
+        self.assertEqual(forced["items_unchanged"], 0)
+
+
+def _urlset(locs, lastmod="2026-10-01"):
+    items = "".join(f"<url><loc>{loc}</loc><lastmod>{lastmod}</lastmod></url>" for loc in locs)
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{items}</urlset>'
+    ).encode()
+
+
+def _sitemap_index(locs):
+    items = "".join(f"<sitemap><loc>{loc}</loc></sitemap>" for loc in locs)
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{items}</sitemapindex>'
+    ).encode()
+
+
+class TestSitemapReader(TestCase):
+    """Streaming, gzip-aware sitemap enumeration."""
+
+    def _opener(self, documents, opened=None):
+        from contextlib import contextmanager
+
+        @contextmanager
+        def open_stream(url):
+            if opened is not None:
+                opened.append(url)
+            yield io.BytesIO(documents[url])
+
+        return open_stream
+
+    def test_plain_and_gzip_documents(self):
+        plain = _urlset(["https://sofino.ua/a/"])
+        for body in (plain, gzip.compress(plain)):
+            entries = list(iter_sitemap_entries(io.BytesIO(body)))
+            self.assertEqual(entries, [("url", "https://sofino.ua/a/", "2026-10-01")])
+
+    def test_index_children_are_read_in_order(self):
+        documents = {
+            "https://sofino.ua/sitemap.xml": _sitemap_index([
+                "https://sofino.ua/sitemap-1.xml.gz", "https://sofino.ua/sitemap-2.xml",
+            ]),
+            "https://sofino.ua/sitemap-1.xml.gz": gzip.compress(_urlset(["https://sofino.ua/1/"])),
+            "https://sofino.ua/sitemap-2.xml": _urlset(["https://sofino.ua/2/", "https://sofino.ua/3/"]),
+        }
+        reader = SitemapReader(self._opener(documents), max_urls=100, workers=2)
+
+        entries = reader.read(["https://sofino.ua/sitemap.xml"])
+
+        self.assertEqual([loc for loc, _ in entries], [
+            "https://sofino.ua/1/", "https://sofino.ua/2/", "https://sofino.ua/3/",
+        ])
+
+    def test_stops_at_max_urls(self):
+        documents = {
+            "https://sofino.ua/sitemap.xml": _sitemap_index(["https://sofino.ua/big.xml", "https://sofino.ua/more.xml"]),
+            "https://sofino.ua/big.xml": _urlset([f"https://sofino.ua/{n}/" for n in range(1000)]),
+            "https://sofino.ua/more.xml": _urlset(["https://sofino.ua/x/"]),
+        }
+        reader = SitemapReader(self._opener(documents), max_urls=10, workers=1)
+
+        entries = reader.read(["https://sofino.ua/sitemap.xml"])
+
+        self.assertEqual(len(entries), 10)
+        self.assertEqual(entries[-1][0], "https://sofino.ua/9/")
+
+    def test_web_updater_records_lastmod(self):
+        updater = SupplierWebPriceUpdater(_make_web_config())
+        updater.config.max_urls_to_scan = 50
+        documents = {"https://sofino.ua/sitemap.xml": _urlset(["https://sofino.ua/product/baltika/"])}
+        with patch.object(updater, "_extract_sitemaps_from_robots", return_value=list(documents)), \
+                patch.object(updater, "_open_sitemap_stream", self._opener(documents)), \
+                patch.object(updater, "_progress"):
+            urls = updater._collect_urls_from_robots_and_sitemaps()
+
+        self.assertEqual(urls, ["https://sofino.ua/product/baltika/"])
+        self.assertEqual(updater._sitemap_lastmods["https://sofino.ua/product/baltika/"], "2026-10-01")
+
+
+class _FakeDriver:
+    def __init__(self):
+        self.healthy = True
+        self.quit_called = False
+
+    def execute_script(self, script):
+        if not self.healthy:
+            raise RuntimeError("browser crashed")
+        return 1
+
+    def quit(self):
+        self.quit_called = True
+
+
+class TestBrowserPool(TestCase):
+    """Reuse, recycling and health checks of pooled headless browsers."""
+
+    def test_driver_is_reused_and_recycled(self):
+        created = []
+        pool = BrowserPool(lambda: created.append(_FakeDriver()) or created[-1], size=1, max_pages=2)
+
+        with pool.driver() as first:
+            pass
+        with pool.driver() as second:
+            pass
+        with pool.driver() as third:
+            pass
+
+        self.assertIs(first, second)
+        self.assertTrue(first.quit_called)
+        self.assertIsNot(third, first)
+        self.assertEqual(len(created), 2)
+        pool.close()
+        self.assertTrue(third.quit_called)
+
+    def test_unhealthy_or_failed_driver_is_replaced(self):
+        pool = BrowserPool(_FakeDriver, size=1)
+        with pool.driver() as first:
+            pass
+        first.healthy = False
+        with pool.driver() as second:
+            pass
+        self.assertIsNot(second, first)
+        self.assertTrue(first.quit_called)
+
+        with self.assertRaises(ValueError):
+            with pool.driver():
+                raise ValueError("page load timeout")
+        self.assertTrue(second.quit_called)
+        pool.close()
+
+    def test_waiter_gets_a_new_driver_after_a_discard(self):
+        pool = BrowserPool(_FakeDriver, size=1)
+        pool.wait_interval = 0.01
+        holding, release = threading.Event(), threading.Event()
+        borrowed = []
+
+        def fail_while_holding():
+            try:
+                with pool.driver():
+                    holding.set()
+                    release.wait(5)
+                    raise ValueError("page load timeout")
+            except ValueError:
+                pass
+
+        def borrow():
+            with pool.driver() as driver:
+                borrowed.append(driver)
+
+        holder = threading.Thread(target=fail_while_holding)
+        holder.start()
+        holding.wait(5)
+        waiter = threading.Thread(target=borrow, daemon=True)
+        waiter.start()
+        release.set()
+        holder.join(5)
+        waiter.join(5)
+
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(len(borrowed), 1)
+        pool.close()
+
+    def test_browser_configs_do_not_probe_http_by_default(self):
+        config = SupplierWebConfig(name="Sofino", base_url="https://sofino.ua/", use_selenium=True)
+        updater = SupplierWebPriceUpdater(config)
+
+        with patch.object(updater, "_fetch_if_server_rendered") as mock_probe, \
+                patch.object(updater, "_fetch_with_selenium", return_value="<html></html>"):
+            updater._fetch_page_content("https://sofino.ua/product/baltika/")
+
+        self.assertFalse(config.selenium_http_first)
+        mock_probe.assert_not_called()
+
+    def test_web_updater_skips_browser_for_server_rendered_page(self):
+        config = _make_web_config()
+        config.use_selenium = True
+        config.selenium_http_first = True
+        config.price_block_selector = "div.price.hp_price"
+        updater = SupplierWebPriceUpdater(config)
+        response = MagicMock(status_code=200, text='<div class="price hp_price"><ins>9 990</ins></div>')
+
+        with patch.object(updater, "_http_get", return_value=response), \
+                patch.object(updater, "_fetch_with_selenium") as mock_browser:
+            html = updater._fetch_page_content("https://sofino.ua/product/baltika/")
+
+        mock_browser.assert_not_called()
+        self.assertIn("9 990", html)
+
+
+class TestBlockedMatcher(TestCase):
+    """The n-gram shortlist must pick the same key as scoring every pair."""
+
+    @staticmethod
+    def _brute_force(keys, query, cutoff):
+        from difflib import SequenceMatcher
+
+        best_idx, best_score = None, 0.0
+        for idx, key in enumerate(keys):
+            score = SequenceMatcher(None, query, key).ratio()
+            if best_idx is None or score > best_score:
+                best_idx, best_score = idx, score
+        if best_idx is None or best_score < cutoff:
+            return None
+        return best_idx, best_score
+
+    def test_same_result_as_all_pairs(self):
+        import random
+
+        rng = random.Random(7)
+        alphabet = "abcdeklmnorst"
+        keys = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 14))) for _ in range(300)]
+        keys += keys[:20]  # duplicates: the first occurrence must win
+        matcher = BlockedMatcher(keys)
+        queries = [key[:-1] + "x" for key in keys[:80]] + keys[100:120] + ["", "zzzz"]
+        for cutoff in (0.0, 0.65, 0.92):
+            for query in queries:
+                expected = self._brute_force(keys, query, cutoff)
+                idx, score = matcher.best(query, cutoff)
+                self.assertEqual((idx, score) if idx is not None else None, expected, (query, cutoff))
+        self.assertLess(matcher.scored, len(keys) * len(queries) * 3)
+
+    def test_unmatched_log_reports_closest_score(self):
+        from difflib import SequenceMatcher
+
+        from price_parser.eurosof_scraper import (
+            CatalogProduct,
+            ScrapedProduct,
+            match_catalog_to_scraped,
+        )
+
+        scraped = [
+            ScrapedProduct("u", slug, slug, name, "", {}, [])
+            for slug, name in [("a", "бостон"), ("b", "бостон люкс"), ("c", "моріс")]
+        ]
+        catalog = [CatalogProduct("Бостер", "бостер", "sofa", "", "", [])]
+        with self.assertLogs("price_parser.eurosof_scraper", "WARNING") as logs:
+            result = match_catalog_to_scraped(catalog, scraped, threshold=0.95)
+        self.assertIsNone(result[0][1])
+        closest = SequenceMatcher(None, "бостер", "бостон").ratio()
+        self.assertIn(f"UNMATCHED ({closest:.2f})", logs.output[0])
+
+    def test_divanoff_price_rows_match_by_size(self):
+        rows = [
+            PriceRow(
+                raw_name=f"{name}{size}",
+                base_name=name,
+                size_label=size,
+                norm_key=_normalise_for_match(name),
+                price=Decimal(price),
+            )
+            for name, size, price in [
+                ("Джейм", "160", "20000"),
+                ("Джейм", "180", "22000"),
+                ("Норд mini", "", "18000"),
+                ("Хьюго", "", "15000"),
+            ]
+        ]
+        matcher = price_row_matcher(rows)
+        self.assertEqual(len(matcher), 3)
+        matched = match_price_rows("Диван Джейм", rows, matcher)
+        self.assertEqual([row.size_label for row in matched], ["160", "180"])
+        self.assertEqual(match_price_rows("Диван Невідомий", rows, matcher), [])
+
+
+class TestXlsxReader(TestCase):
+    """Read-only XLSX ingestion with the content-hash row cache."""
+
+    def setUp(self):
+        import openpyxl
+
+        clear_xlsx_cache()
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.title = "Прайс"
+        sheet.append(["Назва", "Ціна", "Примітка"])
+        sheet.append(["Стіл", 1200, None])
+        sheet.append(["Стілець", 450.5])
+        workbook.create_sheet("Інше").append(["x"])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        self.content = buffer.getvalue()
+
+    def test_rows_are_text_padded_and_limited_to_columns(self):
+        rows = read_xlsx_rows(self.content, "Прайс", as_text=True)
+        self.assertEqual(rows, [["Назва", "Ціна", "Примітка"], ["Стіл", "1200", ""], ["Стілець", "450.5", ""]])
+        self.assertEqual(read_xlsx_rows(self.content, "Прайс", max_col=2, min_row=2), [("Стіл", 1200), ("Стілець", 450.5)])
+
+    def test_missing_sheet(self):
+        self.assertEqual(read_xlsx_rows(self.content, "Немає", default_to_active=True, max_col=1)[0], ("Назва",))
+        with self.assertRaises(KeyError):
+            read_xlsx_rows(self.content, "Немає")
+
+    def test_same_content_is_parsed_once(self):
+        import openpyxl
+
+        with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as fh:
+            fh.write(self.content)
+        self.addCleanup(os.remove, fh.name)
+        with patch("openpyxl.load_workbook", wraps=openpyxl.load_workbook) as load:
+            first = read_xlsx_rows(fh.name, "Прайс")
+            first[0] = None  # callers get their own list
+            second = read_xlsx_rows(self.content, "Прайс")
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(second[0], ("Назва", "Ціна", "Примітка"))
+
+
+class _SheetResponse:
+    def __init__(self, status_code=200, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode("utf-8")
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {self.status_code}")
+
+
+class TestGoogleSheetsFetchStrategy(TestCase):
+    """Remembered fetch strategy and conditional re-runs of sheet configs."""
+
+    def setUp(self):
+        self.config = GoogleSheetConfig.objects.create(
+            name="Столи",
+            sheet_url="https://docs.google.com/spreadsheets/d/abc123/edit",
+            sheet_id="abc123",
+            sheet_gid="0",
+        )
+        self.session = MagicMock()
+        patcher = patch("price_parser.services._get_sheets_session", return_value=self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_last_successful_strategy_is_tried_first(self):
+        def get(url, **kwargs):
+            if "gviz" in url:
+                return _SheetResponse(text="Назва,Ціна\nСтіл,100\n")
+            return _SheetResponse(status_code=403)
+
+        self.session.get.side_effect = get
+        data = GoogleSheetsPriceUpdater(self.config)._fetch_sheet_data()
+        self.assertEqual(data[1], ["Стіл", "100"])
+        self.config.refresh_from_db()
+        self.assertEqual(self.config.fetch_strategy, GoogleSheetConfig.FETCH_STRATEGY_GVIZ)
+        self.assertIsNotNone(self.config.fetch_latency_ms)
+
+        self.session.get.reset_mock()
+        GoogleSheetsPriceUpdater(self.config)._fetch_sheet_data()
+        self.assertEqual(self.session.get.call_count, 1)
+        self.assertIn("gviz", self.session.get.call_args[0][0])
+
+    def test_unchanged_sheet_is_skipped_until_forced(self):
+        self.session.get.return_value = _SheetResponse(text="Назва,Ціна\n", headers={"ETag": '"v1"'})
+        first = GoogleSheetsPriceUpdater(self.config).update_prices()
+        self.assertTrue(first["success"])
+        self.assertNotIn("unchanged", first)
+        self.config.refresh_from_db()
+        self.assertEqual(self.config.sheet_etag, '"v1"')
+
+        self.session.get.return_value = _SheetResponse(status_code=304)
+        second = GoogleSheetsPriceUpdater(self.config).update_prices()
+        self.assertTrue(second["unchanged"])
+        self.assertEqual(self.session.get.call_args[1]["headers"], {"If-None-Match": '"v1"'})
+
+        self.session.get.return_value = _SheetResponse(text="Назва,Ціна\n")
+        forced = GoogleSheetsPriceUpdater(self.config).update_prices(force=True)
+        self.assertNotIn("unchanged", forced)
+        self.assertEqual(self.session.get.call_args[1]["headers"], {})
+
+    def test_variant_price_edit_disables_skip(self):
+        category = Category.objects.create(name="Столи", slug="stoly")
+        sub_category = SubCategory.objects.create(name="Обідні", slug="obidni", category=category)
+        furniture = Furniture.objects.create(
+            name="Стіл", article_code="TEST-TABLE", sub_category=sub_category, price=Decimal("0")
+        )
+        variant = FurnitureSizeVariant.objects.create(
+            furniture=furniture, width=80, length=120, height=75, price=Decimal("100")
+        )
+        self.session.get.return_value = _SheetResponse(text="Назва,Ціна\n", headers={"ETag": '"v1"'})
+        GoogleSheetsPriceUpdater(self.config).update_prices()
+        self.config.refresh_from_db()
+
+        FurnitureSizeVariant.objects.filter(pk=variant.pk).update(price=Decimal("120"))
+        result = GoogleSheetsPriceUpdater(self.config).update_prices()
+        self.assertNotIn("unchanged", result)
+        # The sheet is fetched unconditionally rather than revalidated.
+        self.assertEqual(self.session.get.call_args[1]["headers"], {})
+
+
+def _photo_bytes(width=240, height=180, fmt="PNG", color=(120, 60, 30)):
+    from PIL import Image, ImageDraw
+
+    img = Image.new("RGB", (240, 180), (240, 235, 225))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((20, 30, 150, 160), fill=color)
+    draw.ellipse((130, 20, 230, 120), fill=color)
+    draw.rectangle((60, 120, 220, 170), fill=tuple(channel // 2 for channel in color))
+    if (width, height) != img.size:
+        img = img.resize((width, height), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    img.save(buffer, fmt, quality=90)
+    return buffer.getvalue()
+
+
+class TestSupplierImageStore(TestCase):
+    """Content-addressed supplier photos: one stored copy per distinct image."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.storage = FileSystemStorage(location=tmp.name)
+        self.bodies = {}
+        self.requested = []
+        self.lock = threading.Lock()
+
+    def _get(self, url, timeout=None):
+        with self.lock:
+            self.requested.append(url)
+        if url not in self.bodies:
+            return _SheetResponse(status_code=404)
+        response = _SheetResponse()
+        response.content = self.bodies[url]
+        return response
+
+    def _store(self, variants=False):
+        return SupplierImageStore(self._get, workers=3, storage=self.storage, variants=variants)
+
+    def test_identical_photos_from_different_urls_are_stored_once(self):
+        photo = _photo_bytes()
+        self.bodies = {"https://a.test/1.jpg": photo, "https://cdn.test/x.png?v=2": photo}
+        result = self._store().fetch_many(list(self.bodies) + ["https://a.test/missing.jpg"])
+
+        key = result["https://a.test/1.jpg"]
+        self.assertTrue(key.startswith("supplier_cache/content/"))
+        self.assertTrue(key.endswith(".png"))
+        self.assertEqual(result["https://cdn.test/x.png?v=2"], key)
+        self.assertIsNone(result["https://a.test/missing.jpg"])
+        self.assertEqual(SupplierImage.objects.count(), 1)
+        self.assertEqual(SupplierImageUrl.objects.count(), 2)
+        self.assertEqual(self.storage.listdir(key.rsplit("/", 1)[0])[1], [key.rsplit("/", 1)[1]])
+
+    def test_known_url_is_not_downloaded_again(self):
+        self.bodies = {"https://a.test/1.jpg": _photo_bytes()}
+        key = self._store().fetch("https://a.test/1.jpg")
+        self.requested.clear()
+
+        self.assertEqual(self._store().fetch("https://a.test/1.jpg"), key)
+        self.assertEqual(self.requested, [])
+
+    def test_near_duplicates_are_kept_apart_by_default(self):
+        self.bodies = {
+            "https://a.test/big.png": _photo_bytes(),
+            "https://b.test/small.jpg": _photo_bytes(120, 90, fmt="JPEG"),
+        }
+        big = self._store().fetch("https://a.test/big.png")
+        self.assertNotEqual(self._store().fetch("https://b.test/small.jpg"), big)
+
+    @override_settings(SUPPLIER_IMAGE_PHASH_DISTANCE=3)
+    def test_resized_copy_reuses_the_larger_photo(self):
+        self.bodies = {
+            "https://a.test/big.png": _photo_bytes(),
+            "https://b.test/small.jpg": _photo_bytes(120, 90, fmt="JPEG"),
+            "https://b.test/navy.png": _photo_bytes(color=(30, 40, 110)),
+        }
+        big = self._store().fetch("https://a.test/big.png")
+        small = self._store().fetch("https://b.test/small.jpg")
+        self.assertEqual(small, big)
+        # Same shapes in another colourway: the grayscale hash matches, the colour does not.
+        self.assertNotEqual(self._store().fetch("https://b.test/navy.png"), big)
+        self.assertEqual(SupplierImage.objects.count(), 2)
+
+        # Colour variants want the exact photo: the similar match is not reused.
+        exact = self._store().fetch("https://b.test/small.jpg", similar=False)
+        self.assertNotEqual(exact, big)
+        self.assertEqual(self._store().fetch("https://b.test/small.jpg", similar=False), exact)
+
+    def test_invalid_image_is_skipped(self):
+        self.bodies = {"https://a.test/page.jpg": b"<html>not an image</html>"}
+        self.assertIsNone(self._store().fetch("https://a.test/page.jpg"))
+        self.assertFalse(SupplierImage.objects.exists())
+
+    @override_settings(IMAGE_VARIANT_FORMATS=["webp"], IMAGE_VARIANT_WIDTHS=[100, 200])
+    def test_variants_are_made_from_downloaded_bytes(self):
+        self.bodies = {"https://a.test/1.png": _photo_bytes()}
+        key = self._store(variants=True).fetch("https://a.test/1.png")
+
+        self.assertEqual(
+            set(ImageVariant.objects.filter(source_name=key).values_list("width", "pixel_width")),
+            {(100, 100), (200, 200)},
+        )
+        self.assertTrue(self.storage.exists(build_variant_name(key, 100, "webp")))
+        meta = ImageMetadata.objects.get(source_name=key)
+        self.assertEqual((meta.width, meta.height), (240, 180))
+        # The job scheduled when a product is saved with the key never reads the original.
+        with patch.object(FileSystemStorage, "open", side_effect=AssertionError("storage read")):
+            generated = generate_variants_for_storage_key(key, storage=self.storage, assume_exists=False)
+        self.assertEqual(generated, [])
@@ -0,0 +1,115 @@
+"""Shared XLSX ingestion for supplier price workbooks.
+
+``openpyxl.load_workbook`` in its default mode builds a ``Cell`` object (with
+styles) for every cell of every sheet, which is slow and memory hungry on
+big supplier price lists — and some importers parse the same file several
+times per run (e.g. Eurosof ``parse`` then ``parse_corner``).
+
+``read_xlsx_rows`` streams a single sheet in read-only mode, keeps only the
+first ``max_col`` columns and caches the resulting rows in process, keyed by
+the SHA-256 of the file content, so a re-read of an unchanged file is free.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import List, Optional, Tuple, Union
+
+XLSX_CACHE_SIZE = 8
+
+_cache: "OrderedDict[tuple, Tuple[tuple, ...]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def clear_xlsx_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
+
+
+def _read_content(source: Union[str, bytes]) -> bytes:
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    with open(source, "rb") as fh:
+        return fh.read()
+
+
+def _stream_rows(
+    content: bytes,
+    sheet: Optional[str],
+    max_col: Optional[int],
+    min_row: int,
+    as_text: bool,
+    default_to_active: bool,
+) -> Tuple[tuple, ...]:
+    from openpyxl import load_workbook  # Imported lazily
+
+    workbook = load_workbook(BytesIO(content), read_only=True, data_only=True)
+    try:
+        if sheet and (sheet in workbook.sheetnames or not default_to_active):
+            worksheet = workbook[sheet]
+        else:
+            worksheet = workbook.active
+        # The <dimension> tag is often wrong in generated files; read what is
+        # actually there instead of trusting it.
+        worksheet.reset_dimensions()
+        filler = "" if as_text else None
+        rows: List[tuple] = []
+        for row in worksheet.iter_rows(
+            min_row=min_row, max_col=max_col, values_only=True
+        ):
+            if as_text:
+                row = tuple("" if value is None else str(value) for value in row)
+            rows.append(row)
+    finally:
+        workbook.close()
+
+    # Read-only rows are as wide as their last cell; pad them to one width so
+    # callers can index columns like with a full worksheet.
+    width = max_col if max_col else max((len(row) for row in rows), default=0)
+    return tuple(
+        row if len(row) == width else row + (filler,) * (width - len(row))
+        for row in rows
+    )
+
+
+def read_xlsx_rows(
+    source: Union[str, bytes],
+    sheet: Optional[str] = None,
+    max_col: Optional[int] = None,
+    min_row: int = 1,
+    as_text: bool = False,
+    default_to_active: bool = False,
+) -> List:
+    """Return cell values of one sheet as rows.
+
+    ``source`` is a file path or the workbook bytes. ``sheet`` defaults to the
+    active sheet; a missing sheet raises ``KeyError`` unless
+    ``default_to_active`` is set. With ``as_text`` every value is ``str`` (empty
+    cells become ``""``) and rows are lists, as the Google Sheets updater
+    expects; otherwise rows are tuples of raw values.
+    """
+    content = _read_content(source)
+    key = (
+        hashlib.sha256(content).hexdigest(),
+        sheet,
+        max_col,
+        min_row,
+        as_text,
+        default_to_active,
+    )
+    with _cache_lock:
+        rows = _cache.get(key)
+        if rows is not None:
+            _cache.move_to_end(key)
+    if rows is None:
+        rows = _stream_rows(
+            content, sheet, max_col, min_row, as_text, default_to_active
+        )
+        with _cache_lock:
+            _cache[key] = rows
+            while len(_cache) > XLSX_CACHE_SIZE:
+                _cache.popitem(last=False)
+    if as_text:
+        return [list(row) for row in rows]
+    return list(rows)
@@ -1,16 +1,28 @@
+import json
 import logging
+import os
 import sys
-from typing import Iterable, Optional, Sequence, Tuple
+import time
+from collections import deque
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future
+from concurrent.futures import wait as wait_futures
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 from django.apps import apps
+from django.conf import settings
 from django.core.files.storage import default_storage
 from django.core.management.base import BaseCommand, CommandError
 from django.db import OperationalError, close_old_connections, models
 
-from utils.image_variants import (
-    GeneratedVariant,
-    build_variant_name,
-    generate_variants_for_storage_key,
+from utils.image_variants import GeneratedVariant, build_variant_name
+from utils.variant_pool import (
+    generate_with_stats,
+    get_variant_pool,
+    process_executor,
+    retry_failed_variants,
+    storage_ref,
 )
 
 log = logging.getLogger(__name__)
@@ -69,6 +81,110 @@ def batched_queryset(queryset, *, chunk_size: int = 200):
         close_old_connections()
 
 
+def _mb(value: int) -> str:
+    return f"{value / (1024 * 1024):.1f}MB"
+
+
+@dataclass(frozen=True)
+class _Item:
+    label: str
+    key: str
+    pk: Any
+    field: str
+    name: str
+
+
+@dataclass
+class _Stats:
+    processed: int = 0
+    errors: int = 0
+    variants: int = 0
+    source_bytes: int = 0
+    variant_bytes: int = 0
+    saved_bytes: int = 0
+    started: float = 0.0
+
+    def add(self, variants: List[GeneratedVariant], source_bytes: int) -> None:
+        self.variants += len(variants)
+        variant_bytes = sum(v.size_bytes for v in variants)
+        self.variant_bytes += variant_bytes
+        if source_bytes and variants:
+            self.source_bytes += source_bytes
+            # What a visitor saves getting an average variant instead of the original.
+            self.saved_bytes += source_bytes - variant_bytes // len(variants)
+
+
+class _Checkpoint:
+    """Resumable progress: per model/field the pk up to which every record is done.
+
+    Parallel results complete out of order, so the stored pk only advances
+    over a contiguous run of finished records.
+    """
+
+    SAVE_INTERVAL = 5.0
+
+    def __init__(self, path: str, enabled: bool = True):
+        self.path = Path(path)
+        self.enabled = enabled
+        self._data: Dict[str, dict] = {}
+        self._open: Dict[str, deque] = {}
+        self._finished: Dict[str, set] = {}
+        self._saved_at = 0.0
+        if enabled and self.path.exists():
+            try:
+                self._data = json.loads(self.path.read_text(encoding="utf-8"))
+            except ValueError:
+                self._data = {}
+
+    def is_done(self, key: str) -> bool:
+        return bool(self._data.get(key, {}).get("done"))
+
+    def after(self, key: str) -> Optional[int]:
+        return self._data.get(key, {}).get("after")
+
+    def submitted(self, key: str, pk: int) -> None:
+        self._open.setdefault(key, deque()).append(pk)
+
+    def completed(self, key: str, pk: int) -> None:
+        finished = self._finished.setdefault(key, set())
+        finished.add(pk)
+        queue = self._open.get(key, deque())
+        advanced = None
+        while queue and queue[0] in finished:
+            advanced = queue.popleft()
+            finished.discard(advanced)
+        if advanced is not None:
+            entry = self._data.setdefault(key, {})
+            entry["after"] = advanced
+            if entry.get("iterated") and not queue:
+                entry["done"] = True
+            self.save()
+
+    def iterated(self, key: str) -> None:
+        entry = self._data.setdefault(key, {})
+        entry["iterated"] = True
+        if not self._open.get(key):
+            entry["done"] = True
+        self.save()
+
+    def save(self, force: bool = False) -> None:
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if not force and now - self._saved_at < self.SAVE_INTERVAL:
+            return
+        self._saved_at = now
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self._data), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        self._data = {}
+        if self.enabled and self.path.exists():
+            self.path.unlink()
+
+
 class Command(BaseCommand):
     help = (
         "Генерує responsive-варіанти (WebP) для усіх ImageField у проєкті. "
@@ -91,7 +207,7 @@ class Command(BaseCommand):
             "--format",
             dest="fmt",
             default=None,
-            help="Формат виводу (default: settings.IMAGE_VARIANT_FORMAT, зазвичай webp)",
+            help="Лише один формат (default: усі з settings.IMAGE_VARIANT_FORMATS — avif, webp, jpeg)",
         )
         parser.add_argument(
             "--quality",
@@ -112,8 +228,32 @@ class Command(BaseCommand):
             action="store_true",
             help="Не перевіряти наявність файлів у стореджі (швидше, але завжди перезаписує варіанти)",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Кількість процесів для паралельної генерації (default: 1 — послідовно)",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=str(Path(settings.BASE_DIR) / "cache" / "generate_responsive_images.json"),
+            help="Файл прогресу для --resume",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Продовжити перервану генерацію з --checkpoint замість початку спочатку",
+        )
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Лише повторити зображення зі списку невдалих фонових генерацій (IMAGE_VARIANT_RETRY_FILE)",
+        )
 
     def handle(self, *args, **options):
+        if options.get("retry_failed"):
+            return self._retry_failed()
+
         app_label = options.get("app_label")
         model_name = options.get("model_name")
         field_name = options.get("field_name")
@@ -125,73 +265,167 @@ class Command(BaseCommand):
         dry_run = options.get("dry_run", False)
         chunk_size = max(1, options.get("chunk_size") or 200)
         assume_exists = options.get("assume_existing", False)
+        workers = max(1, options.get("workers") or 1)
 
         storage = default_storage
         if not storage:
             raise CommandError("Не вдалося отримати default_storage.")
 
-        total_models = total_processed = total_generated = 0
+        self.fmt = fmt
+        self.force = force
+        self.stats = _Stats(started=time.monotonic())
+        checkpoint = _Checkpoint(options["checkpoint"], enabled=not dry_run)
+        if not options.get("resume"):
+            checkpoint.clear()
+        generate_options = {
+            "widths": list(widths) if widths else None,
+            "fmt": fmt,
+            "quality": quality,
+            "force": force,
+            "dry_run": dry_run,
+            "assume_exists": assume_exists,
+        }
 
-        for model, field in iter_image_fields(app_label, model_name, field_name):
-            total_models += 1
-            queryset = model.objects.all()
-            fname = field.name
-            queryset = queryset.exclude(**{fname: ""}).exclude(**{f"{fname}__isnull": True})
-            if limit:
-                queryset = queryset[:limit]
+        executor = process_executor(workers) if workers > 1 else None
+        # Bounded look-ahead: enough to keep every worker busy, few enough
+        # that the queue never holds a whole table.
+        window = workers * 2
+        in_flight: Dict[Future, _Item] = {}
+        total_models = 0
 
-            self.stdout.write(self.style.MIGRATE_HEADING(
-                f"Модель {model._meta.label} • поле {fname} • обробляємо…"
-            ))
-
-            for obj in batched_queryset(queryset, chunk_size=chunk_size):
-                image_field = getattr(obj, fname, None)
-                if not image_field:
-                    continue
-                name = getattr(image_field, "name", "")
-                if not name:
+        try:
+            for model, field in iter_image_fields(app_label, model_name, field_name):
+                total_models += 1
+                fname = field.name
+                key = f"{model._meta.label}.{fname}"
+                if checkpoint.is_done(key):
+                    self.stdout.write(self.style.NOTICE(f"[SKIP] {key} — вже оброблено (checkpoint)"))
                     continue
 
-                total_processed += 1
-
-                try:
-                    generated_variants = generate_variants_for_storage_key(
-                        name,
-                        storage=image_field.storage if hasattr(image_field, "storage") else storage,
-                        widths=widths,
-                        fmt=fmt,
-                        quality=quality,
-                        force=force,
-                        dry_run=dry_run,
-                        assume_exists=assume_exists,
+                queryset = model.objects.exclude(**{fname: ""}).exclude(**{f"{fname}__isnull": True})
+                after = checkpoint.after(key)
+                if after is not None:
+                    queryset = queryset.filter(pk__gt=after)
+                    self.stdout.write(self.style.NOTICE(f"Продовжуємо {key} після id={after}"))
+
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f"Модель {model._meta.label} • поле {fname} • обробляємо…"
+                ))
+
+                seen = 0
+                limited = False
+                for obj in batched_queryset(queryset, chunk_size=chunk_size):
+                    if limit and seen >= limit:
+                        limited = True
+                        break
+                    image_field = getattr(obj, fname, None)
+                    name = getattr(image_field, "name", "") if image_field else ""
+                    if not name:
+                        continue
+                    seen += 1
+                    item_storage = getattr(image_field, "storage", None) or storage
+                    item = _Item(model._meta.label, key, obj.pk, fname, name)
+                    checkpoint.submitted(key, obj.pk)
+
+                    if executor is None:
+                        try:
+                            result = generate_with_stats(name, item_storage, generate_options)
+                        except Exception as exc:
+                            self._finish(item, exc=exc)
+                        else:
+                            self._finish(item, result=result)
+                        checkpoint.completed(key, obj.pk)
+                        continue
+
+                    while len(in_flight) >= window:
+                        self._drain(in_flight, checkpoint, return_when=FIRST_COMPLETED)
+                    future = executor.submit(
+                        generate_with_stats, name, storage_ref(item_storage), generate_options
                     )
-                except FileNotFoundError:
-                    self.stdout.write(self.style.WARNING(
-                        f"[SKIP] {model._meta.label} id={obj.pk} {fname}='{name}' — файл не знайдено у стореджі"
-                    ))
-                    continue
-                except Exception as exc:
-                    log.exception("Помилка при генерації responsive для %s:%s", model._meta.label, obj.pk)
-                    self.stdout.write(self.style.WARNING(
-                        f"[ERROR] {model._meta.label} id={obj.pk} {fname}='{name}': {exc}"
-                    ))
-                    continue
+                    in_flight[future] = item
 
-                if not generated_variants and not force:
-                    self.stdout.write(self.style.NOTICE(
-                        f"[SKIP] {model._meta.label} id={obj.pk} {fname}='{name}' — усі варіанти вже існують"
-                    ))
-                    continue
+                if not limited:
+                    checkpoint.iterated(key)
+
+            self._drain(in_flight, checkpoint, return_when=ALL_COMPLETED)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+            checkpoint.save(force=True)
+
+        if not dry_run and self.stats.errors == 0:
+            checkpoint.clear()
+
+        stats = self.stats
+        elapsed = max(time.monotonic() - stats.started, 0.001)
+        self.stdout.write(self.style.HTTP_INFO(
+            f"Готово: моделей={total_models}, записів={stats.processed}, створено варіантів={stats.variants}, "
+            f"помилок={stats.errors}, dry_run={dry_run}"
+        ))
+        ratio = f"{100 * stats.variant_bytes / stats.source_bytes:.0f}%" if stats.source_bytes else "—"
+        self.stdout.write(self.style.HTTP_INFO(
+            f"Швидкість: {stats.processed / elapsed:.2f} зобр./с за {elapsed:.0f} с (процесів: {workers}); "
+            f"оригінали {_mb(stats.source_bytes)} → варіанти {_mb(stats.variant_bytes)} ({ratio}), "
+            f"заощаджено {_mb(max(stats.saved_bytes, 0))} на показ усіх зображень"
+        ))
+
+    def _drain(self, in_flight: Dict[Future, "_Item"], checkpoint: "_Checkpoint", return_when: str) -> None:
+        if not in_flight:
+            return
+        done, _ = wait_futures(list(in_flight), return_when=return_when)
+        for future in done:
+            item = in_flight.pop(future)
+            exc = future.exception()
+            if exc is not None:
+                self._finish(item, exc=exc)
+            else:
+                self._finish(item, result=future.result())
+            checkpoint.completed(item.key, item.pk)
 
-                total_generated += len(generated_variants)
+    def _finish(
+        self,
+        item: "_Item",
+        result: Optional[Tuple[List[GeneratedVariant], int]] = None,
+        exc: Optional[BaseException] = None,
+    ) -> None:
+        self.stats.processed += 1
+        if isinstance(exc, FileNotFoundError):
+            self.stdout.write(self.style.WARNING(
+                f"[SKIP] {item.label} id={item.pk} {item.field}='{item.name}' — файл не знайдено у стореджі"
+            ))
+            return
+        if exc is not None:
+            self.stats.errors += 1
+            log.error("Помилка при генерації responsive для %s:%s: %s", item.label, item.pk, exc)
+            self.stdout.write(self.style.WARNING(
+                f"[ERROR] {item.label} id={item.pk} {item.field}='{item.name}': {exc}"
+            ))
+            return
 
-                for variant in generated_variants:
-                    suffix = f"{variant.width}w"
-                    size_info = f"{variant.size_bytes / 1024:.1f}KB" if variant.size_bytes else "dry-run"
-                    self.stdout.write(self.style.SUCCESS(
-                        f"[OK] {model._meta.label} id={obj.pk} {fname}: {build_variant_name(name, variant.width, fmt)} ({suffix}, {size_info})"
-                    ))
+        generated_variants, source_bytes = result or ([], 0)
+        if not generated_variants and not self.force:
+            self.stdout.write(self.style.NOTICE(
+                f"[SKIP] {item.label} id={item.pk} {item.field}='{item.name}' — усі варіанти вже існують"
+            ))
+            return
+
+        self.stats.add(generated_variants, source_bytes)
+        for variant in generated_variants:
+            suffix = f"{variant.width}w {variant.format}".strip()
+            size_info = f"{variant.size_bytes / 1024:.1f}KB" if variant.size_bytes else "dry-run"
+            self.stdout.write(self.style.SUCCESS(
+                f"[OK] {item.label} id={item.pk} {item.field}: "
+                f"{variant.name or build_variant_name(item.name, variant.width, self.fmt)} ({suffix}, {size_info})"
+            ))
 
+    def _retry_failed(self) -> None:
+        pool = get_variant_pool()
+        if pool.retry_list is None:
+            raise CommandError("IMAGE_VARIANT_RETRY_FILE не налаштовано.")
+        before = len(pool.retry_list.entries())
+        submitted = retry_failed_variants(pool)
+        pool.wait()
+        left = len(pool.retry_list.entries())
         self.stdout.write(self.style.HTTP_INFO(
-            f"Готово: моделей={total_models}, записів={total_processed}, створено варіантів={total_generated}, dry_run={dry_run}"
+            f"Повтор невдалих: у списку={before}, запущено={submitted}, залишилось={left}"
         ))
@@ -0,0 +1,73 @@
+# Generated by Django 5.2 on 2026-10-19 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0004_seasonalsettings_name"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImageVariant",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source_name",
+                    models.CharField(
+                        max_length=255, verbose_name="Оригінал (ключ у сховищі)"
+                    ),
+                ),
+                ("width", models.PositiveIntegerField(verbose_name="Ширина варіанту")),
+                ("format", models.CharField(max_length=10, verbose_name="Формат")),
+                (
+                    "name",
+                    models.CharField(
+                        max_length=255, verbose_name="Ключ варіанту у сховищі"
+                    ),
+                ),
+                (
+                    "size_bytes",
+                    models.PositiveIntegerField(default=0, verbose_name="Розмір, байт"),
+                ),
+                (
+                    "pixel_width",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Менша за ширину варіанту, якщо оригінал вужчий; 0 — невідомо.",
+                        verbose_name="Фактична ширина, px",
+                    ),
+                ),
+                (
+                    "pixel_height",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Фактична висота, px"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Оновлено"),
+                ),
+            ],
+            options={
+                "verbose_name": "Варіант зображення",
+                "verbose_name_plural": "Варіанти зображень",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("source_name", "width", "format"),
+                        name="image_variant_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0005_imagevariant"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImageMetadata",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source_name",
+                    models.CharField(
+                        max_length=255,
+                        unique=True,
+                        verbose_name="Оригінал (ключ у сховищі)",
+                    ),
+                ),
+                (
+                    "width",
+                    models.PositiveIntegerField(default=0, verbose_name="Ширина, px"),
+                ),
+                (
+                    "height",
+                    models.PositiveIntegerField(default=0, verbose_name="Висота, px"),
+                ),
+                (
+                    "dominant_color",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        max_length=7,
+                        verbose_name="Домінантний колір",
+                    ),
+                ),
+                (
+                    "lqip",
+                    models.TextField(
+                        blank=True,
+                        default="",
+                        help_text="Крихітна розмита копія; порожньо для зображень із прозорістю.",
+                        verbose_name="Плейсхолдер (data URI)",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Оновлено"),
+                ),
+            ],
+            options={
+                "verbose_name": "Метадані зображення",
+                "verbose_name_plural": "Метадані зображень",
+            },
+        ),
+    ]
@@ -0,0 +1,158 @@
+# Generated by Django 5.2 on 2026-10-19 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0006_imagemetadata"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaReference",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(max_length=512, verbose_name="Ключ у сховищі"),
+                ),
+                (
+                    "owner",
+                    models.CharField(
+                        db_index=True,
+                        help_text="Ключ без розширення; йому належать і згенеровані варіанти.",
+                        max_length=512,
+                        verbose_name="Власник",
+                    ),
+                ),
+                ("model", models.CharField(max_length=100, verbose_name="Модель")),
+                (
+                    "object_id",
+                    models.CharField(max_length=64, verbose_name="ID запису"),
+                ),
+                ("field", models.CharField(max_length=100, verbose_name="Поле")),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Оновлено"),
+                ),
+            ],
+            options={
+                "verbose_name": "Посилання на медіафайл",
+                "verbose_name_plural": "Посилання на медіафайли",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("model", "object_id", "field"),
+                        name="media_reference_uniq",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="MediaObject",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(
+                        max_length=512, unique=True, verbose_name="Ключ у сховищі"
+                    ),
+                ),
+                (
+                    "owner",
+                    models.CharField(
+                        db_index=True, max_length=512, verbose_name="Власник"
+                    ),
+                ),
+                (
+                    "size",
+                    models.BigIntegerField(default=0, verbose_name="Розмір, байт"),
+                ),
+                (
+                    "last_modified",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Змінено у сховищі"
+                    ),
+                ),
+                (
+                    "listed_at",
+                    models.DateTimeField(verbose_name="Останній раз у переліку"),
+                ),
+                (
+                    "dirty",
+                    models.BooleanField(
+                        db_index=True,
+                        default=True,
+                        help_text="Новий ключ або власник втратив посилання після останнього очищення.",
+                        verbose_name="Потребує перевірки",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Файл у сховищі",
+                "verbose_name_plural": "Файли у сховищі",
+            },
+        ),
+        migrations.CreateModel(
+            name="MediaInventoryState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "prefix",
+                    models.CharField(
+                        blank=True, max_length=255, unique=True, verbose_name="Префікс"
+                    ),
+                ),
+                (
+                    "cursor",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        max_length=1024,
+                        verbose_name="Останній отриманий ключ",
+                    ),
+                ),
+                (
+                    "pass_started_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Прохід розпочато"
+                    ),
+                ),
+                (
+                    "pass_completed_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Прохід завершено"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Стан переліку сховища",
+                "verbose_name_plural": "Стан переліку сховища",
+            },
+        ),
+    ]
@@ -30,3 +30,128 @@ class SeasonalSettings(models.Model):
     def get_solo(cls) -> "SeasonalSettings":
         obj, _ = cls.objects.get_or_create(pk=1)
         return obj
+
+
+class ImageVariant(models.Model):
+    """Manifest of generated responsive variants, so templates never ask storage."""
+
+    source_name = models.CharField(max_length=255, verbose_name="Оригінал (ключ у сховищі)")
+    width = models.PositiveIntegerField(verbose_name="Ширина варіанту")
+    format = models.CharField(max_length=10, verbose_name="Формат")
+    name = models.CharField(max_length=255, verbose_name="Ключ варіанту у сховищі")
+    size_bytes = models.PositiveIntegerField(default=0, verbose_name="Розмір, байт")
+    pixel_width = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Фактична ширина, px",
+        help_text="Менша за ширину варіанту, якщо оригінал вужчий; 0 — невідомо.",
+    )
+    pixel_height = models.PositiveIntegerField(default=0, verbose_name="Фактична висота, px")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Оновлено")
+
+    class Meta:
+        verbose_name = "Варіант зображення"
+        verbose_name_plural = "Варіанти зображень"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source_name", "width", "format"], name="image_variant_uniq"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class ImageMetadata(models.Model):
+    """Intrinsic size and placeholder of an original image, computed with its variants."""
+
+    source_name = models.CharField(
+        max_length=255, unique=True, verbose_name="Оригінал (ключ у сховищі)"
+    )
+    width = models.PositiveIntegerField(default=0, verbose_name="Ширина, px")
+    height = models.PositiveIntegerField(default=0, verbose_name="Висота, px")
+    dominant_color = models.CharField(
+        max_length=7, blank=True, default="", verbose_name="Домінантний колір"
+    )
+    lqip = models.TextField(
+        blank=True,
+        default="",
+        verbose_name="Плейсхолдер (data URI)",
+        help_text="Крихітна розмита копія; порожньо для зображень із прозорістю.",
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Оновлено")
+
+    class Meta:
+        verbose_name = "Метадані зображення"
+        verbose_name_plural = "Метадані зображень"
+
+    def __str__(self) -> str:
+        return self.source_name
+
+
+class MediaReference(models.Model):
+    """Storage key referenced by a FileField of a row (kept current by utils.media_index)."""
+
+    key = models.CharField(max_length=512, verbose_name="Ключ у сховищі")
+    owner = models.CharField(
+        max_length=512,
+        db_index=True,
+        verbose_name="Власник",
+        help_text="Ключ без розширення; йому належать і згенеровані варіанти.",
+    )
+    model = models.CharField(max_length=100, verbose_name="Модель")
+    object_id = models.CharField(max_length=64, verbose_name="ID запису")
+    field = models.CharField(max_length=100, verbose_name="Поле")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Оновлено")
+
+    class Meta:
+        verbose_name = "Посилання на медіафайл"
+        verbose_name_plural = "Посилання на медіафайли"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["model", "object_id", "field"], name="media_reference_uniq"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return self.key
+
+
+class MediaObject(models.Model):
+    """Cached listing of the media storage used by cleanup_unused_media."""
+
+    key = models.CharField(max_length=512, unique=True, verbose_name="Ключ у сховищі")
+    owner = models.CharField(max_length=512, db_index=True, verbose_name="Власник")
+    size = models.BigIntegerField(default=0, verbose_name="Розмір, байт")
+    last_modified = models.DateTimeField(null=True, blank=True, verbose_name="Змінено у сховищі")
+    listed_at = models.DateTimeField(verbose_name="Останній раз у переліку")
+    dirty = models.BooleanField(
+        default=True,
+        db_index=True,
+        verbose_name="Потребує перевірки",
+        help_text="Новий ключ або власник втратив посилання після останнього очищення.",
+    )
+
+    class Meta:
+        verbose_name = "Файл у сховищі"
+        verbose_name_plural = "Файли у сховищі"
+
+    def __str__(self) -> str:
+        return self.key
+
+
+class MediaInventoryState(models.Model):
+    """Resumable listing pass over one storage prefix."""
+
+    prefix = models.CharField(max_length=255, unique=True, blank=True, verbose_name="Префікс")
+    cursor = models.CharField(
+        max_length=1024, blank=True, default="", verbose_name="Останній отриманий ключ"
+    )
+    pass_started_at = models.DateTimeField(null=True, blank=True, verbose_name="Прохід розпочато")
+    pass_completed_at = models.DateTimeField(null=True, blank=True, verbose_name="Прохід завершено")
+
+    class Meta:
+        verbose_name = "Стан переліку сховища"
+        verbose_name_plural = "Стан переліку сховища"
+
+    def __str__(self) -> str:
+        return self.prefix or "/"
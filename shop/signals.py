@@ -6,6 +6,7 @@ from categories.models import Category
 from furniture.models import Furniture
 from shop.models import SeasonalSettings
 from sub_categories.models import SubCategory
+from utils import media_index
 
 
 def _delete_pattern(pattern: str) -> None:
@@ -38,3 +39,7 @@ def invalidate_furniture_cache(sender, **kwargs):
 @receiver(post_save, sender=SeasonalSettings)
 def invalidate_seasonal_cache(sender, **kwargs):
     cache.delete("seasonal_pack_settings")
+
+
+# Keep the media reference index (cleanup_unused_media) in sync with file fields.
+media_index.connect_signals()
@@ -1,12 +1,26 @@
 from __future__ import annotations
 
-from typing import Iterable, Optional, Sequence
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
 
 from django import template
 from django.conf import settings
 from django.core.files.storage import Storage, default_storage
+from django.utils.html import format_html, format_html_join
 
-from utils.image_variants import build_media_url, build_variant_name
+from utils.image_resize import resize_url
+from utils.image_variants import (
+    build_media_url,
+    build_variant_name,
+    get_variant_formats,
+    variant_mime_type,
+)
+from utils.variant_manifest import (
+    Entries,
+    ImageMeta,
+    current_lookup,
+    manifest_enabled,
+    prefetch,
+)
 
 register = template.Library()
 
@@ -30,6 +44,43 @@ def _variant_widths(widths: Optional[Sequence[int]]) -> Iterable[int]:
     return getattr(settings, "IMAGE_VARIANT_WIDTHS", [400, 800, 1200])
 
 
+def _manifest_entries(name: str) -> Optional[Entries]:
+    """Variants recorded for ``name``, or None when the manifest does not know it."""
+    if not manifest_enabled():
+        return None
+    return current_lookup().get(name)
+
+
+def _metadata(image_field: Any) -> Optional[ImageMeta]:
+    name = _get_name(image_field)
+    if not name or not manifest_enabled():
+        return None
+    return current_lookup().metadata(name)
+
+
+def _placeholder_style(meta: Optional[ImageMeta]) -> str:
+    if meta is None or not (meta.lqip or meta.dominant_color):
+        return ""
+    style = f"background-color:{meta.dominant_color};" if meta.dominant_color else ""
+    if meta.lqip:
+        style += f"background-image:url({meta.lqip});background-size:cover;background-position:center;"
+    return style
+
+
+def _legacy_format() -> str:
+    return getattr(settings, "IMAGE_VARIANT_FORMAT", "webp").lower()
+
+
+def _variant_exists(image_field: Any, name: str, width: int, fmt: str) -> bool:
+    entries = _manifest_entries(name)
+    if entries is not None:
+        return (width, fmt.lower()) in entries
+    if not _should_check_exists():
+        # Images from before the manifest only have the single-format variants.
+        return fmt.lower() == _legacy_format()
+    return _get_storage(image_field).exists(build_variant_name(name, width, fmt))
+
+
 @register.filter
 def image_variant(image_field, width: Optional[int] = None) -> str:
     """
@@ -45,17 +96,52 @@ def image_variant(image_field, width: Optional[int] = None) -> str:
     fmt = getattr(settings, "IMAGE_VARIANT_FORMAT", "webp")
     variant_name = build_variant_name(name, width, fmt)
 
-    if _should_check_exists():
-        storage = _get_storage(image_field)
-        if not storage.exists(variant_name):
-            # Fallback на оригінальне зображення
-            return getattr(image_field, "url", build_media_url(name))
+    if _should_check_exists() and not _variant_exists(image_field, name, width, fmt):
+        # Fallback на оригінальне зображення
+        return getattr(image_field, "url", build_media_url(name))
 
     return build_media_url(variant_name)
 
 
+def _srcset(
+    image_field: Any, name: str, widths: Optional[Sequence[int]], fmt: str
+) -> str:
+    fmt = fmt.lower()
+    entries = _manifest_entries(name)
+    if entries is None and not _should_check_exists():
+        if fmt != _legacy_format():
+            # AVIF/JPEG exist only once the manifest lists them.
+            return ""
+        return ", ".join(
+            f"{build_media_url(build_variant_name(name, width, fmt))} {int(width)}w"
+            for width in _variant_widths(widths)
+        )
+
+    parts = []
+    seen = set()
+    for width in _variant_widths(widths):
+        width = int(width)
+        if entries is not None:
+            entry = entries.get((width, fmt))
+            if entry is None:
+                continue
+            # Real pixel width: a narrow original yields the same file for several widths.
+            descriptor = entry.pixel_width or width
+            url = build_media_url(entry.name)
+        elif _get_storage(image_field).exists(build_variant_name(name, width, fmt)):
+            descriptor = width
+            url = build_media_url(build_variant_name(name, width, fmt))
+        else:
+            continue
+        if descriptor in seen:
+            continue
+        seen.add(descriptor)
+        parts.append(f"{url} {descriptor}w")
+    return ", ".join(parts)
+
+
 @register.simple_tag
-def responsive_srcset(image_field, widths: Optional[Sequence[int]] = None) -> str:
+def responsive_srcset(image_field: Any, widths: Optional[Sequence[int]] = None) -> str:
     """
     Будує srcset значення у форматі "url 400w, url 800w, ...".
     """
@@ -64,13 +150,138 @@ def responsive_srcset(image_field, widths: Optional[Sequence[int]] = None) -> st
     name = _get_name(image_field)
     if not name:
         return ""
+    return _srcset(
+        image_field, name, widths, getattr(settings, "IMAGE_VARIANT_FORMAT", "webp")
+    )
 
-    parts = []
-    for width in _variant_widths(widths):
-        url = image_variant(image_field, width)
-        if url:
-            parts.append(f"{url} {int(width)}w")
-    return ", ".join(parts)
+
+@register.simple_tag
+def responsive_picture(
+    image_field: Any,
+    alt: str = "",
+    css_class: str = "",
+    sizes: Optional[str] = None,
+    widths: Optional[Sequence[int]] = None,
+    loading: str = "lazy",
+) -> str:
+    """
+    Рендерить <picture> з <source type="image/avif|webp"> для кожного формату з
+    IMAGE_VARIANT_FORMATS і <img> з останнім наявним форматом (JPEG) як fallback:
+    {% responsive_picture item.image alt=item.name css_class="card-media-img" %}
+    Формати, яких ще немає в маніфесті, не виводяться: старі зображення
+    отримують лише WebP, доки generate_responsive_images не згенерує решту.
+    """
+    if not image_field:
+        return ""
+    name = _get_name(image_field)
+    if not name:
+        return ""
+
+    sizes = responsive_sizes(sizes)
+    formats = get_variant_formats() or [_legacy_format()]
+    available = [
+        (fmt, srcset)
+        for fmt, srcset in (
+            (fmt, _srcset(image_field, name, widths, fmt)) for fmt in formats
+        )
+        if srcset
+    ]
+    fallback, fallback_srcset = available.pop() if available else (formats[-1], "")
+    sources = [(variant_mime_type(fmt), srcset, sizes) for fmt, srcset in available]
+
+    default_width = int(getattr(settings, "IMAGE_VARIANT_DEFAULT_WIDTH", 800))
+    if fallback_srcset and _variant_exists(image_field, name, default_width, fallback):
+        src = build_media_url(build_variant_name(name, default_width, fallback))
+    else:
+        src = getattr(image_field, "url", build_media_url(name))
+
+    img_attrs: List[Tuple[str, object]] = [("src", src), ("alt", alt)]
+    if fallback_srcset:
+        img_attrs += [("srcset", fallback_srcset), ("sizes", sizes)]
+    meta = _metadata(image_field)
+    if meta is not None and meta.width and meta.height:
+        img_attrs += [("width", meta.width), ("height", meta.height)]
+    placeholder = _placeholder_style(meta)
+    if placeholder:
+        img_attrs.append(("style", placeholder))
+    if css_class:
+        img_attrs.append(("class", css_class))
+    if loading:
+        img_attrs.append(("loading", loading))
+    img_attrs.append(("decoding", "async"))
+
+    return format_html(
+        "<picture>{}<img{}></picture>",
+        format_html_join("", '<source type="{}" srcset="{}" sizes="{}">', sources),
+        format_html_join("", ' {}="{}"', img_attrs),
+    )
+
+
+@register.simple_tag
+def image_dimensions(image_field: Any) -> str:
+    """
+    Атрибути width/height оригіналу, щоб браузер зарезервував місце до завантаження:
+    <img src="..." {% image_dimensions item.image %}>
+    """
+    meta = _metadata(image_field) if image_field else None
+    if meta is None or not (meta.width and meta.height):
+        return ""
+    return format_html('width="{}" height="{}"', meta.width, meta.height)
+
+
+@register.filter
+def intrinsic_width(image_field: Any) -> str:
+    """
+    Ширина оригіналу з метаданих (без завантаження файлу зі сховища, як
+    ImageFieldFile.width); порожньо, якщо ще не обчислено.
+    """
+    meta = _metadata(image_field) if image_field else None
+    return str(meta.width) if meta is not None and meta.width else ""
+
+
+@register.filter
+def intrinsic_height(image_field: Any) -> str:
+    meta = _metadata(image_field) if image_field else None
+    return str(meta.height) if meta is not None and meta.height else ""
+
+
+@register.simple_tag
+def image_placeholder(image_field: Any) -> str:
+    """
+    Значення для style: домінантний колір і розмита LQIP-копія як фон
+    <img style="{% image_placeholder item.image %}">
+    """
+    return _placeholder_style(_metadata(image_field) if image_field else None)
+
+
+@register.simple_tag
+def resized_image_url(
+    image_field: Any,
+    width: int = 0,
+    height: int = 0,
+    fit: str = "contain",
+    fmt: Optional[str] = None,
+) -> str:
+    """
+    URL зображення довільного розміру (генерується при першому запиті):
+    {% resized_image_url item.image 192 192 "cover" %}
+    """
+    if not image_field or not _get_name(image_field):
+        return ""
+    return resize_url(image_field, width, height, fit, fmt)
+
+
+@register.simple_tag
+def prefetch_variants(items: Iterable[Any], attr: str = "") -> str:
+    """
+    Завантажує маніфест варіантів для всіх зображень списку одним запитом:
+    {% prefetch_variants page_obj "image" %} перед циклом карток.
+    """
+    if items:
+        # Variants are loaded even with IMAGE_VARIANT_ASSUME_EXISTS: <picture>
+        # needs them to tell which formats an image has.
+        prefetch(getattr(item, attr, None) if attr else item for item in items)
+    return ""
 
 
 @register.simple_tag
@@ -1,3 +1,776 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import CommandError, call_command
+from django.template import Context, Template
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from categories.models import Category
+from shop.models import (
+    ImageMetadata,
+    ImageVariant,
+    MediaInventoryState,
+    MediaObject,
+    MediaReference,
+)
+from utils.image_resize import ResizeSpec, ensure_resized, resize_url
+from utils.image_variants import (
+    _resize_cascade,
+    build_variant_name,
+    draft_for_width,
+    format_supported,
+    generate_variants_for_storage_key,
+    is_immutable_key,
+    resize_image,
+)
+from utils.media_index import owner_key
+from utils.variant_manifest import manifest_scope
+from utils.variant_pool import RetryList, VariantPool, retry_failed_variants
+
+
+def _use_temp_media(testcase):
+    """Point default_storage at a temporary directory, never the R2 bucket configured in .env."""
+    tmp = tempfile.TemporaryDirectory()
+    testcase.addCleanup(tmp.cleanup)
+    override = override_settings(
+        MEDIA_ROOT=tmp.name,
+        STORAGES={
+            **settings.STORAGES,
+            "default": {
+                "BACKEND": "django.core.files.storage.FileSystemStorage",
+                "OPTIONS": {"location": tmp.name},
+            },
+        },
+    )
+    override.enable()
+    testcase.addCleanup(override.disable)
+    return tmp.name
+
+
+def _png_bytes(width=1000, height=600):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), (200, 120, 40)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@override_settings(IMAGE_VARIANT_MANIFEST=False)
+class TestVariantGenerator(SimpleTestCase):
+    def test_cascade_matches_direct_resize_sizes(self):
+        source = Image.new("RGB", (1001, 667))
+        cascade = _resize_cascade(source, [400, 800, 1200])
+        for width in (400, 800):
+            self.assertEqual(cascade[width].size, resize_image(source, width).size)
+        self.assertEqual(cascade[1200].size, source.size)  # never upscaled
+
+    def test_jpeg_draft_respects_exif_orientation(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        storage = FileSystemStorage(location=tmp.name)
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotated 90°: 5000x2500 on disk, 2500x5000 displayed
+        buffer = BytesIO()
+        Image.new("RGB", (5000, 2500), (10, 90, 160)).save(
+            buffer, format="JPEG", exif=exif
+        )
+        storage.save("big.jpg", ContentFile(buffer.getvalue()))
+
+        with storage.open("big.jpg", "rb") as fh, Image.open(fh) as img:
+            draft_for_width(img, 400)
+            self.assertEqual(img.size, (2500, 1250))  # decoded at 1/2
+
+        generate_variants_for_storage_key(
+            "big.jpg", storage=storage, widths=[400], fmt="webp", force=True
+        )
+        with storage.open("big_400w.webp", "rb") as fh, Image.open(fh) as variant:
+            self.assertEqual(variant.size, (400, 800))
+
+    @override_settings(IMAGE_VARIANT_FORMATS=["avif", "webp", "jpeg"])
+    def test_generates_every_supported_format(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        storage = FileSystemStorage(location=tmp.name)
+        buffer = BytesIO()
+        Image.new("RGBA", (900, 600), (10, 90, 160, 0)).save(buffer, format="PNG")
+        storage.save("alpha.png", ContentFile(buffer.getvalue()))
+
+        generated = generate_variants_for_storage_key(
+            "alpha.png", storage=storage, widths=[400], force=True
+        )
+        expected = [fmt for fmt in ("avif", "webp", "jpeg") if format_supported(fmt)]
+        self.assertEqual([v.format for v in generated], expected)
+        self.assertEqual(build_variant_name("alpha.png", 400, "jpeg"), "alpha_400w.jpg")
+        with storage.open("alpha_400w.jpg", "rb") as fh, Image.open(fh) as jpeg:
+            # Transparent pixels are flattened onto white, not black.
+            self.assertEqual((jpeg.format, jpeg.size), ("JPEG", (400, 267)))
+            self.assertGreater(min(jpeg.getpixel((0, 0))), 240)
+
+        # ``fmt`` still restricts generation to a single format.
+        only = generate_variants_for_storage_key(
+            "alpha.png", storage=storage, widths=[400], fmt="webp", force=True
+        )
+        self.assertEqual([v.name for v in only], ["alpha_400w.webp"])
+
+
+@override_settings(IMAGE_VARIANT_MANIFEST=False)
+class TestVariantPool(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.storage = FileSystemStorage(location=os.path.join(self.tmp.name, "media"))
+        self.retry = RetryList(os.path.join(self.tmp.name, "retry.json"))
+
+    def _pool(self, **kwargs):
+        kwargs.setdefault("executor", "thread")
+        pool = VariantPool(retry_list=self.retry, **kwargs)
+        self.addCleanup(pool.shutdown)
+        return pool
+
+    def test_generates_variants(self):
+        self.storage.save("pictures/a.png", ContentFile(_png_bytes()))
+        pool = self._pool()
+        future = pool.submit(
+            "pictures/a.png", self.storage, widths=[400, 800], fmt="webp"
+        )
+        self.assertEqual([v.width for v in future.result(timeout=30)], [400, 800])
+        self.assertTrue(
+            self.storage.exists(build_variant_name("pictures/a.png", 400, "webp"))
+        )
+        pool.wait(timeout=5)
+        self.assertEqual(pool.pending(), 0)
+
+    def test_process_pool(self):
+        self.storage.save("pictures/p.png", ContentFile(_png_bytes()))
+        pool = self._pool(executor="process", workers=1)
+        future = pool.submit("pictures/p.png", self.storage, widths=[400], fmt="webp")
+        self.assertEqual(len(future.result(timeout=120)), 1)
+        self.assertTrue(self.storage.exists("pictures/p_400w.webp"))
+
+    def test_dedupes_queued_key(self):
+        release = threading.Event()
+        calls = []
+
+        def slow(name, storage_ref, options):
+            calls.append(name)
+            release.wait(5)
+            return []
+
+        pool = self._pool(workers=1)
+        with patch("utils.variant_pool._generate", slow):
+            blocker = pool.submit("busy.png")
+            first = pool.submit("same.png")
+            self.assertIs(pool.submit("same.png"), first)
+            release.set()
+            pool.wait(timeout=5)
+        blocker.result(timeout=5)
+        self.assertEqual(calls, ["busy.png", "same.png"])
+
+    def test_backpressure_defers_to_retry_list(self):
+        release = threading.Event()
+
+        def slow(name, storage_ref, options):
+            release.wait(5)
+            return []
+
+        pool = self._pool(workers=1, max_pending=1, submit_timeout=0.01)
+        with patch("utils.variant_pool._generate", slow):
+            self.assertIsNotNone(pool.submit("one.png"))
+            self.assertIsNone(pool.submit("two.png", widths=[400]))
+            release.set()
+            pool.wait(timeout=5)
+        entry = self.retry.entries()["two.png"]
+        self.assertEqual(
+            (entry["error"], entry["options"]), ("queue full", {"widths": [400]})
+        )
+
+    def test_failures_are_retried(self):
+        pool = self._pool()
+        pool.submit("pictures/missing-later.png", self.storage, widths=[400])
+        pool.wait(timeout=10)
+        # A missing original is not worth retrying.
+        self.assertEqual(self.retry.entries(), {})
+
+        with patch("utils.variant_pool._generate", side_effect=OSError("broken file")):
+            pool.submit("pictures/b.png", widths=[400])
+            pool.wait(timeout=10)
+        self.assertEqual(self.retry.entries()["pictures/b.png"]["attempts"], 1)
+
+        with patch("utils.variant_pool._generate", return_value=[]):
+            self.assertEqual(retry_failed_variants(pool), 1)
+            pool.wait(timeout=10)
+        self.assertEqual(self.retry.entries(), {})
+
+
+class TestGenerateResponsiveImagesCommand(TestCase):
+    def setUp(self):
+        _use_temp_media(self)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.checkpoint = os.path.join(self.tmp.name, "checkpoint.json")
+        self.categories = []
+        for idx in range(3):
+            category = Category(name=f"Cat {idx}", slug=f"cat-{idx}")
+            category.image.save(
+                f"gri-test-{idx}.png", ContentFile(_png_bytes()), save=True
+            )
+            self.categories.append(category)
+
+    def _run(self, **options):
+        out = StringIO()
+        call_command(
+            "generate_responsive_images",
+            app_label="categories",
+            widths=[200],
+            fmt="webp",
+            checkpoint=self.checkpoint,
+            stdout=out,
+            **options,
+        )
+        return out.getvalue()
+
+    def test_parallel_run(self):
+        # Spawned worker processes would load store.settings (and its R2 storage)
+        # from scratch; threads share the overridden test settings.
+        with patch(
+            "shop.management.commands.generate_responsive_images.process_executor",
+            lambda workers: ThreadPoolExecutor(max_workers=workers),
+        ):
+            output = self._run(workers=2)
+        for category in self.categories:
+            self.assertTrue(
+                default_storage.exists(
+                    build_variant_name(category.image.name, 200, "webp")
+                )
+            )
+        self.assertIn("записів=3", output)
+        self.assertIn("зобр./с", output)
+        # A complete run leaves no checkpoint behind.
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resume_from_checkpoint(self):
+        with open(self.checkpoint, "w") as fh:
+            json.dump(
+                {"categories.Category.image": {"after": self.categories[0].pk}}, fh
+            )
+        output = self._run(resume=True)
+        self.assertIn("записів=2", output)
+        self.assertFalse(
+            default_storage.exists(
+                build_variant_name(self.categories[0].image.name, 200, "webp")
+            )
+        )
+
+
+@override_settings(IMAGE_VARIANT_ASSUME_EXISTS=False, IMAGE_VARIANT_FORMAT="webp")
+class TestVariantManifest(TestCase):
+    def setUp(self):
+        self.storage = FileSystemStorage(location=_use_temp_media(self))
+
+    def _render(self, source, **context):
+        return Template("{% load responsive_images %}" + source).render(
+            Context(context)
+        )
+
+    def test_generator_records_variants(self):
+        self.storage.save("narrow.png", ContentFile(_png_bytes(600, 300)))
+        generate_variants_for_storage_key(
+            "narrow.png",
+            storage=self.storage,
+            widths=[400, 800],
+            fmt="webp",
+            force=True,
+        )
+        rows = {
+            row.width: (row.pixel_width, row.pixel_height, row.size_bytes > 0)
+            for row in ImageVariant.objects.filter(source_name="narrow.png")
+        }
+        self.assertEqual(rows, {400: (400, 200, True), 800: (600, 300, True)})
+
+        # Existing variants found in storage are backfilled without re-encoding.
+        ImageVariant.objects.all().delete()
+        generated = generate_variants_for_storage_key(
+            "narrow.png",
+            storage=self.storage,
+            widths=[400, 800],
+            fmt="webp",
+            assume_exists=False,
+        )
+        self.assertEqual(generated, [])
+        self.assertEqual(
+            ImageVariant.objects.filter(source_name="narrow.png").count(), 2
+        )
+
+    def test_variants_in_manifest_are_not_regenerated(self):
+        self.storage.save(
+            "supplier_cache/content/ab/abc.png", ContentFile(_png_bytes(600, 300))
+        )
+        generate_variants_for_storage_key(
+            "supplier_cache/content/ab/abc.png",
+            storage=self.storage,
+            widths=[400],
+            fmt="webp",
+            force=True,
+        )
+        with patch.object(
+            FileSystemStorage, "exists", side_effect=AssertionError("storage call")
+        ):
+            generated = generate_variants_for_storage_key(
+                "supplier_cache/content/ab/abc.png",
+                storage=self.storage,
+                widths=[400],
+                fmt="webp",
+                assume_exists=False,
+            )
+        self.assertEqual(generated, [])
+
+        with self.settings(IMAGE_VARIANT_IMMUTABLE_PREFIXES=["supplier_cache/content"]):
+            self.assertTrue(is_immutable_key("supplier_cache/content/ab/abc.png"))
+            self.assertFalse(is_immutable_key("furniture/abc.png"))
+
+    def test_tags_read_manifest_without_storage_calls(self):
+        ImageVariant.objects.bulk_create(
+            [
+                ImageVariant(
+                    source_name="p/a.jpg",
+                    width=400,
+                    format="webp",
+                    name="p/a_400w.webp",
+                    pixel_width=400,
+                ),
+                ImageVariant(
+                    source_name="p/a.jpg",
+                    width=800,
+                    format="webp",
+                    name="p/a_800w.webp",
+                    pixel_width=600,
+                ),
+                ImageVariant(
+                    source_name="p/a.jpg",
+                    width=1200,
+                    format="webp",
+                    name="p/a_1200w.webp",
+                    pixel_width=600,
+                ),
+                ImageVariant(
+                    source_name="p/b.jpg",
+                    width=400,
+                    format="webp",
+                    name="p/b_400w.webp",
+                    pixel_width=400,
+                ),
+            ]
+        )
+        a = Category(name="A", image="p/a.jpg").image
+        b = Category(name="B", image="p/b.jpg").image
+        images = [a, b]
+        with patch.object(
+            FileSystemStorage, "exists", side_effect=AssertionError("storage call")
+        ):
+            with manifest_scope(), self.assertNumQueries(1):
+                output = self._render(
+                    "{% prefetch_variants images %}"
+                    "{% for image in images %}{{ image|image_variant:800 }}|{% responsive_srcset image %};{% endfor %}",
+                    images=images,
+                )
+        first, second = output.split(";")[:2]
+        self.assertIn("p/a_800w.webp|", first)
+        # 1200w is the same 600 px file as 800w and is listed once.
+        self.assertRegex(first, r"p/a_400w\.webp 400w, \S*p/a_800w\.webp 600w$")
+        # b has no 800w variant: the original is used and the srcset lists what exists.
+        self.assertIn("p/b.jpg|", second)
+        self.assertTrue(second.endswith("p/b_400w.webp 400w"), second)
+
+    def test_generator_records_dimensions_and_placeholder(self):
+        self.storage.save("sofa.png", ContentFile(_png_bytes(1000, 600)))
+        generate_variants_for_storage_key(
+            "sofa.png", storage=self.storage, widths=[400], fmt="webp"
+        )
+        meta = ImageMetadata.objects.get(source_name="sofa.png")
+        self.assertEqual(
+            (meta.width, meta.height, meta.dominant_color), (1000, 600, "#c87828")
+        )
+        self.assertTrue(meta.lqip.startswith("data:image/webp;base64,"))
+        self.assertLess(len(meta.lqip), 400)
+
+        # Variants already exist: decoded again only to fill in the metadata.
+        ImageMetadata.objects.all().delete()
+        generated = generate_variants_for_storage_key(
+            "sofa.png",
+            storage=self.storage,
+            widths=[400],
+            fmt="webp",
+            assume_exists=False,
+        )
+        self.assertEqual(generated, [])
+        self.assertTrue(
+            ImageMetadata.objects.filter(source_name="sofa.png", width=1000).exists()
+        )
+
+        buffer = BytesIO()
+        Image.new("RGBA", (300, 300), (0, 0, 0, 0)).save(buffer, format="PNG")
+        self.storage.save("clear.png", ContentFile(buffer.getvalue()))
+        generate_variants_for_storage_key(
+            "clear.png", storage=self.storage, widths=[400], fmt="webp"
+        )
+        meta = ImageMetadata.objects.get(source_name="clear.png")
+        self.assertEqual((meta.width, meta.dominant_color, meta.lqip), (300, "", ""))
+
+    @override_settings(IMAGE_VARIANT_ASSUME_EXISTS=True)
+    def test_dimension_tags_batch_metadata(self):
+        ImageMetadata.objects.bulk_create(
+            [
+                ImageMetadata(
+                    source_name="p/a.jpg",
+                    width=1000,
+                    height=600,
+                    dominant_color="#aabbcc",
+                    lqip="data:image/webp;base64,AAAA",
+                ),
+                ImageMetadata(source_name="p/b.jpg", width=800, height=800),
+            ]
+        )
+        images = [Category(name=n, image=f"p/{n}.jpg").image for n in ("a", "b", "c")]
+        # One query for the variants, one for the metadata.
+        with manifest_scope(), self.assertNumQueries(2):
+            output = self._render(
+                "{% prefetch_variants images %}{% for image in images %}"
+                '<img {% image_dimensions image %} data-w="{{ image|intrinsic_width }}" style="{% image_placeholder image %}">'
+                "{% endfor %}",
+                images=images,
+            )
+        self.assertEqual(
+            output,
+            '<img width="1000" height="600" data-w="1000" style="background-color:#aabbcc;'
+            'background-image:url(data:image/webp;base64,AAAA);background-size:cover;background-position:center;">'
+            '<img width="800" height="800" data-w="800" style="">'
+            '<img  data-w="" style="">',
+        )
+
+    @override_settings(
+        IMAGE_VARIANT_FORMATS=["webp", "jpeg"], IMAGE_VARIANT_DEFAULT_WIDTH=800
+    )
+    def test_picture_tag_emits_sources_and_fallback(self):
+        ImageVariant.objects.bulk_create(
+            [
+                ImageVariant(
+                    source_name="p/a.jpg",
+                    width=400,
+                    format="webp",
+                    name="p/a_400w.webp",
+                    pixel_width=400,
+                ),
+                ImageVariant(
+                    source_name="p/a.jpg",
+                    width=800,
+                    format="webp",
+                    name="p/a_800w.webp",
+                    pixel_width=800,
+                ),
+                ImageVariant(
+                    source_name="p/a.jpg",
+                    width=400,
+                    format="jpeg",
+                    name="p/a_400w.jpg",
+                    pixel_width=400,
+                ),
+            ]
+        )
+        image = Category(name="A", image="p/a.jpg").image
+        with patch.object(
+            FileSystemStorage, "exists", side_effect=AssertionError("storage call")
+        ):
+            with manifest_scope():
+                output = self._render(
+                    '{% responsive_picture image alt=name css_class="card-media-img" %}',
+                    image=image,
+                    name='Диван "Лофт"',
+                )
+        self.assertRegex(
+            output,
+            r'^<picture><source type="image/webp" srcset="\S*p/a_400w\.webp 400w, \S*p/a_800w\.webp 800w"',
+        )
+        # No 800w JPEG yet: the original is the src, the srcset lists what exists.
+        self.assertRegex(
+            output,
+            r'<img src="\S*p/a\.jpg" alt="Диван &quot;Лофт&quot;" srcset="\S*p/a_400w\.jpg 400w"',
+        )
+        self.assertIn(
+            'class="card-media-img" loading="lazy" decoding="async"></picture>', output
+        )
+
+    @override_settings(
+        IMAGE_VARIANT_ASSUME_EXISTS=True, IMAGE_VARIANT_FORMATS=["avif", "webp", "jpeg"]
+    )
+    def test_picture_tag_skips_formats_pillow_cannot_write(self):
+        ImageVariant.objects.bulk_create(
+            [
+                ImageVariant(
+                    source_name="p/a.jpg",
+                    width=800,
+                    format=fmt,
+                    name=f"p/a_800w.{ext}",
+                    pixel_width=800,
+                )
+                for fmt, ext in (("avif", "avif"), ("webp", "webp"), ("jpeg", "jpg"))
+            ]
+        )
+        image = Category(name="A", image="p/a.jpg").image
+        with patch(
+            "utils.image_variants.format_supported",
+            side_effect=lambda fmt: fmt != "avif",
+        ):
+            output = self._render("{% responsive_picture image %}", image=image)
+        self.assertNotIn("image/avif", output)
+        self.assertEqual(output.count("<source "), 1)
+        self.assertIn("p/a_800w.jpg", output)
+
+    @override_settings(
+        IMAGE_VARIANT_ASSUME_EXISTS=True,
+        IMAGE_VARIANT_FORMATS=["avif", "webp", "jpeg"],
+        IMAGE_VARIANT_WIDTHS=[400],
+    )
+    def test_picture_tag_assumes_only_webp_for_images_missing_from_the_manifest(self):
+        ImageVariant.objects.create(
+            source_name="p/new.jpg", width=400, format="jpeg", name="p/new_400w.jpg"
+        )
+        legacy = Category(name="L", image="p/legacy.jpg").image
+        new = Category(name="N", image="p/new.jpg").image
+        with patch.object(
+            FileSystemStorage, "exists", side_effect=AssertionError("storage call")
+        ):
+            with manifest_scope():
+                output = self._render(
+                    "{% prefetch_variants images %}{% for image in images %}{% responsive_picture image %};{% endfor %}",
+                    images=[legacy, new],
+                )
+        legacy_html, new_html = output.split(";")[:2]
+        # Generated before AVIF/JPEG existed: WebP only, as before.
+        self.assertNotIn("<source", legacy_html)
+        self.assertRegex(
+            legacy_html,
+            r'<img src="\S*p/legacy_800w\.webp" alt="" srcset="\S*p/legacy_400w\.webp 400w"',
+        )
+        # Known to the manifest: exactly the formats it lists.
+        self.assertNotIn("<source", new_html)
+        self.assertRegex(
+            new_html,
+            r'<img src="\S*p/new\.jpg" alt="" srcset="\S*p/new_400w\.jpg 400w"',
+        )
+
+    def test_unknown_key_falls_back_to_storage(self):
+        image = Category(name="C", image="p/legacy.jpg").image
+        with patch.object(FileSystemStorage, "exists", return_value=True) as exists:
+            output = self._render("{{ image|image_variant:400 }}", image=image)
+        self.assertIn("p/legacy_400w.webp", output)
+        exists.assert_called_once()
+
+
+@override_settings(MEDIA_URL="/media/", IMAGE_RESIZE_FORMAT="webp")
+class TestResizedImage(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.storage = FileSystemStorage(location=self.tmp.name)
+        self.storage.save("p/sofa.png", ContentFile(_png_bytes(1000, 600)))
+        patcher = patch("utils.image_resize.default_storage", self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+
+    def test_first_request_renders_then_links_go_to_storage(self):
+        url = resize_url("p/sofa.png", 96, 96, "cover")
+        self.assertTrue(url.startswith("/img/"), url)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Location"], "/media/resized/p/sofa_96x96-cover.webp")
+        with self.storage.open(
+            "resized/p/sofa_96x96-cover.webp", "rb"
+        ) as fh, Image.open(fh) as img:
+            self.assertEqual(img.size, (96, 96))
+
+        self.assertEqual(
+            resize_url("p/sofa.png", 96, 96, "cover"),
+            "/media/resized/p/sofa_96x96-cover.webp",
+        )
+
+    def test_contain_fits_box_without_upscaling(self):
+        key = ensure_resized("p/sofa.png", ResizeSpec(0, 300, "contain", "jpeg"))
+        self.assertEqual(key, "resized/p/sofa_0x300-contain.jpg")
+        with self.storage.open(key, "rb") as fh, Image.open(fh) as img:
+            self.assertEqual(img.size, (500, 300))
+        key = ensure_resized("p/sofa.png", ResizeSpec(2000, 2000, "cover", "webp"))
+        with self.storage.open(key, "rb") as fh, Image.open(fh) as img:
+            self.assertEqual(img.size, (1000, 600))
+
+    def test_rejects_bad_signature_and_parameters(self):
+        url = resize_url("p/sofa.png", 96, 96, "cover")
+        self.assertEqual(
+            self.client.get(url.replace("96x96", "97x96")).status_code, 404
+        )
+        self.assertEqual(
+            self.client.get(url.replace("/img/", "/img/x")).status_code, 404
+        )
+        self.assertEqual(
+            self.client.get(resize_url("p/missing.png", 96)).status_code, 404
+        )
+        with self.assertRaises(ValueError):
+            ResizeSpec(5000, 0)
+
+    def test_concurrent_first_requests_render_once(self):
+        from utils import image_resize
+
+        calls = []
+        real_encode = image_resize.encode_image
+
+        def slow_encode(*args):
+            calls.append(1)
+            threading.Event().wait(0.2)
+            return real_encode(*args)
+
+        spec = ResizeSpec(64, 64, "cover", "webp")
+        with patch("utils.image_resize.encode_image", side_effect=slow_encode):
+            threads = [
+                threading.Thread(target=ensure_resized, args=("p/sofa.png", spec))
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(
+            self.storage.listdir("resized/p")[1], ["sofa_64x64-cover.webp"]
+        )
+
+
+class TestMediaIndex(TestCase):
+    def setUp(self):
+        self.media_root = _use_temp_media(self)
+
+    def _touch(self, *keys):
+        for key in keys:
+            path = os.path.join(self.media_root, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as fh:
+                fh.write(b"x")
+
+    def _exists(self, key):
+        return os.path.exists(os.path.join(self.media_root, key))
+
+    def _cleanup(self, **options):
+        out = StringIO()
+        call_command("cleanup_unused_media", grace_minutes=0, stdout=out, **options)
+        return out.getvalue()
+
+    def test_owner_key_strips_generated_suffixes(self):
+        self.assertEqual(owner_key("p/a_1600w.avif"), "p/a")
+        self.assertEqual(owner_key("resized/p/a_96x96-cover.webp"), "p/a")
+        self.assertEqual(owner_key("/p/a.jpg"), "p/a")
+        self.assertEqual(owner_key("p/w_400w.jpg"), "p/w")
+
+    def test_index_follows_saves_and_deletes(self):
+        category = Category.objects.create(name="A", slug="a", image="categories/a.jpg")
+        self.assertEqual(
+            list(MediaReference.objects.values_list("model", "key", "owner")),
+            [("categories.category", "categories/a.jpg", "categories/a")],
+        )
+        self._touch("categories/a.jpg", "categories/a_400w.webp")
+        self._cleanup()
+        self.assertFalse(MediaObject.objects.filter(dirty=True).exists())
+
+        category.image = "categories/b.jpg"
+        category.save()
+        self.assertEqual(MediaObject.objects.filter(dirty=True).count(), 2)  # a's files
+        category.delete()
+        self.assertFalse(MediaReference.objects.exists())
+
+    def test_saves_without_file_fields_skip_the_index(self):
+        category = Category.objects.create(name="A", slug="a", image="categories/a.jpg")
+        with self.assertNumQueries(1):
+            category.name = "B"
+            category.save(update_fields=["name"])
+        category.image = "categories/b.jpg"
+        category.save(update_fields=["image"])
+        self.assertEqual(MediaReference.objects.get().key, "categories/b.jpg")
+
+    def test_cleanup_deletes_only_unreferenced_files(self):
+        Category.objects.create(name="A", slug="a", image="categories/a.jpg")
+        keep = [
+            "categories/a.jpg",
+            "categories/a_400w.webp",
+            "categories/a_1600w.avif",
+            "resized/categories/a_96x96-cover.webp",
+        ]
+        self._touch(*keep, "categories/orphan.jpg", "categories/orphan_400w.jpg")
+
+        output = self._cleanup()
+        self.assertIn("Виявлено 2 файлів", output)
+        self.assertIn("categories/orphan_400w.jpg", output)
+
+        self._cleanup(delete=True)
+        self.assertTrue(all(self._exists(key) for key in keep))
+        self.assertFalse(self._exists("categories/orphan.jpg"))
+        self.assertFalse(
+            MediaObject.objects.filter(key__startswith="categories/orphan").exists()
+        )
+
+        # Nothing changed since: no key is diffed again.
+        output = self._cleanup()
+        self.assertIn("Перевірено змінених ключів: 0", output)
+
+    def test_stale_index_is_checked_against_database(self):
+        category = Category.objects.create(name="A", slug="a", image="categories/a.jpg")
+        Category.objects.filter(pk=category.pk).update(
+            image="categories/c.jpg"
+        )  # no signals
+        self._touch("categories/c.jpg")
+        self._cleanup(delete=True)
+        self.assertTrue(self._exists("categories/c.jpg"))
+        self.assertTrue(MediaReference.objects.filter(key="categories/c.jpg").exists())
+
+    def test_listing_resumes_from_cursor(self):
+        Category.objects.create(name="A", slug="a", image="categories/a.jpg")
+        self._touch("a/1.jpg", "a/2.jpg", "a/3.jpg")
+        output = self._cleanup(max_list=2)
+        self.assertIn("прохід буде продовжено", output)
+        self.assertEqual(MediaInventoryState.objects.get(prefix="").cursor, "a/2.jpg")
+
+        os.remove(os.path.join(self.media_root, "a/1.jpg"))
+        output = self._cleanup(max_list=2)
+        self.assertIn("Продовжуємо перелік сховища після 'a/2.jpg'", output)
+        self.assertIn("прохід завершено", output)
+        # a/1.jpg was listed before the pass finished; still listed for now.
+        self.assertEqual(MediaObject.objects.count(), 3)
+        self._cleanup()
+        self.assertEqual(
+            set(MediaObject.objects.values_list("key", flat=True)),
+            {"a/2.jpg", "a/3.jpg"},
+        )
+
+    def test_delete_is_refused_when_most_files_look_unused(self):
+        Category.objects.create(name="A", slug="a", image="categories/a.jpg")
+        self._touch("categories/a.jpg", "other/1.jpg", "other/2.jpg")
+        with self.assertRaises(CommandError):
+            self._cleanup(delete=True)
+        self.assertTrue(self._exists("other/1.jpg"))
+
+        MediaReference.objects.all().delete()
+        with patch(
+            "utils.media_index.rebuild_references", return_value=0
+        ), self.assertRaises(CommandError):
+            self._cleanup(delete=True, max_delete_ratio=1)
+        self.assertTrue(self._exists("categories/a.jpg"))
+
+        self._cleanup(delete=True, rebuild_index=True, max_delete_ratio=1)
+        self.assertFalse(self._exists("other/1.jpg"))
+        self.assertTrue(self._exists("categories/a.jpg"))
@@ -20,4 +20,5 @@ urlpatterns = [
     path("update-cart-quantity/", views.update_cart_quantity, name="update_cart_quantity"),
     path("cart/", views.view_cart, name="view_cart"),
     path("order-success/", views.order_success, name="order_success"),
+    path("img/<str:signature>/<str:params>/<path:name>", views.resized_image, name="resized_image"),
 ]
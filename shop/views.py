@@ -7,7 +7,7 @@ from django.core.cache import cache
 from django.core.paginator import Paginator
 from django.db import models
 from django.db.models import Q
-from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 from django.utils.html import strip_tags
@@ -26,6 +26,8 @@ from delivery.views import search_city
 from fabric_category.models import FabricCategory, FabricColor
 from furniture.models import Furniture, FurnitureCustomOption, FurnitureSizeVariant
 from store.settings import ITEMS_PER_PAGE
+from utils.image_resize import InvalidResize, ResizeSpec, check_signature, ensure_resized
+from utils.image_variants import build_media_url
 
 PROMOTIONAL_CACHE_TIMEOUT = 180
 
@@ -782,3 +784,21 @@ def search_suggestions(request):
     
     cache.set(cache_key, suggestions, 60)
     return JsonResponse({'suggestions': suggestions})
+
+
+@require_http_methods(["GET", "HEAD"])
+def resized_image(request: HttpRequest, signature: str, params: str, name: str) -> HttpResponse:
+    """Render a signed resize of a media file on first request and redirect to it."""
+    try:
+        spec = ResizeSpec.from_params(params)
+    except InvalidResize:
+        raise Http404("Невірні параметри зображення")
+    if not check_signature(name, spec, signature):
+        raise Http404("Невірний підпис")
+    try:
+        key = ensure_resized(name, spec)
+    except FileNotFoundError:
+        raise Http404("Зображення не знайдено")
+    response = redirect(build_media_url(key))
+    response["Cache-Control"] = "public, max-age=86400"
+    return response
@@ -5,7 +5,8 @@ Custom middleware for handling connection resilience and graceful reconnects.
 import json
 import logging
 import time
-from django.http import JsonResponse, HttpResponse
+from typing import Callable
+from django.http import JsonResponse, HttpRequest, HttpResponse
 from django.utils.deprecation import MiddlewareMixin
 from django.contrib import messages
 from django.core.cache import cache
@@ -42,6 +43,23 @@ class FrameAncestorsMiddleware:
         return response
 
 
+class VariantManifestMiddleware:
+    """Memoise responsive-variant manifest lookups for the whole request.
+
+    Every image rendered in the response then reads the manifest at most once
+    (or in one batch after ``{% prefetch_variants %}``).
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        from utils.variant_manifest import manifest_scope
+
+        with manifest_scope():
+            return self.get_response(request)
+
+
 class ConnectionResilienceMiddleware(MiddlewareMixin):
     """
     Middleware for handling connection resilience across all requests.
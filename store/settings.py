@@ -84,6 +84,7 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "store.middleware.FrameAncestorsMiddleware",  # allow Tag Assistant preview framing
     "store.middleware.AdminConnectionMonitorMiddleware",  # Admin connection monitoring
+    "store.middleware.VariantManifestMiddleware",  # per-request responsive image manifest
 ]
 
 ROOT_URLCONF = "store.urls"
@@ -303,10 +304,72 @@ else:
     }
 # ------------------
 
+# Price history: raw rows older than this are rolled up to one row per item per month
+PRICE_HISTORY_RETENTION_DAYS = int(os.getenv("PRICE_HISTORY_RETENTION_DAYS", "180"))
+
+# Supplier scrapers: concurrent page fetches per run (rate limit per host stays REQUEST_DELAY)
+SUPPLIER_CRAWL_WORKERS = int(os.getenv("SUPPLIER_CRAWL_WORKERS", "4"))
+# Incremental crawls re-scrape unchanged pages at least this often (0 = always full crawl)
+SUPPLIER_CRAWL_FULL_SWEEP_DAYS = int(os.getenv("SUPPLIER_CRAWL_FULL_SWEEP_DAYS", "7"))
+# Disk cache for supplier pages (ETag/Last-Modified revalidation); empty dir disables it
+SUPPLIER_HTTP_CACHE_DIR = os.getenv("SUPPLIER_HTTP_CACHE_DIR", str(BASE_DIR / "cache" / "supplier_http"))
+SUPPLIER_HTTP_CACHE_MAX_MB = int(os.getenv("SUPPLIER_HTTP_CACHE_MAX_MB", "256"))
+SUPPLIER_HTTP_CACHE_TTL = int(os.getenv("SUPPLIER_HTTP_CACHE_TTL", "600"))
+# Headless Chrome pool for Selenium-backed supplier configs
+SUPPLIER_BROWSER_POOL_SIZE = int(os.getenv("SUPPLIER_BROWSER_POOL_SIZE", "2"))
+SUPPLIER_BROWSER_MAX_PAGES = int(os.getenv("SUPPLIER_BROWSER_MAX_PAGES", "50"))
+# Supplier photos: stored once per content hash under this prefix (price_parser.supplier_images)
+SUPPLIER_IMAGE_PREFIX = os.getenv("SUPPLIER_IMAGE_PREFIX", "supplier_cache/content")
+SUPPLIER_IMAGE_WORKERS = int(os.getenv("SUPPLIER_IMAGE_WORKERS", "4"))
+# Near-duplicate reuse: photos whose 64-bit difference hashes differ in at most this many
+# bits (and whose mean colours match) are the same photo; 0 = only byte-identical photos
+SUPPLIER_IMAGE_PHASH_DISTANCE = int(os.getenv("SUPPLIER_IMAGE_PHASH_DISTANCE", "0"))
+# Encode responsive variants of new supplier photos from the downloaded bytes during imports
+SUPPLIER_IMAGE_VARIANTS = os.getenv("SUPPLIER_IMAGE_VARIANTS", "true").lower() == "true"
+
+# Catalog import/update jobs: "worker" = run by `manage.py run_catalog_jobs`,
+# "thread" = start in the web process (development without a worker)
+CATALOG_JOB_RUNNER = os.getenv("CATALOG_JOB_RUNNER", "worker")
+CATALOG_JOB_CONCURRENCY = int(os.getenv("CATALOG_JOB_CONCURRENCY", "2"))
+CATALOG_JOB_DEFAULT_SUPPLIER_CONCURRENCY = int(os.getenv("CATALOG_JOB_DEFAULT_SUPPLIER_CONCURRENCY", "1"))
+# Per-supplier overrides, e.g. "supplier_web=2,google_sheet=3"
+CATALOG_JOB_SUPPLIER_CONCURRENCY = {
+    key.strip(): int(value)
+    for key, _, value in (
+        item.partition("=") for item in os.getenv("CATALOG_JOB_SUPPLIER_CONCURRENCY", "").split(",")
+    )
+    if key.strip() and value.strip()
+}
+CATALOG_JOB_HEARTBEAT_SECONDS = int(os.getenv("CATALOG_JOB_HEARTBEAT_SECONDS", "15"))
+# A running job without a heartbeat for this long is re-queued
+CATALOG_JOB_LEASE_SECONDS = int(os.getenv("CATALOG_JOB_LEASE_SECONDS", "120"))
+CATALOG_JOB_MAX_ATTEMPTS = int(os.getenv("CATALOG_JOB_MAX_ATTEMPTS", "3"))
+# Live job progress: cache publish / DB snapshot intervals and how often the admin page polls
+CATALOG_JOB_PROGRESS_CACHE_SECONDS = float(os.getenv("CATALOG_JOB_PROGRESS_CACHE_SECONDS", "1"))
+CATALOG_JOB_PROGRESS_DB_SECONDS = float(os.getenv("CATALOG_JOB_PROGRESS_DB_SECONDS", "15"))
+# Without a shared cache (locmem) the DB snapshot is the only channel to the web process
+CATALOG_JOB_PROGRESS_UNSHARED_DB_SECONDS = float(os.getenv("CATALOG_JOB_PROGRESS_UNSHARED_DB_SECONDS", "3"))
+CATALOG_JOB_PROGRESS_POLL_SECONDS = float(os.getenv("CATALOG_JOB_PROGRESS_POLL_SECONDS", "3"))
+
 # Responsive image generation defaults
 IMAGE_VARIANT_WIDTHS = [400, 800, 1200]
 IMAGE_VARIANT_FORMAT = os.getenv("IMAGE_VARIANT_FORMAT", "webp")
+# Formats generated side by side for <picture>, best first; the last one is the <img>
+# fallback. AVIF is skipped when Pillow is built without libavif
+IMAGE_VARIANT_FORMATS = [
+    fmt.strip().lower()
+    for fmt in os.getenv("IMAGE_VARIANT_FORMATS", "avif,webp,jpeg").split(",")
+    if fmt.strip()
+]
+# Record generated variants in shop.ImageVariant and read it instead of storage.exists()
+IMAGE_VARIANT_MANIFEST = os.getenv("IMAGE_VARIANT_MANIFEST", "true").lower() == "true"
 IMAGE_VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", "82"))
+# Per-format encoder quality (AVIF looks the same as WebP at a much lower setting)
+IMAGE_VARIANT_QUALITIES = {
+    "avif": int(os.getenv("IMAGE_VARIANT_QUALITY_AVIF", "55")),
+    "webp": int(os.getenv("IMAGE_VARIANT_QUALITY_WEBP", str(IMAGE_VARIANT_QUALITY))),
+    "jpeg": int(os.getenv("IMAGE_VARIANT_QUALITY_JPEG", "80")),
+}
 IMAGE_VARIANT_DEFAULT_WIDTH = int(os.getenv("IMAGE_VARIANT_DEFAULT_WIDTH", "800"))
 IMAGE_VARIANT_SIZES_ATTR = os.getenv(
     "IMAGE_VARIANT_SIZES_ATTR",
@@ -317,6 +380,35 @@ if _image_variant_assume_env is None:
     IMAGE_VARIANT_ASSUME_EXISTS = not DEBUG
 else:
     IMAGE_VARIANT_ASSUME_EXISTS = _image_variant_assume_env.lower() == "true"
+# Inline LQIP placeholder (shop.ImageMetadata): width in px and WebP quality
+IMAGE_LQIP_WIDTH = int(os.getenv("IMAGE_LQIP_WIDTH", "16"))
+IMAGE_LQIP_QUALITY = int(os.getenv("IMAGE_LQIP_QUALITY", "30"))
+# Background variant generation after an image is saved: "process" pool (CPU-bound
+# encoding) or "thread" (development); workers per web/importer process
+IMAGE_VARIANT_EXECUTOR = os.getenv("IMAGE_VARIANT_EXECUTOR", "process")
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))
+# Recycle a worker process after this many images (bounds Pillow memory growth)
+IMAGE_VARIANT_MAX_TASKS_PER_CHILD = int(os.getenv("IMAGE_VARIANT_MAX_TASKS_PER_CHILD", "200"))
+# Threads per process uploading finished variants while the next one is encoded
+IMAGE_VARIANT_UPLOAD_THREADS = int(os.getenv("IMAGE_VARIANT_UPLOAD_THREADS", "3"))
+# Backpressure: images in flight per process, and how long a save may wait for a slot
+IMAGE_VARIANT_MAX_PENDING = int(os.getenv("IMAGE_VARIANT_MAX_PENDING", "200"))
+IMAGE_VARIANT_SUBMIT_TIMEOUT = float(os.getenv("IMAGE_VARIANT_SUBMIT_TIMEOUT", "5"))
+# Failed/deferred images, re-run by `generate_responsive_images --retry-failed`; empty disables it
+IMAGE_VARIANT_RETRY_FILE = os.getenv(
+    "IMAGE_VARIANT_RETRY_FILE", str(BASE_DIR / "cache" / "image_variant_retry.json")
+)
+# Content-addressed keys: variants are made once, not again when another row reuses the key
+IMAGE_VARIANT_IMMUTABLE_PREFIXES = [SUPPLIER_IMAGE_PREFIX]
+
+# On-demand resizes (/img/<signature>/<w>x<h>-<fit>.<ext>/<key>) saved under this prefix
+IMAGE_RESIZE_PREFIX = os.getenv("IMAGE_RESIZE_PREFIX", "resized")
+IMAGE_RESIZE_FORMAT = os.getenv("IMAGE_RESIZE_FORMAT", IMAGE_VARIANT_FORMAT)
+IMAGE_RESIZE_MAX_SIDE = int(os.getenv("IMAGE_RESIZE_MAX_SIDE", "2400"))
+# How long a rendered resize is remembered (links then go straight to storage/CDN)
+IMAGE_RESIZE_CACHE_SECONDS = int(os.getenv("IMAGE_RESIZE_CACHE_SECONDS", str(60 * 60 * 24 * 30)))
+# How long a request waits for a concurrent render of the same image
+IMAGE_RESIZE_LOCK_TIMEOUT = float(os.getenv("IMAGE_RESIZE_LOCK_TIMEOUT", "30"))
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -0,0 +1,259 @@
+"""On-demand resized images behind signed URLs.
+
+Only ``IMAGE_VARIANT_WIDTHS`` are generated up front; cart thumbnails, admin
+previews and colour swatches need other (often square) sizes. ``resize_url``
+returns ``/img/<signature>/<width>x<height>-<fit>.<format>/<storage key>``:
+
+* the first request renders the image with the ``utils.image_variants``
+  helpers, saves it under ``IMAGE_RESIZE_PREFIX`` in the same storage and
+  redirects to it;
+* the result key is remembered in the cache, so later ``resize_url`` calls
+  link straight to storage/CDN and the endpoint only redirects;
+* concurrent first requests for the same key render once: a per-key lock in
+  the process plus a cache lock (``cache.add``) across processes, after
+  which the waiters find the saved file. The cross-process part needs a
+  shared cache (Redis via ``REDIS_URL``); with the default locmem cache each
+  web process only serialises its own threads, so two processes may both
+  render the same key and the storage keeps a renamed duplicate;
+* URLs are signed with ``SECRET_KEY``, so arbitrary sizes cannot be
+  requested to fill the storage or burn CPU.
+
+``0`` for the width or height means "any": the image is scaled to the other
+side. ``contain`` fits the image inside the box, ``cover`` fills the box and
+crops the centre. Images are never upscaled.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage, default_storage
+from django.urls import reverse
+from PIL import Image
+
+from .image_variants import (
+    FORMAT_EXTENSIONS,
+    build_media_url,
+    display_size,
+    draft_for_width,
+    encode_image,
+    format_supported,
+    get_variant_quality,
+    prepare_image,
+    resize_image,
+)
+
+log = logging.getLogger(__name__)
+
+FITS = ("contain", "cover")
+_PARAMS_RE = re.compile(r"^(\d+)x(\d+)-(contain|cover)\.(avif|webp|jpg|png)$")
+_SIGNER = signing.Signer(salt="utils.image_resize")
+_CACHE_KEY = "image_resize:{}"
+_LOCK_KEY = "image_resize_lock:{}"
+
+
+class InvalidResize(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class ResizeSpec:
+    width: int = 0
+    height: int = 0
+    fit: str = "contain"
+    format: str = "webp"
+
+    def __post_init__(self) -> None:
+        max_side = int(getattr(settings, "IMAGE_RESIZE_MAX_SIDE", 2400))
+        if self.width < 0 or self.height < 0 or not (self.width or self.height):
+            raise InvalidResize("Width or height must be positive")
+        if max(self.width, self.height) > max_side:
+            raise InvalidResize(f"Size is limited to {max_side}px")
+        if self.fit not in FITS:
+            raise InvalidResize(f"Unknown fit '{self.fit}'")
+        if self.format not in ("avif", "webp", "jpeg", "png") or not format_supported(
+            self.format
+        ):
+            raise InvalidResize(f"Unsupported format '{self.format}'")
+
+    @property
+    def extension(self) -> str:
+        return FORMAT_EXTENSIONS.get(self.format, self.format)
+
+    @property
+    def params(self) -> str:
+        return f"{self.width}x{self.height}-{self.fit}.{self.extension}"
+
+    @classmethod
+    def from_params(cls, params: str) -> "ResizeSpec":
+        match = _PARAMS_RE.match(params)
+        if not match:
+            raise InvalidResize(f"Bad resize parameters '{params}'")
+        width, height, fit, ext = match.groups()
+        fmt = "jpeg" if ext == "jpg" else ext
+        return cls(int(width), int(height), fit, fmt)
+
+
+def _default_format() -> str:
+    fmt = getattr(settings, "IMAGE_RESIZE_FORMAT", "") or getattr(
+        settings, "IMAGE_VARIANT_FORMAT", "webp"
+    )
+    fmt = fmt.lower()
+    return "jpeg" if fmt == "jpg" else fmt
+
+
+def make_spec(
+    width: int = 0, height: int = 0, fit: str = "contain", fmt: Optional[str] = None
+) -> ResizeSpec:
+    fmt = (fmt or _default_format()).lower()
+    return ResizeSpec(
+        int(width or 0), int(height or 0), fit, "jpeg" if fmt == "jpg" else fmt
+    )
+
+
+def resized_name(name: str, spec: ResizeSpec) -> str:
+    """Storage key of the resized copy of ``name``."""
+    prefix = getattr(settings, "IMAGE_RESIZE_PREFIX", "resized").strip("/")
+    base = str(PurePosixPath(name.lstrip("/")).with_suffix(""))
+    return f"{prefix}/{base}_{spec.params}"
+
+
+def sign(name: str, spec: ResizeSpec) -> str:
+    return _SIGNER.signature(f"{name}|{spec.params}")
+
+
+def check_signature(name: str, spec: ResizeSpec, signature: str) -> bool:
+    return signing.constant_time_compare(sign(name, spec), signature)
+
+
+def _cache_key(template: str, key: str) -> str:
+    # Storage keys can be longer than memcached/redis-friendly cache keys.
+    return template.format(hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+
+def is_rendered(key: str) -> bool:
+    return bool(cache.get(_cache_key(_CACHE_KEY, key)))
+
+
+def _mark_rendered(key: str) -> None:
+    cache.set(
+        _cache_key(_CACHE_KEY, key),
+        1,
+        int(getattr(settings, "IMAGE_RESIZE_CACHE_SECONDS", 60 * 60 * 24 * 30)),
+    )
+
+
+def resize_url(
+    image_field_or_name: Any,
+    width: int = 0,
+    height: int = 0,
+    fit: str = "contain",
+    fmt: Optional[str] = None,
+) -> str:
+    """URL of a resized copy: straight to storage once rendered, else the signed endpoint."""
+    name = getattr(image_field_or_name, "name", image_field_or_name) or ""
+    if not name:
+        return ""
+    spec = make_spec(width, height, fit, fmt)
+    key = resized_name(name, spec)
+    if is_rendered(key):
+        return build_media_url(key)
+    return reverse(
+        "shop:resized_image",
+        kwargs={"signature": sign(name, spec), "params": spec.params, "name": name},
+    )
+
+
+_local_locks: Dict[str, threading.Lock] = {}
+_local_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _render_lock(key: str) -> Iterator[None]:
+    """Per-key render lock: a thread lock, then a ``cache.add`` lock.
+
+    The cache lock only excludes other processes when the default cache is
+    shared between them (Redis); locmem makes it per-process as well.
+    """
+    with _local_locks_guard:
+        local = _local_locks.setdefault(key, threading.Lock())
+    timeout = float(getattr(settings, "IMAGE_RESIZE_LOCK_TIMEOUT", 30))
+    with local:
+        lock_key = _cache_key(_LOCK_KEY, key)
+        deadline = time.monotonic() + timeout
+        acquired = cache.add(lock_key, 1, int(timeout) + 1)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(0.1)
+            acquired = cache.add(lock_key, 1, int(timeout) + 1)
+        if not acquired:
+            log.warning("Resize lock for '%s' timed out, rendering anyway", key)
+        try:
+            yield
+        finally:
+            if acquired:
+                cache.delete(lock_key)
+            with _local_locks_guard:
+                _local_locks.pop(key, None)
+
+
+def _scaled_width(size: Tuple[int, int], spec: ResizeSpec) -> int:
+    width, height = size
+    scales = []
+    if spec.width:
+        scales.append(spec.width / float(width))
+    if spec.height:
+        scales.append(spec.height / float(height))
+    scale = max(scales) if spec.fit == "cover" else min(scales)
+    return max(1, min(width, int(round(width * scale))))
+
+
+def render(source: Image.Image, spec: ResizeSpec) -> Image.Image:
+    """Resize (and for ``cover`` centre-crop) an opened image to ``spec``."""
+    draft_for_width(source, _scaled_width(display_size(source), spec))
+    prepared = prepare_image(source)
+    if prepared.mode not in ("RGB", "RGBA"):
+        prepared = prepared.convert("RGBA" if "A" in prepared.getbands() else "RGB")
+    resized = resize_image(prepared, _scaled_width(prepared.size, spec))
+    if spec.fit == "cover" and spec.width and spec.height:
+        crop_width, crop_height = min(spec.width, resized.width), min(
+            spec.height, resized.height
+        )
+        left = (resized.width - crop_width) // 2
+        top = (resized.height - crop_height) // 2
+        resized = resized.crop((left, top, left + crop_width, top + crop_height))
+    return resized
+
+
+def ensure_resized(
+    name: str, spec: ResizeSpec, storage: Optional[Storage] = None
+) -> str:
+    """Render ``name`` to ``spec`` unless already done; returns the result's storage key."""
+    storage = storage or default_storage
+    key = resized_name(name, spec)
+    if is_rendered(key):
+        return key
+    with _render_lock(key):
+        if is_rendered(key) or storage.exists(key):
+            _mark_rendered(key)
+            return key
+        with storage.open(name, "rb") as original_file, Image.open(
+            original_file
+        ) as img:
+            data = encode_image(
+                render(img, spec), spec.format, get_variant_quality(spec.format)
+            )
+        storage.save(key, ContentFile(data, name=key))
+        _mark_rendered(key)
+    return key
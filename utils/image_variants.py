@@ -1,12 +1,13 @@
 from __future__ import annotations
 
+import base64
 import logging
-import threading
 
+from concurrent.futures import Executor
 from dataclasses import dataclass
 from io import BytesIO
 from pathlib import PurePosixPath
-from typing import Iterable, List, Optional, Sequence, Tuple
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, cast
 
 from django.conf import settings
 from django.core.files.base import ContentFile
@@ -17,6 +18,21 @@ from PIL import Image, ImageOps
 
 # Image.ANTIALIAS is deprecated in Pillow>=10, use Image.Resampling.LANCZOS instead
 RESAMPLE = Image.Resampling.LANCZOS
+# Like Image.thumbnail(): JPEG draft decoding keeps at least this multiple of
+# the largest target size, so the final LANCZOS pass still has detail to work with.
+DRAFT_REDUCING_GAP = 2.0
+# EXIF orientations that swap width and height.
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+# Placeholders are computed from a copy about this wide.
+PLACEHOLDER_SOURCE_WIDTH = 64
+# libavif speed 0 (slowest, smallest) .. 10; 6 is a good size/CPU trade-off.
+AVIF_SPEED = 6
+MIME_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+# File extension per variant format where they differ.
+FORMAT_EXTENSIONS = {"jpeg": "jpg"}
+_PIL_FORMATS = {"jpg": "JPEG"}
+_SUPPORTED: Dict[str, bool] = {}
+_WARNED: set = set()
 log = logging.getLogger(__name__)
 
 
@@ -24,6 +40,45 @@ def _get_variant_format(fmt: Optional[str] = None) -> str:
     return (fmt or getattr(settings, "IMAGE_VARIANT_FORMAT", "webp")).lower()
 
 
+def format_supported(fmt: str) -> bool:
+    """Whether this Pillow build can write ``fmt`` (AVIF needs libavif)."""
+    fmt = fmt.lower()
+    if fmt not in _SUPPORTED:
+        Image.init()
+        _SUPPORTED[fmt] = _PIL_FORMATS.get(fmt, fmt.upper()) in Image.SAVE
+    return _SUPPORTED[fmt]
+
+
+def get_variant_formats(formats: Optional[Sequence[str]] = None) -> List[str]:
+    """
+    Formats to generate/serve, best first (settings.IMAGE_VARIANT_FORMATS, e.g.
+    avif, webp, jpeg), without the ones this Pillow build cannot encode.
+    """
+    if not formats:
+        formats = getattr(settings, "IMAGE_VARIANT_FORMATS", None) or [_get_variant_format()]
+    result = []
+    for fmt in formats:
+        fmt = fmt.lower().strip()
+        if fmt == "jpg":
+            fmt = "jpeg"
+        if fmt and fmt not in result:
+            if format_supported(fmt):
+                result.append(fmt)
+            elif fmt not in _WARNED:
+                _WARNED.add(fmt)
+                log.warning("Image variant format '%s' is not supported by Pillow here, skipped", fmt)
+    return result
+
+
+def get_variant_quality(fmt: str) -> int:
+    qualities = getattr(settings, "IMAGE_VARIANT_QUALITIES", {}) or {}
+    return int(qualities.get(fmt.lower(), 0) or getattr(settings, "IMAGE_VARIANT_QUALITY", 82))
+
+
+def variant_mime_type(fmt: str) -> str:
+    return MIME_TYPES.get(fmt.lower(), f"image/{fmt.lower()}")
+
+
 def _get_variant_widths(widths: Optional[Sequence[int]] = None) -> List[int]:
     if widths:
         return [int(w) for w in widths]
@@ -44,7 +99,7 @@ def build_variant_name(name: str, width: int, fmt: Optional[str] = None) -> str:
     fmt = _get_variant_format(fmt)
     path = PurePosixPath(name)
     base = str(path.with_suffix(""))
-    return f"{base}_{int(width)}w.{fmt}"
+    return f"{base}_{int(width)}w.{FORMAT_EXTENSIONS.get(fmt, fmt)}"
 
 
 def build_media_url(name: str) -> str:
@@ -69,14 +124,21 @@ def build_variant_urls(name: str, widths: Optional[Sequence[int]] = None, fmt: O
     return urls
 
 
+# Intrinsic (width, height), dominant colour and LQIP data URI of an original.
+Placeholder = Tuple[Tuple[int, int], str, str]
+
+
 @dataclass(frozen=True)
 class GeneratedVariant:
     width: int
     name: str
     size_bytes: int
+    pixel_width: int = 0
+    pixel_height: int = 0
+    format: str = ""
 
 
-def _prepare_image(img: Image.Image) -> Image.Image:
+def prepare_image(img: Image.Image) -> Image.Image:
     """Apply EXIF orientation and ensure compatible mode."""
     img = ImageOps.exif_transpose(img)
     if img.mode in ("P", "CMYK"):
@@ -86,16 +148,70 @@ def _prepare_image(img: Image.Image) -> Image.Image:
     return img
 
 
-def _resize_image(source: Image.Image, width: int) -> Image.Image:
-    """Create a resized copy with the desired width preserving aspect ratio."""
+def display_size(img: Image.Image) -> Tuple[int, int]:
+    """Size of ``img`` after EXIF orientation is applied, without decoding it."""
+    width, height = img.size
+    try:
+        orientation = img.getexif().get(0x0112)
+    except Exception:
+        orientation = None
+    if orientation in _TRANSPOSED_ORIENTATIONS:
+        return height, width
+    return width, height
+
+
+def draft_for_width(img: Image.Image, max_width: int) -> None:
+    """
+    Let the JPEG decoder downscale (1/2, 1/4, 1/8) while decoding when the
+    original is much larger than the biggest variant. No-op for other formats.
+    """
+    if img.format != "JPEG" or max_width <= 0:
+        return
+    raw_width, raw_height = img.size
+    final_width, _ = display_size(img)
+    scale = max_width * DRAFT_REDUCING_GAP / float(final_width)
+    if scale >= 1:
+        return
+    img.draft(img.mode, (
+        max(1, int(raw_width * scale + 0.5)),
+        max(1, int(raw_height * scale + 0.5)),
+    ))
+
+
+def _target_size(original: Tuple[int, int], width: int) -> Tuple[int, int]:
+    original_width, original_height = original
+    ratio = width / float(original_width)
+    return width, max(1, int(round(original_height * ratio)))
+
+
+def resize_image(source: Image.Image, width: int, original: Optional[Tuple[int, int]] = None) -> Image.Image:
+    """
+    Create a resized copy with the desired width preserving aspect ratio.
+    ``original`` is the size the aspect ratio is taken from when ``source``
+    is itself a downscaled copy (cascade), so heights match a direct resize.
+    """
     width = int(width)
     if width <= 0:
         raise ValueError("Variant width must be positive")
     if source.width <= width:
         return source.copy()
-    ratio = width / float(source.width)
-    height = max(1, int(round(source.height * ratio)))
-    return source.resize((width, height), RESAMPLE)
+    return source.resize(_target_size(original or source.size, width), RESAMPLE)
+
+
+def _resize_cascade(source: Image.Image, widths: Iterable[int]) -> Dict[int, Image.Image]:
+    """
+    Resize to every width, largest first, each step starting from the previous
+    (smaller) result instead of the full-size source: 1200 from the original,
+    800 from 1200, 400 from 800.
+    """
+    resized: Dict[int, Image.Image] = {}
+    current = source
+    for width in sorted({int(w) for w in widths}, reverse=True):
+        image = resize_image(current, width, original=source.size)
+        resized[width] = image
+        if image.width < current.width:
+            current = image
+    return resized
 
 
 def _save_webp(image: Image.Image, quality: int, lossless: bool = False) -> BytesIO:
@@ -112,6 +228,49 @@ def _save_webp(image: Image.Image, quality: int, lossless: bool = False) -> Byte
     return buffer
 
 
+def _flatten(image: Image.Image, background: Tuple[int, int, int] = (255, 255, 255)) -> Image.Image:
+    """JPEG has no alpha: put transparent images on a white background."""
+    if image.mode == "RGB":
+        return image
+    flat = Image.new("RGB", image.size, background)
+    flat.paste(image, mask=image.getchannel("A") if "A" in image.getbands() else None)
+    return flat
+
+
+def encode_image(image: Image.Image, fmt: str, quality: int) -> bytes:
+    """Encode ``image`` as ``fmt`` (avif/webp/jpeg/png) at ``quality``."""
+    if fmt == "webp":
+        return _save_webp(image, quality=quality, lossless=False).getvalue()
+    buffer = BytesIO()
+    if fmt == "avif":
+        image.save(buffer, format="AVIF", quality=quality, speed=AVIF_SPEED)
+    elif fmt == "jpeg":
+        _flatten(image).save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, format=fmt.upper(), quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def _placeholder(image: Image.Image) -> Tuple[str, str]:
+    """
+    Dominant colour (``#rrggbb``) and a tiny blurred WebP data URI shown
+    while the real image loads. Empty for images with transparency, where a
+    placeholder would show through.
+    """
+    if "A" in image.getbands() and image.getchannel("A").getextrema() != (255, 255):
+        return "", ""
+    small = resize_image(image.convert("RGB"), PLACEHOLDER_SOURCE_WIDTH)
+    quantized = small.quantize(colors=4)
+    # A 4-colour palette image always has its colour counts and palette.
+    _, index = max(cast(List[Tuple[int, int]], quantized.getcolors()))
+    red, green, blue = cast(List[int], quantized.getpalette())[index * 3:index * 3 + 3]
+    tiny = resize_image(small, int(getattr(settings, "IMAGE_LQIP_WIDTH", 16)))
+    buffer = BytesIO()
+    tiny.save(buffer, format="WEBP", quality=int(getattr(settings, "IMAGE_LQIP_QUALITY", 30)))
+    lqip = "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+    return f"#{red:02x}{green:02x}{blue:02x}", lqip
+
+
 def generate_variants_for_storage_key(
     name: str,
     *,
@@ -122,6 +281,8 @@ def generate_variants_for_storage_key(
     force: bool = False,
     assume_exists: Optional[bool] = None,
     dry_run: bool = False,
+    uploader: Optional[Executor] = None,
+    formats: Optional[Sequence[str]] = None,
 ) -> List[GeneratedVariant]:
     """
     Generates responsive variants for a given storage key and uploads them to storage.
@@ -130,18 +291,22 @@ def generate_variants_for_storage_key(
         name: Original storage key.
         storage: Optional custom storage (defaults to default_storage).
         widths: Variant widths to generate (defaults to settings.IMAGE_VARIANT_WIDTHS).
-        fmt: Target image format (defaults to settings.IMAGE_VARIANT_FORMAT).
-        quality: Quality for the encoder (defaults to settings.IMAGE_VARIANT_QUALITY).
+        fmt: Generate only this format (e.g. "webp").
+        quality: Quality for every encoder (defaults to the per-format
+            settings.IMAGE_VARIANT_QUALITIES, then settings.IMAGE_VARIANT_QUALITY).
         force: Recreate variants even if they exist.
         assume_exists: If True, skip storage existence checks (defaults to settings.IMAGE_VARIANT_ASSUME_EXISTS).
         dry_run: When True, does not upload files and returns the planned variants.
+        uploader: Optional executor for storage uploads, so a variant is uploaded
+            while the next one is encoded; all uploads finish before returning.
+        formats: Formats to generate when ``fmt`` is not given (defaults to
+            settings.IMAGE_VARIANT_FORMATS; formats this Pillow cannot write are skipped).
     """
     if not name:
         return []
 
     storage = storage or default_storage
-    fmt = _get_variant_format(fmt)
-    quality = quality or getattr(settings, "IMAGE_VARIANT_QUALITY", 82)
+    fmts = get_variant_formats([fmt] if fmt else formats)
     widths = _get_variant_widths(widths)
     assume_exists = (
         getattr(settings, "IMAGE_VARIANT_ASSUME_EXISTS", True)
@@ -149,51 +314,204 @@ def generate_variants_for_storage_key(
         else assume_exists
     )
 
-    generated: List[GeneratedVariant] = []
-
-    if force:
-        existing_variants = {width: False for width in widths}
-    elif assume_exists:
-        existing_variants = {width: False for width in widths}
-    else:
-        existing_variants = {
-            width: storage.exists(build_variant_name(name, width, fmt)) for width in widths
-        }
+    # Variants recorded in the manifest exist; only the others are checked or made.
+    known = {} if force or dry_run else _known_variants(name)
+    todo: Dict[str, List[int]] = {}
+    for variant_fmt in fmts:
+        if force:
+            missing = list(widths)
+        else:
+            missing = [width for width in widths if (width, variant_fmt) not in known]
+            if not assume_exists:
+                missing = [
+                    width for width in missing
+                    if not storage.exists(build_variant_name(name, width, variant_fmt))
+                ]
+        if not dry_run:
+            _backfill_manifest(name, variant_fmt, [w for w in widths if w not in missing], storage)
+        if missing:
+            todo[variant_fmt] = missing
+    # Placeholders are computed whenever the original is decoded anyway, and
+    # decoded just for them when an image's variants already exist.
+    with_metadata = not dry_run and _metadata_enabled() and (bool(todo) or _metadata_missing(name))
+    if not todo and not with_metadata:
+        return []
 
     with storage.open(name, "rb") as original_file:
         with Image.open(original_file) as img:
-            prepared = _prepare_image(img)
+            generated, metadata = _render_variants(
+                name, img, todo, storage, quality=quality, dry_run=dry_run,
+                uploader=uploader, with_metadata=with_metadata,
+            )
 
-            for width in widths:
-                variant_name = build_variant_name(name, width, fmt)
-                if existing_variants.get(width) and not force:
-                    continue
+    if not dry_run:
+        record_generated(name, generated, metadata, formats=todo)
+    return generated
 
-                resized = _resize_image(prepared, width)
-                # Preserve alpha transparency when present.
-                if resized.mode not in ("RGB", "RGBA"):
-                    resized = resized.convert("RGBA" if "A" in resized.getbands() else "RGB")
 
-                buffer = BytesIO()
-                if fmt == "webp":
-                    buffer = _save_webp(resized, quality=quality, lossless=False)
-                else:
-                    resized.save(buffer, format=fmt.upper(), quality=quality, optimize=True)
-                    buffer.seek(0)
+def generate_variants_from_bytes(
+    name: str,
+    data: bytes,
+    *,
+    storage: Optional[Storage] = None,
+    widths: Optional[Sequence[int]] = None,
+    formats: Optional[Sequence[str]] = None,
+    quality: Optional[int] = None,
+) -> Tuple[List[GeneratedVariant], Optional[Placeholder]]:
+    """
+    Variants of an original that was just uploaded as ``name``, made from its
+    bytes in memory instead of reading it back from storage. Nothing is
+    written to the database, so this can run in a worker thread; pass the
+    result to ``record_generated`` afterwards.
+    """
+    storage = storage or default_storage
+    widths = _get_variant_widths(widths)
+    todo = {variant_fmt: list(widths) for variant_fmt in get_variant_formats(formats)}
+    with Image.open(BytesIO(data)) as img:
+        return _render_variants(name, img, todo, storage, quality=quality, with_metadata=_metadata_enabled())
+
+
+def record_generated(
+    name: str,
+    generated: Sequence[GeneratedVariant],
+    metadata: Optional[Placeholder] = None,
+    formats: Optional[Iterable[str]] = None,
+) -> None:
+    """Record generated variants (and intrinsic size/placeholder) in the manifest."""
+    for variant_fmt in formats if formats is not None else {v.format for v in generated}:
+        _record_manifest(name, variant_fmt, [v for v in generated if v.format == variant_fmt])
+    if metadata is not None:
+        _record_metadata(name, *metadata)
 
-                data = buffer.getvalue()
-                if not dry_run:
-                    content = ContentFile(data, name=variant_name)
+
+def _render_variants(
+    name: str,
+    img: Image.Image,
+    todo: Dict[str, List[int]],
+    storage: Storage,
+    *,
+    quality: Optional[int] = None,
+    dry_run: bool = False,
+    uploader: Optional[Executor] = None,
+    with_metadata: bool = False,
+) -> Tuple[List[GeneratedVariant], Optional[Placeholder]]:
+    """Decode ``img`` once, encode every (format, width) in ``todo`` and upload them."""
+    generated: List[GeneratedVariant] = []
+    uploads = []
+    all_widths = sorted({width for missing in todo.values() for width in missing})
+    metadata = None
+    original_size = display_size(img)
+    draft_for_width(img, max(all_widths) if all_widths else PLACEHOLDER_SOURCE_WIDTH)
+    prepared = prepare_image(img)
+    # Preserve alpha transparency when present.
+    if prepared.mode not in ("RGB", "RGBA"):
+        prepared = prepared.convert("RGBA" if "A" in prepared.getbands() else "RGB")
+    # Decoded and resized once; every format encodes the same images.
+    resized_by_width = _resize_cascade(prepared, all_widths)
+    if with_metadata:
+        smallest = resized_by_width[all_widths[0]] if all_widths else prepared
+        metadata = (original_size, *_placeholder(smallest))
+
+    for variant_fmt, fmt_widths in todo.items():
+        fmt_quality = quality or get_variant_quality(variant_fmt)
+        for width in fmt_widths:
+            variant_name = build_variant_name(name, width, variant_fmt)
+            resized = resized_by_width[width]
+            data = encode_image(resized, variant_fmt, fmt_quality)
+            if not dry_run:
+                content = ContentFile(data, name=variant_name)
+                if uploader is not None:
+                    uploads.append(uploader.submit(storage.save, variant_name, content))
+                else:
                     storage.save(variant_name, content)
-                generated.append(
-                    GeneratedVariant(
-                        width=width,
-                        name=variant_name,
-                        size_bytes=len(data),
-                    )
+            generated.append(
+                GeneratedVariant(
+                    width=width,
+                    name=variant_name,
+                    size_bytes=len(data),
+                    pixel_width=resized.width,
+                    pixel_height=resized.height,
+                    format=variant_fmt,
                 )
+            )
 
-    return generated
+    for upload in uploads:
+        upload.result()
+    return generated, metadata
+
+
+def _record_manifest(name: str, fmt: str, variants: Sequence[GeneratedVariant]) -> None:
+    from .variant_manifest import record_variants
+
+    try:
+        record_variants(name, fmt, variants)
+    except Exception:
+        log.exception("Failed to record responsive variants of '%s' in the manifest", name)
+
+
+def _known_variants(name: str) -> Dict:
+    from .variant_manifest import ManifestLookup, manifest_enabled
+
+    if not manifest_enabled():
+        return {}
+    try:
+        return ManifestLookup().get(name) or {}
+    except Exception:
+        log.exception("Failed to read responsive variants of '%s' from the manifest", name)
+        return {}
+
+
+def is_immutable_key(name: str) -> bool:
+    """Keys under ``IMAGE_VARIANT_IMMUTABLE_PREFIXES`` never change content once written."""
+    prefixes = getattr(settings, "IMAGE_VARIANT_IMMUTABLE_PREFIXES", ())
+    clean = name.lstrip("/")
+    return any(clean.startswith(prefix.strip("/") + "/") for prefix in prefixes if prefix)
+
+
+def _metadata_enabled() -> bool:
+    from .variant_manifest import manifest_enabled
+
+    return manifest_enabled()
+
+
+def _metadata_missing(name: str) -> bool:
+    from .variant_manifest import has_metadata
+
+    try:
+        return not has_metadata(name)
+    except Exception:
+        log.exception("Failed to read image metadata of '%s'", name)
+        return False
+
+
+def _record_metadata(name: str, size: Tuple[int, int], color: str, lqip: str) -> None:
+    from .variant_manifest import ImageMeta, record_metadata
+
+    try:
+        record_metadata(name, ImageMeta(size[0], size[1], color, lqip))
+    except Exception:
+        log.exception("Failed to record image metadata of '%s'", name)
+
+
+def _backfill_manifest(name: str, fmt: str, existing_widths: Sequence[int], storage: Storage) -> None:
+    """Record variants found in storage (made before the manifest existed)."""
+    from .variant_manifest import ManifestLookup, manifest_enabled
+
+    if not existing_widths or not manifest_enabled():
+        return
+    known = ManifestLookup().get(name) or {}
+    missing = [width for width in existing_widths if (width, fmt) not in known]
+    variants = []
+    for width in missing:
+        variant_name = build_variant_name(name, width, fmt)
+        try:
+            size = storage.size(variant_name)
+        except Exception:
+            size = 0
+        variants.append(
+            GeneratedVariant(width=width, name=variant_name, size_bytes=size, format=fmt)
+        )
+    _record_manifest(name, fmt, variants)
 
 
 def schedule_variant_generation_for_field(
@@ -206,7 +524,8 @@ def schedule_variant_generation_for_field(
     assume_exists: Optional[bool] = None,
 ) -> None:
     """
-    Відкладає генерацію responsive-варіантів у фоновому потоці після успішного коміту.
+    Після успішного коміту ставить генерацію responsive-варіантів у фоновий пул
+    (див. utils.variant_pool).
     """
     if not image_field:
         return
@@ -216,29 +535,22 @@ def schedule_variant_generation_for_field(
         return
 
     storage = getattr(image_field, "storage", None) or default_storage
-
-    def _worker():
-        try:
-            generate_variants_for_storage_key(
-                name,
-                storage=storage,
-                widths=widths,
-                fmt=fmt,
-                quality=quality,
-                force=force,
-                assume_exists=assume_exists,
-            )
-        except FileNotFoundError:
-            log.warning("Responsive variants skipped: '%s' not found in storage", name)
-        except Exception as exc:
-            log.exception("Failed to generate responsive variants for '%s': %s", name, exc)
+    if force and is_immutable_key(name):
+        # The same content key is shared by every product using the photo;
+        # its variants are made once.
+        force = False
 
     def _schedule():
-        thread = threading.Thread(
-            target=_worker,
-            daemon=True,
-            name=f"img-variants-{PurePosixPath(name).name}",
+        from .variant_pool import get_variant_pool
+
+        get_variant_pool().submit(
+            name,
+            storage,
+            widths=list(widths) if widths else None,
+            fmt=fmt,
+            quality=quality,
+            force=force,
+            assume_exists=assume_exists,
         )
-        thread.start()
 
     transaction.on_commit(_schedule)
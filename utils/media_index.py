@@ -0,0 +1,408 @@
+"""Media reference index and cached storage inventory for ``cleanup_unused_media``.
+
+The cleanup used to read every FileField value from the database and list
+the whole bucket on each run, then diff both in memory; on R2 the listing
+alone took minutes. Instead:
+
+* ``shop.MediaReference`` maps every (model, pk, field) to the storage key it
+  references. ``post_save``/``post_delete`` of each model with a FileField
+  keep it current (``connect_signals``); ``rebuild_references`` recreates it
+  (queryset ``update()`` and raw SQL bypass the signals).
+* ``shop.MediaObject`` is the storage inventory. ``refresh_inventory`` lists
+  the bucket in key order from a saved cursor (``shop.MediaInventoryState``),
+  so a pass can be spread over several runs and resumes after a crash; keys
+  not seen during a completed pass are dropped.
+* a key is "dirty" when it is newly listed or its owner lost a reference.
+  ``find_unused`` only diffs dirty keys, in SQL, and re-checks the result
+  against the live tables before anything is deleted.
+
+Keys are compared by *owner*: the key without extension, responsive-variant
+suffix (``_800w``) or on-demand resize suffix and prefix
+(``resized/…_96x96-cover``), so generated files belong to their original.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Type
+from urllib.parse import urlparse
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import Storage, default_storage
+from django.db import models, transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+_SUFFIX_RE = re.compile(r"_(?:\d+w|\d+x\d+-(?:contain|cover)|default)$")
+
+
+def normalize_key(value: Any) -> Optional[str]:
+    """Storage key of a FileField value (absolute URLs are reduced to their path)."""
+    value = (getattr(value, "name", value) or "").strip()
+    if not value:
+        return None
+    parsed = urlparse(value)
+    if parsed.scheme and parsed.netloc:
+        value = parsed.path
+    return value.lstrip("/") or None
+
+
+def owner_key(path: Optional[str]) -> str:
+    """Key without extension and generated-file suffixes: ``p/a_800w.webp`` -> ``p/a``."""
+    if not path:
+        return ""
+    clean = path.strip().strip("/")
+    resized_prefix = (
+        getattr(settings, "IMAGE_RESIZE_PREFIX", "resized").strip("/") + "/"
+    )
+    if clean.startswith(resized_prefix):
+        clean = clean[len(resized_prefix) :]
+    stem, _ = os.path.splitext(clean)
+    directory, _, filename = stem.rpartition("/")
+    filename = _SUFFIX_RE.sub("", filename) or filename
+    return "/".join(filter(None, [directory, filename])) or stem
+
+
+def file_fields(model: Type[models.Model]) -> List[models.FileField]:
+    return [
+        field
+        for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField)
+    ]
+
+
+def _indexed_models() -> Iterator[Tuple[Type[models.Model], List[models.FileField]]]:
+    for model in apps.get_models():
+        fields = file_fields(model)
+        if fields:
+            yield model, fields
+
+
+# --- Reference index ------------------------------------------------------------
+
+
+def _mark_dirty(owners: Iterable[str]) -> None:
+    from shop.models import MediaObject
+
+    owners = [owner for owner in set(owners) if owner]
+    if owners:
+        MediaObject.objects.filter(owner__in=owners).update(dirty=True)
+
+
+def index_instance(
+    instance: models.Model, update_fields: Optional[Iterable[str]] = None
+) -> None:
+    """Record the keys referenced by ``instance``'s file fields (only those in ``update_fields``)."""
+    from shop.models import MediaReference
+
+    fields = file_fields(type(instance))
+    if update_fields is not None:
+        # save(update_fields=["price"]) and the like cannot change a file.
+        updated = set(update_fields)
+        fields = [
+            field
+            for field in fields
+            if field.name in updated or field.attname in updated
+        ]
+    if not fields or instance.pk is None:
+        return
+    label, object_id = instance._meta.label_lower, str(instance.pk)
+    existing = {
+        ref.field: ref
+        for ref in MediaReference.objects.filter(model=label, object_id=object_id)
+    }
+    released: Set[str] = set()
+    for field in fields:
+        key = normalize_key(getattr(instance, field.attname))
+        ref = existing.get(field.name)
+        if key is None:
+            if ref is not None:
+                released.add(ref.owner)
+                ref.delete()
+        elif ref is None:
+            MediaReference.objects.create(
+                key=key,
+                owner=owner_key(key),
+                model=label,
+                object_id=object_id,
+                field=field.name,
+            )
+        elif ref.key != key:
+            released.add(ref.owner)
+            ref.key, ref.owner = key, owner_key(key)
+            ref.save(update_fields=["key", "owner", "updated_at"])
+    _mark_dirty(released)
+
+
+def unindex_instance(instance: models.Model) -> None:
+    from shop.models import MediaReference
+
+    refs = MediaReference.objects.filter(
+        model=instance._meta.label_lower, object_id=str(instance.pk)
+    )
+    owners = list(refs.values_list("owner", flat=True))
+    refs.delete()
+    _mark_dirty(owners)
+
+
+def _on_save(
+    sender: Type[models.Model],
+    instance: models.Model,
+    update_fields: Optional[Iterable[str]] = None,
+    **kwargs: Any,
+) -> None:
+    index_instance(instance, update_fields)
+
+
+def _on_delete(
+    sender: Type[models.Model], instance: models.Model, **kwargs: Any
+) -> None:
+    unindex_instance(instance)
+
+
+def connect_signals() -> None:
+    for model, _ in _indexed_models():
+        label = model._meta.label_lower
+        post_save.connect(
+            _on_save, sender=model, dispatch_uid=f"media_index_save:{label}"
+        )
+        post_delete.connect(
+            _on_delete, sender=model, dispatch_uid=f"media_index_delete:{label}"
+        )
+
+
+def rebuild_references() -> int:
+    """Recreate the index from all file fields; every listed key is re-checked."""
+    from shop.models import MediaObject, MediaReference
+
+    created = 0
+    with transaction.atomic():
+        MediaReference.objects.all().delete()
+        for model, fields in _indexed_models():
+            label = model._meta.label_lower
+            names = [field.name for field in fields]
+            rows = []
+            values = model._base_manager.values_list(
+                "pk", *[field.attname for field in fields]
+            )
+            for pk, *keys in values.iterator(chunk_size=BATCH_SIZE):
+                for field_name, value in zip(names, keys):
+                    key = normalize_key(value)
+                    if key:
+                        rows.append(
+                            MediaReference(
+                                key=key,
+                                owner=owner_key(key),
+                                model=label,
+                                object_id=str(pk),
+                                field=field_name,
+                            )
+                        )
+                if len(rows) >= BATCH_SIZE:
+                    created += len(MediaReference.objects.bulk_create(rows))
+                    rows = []
+            created += len(MediaReference.objects.bulk_create(rows))
+        MediaObject.objects.update(dirty=True)
+    return created
+
+
+# --- Storage inventory -------------------------------------------------------------
+
+
+@dataclass
+class InventoryResult:
+    listed: int = 0
+    removed: int = 0
+    completed: bool = False
+
+
+def _iter_storage(
+    storage: Storage, prefix: str, start_after: str
+) -> Iterator[Tuple[str, int, Optional[datetime]]]:
+    """(key, size, last_modified) in key order, after ``start_after``."""
+    if hasattr(storage, "bucket"):
+        bucket = storage.bucket
+        params = {"Bucket": bucket.name, "Prefix": prefix}
+        if start_after:
+            params["StartAfter"] = start_after
+        paginator = bucket.meta.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(**params):
+            for obj in page.get("Contents", []):
+                yield obj["Key"].lstrip("/"), obj.get("Size", 0), obj.get(
+                    "LastModified"
+                )
+        return
+
+    media_root = getattr(settings, "MEDIA_ROOT", None)
+    if not media_root:
+        raise RuntimeError(
+            "MEDIA_ROOT не заданий та storage не підтримує перелік файлів."
+        )
+    root = Path(media_root)
+    target = root / prefix if prefix else root
+    if not target.exists():
+        return
+    keys = []
+    for directory, _, filenames in os.walk(target):
+        for filename in filenames:
+            keys.append(
+                str((Path(directory) / filename).relative_to(root)).replace("\\", "/")
+            )
+    for key in sorted(keys):
+        if key > start_after and key.startswith(prefix):
+            stat = (root / key).stat()
+            yield key, stat.st_size, datetime.fromtimestamp(
+                stat.st_mtime, tz=dt_timezone.utc
+            )
+
+
+def _store(
+    batch: List[Tuple[str, int, Optional[datetime]]], listed_at: datetime
+) -> None:
+    from shop.models import MediaObject
+
+    MediaObject.objects.bulk_create(
+        [
+            MediaObject(
+                key=key,
+                owner=owner_key(key),
+                size=size or 0,
+                last_modified=modified,
+                listed_at=listed_at,
+            )
+            for key, size, modified in batch
+        ],
+        update_conflicts=True,
+        unique_fields=["key"],
+        update_fields=["size", "last_modified", "listed_at"],
+    )
+
+
+def refresh_inventory(
+    prefix: str = "",
+    max_keys: Optional[int] = None,
+    storage: Optional[Storage] = None,
+    restart: bool = False,
+) -> InventoryResult:
+    """List up to ``max_keys`` keys from the saved cursor (None: to the end of the pass)."""
+    from shop.models import MediaInventoryState, MediaObject
+
+    storage = storage or default_storage
+    state, _ = MediaInventoryState.objects.get_or_create(prefix=prefix)
+    now = timezone.now()
+    if restart or not state.cursor or state.pass_started_at is None:
+        state.cursor, state.pass_started_at = "", now
+        state.save(update_fields=["cursor", "pass_started_at"])
+
+    result = InventoryResult()
+    batch: List[Tuple[str, int, Optional[datetime]]] = []
+    exhausted = True
+    for item in _iter_storage(storage, prefix, state.cursor):
+        batch.append(item)
+        result.listed += 1
+        if len(batch) >= BATCH_SIZE:
+            _store(batch, now)
+            state.cursor = batch[-1][0]
+            state.save(update_fields=["cursor"])
+            batch = []
+        if max_keys and result.listed >= max_keys:
+            exhausted = False
+            break
+    if batch:
+        _store(batch, now)
+        state.cursor = batch[-1][0]
+        state.save(update_fields=["cursor"])
+
+    if exhausted:
+        # Keys not listed during the whole pass are gone from storage.
+        result.removed, _ = MediaObject.objects.filter(
+            key__startswith=prefix, listed_at__lt=state.pass_started_at
+        ).delete()
+        state.cursor, state.pass_completed_at = "", now
+        state.save(update_fields=["cursor", "pass_completed_at"])
+        result.completed = True
+    return result
+
+
+# --- Diff -----------------------------------------------------------------------------
+
+
+def _referenced_in_database(owners: Set[str]) -> Dict[str, list]:
+    """Owners still referenced by a file field (catches changes that bypassed the signals)."""
+    found: Dict[str, list] = {}
+    owners_list = sorted(owners)
+    for model, fields in _indexed_models():
+        for field in fields:
+            for start in range(0, len(owners_list), 200):
+                condition = Q()
+                for owner in owners_list[start : start + 200]:
+                    condition |= Q(**{f"{field.attname}__startswith": owner})
+                rows = model._base_manager.filter(condition).values_list(
+                    "pk", field.attname
+                )
+                for pk, value in rows:
+                    key = normalize_key(value)
+                    owner = owner_key(key)
+                    if owner in owners:
+                        found.setdefault(owner, []).append((model, pk, field, key))
+    return found
+
+
+def find_unused(prefix: str = "", grace: timedelta = timedelta(hours=1)) -> List[str]:
+    """Keys of dirty inventory entries whose owner is no longer referenced."""
+    from shop.models import MediaObject, MediaReference
+
+    referenced = MediaReference.objects.values("owner")
+    dirty = MediaObject.objects.filter(dirty=True, key__startswith=prefix)
+    dirty.filter(owner__in=referenced).update(dirty=False)
+    # Recent uploads may belong to a row that is still being saved.
+    candidates = dict(
+        dirty.exclude(owner__in=referenced)
+        .exclude(last_modified__gt=timezone.now() - grace)
+        .values_list("key", "owner")
+    )
+    if not candidates:
+        return []
+
+    stale = _referenced_in_database(set(candidates.values()))
+    if stale:
+        log.warning(
+            "Media reference index missed %d referenced files; consider --rebuild-index",
+            len(stale),
+        )
+        for refs in stale.values():
+            for model, pk, field, key in refs:
+                MediaReference.objects.update_or_create(
+                    model=model._meta.label_lower,
+                    object_id=str(pk),
+                    field=field.name,
+                    defaults={"key": key, "owner": owner_key(key)},
+                )
+        MediaObject.objects.filter(owner__in=list(stale)).update(dirty=False)
+    return sorted(key for key, owner in candidates.items() if owner not in stale)
+
+
+def forget_keys(keys: List[str]) -> None:
+    """Drop deleted keys from the inventory, the variant manifest and the supplier image index."""
+    from price_parser.models import SupplierImage
+    from shop.models import MediaObject
+
+    from .variant_manifest import forget_variants
+
+    for start in range(0, len(keys), BATCH_SIZE):
+        chunk = keys[start : start + BATCH_SIZE]
+        MediaObject.objects.filter(key__in=chunk).delete()
+        forget_variants(chunk)
+        # Their URLs are downloaded again the next time an importer meets them.
+        SupplierImage.objects.filter(key__in=chunk).delete()
@@ -0,0 +1,230 @@
+"""Manifest of generated responsive variants (``shop.ImageVariant``).
+
+With ``IMAGE_VARIANT_ASSUME_EXISTS`` off, the ``image_variant`` filter and
+``responsive_srcset`` tag used to call ``storage.exists()`` for every width of
+every rendered image — one HTTP HEAD each on R2/S3. The generator now records
+each variant (width, format, bytes, pixel size) here and the tags read the
+manifest instead:
+
+* lookups are memoised per request (``manifest_scope``, opened by
+  ``store.middleware.VariantManifestMiddleware``) and can be batched up front
+  with ``prefetch`` / ``{% prefetch_variants %}``, one query per page;
+* a key without any manifest rows is "unknown" (generated before the
+  manifest existed) and the tags fall back to the storage check for it;
+  ``generate_responsive_images`` fills those in.
+
+The same pass stores each original's intrinsic size, dominant colour and a
+tiny LQIP data URI (``shop.ImageMetadata``) for width/height attributes and
+inline placeholders. ``ManifestLookup.metadata`` loads it for every name the
+lookup has seen in one more query, only when a template asks for it.
+"""
+
+from __future__ import annotations
+
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Set, Tuple
+
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    width: int
+    format: str
+    name: str
+    size_bytes: int
+    pixel_width: int
+    pixel_height: int
+
+
+Entries = Dict[Tuple[int, str], ManifestEntry]
+
+
+@dataclass(frozen=True)
+class ImageMeta:
+    width: int
+    height: int
+    dominant_color: str = ""
+    lqip: str = ""
+
+
+def manifest_enabled() -> bool:
+    return bool(getattr(settings, "IMAGE_VARIANT_MANIFEST", True))
+
+
+def record_variants(source_name: str, fmt: str, variants: Sequence) -> None:
+    """Upsert manifest rows for freshly generated (or verified) variants."""
+    if not source_name or not variants or not manifest_enabled():
+        return
+    from shop.models import ImageVariant
+
+    rows = [
+        ImageVariant(
+            source_name=source_name,
+            width=variant.width,
+            format=fmt,
+            name=variant.name,
+            size_bytes=variant.size_bytes,
+            pixel_width=getattr(variant, "pixel_width", 0),
+            pixel_height=getattr(variant, "pixel_height", 0),
+        )
+        for variant in variants
+    ]
+    ImageVariant.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["source_name", "width", "format"],
+        update_fields=[
+            "name",
+            "size_bytes",
+            "pixel_width",
+            "pixel_height",
+            "updated_at",
+        ],
+    )
+
+
+def record_metadata(source_name: str, meta: ImageMeta) -> None:
+    if not source_name or not manifest_enabled():
+        return
+    from shop.models import ImageMetadata
+
+    ImageMetadata.objects.bulk_create(
+        [
+            ImageMetadata(
+                source_name=source_name,
+                width=meta.width,
+                height=meta.height,
+                dominant_color=meta.dominant_color,
+                lqip=meta.lqip,
+            )
+        ],
+        update_conflicts=True,
+        unique_fields=["source_name"],
+        update_fields=["width", "height", "dominant_color", "lqip", "updated_at"],
+    )
+
+
+def has_metadata(source_name: str) -> bool:
+    from shop.models import ImageMetadata
+
+    return ImageMetadata.objects.filter(source_name=source_name).exists()
+
+
+def forget_variants(source_names: Iterable[str]) -> int:
+    """Drop manifest rows, e.g. after the variants were deleted from storage."""
+    from shop.models import ImageMetadata, ImageVariant
+
+    source_names = list(source_names)
+    ImageMetadata.objects.filter(source_name__in=source_names).delete()
+    deleted, _ = ImageVariant.objects.filter(source_name__in=source_names).delete()
+    return deleted
+
+
+class ManifestLookup:
+    """Memoised manifest reads; ``None`` for a key means "not in the manifest"."""
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, Optional[Entries]] = {}
+        self._meta: Dict[str, Optional[ImageMeta]] = {}
+        self._seen: Set[str] = set()
+
+    def remember(self, names: Iterable[str]) -> None:
+        """Note names whose metadata a later ``metadata`` call should batch-load."""
+        self._seen.update(name for name in names if name)
+
+    def prefetch(self, names: Iterable[str]) -> None:
+        missing = {name for name in names if name and name not in self._entries}
+        if not missing:
+            return
+        from shop.models import ImageVariant
+
+        found: Dict[str, Entries] = {}
+        rows = ImageVariant.objects.filter(source_name__in=missing).values_list(
+            "source_name",
+            "width",
+            "format",
+            "name",
+            "size_bytes",
+            "pixel_width",
+            "pixel_height",
+        )
+        for (
+            source_name,
+            width,
+            fmt,
+            name,
+            size_bytes,
+            pixel_width,
+            pixel_height,
+        ) in rows:
+            found.setdefault(source_name, {})[(width, fmt)] = ManifestEntry(
+                width, fmt, name, size_bytes, pixel_width, pixel_height
+            )
+        for name in missing:
+            self._entries[name] = found.get(name)
+
+    def get(self, name: str) -> Optional[Entries]:
+        if name not in self._entries:
+            self.prefetch([name])
+        return self._entries.get(name)
+
+    def metadata(self, name: str) -> Optional[ImageMeta]:
+        if not name:
+            return None
+        if name not in self._meta:
+            # Batch with everything prefetched so far (the rest of the page).
+            missing = {
+                key for key in self._seen.union(self._entries) if key not in self._meta
+            } | {name}
+            from shop.models import ImageMetadata
+
+            rows = ImageMetadata.objects.filter(source_name__in=missing).values_list(
+                "source_name", "width", "height", "dominant_color", "lqip"
+            )
+            found = {row[0]: ImageMeta(*row[1:]) for row in rows}
+            for key in missing:
+                self._meta[key] = found.get(key)
+        return self._meta[name]
+
+
+_current: ContextVar[Optional[ManifestLookup]] = ContextVar(
+    "variant_manifest", default=None
+)
+
+
+@contextmanager
+def manifest_scope() -> Iterator[ManifestLookup]:
+    """Share one ``ManifestLookup`` for everything rendered inside the block."""
+    lookup = ManifestLookup()
+    token = _current.set(lookup)
+    try:
+        yield lookup
+    finally:
+        _current.reset(token)
+
+
+def current_lookup() -> ManifestLookup:
+    # Outside a scope (shell, management commands) nothing is memoised.
+    return _current.get() or ManifestLookup()
+
+
+def prefetch(image_fields_or_names: Iterable, variants: bool = True) -> None:
+    """Load the manifest for many images with one query (no-op outside a scope).
+
+    With ``variants=False`` only their metadata is batched (on first use).
+    """
+    lookup = _current.get()
+    if lookup is None or not manifest_enabled():
+        return
+    names = [
+        getattr(item, "name", item) or "" for item in image_fields_or_names if item
+    ]
+    lookup.remember(names)
+    if variants:
+        lookup.prefetch(names)
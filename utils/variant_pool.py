@@ -0,0 +1,371 @@
+"""Bounded background pool for responsive image variant generation.
+
+Saving an image used to start one daemon thread per file; an importer saving
+hundreds of products ran hundreds of LANCZOS resizes and WebP encodes at once
+inside the web process. ``VariantPool`` replaces that with:
+
+* a fixed number of worker *processes* (``IMAGE_VARIANT_WORKERS``) — encoding
+  is CPU-bound, so threads would only fight over the GIL — created lazily on
+  the first submit;
+* de-duplication by storage key: a key already waiting in the queue is not
+  queued again, and a key saved again while it is being processed is re-run
+  once afterwards;
+* backpressure: at most ``IMAGE_VARIANT_MAX_PENDING`` keys are in flight. A
+  submit waits up to ``IMAGE_VARIANT_SUBMIT_TIMEOUT`` seconds for a slot
+  (which throttles bulk importers) and then gives up, so a web request is
+  never blocked for long;
+* a persistent retry list (``IMAGE_VARIANT_RETRY_FILE``) of keys that failed
+  or did not fit in the queue, re-run by
+  ``manage.py generate_responsive_images --retry-failed``.
+
+``IMAGE_VARIANT_EXECUTOR = "thread"`` runs the same pool with threads (no
+process start-up cost; handy in development and tests).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from django.conf import settings
+from django.core.files.storage import Storage, default_storage, storages
+
+from .image_variants import GeneratedVariant, generate_variants_for_storage_key
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+log = logging.getLogger(__name__)
+
+# What crosses the process boundary instead of a Storage: None (default
+# storage), a STORAGES alias or a picklable storage object.
+StorageRef = Optional[Union[str, Storage]]
+
+
+# --- Retry list -------------------------------------------------------------
+
+
+class RetryList:
+    """Storage keys whose variants still have to be generated, kept in a JSON file.
+
+    Several web/worker processes may write it, so every update re-reads the
+    file under an exclusive ``flock``.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]) -> None:
+        self.path = Path(path)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_suffix(self.path.suffix + ".lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write(self, entries: Dict[str, dict]) -> None:
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(entries, fh, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+    def add(self, name: str, options: dict, error: str) -> None:
+        with self._locked():
+            entries = self._read()
+            entry = entries.get(name, {})
+            entries[name] = {
+                "options": options,
+                "error": error[:500],
+                "attempts": entry.get("attempts", 0) + 1,
+                "failed_at": datetime.now(timezone.utc).isoformat(),
+            }
+            self._write(entries)
+
+    def discard(self, name: str) -> None:
+        if not self.path.exists():
+            return
+        with self._locked():
+            entries = self._read()
+            if entries.pop(name, None) is not None:
+                self._write(entries)
+
+    def entries(self) -> Dict[str, dict]:
+        with self._locked():
+            return self._read()
+
+
+# --- Worker side --------------------------------------------------------------
+
+
+def _init_worker() -> None:
+    import django
+
+    django.setup()
+
+
+def _resolve_storage(ref: StorageRef) -> Storage:
+    if ref is None:
+        return default_storage
+    if isinstance(ref, str):
+        return storages[ref]
+    return ref
+
+
+_uploader: Optional[ThreadPoolExecutor] = None
+_uploader_lock = threading.Lock()
+
+
+def _get_uploader() -> ThreadPoolExecutor:
+    """Per-process threads that upload variants while the next one is encoded."""
+    global _uploader
+    with _uploader_lock:
+        if _uploader is None:
+            _uploader = ThreadPoolExecutor(
+                max_workers=max(
+                    1, int(getattr(settings, "IMAGE_VARIANT_UPLOAD_THREADS", 3))
+                ),
+                thread_name_prefix="img-variants-upload",
+            )
+        return _uploader
+
+
+def _generate(name: str, ref: StorageRef, options: dict) -> List[GeneratedVariant]:
+    return generate_variants_for_storage_key(
+        name, storage=_resolve_storage(ref), uploader=_get_uploader(), **options
+    )
+
+
+def generate_with_stats(
+    name: str, ref: StorageRef, options: dict
+) -> Tuple[List[GeneratedVariant], int]:
+    """Like ``_generate``, but also returns the original's size in bytes (0 if unknown)."""
+    variants = _generate(name, ref, options)
+    try:
+        source_bytes = _resolve_storage(ref).size(name)
+    except Exception:
+        source_bytes = 0
+    return variants, source_bytes
+
+
+def process_executor(
+    workers: int, max_tasks_per_child: Optional[int] = None
+) -> ProcessPoolExecutor:
+    """Process pool whose workers have Django set up."""
+    # "spawn": forking a multi-threaded web process is unsafe.
+    return ProcessPoolExecutor(
+        max_workers=max(1, int(workers)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        max_tasks_per_child=max_tasks_per_child,
+    )
+
+
+def storage_ref(storage: Optional[Storage]) -> StorageRef:
+    """Picklable reference to ``storage``: ``None`` (default), an alias or the object."""
+    if storage is None or storage is default_storage:
+        return None
+    for alias in settings.STORAGES:
+        if storages[alias] is storage:
+            return alias
+    return storage
+
+
+# --- Pool ---------------------------------------------------------------------
+
+
+class VariantPool:
+    def __init__(
+        self,
+        workers: int = 2,
+        executor: str = "process",
+        max_pending: int = 200,
+        submit_timeout: float = 5.0,
+        retry_list: Optional[RetryList] = None,
+        max_tasks_per_child: Optional[int] = None,
+    ):
+        self.workers = max(1, int(workers))
+        self.executor_kind = executor
+        self.max_pending = max(1, int(max_pending))
+        self.submit_timeout = submit_timeout
+        self.retry_list = retry_list
+        self.max_tasks_per_child = max_tasks_per_child
+        self._executor: Optional[Union[ProcessPoolExecutor, ThreadPoolExecutor]] = None
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pending: Dict[str, Future] = {}
+        self._options: Dict[str, tuple] = {}
+        self._rerun: Dict[str, tuple] = {}
+
+    def _get_executor(self) -> Union[ProcessPoolExecutor, ThreadPoolExecutor]:
+        if self._executor is None:
+            if self.executor_kind == "thread":
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="img-variants"
+                )
+            else:
+                self._executor = process_executor(
+                    self.workers, self.max_tasks_per_child
+                )
+        return self._executor
+
+    def submit(
+        self, name: str, storage: Optional[Storage] = None, **options: Any
+    ) -> Optional[Future]:
+        """Queue variant generation for ``name``; returns its future or None if deferred."""
+        if not name:
+            return None
+        ref = storage_ref(storage)
+        with self._lock:
+            current = self._pending.get(name)
+            if current is not None:
+                if current.running():
+                    # The file may have changed after the worker read it.
+                    self._rerun[name] = (ref, options)
+                return current
+
+        if not self._slots.acquire(timeout=self.submit_timeout):
+            log.warning(
+                "Responsive variants queue is full, '%s' deferred to the retry list",
+                name,
+            )
+            self._defer(name, options, "queue full")
+            return None
+
+        with self._lock:
+            current = self._pending.get(name)
+            if current is not None:  # queued by another thread meanwhile
+                self._slots.release()
+                return current
+            try:
+                future = self._get_executor().submit(_generate, name, ref, options)
+            except (BrokenProcessPool, RuntimeError):
+                log.warning(
+                    "Responsive variants pool is broken, restarting it", exc_info=True
+                )
+                self._executor = None
+                future = self._get_executor().submit(_generate, name, ref, options)
+            self._pending[name] = future
+            self._options[name] = (ref, options)
+        future.add_done_callback(partial(self._done, name))
+        return future
+
+    def _done(self, name: str, future: Future) -> None:
+        with self._lock:
+            _, options = self._options.get(name, (None, {}))
+        exc = future.exception()
+        if exc is None:
+            if self.retry_list is not None:
+                self.retry_list.discard(name)
+        elif isinstance(exc, FileNotFoundError):
+            log.warning("Responsive variants skipped: '%s' not found in storage", name)
+        else:
+            log.error("Failed to generate responsive variants for '%s': %s", name, exc)
+            self._defer(name, options, repr(exc))
+
+        # Only now the key counts as finished (see ``wait``).
+        with self._lock:
+            if self._pending.get(name) is future:
+                del self._pending[name]
+                self._options.pop(name, None)
+            rerun = self._rerun.pop(name, None)
+            self._idle.notify_all()
+        self._slots.release()
+
+        if rerun is not None:
+            ref, rerun_options = rerun
+            storage = _resolve_storage(ref)
+            threading.Thread(
+                target=self.submit,
+                args=(name, storage),
+                kwargs=rerun_options,
+                daemon=True,
+            ).start()
+
+    def _defer(self, name: str, options: dict, error: str) -> None:
+        if self.retry_list is None:
+            return
+        try:
+            self.retry_list.add(name, options, error)
+        except OSError:
+            log.exception(
+                "Could not record '%s' in the responsive variants retry list", name
+            )
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Block until the queue is empty (including retry-list bookkeeping)."""
+        with self._idle:
+            self._idle.wait_for(lambda: not self._pending, timeout=timeout)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+_pool: Optional[VariantPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_variant_pool() -> VariantPool:
+    """Process-wide pool configured from settings."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            retry_file = getattr(settings, "IMAGE_VARIANT_RETRY_FILE", "")
+            _pool = VariantPool(
+                workers=getattr(settings, "IMAGE_VARIANT_WORKERS", 2),
+                executor=getattr(settings, "IMAGE_VARIANT_EXECUTOR", "process"),
+                max_pending=getattr(settings, "IMAGE_VARIANT_MAX_PENDING", 200),
+                submit_timeout=getattr(settings, "IMAGE_VARIANT_SUBMIT_TIMEOUT", 5.0),
+                retry_list=RetryList(retry_file) if retry_file else None,
+                max_tasks_per_child=getattr(
+                    settings, "IMAGE_VARIANT_MAX_TASKS_PER_CHILD", None
+                )
+                or None,
+            )
+        return _pool
+
+
+def retry_failed_variants(
+    pool: Optional[VariantPool] = None, max_attempts: Optional[int] = None
+) -> int:
+    """Re-queue keys from the retry list; returns how many were submitted."""
+    pool = pool or get_variant_pool()
+    if pool.retry_list is None:
+        return 0
+    submitted = 0
+    for name, entry in pool.retry_list.entries().items():
+        if max_attempts and entry.get("attempts", 0) >= max_attempts:
+            continue
+        if pool.submit(name, **entry.get("options", {})) is not None:
+            submitted += 1
+    return submitted